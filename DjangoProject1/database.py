@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+from urllib.parse import unquote, urlparse
+
+import django
+from django.db.backends.signals import connection_created
+
+# =========================
+# 数据库后端配置
+# =========================
+# 默认 SQLite：WAL + synchronous=NORMAL + busy_timeout + mmap，连接按 CONN_MAX_AGE 复用。
+# 多个 Celery worker 并发回调 job_update 时，读（状态轮询）不再被写锁阻塞，写锁冲突改为排队等待。
+# 多节点部署设 DB_ENGINE=postgres（需要安装 psycopg），连接参数取 DATABASE_URL 或 POSTGRES_*。
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name, "")
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except Exception:
+        return default
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    raw = os.environ.get(name, "")
+    if not raw:
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+def sqlite_pragmas() -> List[str]:
+    if not _env_flag("SQLITE_TUNING", True):
+        return []
+    return [
+        f"PRAGMA journal_mode={os.environ.get('SQLITE_JOURNAL_MODE', 'WAL').strip() or 'WAL'}",
+        f"PRAGMA synchronous={os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').strip() or 'NORMAL'}",
+        f"PRAGMA busy_timeout={_env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)}",
+        f"PRAGMA mmap_size={_env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)}",
+        f"PRAGMA cache_size=-{_env_int('SQLITE_CACHE_SIZE_KB', 20000)}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def _apply_sqlite_pragmas(sender: Any, connection: Any, **kwargs: Any) -> None:
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+
+
+def _sqlite_database(base_dir: Path) -> Dict[str, Any]:
+    name = (os.environ.get("SQLITE_PATH") or "").strip().strip('"').strip("'")
+    busy_ms = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+    options: Dict[str, Any] = {"timeout": max(1, busy_ms) / 1000.0}
+    if django.VERSION >= (5, 1) and _env_flag("SQLITE_TUNING", True):
+        # 写事务一开始就拿写锁：避免“先读后写”升级锁时直接 database is locked（不受 busy_timeout 保护）
+        options["transaction_mode"] = "IMMEDIATE"
+    # 每个新连接执行 PRAGMA（兼容 Django 4.2，没有 init_command 选项）
+    connection_created.connect(_apply_sqlite_pragmas, dispatch_uid="contract_sqlite_pragmas", weak=False)
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": Path(name) if name else base_dir / "db.sqlite3",
+        "OPTIONS": options,
+    }
+
+
+def _postgres_database() -> Dict[str, Any]:
+    url = (os.environ.get("DATABASE_URL") or "").strip()
+    if url:
+        parsed = urlparse(url)
+        return {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": unquote(parsed.path.lstrip("/")),
+            "USER": unquote(parsed.username or ""),
+            "PASSWORD": unquote(parsed.password or ""),
+            "HOST": parsed.hostname or "127.0.0.1",
+            "PORT": str(parsed.port or 5432),
+        }
+    return {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("POSTGRES_DB", "contract_review"),
+        "USER": os.environ.get("POSTGRES_USER", "postgres"),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": os.environ.get("POSTGRES_HOST", "127.0.0.1"),
+        "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+    }
+
+
+def build_databases(base_dir: Path) -> Dict[str, Dict[str, Any]]:
+    engine = (os.environ.get("DB_ENGINE") or "sqlite").strip().lower()
+    if engine in {"postgres", "postgresql", "pg"}:
+        default = _postgres_database()
+    else:
+        default = _sqlite_database(base_dir)
+    # 持久连接：worker 回调与状态轮询不再每个请求重新建连、重复执行 PRAGMA
+    default["CONN_MAX_AGE"] = _env_int("DB_CONN_MAX_AGE", 60)
+    default["CONN_HEALTH_CHECKS"] = True
+    return {"default": default}
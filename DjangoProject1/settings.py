@@ -2,6 +2,8 @@ from pathlib import Path
 from dotenv import load_dotenv
 import os
 
+from DjangoProject1.database import build_databases
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 ENV_PATH = BASE_DIR / ".env"
@@ -76,12 +78,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'DjangoProject1.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# SQLite 默认开启 WAL / busy_timeout / 持久连接；DB_ENGINE=postgres 切换到 PostgreSQL（见 database.py）
+DATABASES = build_databases(BASE_DIR)
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -112,3 +110,53 @@ WORKER_SUBMIT_RETRY = int(os.environ.get("WORKER_SUBMIT_RETRY", "1"))
 MAX_RESULT_MARKDOWN_CHARS = int(os.environ.get("MAX_RESULT_MARKDOWN_CHARS", "200000"))
 JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", "30"))
 
+# Live job state (Redis): running progress is served from Redis, terminal results from the DB
+JOB_STATE_TERMINAL_TTL = int(os.environ.get("JOB_STATE_TERMINAL_TTL", "600"))
+# Check the DB for a terminal status only when the live hash is older than this (leftover of a failed terminal switch)
+JOB_STATE_DB_CHECK_AFTER = int(os.environ.get("JOB_STATE_DB_CHECK_AFTER", "30"))
+JOB_EVENTS_POLL_SECONDS = float(os.environ.get("JOB_EVENTS_POLL_SECONDS", "1.0"))
+JOB_EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("JOB_EVENTS_HEARTBEAT_SECONDS", "15"))
+JOB_EVENTS_MAX_SECONDS = float(os.environ.get("JOB_EVENTS_MAX_SECONDS", "600"))
+
+# Materialized terminal reports (job_status / job_result bodies + ETag)
+REPORT_CACHE_REDIS_URL = os.environ.get("REPORT_CACHE_REDIS_URL", "").strip()
+# Keys carry the job row's updated_at, so rewrites never hit stale entries; the TTL bounds what old versions keep
+REPORT_CACHE_TTL = int(os.environ.get("REPORT_CACHE_TTL", "3600"))
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "reports": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REPORT_CACHE_REDIS_URL,
+            "KEY_PREFIX": "contract",
+        }
+        if REPORT_CACHE_REDIS_URL
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "contract-reports",
+            "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("REPORT_CACHE_MAX_ENTRIES", "512"))},
+        }
+    ),
+}
+
+# Resumable uploads (init -> PUT byte ranges -> finalize)
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(1024 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_HOURS = int(os.environ.get("UPLOAD_SESSION_TTL_HOURS", "24"))
+# cleanup_jobs keeps unreferenced blobs touched within this window (committed, job row not created yet)
+UPLOAD_BLOB_GRACE_MINUTES = int(os.environ.get("UPLOAD_BLOB_GRACE_MINUTES", "10"))
+# init 时声明的 sha256 已在库中则直接跳过上传。默认关闭：只凭哈希（不证明持有内容）就能对库中
+# 别人上传的文件发起分析；仅在单用户 / 可信内网部署中开启
+UPLOAD_DEDUP_BY_HASH = os.environ.get("UPLOAD_DEDUP_BY_HASH", "0").strip().lower() in {"1", "true", "yes", "y", "on"}
+
+# PDF export: rendered once per report content, stored under MEDIA_ROOT/exports
+PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", "2"))
+PDF_RENDER_QUEUE_MAX = int(os.environ.get("PDF_RENDER_QUEUE_MAX", "32"))
+PDF_RENDER_TIMEOUT = int(os.environ.get("PDF_RENDER_TIMEOUT", "120"))
+# 任务完成时后台预渲染，首次下载不再等渲染
+PDF_EXPORT_PREWARM = os.environ.get("PDF_EXPORT_PREWARM", "1").strip().lower() in {"1", "true", "yes", "y", "on"}
+# wkhtmltopdf（默认，HTML 保真，失败退回 reportlab）| reportlab（进程内直接排版）
+# 默认引擎等 bench_pdf_export 的实测对比出来再决定是否切换
+PDF_ENGINE = os.environ.get("PDF_ENGINE", "wkhtmltopdf").strip().lower() or "wkhtmltopdf"
@@ -1,34 +1,93 @@
 ﻿from __future__ import annotations
 
+import asyncio
 import io
 import json
 import os
 import re
 import socket
-import threading
 import zipfile
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Tuple
 from urllib.parse import urlparse
 
+import httpx
 import requests
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import JSONResponse, Response
-
-
-app = FastAPI(title="Contract Local API", version="0.3.0")
-_SESSION = requests.Session()
-_LOCK = threading.Lock()
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 DJANGO_BASE = (os.environ.get("LOCAL_API_DJANGO_BASE") or "http://127.0.0.1:8000/contract").rstrip("/")
 WORKER_HEALTH_URL = (os.environ.get("LOCAL_API_WORKER_HEALTH") or "http://127.0.0.1:8001/healthz").rstrip("/")
 REQUEST_TIMEOUT = int(os.environ.get("LOCAL_API_TIMEOUT", "30"))
+# SSE 读超时需大于 Django 心跳间隔（JOB_EVENTS_HEARTBEAT_SECONDS）
+EVENTS_READ_TIMEOUT = int(os.environ.get("LOCAL_API_EVENTS_READ_TIMEOUT", "60"))
+UPLOAD_TIMEOUT = int(os.environ.get("LOCAL_API_UPLOAD_TIMEOUT", "120"))
+EXPORT_TIMEOUT = int(os.environ.get("LOCAL_API_EXPORT_TIMEOUT", "120"))
+# 连接池满时最多等待的秒数，超时直接返回 502，避免请求无限排队
+POOL_TIMEOUT = float(os.environ.get("LOCAL_API_POOL_TIMEOUT", "10"))
+MAX_CONNECTIONS = int(os.environ.get("LOCAL_API_MAX_CONNECTIONS", "64"))
+MAX_KEEPALIVE = int(os.environ.get("LOCAL_API_MAX_KEEPALIVE", "16"))
+# SSE 长连接单独一个池，不占用普通代理请求的连接
+EVENTS_MAX_CONNECTIONS = int(os.environ.get("LOCAL_API_EVENTS_MAX_CONNECTIONS", "256"))
 UPDATE_MANIFEST_URL = (os.environ.get("APP_UPDATE_MANIFEST_URL") or "").strip()
 VERSION_FILE = Path((os.environ.get("APP_VERSION_FILE") or str(PROJECT_ROOT / "VERSION")).strip().strip('"').strip("'"))
 
 
+# 按路由区分的上游超时：状态轮询要快速失败，上传 / 导出允许较长读写
+STATUS_TIMEOUT = httpx.Timeout(REQUEST_TIMEOUT, pool=POOL_TIMEOUT)
+UPLOAD_TIMEOUTS = httpx.Timeout(connect=REQUEST_TIMEOUT, read=UPLOAD_TIMEOUT, write=UPLOAD_TIMEOUT, pool=POOL_TIMEOUT)
+EXPORT_TIMEOUTS = httpx.Timeout(connect=REQUEST_TIMEOUT, read=EXPORT_TIMEOUT, write=REQUEST_TIMEOUT, pool=POOL_TIMEOUT)
+EVENTS_TIMEOUTS = httpx.Timeout(connect=REQUEST_TIMEOUT, read=EVENTS_READ_TIMEOUT, write=REQUEST_TIMEOUT, pool=POOL_TIMEOUT)
+
+
+# =========================
+# 上游连接（httpx.AsyncClient，无全局锁）
+# =========================
+# 所有代理请求共用一个有界连接池并发访问 Django；慢上传 / 导出不再阻塞状态轮询。
+_CLIENTS: Dict[str, httpx.AsyncClient] = {}
+_CSRF_TOKEN = ""
+_CSRF_LOCK = asyncio.Lock()
+
+
+def _upstream() -> httpx.AsyncClient:
+    client = _CLIENTS.get("api")
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=STATUS_TIMEOUT,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+        )
+        _CLIENTS["api"] = client
+    return client
+
+
+def _events_upstream() -> httpx.AsyncClient:
+    client = _CLIENTS.get("events")
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=EVENTS_TIMEOUTS,
+            limits=httpx.Limits(max_connections=EVENTS_MAX_CONNECTIONS, max_keepalive_connections=0),
+        )
+        _CLIENTS["events"] = client
+    return client
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    try:
+        yield
+    finally:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+        for client in clients:
+            await client.aclose()
+
+
+app = FastAPI(title="Contract Local API", version="0.4.0", lifespan=_lifespan)
+
+
 def _django(path: str) -> str:
     return f"{DJANGO_BASE}{path}"
 
@@ -37,7 +96,7 @@ def _is_truthy(value: str | None) -> bool:
     return (value or "").strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
-def _extract_html_error(resp: requests.Response) -> str:
+def _extract_html_error(resp: httpx.Response) -> str:
     text = (resp.text or "").strip()
     if not text:
         return "上游服务返回空响应。"
@@ -52,7 +111,7 @@ def _extract_html_error(resp: requests.Response) -> str:
     return f"上游服务返回了非 JSON 响应（HTTP {resp.status_code}）。"
 
 
-def _safe_json(resp: requests.Response) -> Dict[str, Any]:
+def _safe_json(resp: httpx.Response) -> Dict[str, Any]:
     try:
         data = resp.json()
         if isinstance(data, dict):
@@ -127,15 +186,19 @@ def _tcp_probe(host: str, port: int, timeout_s: float = 0.8) -> Tuple[bool, str]
         return False, str(exc)
 
 
-def _ensure_csrf() -> str:
-    with _LOCK:
-        resp = _SESSION.get(_django("/api/health/"), timeout=REQUEST_TIMEOUT)
-    if resp.status_code >= 500:
-        raise RuntimeError(f"django health failed: {resp.status_code}")
-    token = _SESSION.cookies.get("csrftoken", "")
-    if token:
-        return token
-    return "local-api-csrf"
+async def _ensure_csrf(refresh: bool = False) -> str:
+    """CSRF token 缓存在进程内（cookie 留在共享 client 里）；被拒（403）时 refresh 重新获取。"""
+    global _CSRF_TOKEN
+    if _CSRF_TOKEN and not refresh:
+        return _CSRF_TOKEN
+    async with _CSRF_LOCK:
+        if _CSRF_TOKEN and not refresh:
+            return _CSRF_TOKEN
+        resp = await _upstream().get(_django("/api/health/"))
+        if resp.status_code >= 500:
+            raise RuntimeError(f"django health failed: {resp.status_code}")
+        _CSRF_TOKEN = _upstream().cookies.get("csrftoken") or resp.cookies.get("csrftoken") or "local-api-csrf"
+        return _CSRF_TOKEN
 
 
 def _is_local_vllm_required() -> bool:
@@ -322,10 +385,12 @@ def _build_preflight_report() -> Dict[str, Any]:
     }
 
 
-def _proxy_get_json(path: str) -> JSONResponse:
+async def _proxy_get_json(path: str, request: Request | None = None) -> Response:
+    headers: Dict[str, str] = {}
+    if request is not None and request.headers.get("if-none-match"):
+        headers["If-None-Match"] = request.headers["if-none-match"]
     try:
-        with _LOCK:
-            resp = _SESSION.get(_django(path), timeout=REQUEST_TIMEOUT)
+        resp = await _upstream().get(_django(path), headers=headers)
     except Exception as exc:
         return _error_response(
             status_code=502,
@@ -335,15 +400,26 @@ def _proxy_get_json(path: str) -> JSONResponse:
             suggestions=["请执行 start_all.bat start，然后重试。"],
         )
 
-    data = _safe_json(resp)
+    etag = resp.headers.get("ETag") or ""
+    if resp.status_code == 304:
+        return Response(status_code=304, headers={"ETag": etag} if etag else None)
+
     if resp.status_code >= 400:
         payload = _normalize_upstream_error(
-            data,
+            _safe_json(resp),
             fallback_code="E-UPSTREAM-REQUEST-FAILED",
             fallback_message="上游服务返回异常",
         )
         return JSONResponse(status_code=resp.status_code, content=payload)
-    return JSONResponse(status_code=resp.status_code, content=data)
+    if etag:
+        # 终态报告带 ETag，原样透传响应体即可，免去一次 JSON 重编码
+        return Response(
+            content=resp.content,
+            status_code=resp.status_code,
+            media_type="application/json",
+            headers={"ETag": etag, "Cache-Control": "no-cache"},
+        )
+    return JSONResponse(status_code=resp.status_code, content=_safe_json(resp))
 
 
 def _load_update_manifest() -> Dict[str, Any]:
@@ -436,27 +512,60 @@ def contract_update_check():
         )
 
 
-@app.post("/contract/api/start/")
-async def contract_start(file: UploadFile = File(...)):
-    filename = (file.filename or "uploaded.pdf").strip()
-    if not filename.lower().endswith(".pdf"):
-        return _error_response(
-            status_code=400,
-            code="E-FILE-TYPE-PDF-ONLY",
-            message="仅支持上传 PDF 文件。",
-            suggestions=["请确认文件扩展名为 .pdf，且文件内容为有效 PDF。"],
-        )
+# Django 上传校验失败时的错误码 -> 面向用户的提示
+_UPLOAD_ERRORS: Dict[str, Tuple[str, List[str]]] = {
+    "E-FILE-MISSING": ("未收到上传文件。", ["请重新选择 PDF 文件后上传。"]),
+    "E-FILE-TYPE-PDF-ONLY": ("仅支持上传 PDF 文件。", ["请确认文件扩展名为 .pdf，且文件内容为有效 PDF。"]),
+    "E-FILE-CONTENT-NOT-PDF": ("文件内容不是有效的 PDF。", ["请确认文件未损坏，或重新导出为 PDF 后上传。"]),
+    "E-UPLOAD-SIZE-INVALID": ("文件大小超出限制。", ["请压缩或拆分文件后重新上传。"]),
+    "E-UPLOAD-NOT-FOUND": ("上传会话不存在或已过期。", ["请重新发起上传。"]),
+    "E-UPLOAD-INCOMPLETE": ("文件尚未上传完整。", ["请按返回的 offset 继续上传剩余部分。"]),
+    "E-UPLOAD-HASH-MISMATCH": ("文件校验失败，上传已作废。", ["请检查网络后重新上传。"]),
+}
+
+
+async def _proxy_upload(
+    method: str,
+    path: str,
+    request: Request,
+    *,
+    stream_body: bool = False,
+    fallback_code: str = "E-UPSTREAM-UPLOAD-FAILED",
+    fallback_message: str = "上游服务拒绝了上传请求",
+) -> Response:
+    """上传相关请求的代理：stream_body 时请求体原样流式转发，不在本进程缓存整份文件。"""
+    headers: Dict[str, str] = {}
+    content: Any = None
+    if stream_body:
+        content_length = request.headers.get("content-length") or ""
+        if not content_length:
+            # Django（WSGI）不接受分块编码的请求体，必须带 Content-Length
+            return _error_response(
+                status_code=411,
+                code="E-UPLOAD-LENGTH-REQUIRED",
+                message="上传请求缺少 Content-Length。",
+                suggestions=["请升级客户端后重试。"],
+            )
+        headers["Content-Length"] = content_length
+        headers["Content-Type"] = request.headers.get("content-type") or "application/octet-stream"
+        if request.headers.get("content-range"):
+            headers["Content-Range"] = request.headers["content-range"]
+        content = request.stream()
+    elif method == "POST":
+        headers["Content-Type"] = "application/json"
+        content = await request.body()
 
     try:
-        csrf = _ensure_csrf()
-        content = await file.read()
-        files = {"file": (filename, content, file.content_type or "application/pdf")}
-        with _LOCK:
-            resp = _SESSION.post(
-                _django("/api/start/"),
-                files=files,
-                headers={"X-CSRFToken": csrf},
-                timeout=max(REQUEST_TIMEOUT, 120),
+        headers["X-CSRFToken"] = await _ensure_csrf()
+        resp = await _upstream().request(method, _django(path), content=content, headers=headers, timeout=UPLOAD_TIMEOUTS)
+        if resp.status_code == 403:
+            # 缓存的 token 失效（Django 重启 / 换了 SECRET_KEY）：请求体已流式发出无法重放，刷新后让客户端重试
+            await _ensure_csrf(refresh=True)
+            return _error_response(
+                status_code=503,
+                code="E-PROXY-CSRF-REFRESHED",
+                message="服务会话已刷新，请重新提交。",
+                suggestions=["请直接重试上传。"],
             )
     except Exception as exc:
         return _error_response(
@@ -469,30 +578,153 @@ async def contract_start(file: UploadFile = File(...)):
 
     data = _safe_json(resp)
     if resp.status_code >= 400:
+        message, suggestions = _UPLOAD_ERRORS.get(str(data.get("error_code") or ""), ("", []))
+        if message:
+            data = dict(data, error=message, error_message=message)
         payload = _normalize_upstream_error(
             data,
-            fallback_code="E-UPSTREAM-START-FAILED",
-            fallback_message="上游服务拒绝了任务提交",
+            fallback_code=fallback_code,
+            fallback_message=fallback_message,
+            suggestions=suggestions,
         )
         return JSONResponse(status_code=resp.status_code, content=payload)
     return JSONResponse(status_code=resp.status_code, content=data)
 
 
+@app.post("/contract/api/start/")
+async def contract_start(request: Request):
+    # multipart 请求体原样流式转发给 Django，不在本进程解析或缓存整份文件；
+    # Django 侧边接收边哈希，直接写入按内容寻址的存储
+    content_type = request.headers.get("content-type") or ""
+    if not content_type.lower().startswith("multipart/form-data"):
+        return _error_response(
+            status_code=400,
+            code="E-UPLOAD-FORMAT-INVALID",
+            message="上传格式错误，请以表单方式上传 PDF 文件。",
+            suggestions=["表单字段名应为 file。"],
+        )
+    return await _proxy_upload(
+        "POST",
+        "/api/start/",
+        request,
+        stream_body=True,
+        fallback_code="E-UPSTREAM-START-FAILED",
+        fallback_message="上游服务拒绝了任务提交",
+    )
+
+
+# 断点续传：init -> PUT 字节区间（Content-Range）-> finalize；GET 查询续传偏移，DELETE 放弃
+@app.post("/contract/api/uploads/")
+async def contract_upload_init(request: Request):
+    return await _proxy_upload("POST", "/api/uploads/", request)
+
+
+@app.get("/contract/api/uploads/{upload_id}/")
+async def contract_upload_state(upload_id: str, request: Request):
+    return await _proxy_upload("GET", f"/api/uploads/{upload_id}/", request)
+
+
+@app.put("/contract/api/uploads/{upload_id}/")
+async def contract_upload_chunk(upload_id: str, request: Request):
+    return await _proxy_upload("PUT", f"/api/uploads/{upload_id}/", request, stream_body=True)
+
+
+@app.delete("/contract/api/uploads/{upload_id}/")
+async def contract_upload_abort(upload_id: str, request: Request):
+    return await _proxy_upload("DELETE", f"/api/uploads/{upload_id}/", request)
+
+
+@app.post("/contract/api/uploads/{upload_id}/finalize/")
+async def contract_upload_finalize(upload_id: str, request: Request):
+    return await _proxy_upload(
+        "POST",
+        f"/api/uploads/{upload_id}/finalize/",
+        request,
+        fallback_code="E-UPSTREAM-START-FAILED",
+        fallback_message="上游服务拒绝了任务提交",
+    )
+
+
+@app.get("/contract/api/status/bulk/")
+async def contract_status_bulk(request: Request):
+    # 必须注册在 /status/{job_id}/ 之前；查询串（ids / since / limit）原样透传
+    query = request.url.query
+    return await _proxy_get_json("/api/status/bulk/" + (f"?{query}" if query else ""), request)
+
+
 @app.get("/contract/api/status/{job_id}/")
-def contract_status(job_id: int):
-    return _proxy_get_json(f"/api/status/{job_id}/")
+async def contract_status(job_id: int, request: Request):
+    return await _proxy_get_json(f"/api/status/{job_id}/", request)
 
 
 @app.get("/contract/api/result/{job_id}/")
-def contract_result(job_id: int):
-    return _proxy_get_json(f"/api/result/{job_id}/")
+async def contract_result(job_id: int, request: Request):
+    return await _proxy_get_json(f"/api/result/{job_id}/", request)
+
+
+@app.get("/contract/api/events/{job_id}/")
+async def contract_events(job_id: int, request: Request):
+    headers = {"Accept": "text/event-stream"}
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id") or ""
+    if last_event_id:
+        headers["Last-Event-ID"] = last_event_id
+    client = _events_upstream()
+    try:
+        # 长连接走单独的连接池，不占用普通代理请求的连接
+        upstream_req = client.build_request("GET", _django(f"/api/events/{job_id}/"), headers=headers)
+        resp = await client.send(upstream_req, stream=True)
+    except Exception as exc:
+        return _error_response(
+            status_code=502,
+            code="E-PROXY-EVENTS-FAILED",
+            message="进度推送连接失败，请改用轮询或稍后重试。",
+            detail=str(exc),
+            suggestions=["请执行 start_all.bat status 检查服务状态。"],
+        )
+
+    if resp.status_code != 200:
+        await resp.aread()
+        await resp.aclose()
+        data = _safe_json(resp)
+        payload = _normalize_upstream_error(
+            data,
+            fallback_code="E-UPSTREAM-EVENTS-FAILED",
+            fallback_message="上游服务拒绝了进度推送",
+        )
+        return JSONResponse(status_code=resp.status_code, content=payload)
+
+    async def _relay():
+        try:
+            async for chunk in resp.aiter_raw():
+                if chunk:
+                    yield chunk
+        except Exception:
+            # 上游断开：客户端按 retry 间隔带 Last-Event-ID 重连
+            return
+        finally:
+            await resp.aclose()
+
+    return StreamingResponse(
+        _relay(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+_EXPORT_FORWARD_HEADERS = ("if-none-match", "range", "if-range")
+_EXPORT_RELAY_HEADERS = ("ETag", "Accept-Ranges", "Content-Range", "Content-Disposition", "Cache-Control", "X-PDF-Engine")
 
 
 @app.get("/contract/api/export_pdf/{job_id}/")
-def contract_export_pdf(job_id: int):
+async def contract_export_pdf(job_id: int, request: Request):
+    # PDF 在 Django 侧按报告哈希缓存：条件请求 / 断点下载原样转发，响应体流式转发，不在本进程缓存整份文件
+    headers = {k: request.headers[k] for k in _EXPORT_FORWARD_HEADERS if request.headers.get(k)}
+    client = _upstream()
     try:
-        with _LOCK:
-            resp = _SESSION.get(_django(f"/api/export_pdf/{job_id}/"), timeout=max(REQUEST_TIMEOUT, 120))
+        upstream_req = client.build_request(
+            "GET", _django(f"/api/export_pdf/{job_id}/"), headers=headers, timeout=EXPORT_TIMEOUTS
+        )
+        resp = await client.send(upstream_req, stream=True)
     except Exception as exc:
         return _error_response(
             status_code=502,
@@ -502,7 +734,12 @@ def contract_export_pdf(job_id: int):
             suggestions=["请先确认任务已完成，再执行导出。"],
         )
 
-    if resp.status_code != 200:
+    relay = {k: resp.headers[k] for k in _EXPORT_RELAY_HEADERS if resp.headers.get(k)}
+    if resp.status_code not in (200, 206):
+        await resp.aread()
+        await resp.aclose()
+        if resp.status_code in (304, 416):
+            return Response(status_code=resp.status_code, headers=relay)
         data = _safe_json(resp)
         payload = _normalize_upstream_error(
             data,
@@ -510,7 +747,20 @@ def contract_export_pdf(job_id: int):
             fallback_message="上游服务导出 PDF 失败",
         )
         return JSONResponse(status_code=resp.status_code, content=payload)
-    return Response(content=resp.content, media_type="application/pdf")
+
+    if resp.headers.get("Content-Length"):
+        # 带上长度：客户端能显示下载进度，上游中途断开时也能发现文件不完整
+        relay["Content-Length"] = resp.headers["Content-Length"]
+
+    async def _relay():
+        try:
+            async for chunk in resp.aiter_raw():
+                if chunk:
+                    yield chunk
+        finally:
+            await resp.aclose()
+
+    return StreamingResponse(_relay(), status_code=resp.status_code, media_type="application/pdf", headers=relay)
 
 
 @app.get("/contract/api/export_logs/")
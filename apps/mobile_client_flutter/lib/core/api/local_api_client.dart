@@ -1,6 +1,7 @@
 ﻿import 'dart:async';
 import 'dart:convert';
 import 'dart:io';
+import 'dart:math' as math;
 import 'dart:typed_data';
 
 import 'package:crypto/crypto.dart' as crypto;
@@ -66,38 +67,54 @@ class LocalApiClient {
     }
   }
 
-  Future<int> startAnalyze(File pdfFile) async {
+  static const int _uploadChunkDefault = 8 * 1024 * 1024;
+  static const int _uploadRetries = 3;
+
+  // 未完成的上传会话（sha256 -> upload_id）：同一文件再次提交时从服务端偏移续传
+  final Map<String, String> _pendingUploads = <String, String>{};
+
+  /// 提交 PDF 并返回任务编号。
+  ///
+  /// 走断点续传协议：init -> 按区间 PUT -> finalize。网络中断时先查询服务端偏移再续传；
+  /// 服务端没有上传接口（init 返回 404）时退回一次性上传 `/api/start/`。
+  Future<int> startAnalyze(
+    File pdfFile, {
+    void Function(int sent, int total)? onProgress,
+  }) async {
     try {
-      final req = http.MultipartRequest('POST', _uri('/api/start/'));
-      req.files.add(await http.MultipartFile.fromPath('file', pdfFile.path));
-      final streamed = await req.send().timeout(const Duration(seconds: 120));
-      final resp = await http.Response.fromStream(streamed);
-      final data = _readJson(resp);
-      if (resp.statusCode >= 400 || data['ok'] != true) {
-        throw _buildApiException(
-          data,
-          fallbackCode: 'E-START-FAILED',
-          fallbackMessage: '任务启动失败，请稍后重试。',
-        );
-      }
-      final id = data['job_id'];
-      if (id is int) {
-        return id;
+      final size = await pdfFile.length();
+      final sha256 =
+          (await crypto.sha256.bind(pdfFile.openRead()).first).toString();
+      final session = await _resumeUpload(sha256) ??
+          await _initUpload(pdfFile, size, sha256);
+      if (session == null) {
+        return _startAnalyzeMultipart(pdfFile);
       }
-      if (id is String) {
-        final parsed = int.tryParse(id);
-        if (parsed != null) {
-          return parsed;
-        }
+      final uploadId = session['upload_id'].toString();
+      _pendingUploads[sha256] = uploadId;
+
+      var offset = _asInt(session['offset']);
+      onProgress?.call(offset, size);
+      if (session['complete'] != true) {
+        final chunkSize = math.max(
+          64 * 1024,
+          _asInt(session['chunk_size'], fallback: _uploadChunkDefault),
+        );
+        await _uploadRanges(
+          pdfFile,
+          uploadId,
+          offset,
+          size,
+          chunkSize,
+          onProgress,
+        );
       }
-      throw const ApiException(
-        code: 'E-INVALID-JOB-ID',
-        message: '系统返回了无效任务编号，请重试。',
-      );
+      return await _finalizeUpload(uploadId, sha256);
     } on TimeoutException {
       throw const ApiException(
         code: 'E-START-TIMEOUT',
         message: '任务提交超时，请稍后重试。',
+        suggestions: ['重新提交同一文件会从已上传的位置继续。'],
       );
     } on SocketException catch (e) {
       throw ApiException(
@@ -109,6 +126,225 @@ class LocalApiClient {
     }
   }
 
+  Future<Map<String, dynamic>?> _resumeUpload(String sha256) async {
+    final uploadId = _pendingUploads[sha256];
+    if (uploadId == null) {
+      return null;
+    }
+    final resp = await http
+        .get(_uri('/api/uploads/$uploadId/'))
+        .timeout(const Duration(seconds: 20));
+    final data = _readJson(resp);
+    if (resp.statusCode == 200 && data['ok'] == true) {
+      return data;
+    }
+    // 会话已过期或已被清理：重新 init
+    _pendingUploads.remove(sha256);
+    return null;
+  }
+
+  Future<Map<String, dynamic>?> _initUpload(
+    File pdfFile,
+    int size,
+    String sha256,
+  ) async {
+    final body = jsonEncode({
+      'filename': pdfFile.uri.pathSegments.last,
+      'size': size,
+      'sha256': sha256,
+    });
+    final resp = await _postWithRetry(
+      () => http.post(
+        _uri('/api/uploads/'),
+        headers: const {'Content-Type': 'application/json'},
+        body: body,
+      ),
+    );
+    if (resp.statusCode == 404) {
+      return null;
+    }
+    final data = _readJson(resp);
+    if (resp.statusCode >= 400 || data['ok'] != true) {
+      throw _buildApiException(
+        data,
+        fallbackCode: 'E-UPLOAD-INIT-FAILED',
+        fallbackMessage: '上传初始化失败，请稍后重试。',
+      );
+    }
+    return data;
+  }
+
+  Future<void> _uploadRanges(
+    File pdfFile,
+    String uploadId,
+    int offset,
+    int size,
+    int chunkSize,
+    void Function(int sent, int total)? onProgress,
+  ) async {
+    final raf = await pdfFile.open();
+    try {
+      var failures = 0;
+      while (offset < size) {
+        final end = math.min(offset + chunkSize, size);
+        await raf.setPosition(offset);
+        final bytes = await raf.read(end - offset);
+        try {
+          offset = await _putRange(uploadId, bytes, offset, size);
+          failures = 0;
+          onProgress?.call(offset, size);
+        } catch (e) {
+          if (!_isRetryableUpload(e) || ++failures > _uploadRetries) {
+            rethrow;
+          }
+          await Future<void>.delayed(Duration(seconds: failures));
+          // 断线时服务端可能已收下一部分字节：以服务端偏移为准续传
+          offset = await _uploadOffset(uploadId) ?? offset;
+        }
+      }
+    } finally {
+      await raf.close();
+    }
+  }
+
+  Future<int> _putRange(
+    String uploadId,
+    Uint8List bytes,
+    int start,
+    int total,
+  ) async {
+    final resp = await http
+        .put(
+          _uri('/api/uploads/$uploadId/'),
+          headers: {
+            'Content-Type': 'application/octet-stream',
+            'Content-Range': 'bytes $start-${start + bytes.length - 1}/$total',
+          },
+          body: bytes,
+        )
+        .timeout(const Duration(seconds: 120));
+    final data = _readJson(resp);
+    // 409 = 区间越过服务端偏移（别的连接写过或丢了一段）：按返回的偏移重新对齐
+    if ((resp.statusCode == 200 || resp.statusCode == 409) &&
+        data['offset'] != null) {
+      return _asInt(data['offset']);
+    }
+    throw _buildApiException(
+      data,
+      fallbackCode: resp.statusCode >= 500
+          ? 'E-UPLOAD-UNAVAILABLE'
+          : 'E-UPLOAD-PUT-FAILED',
+      fallbackMessage: '文件上传失败，请稍后重试。',
+    );
+  }
+
+  Future<int?> _uploadOffset(String uploadId) async {
+    try {
+      final resp = await http
+          .get(_uri('/api/uploads/$uploadId/'))
+          .timeout(const Duration(seconds: 20));
+      final data = _readJson(resp);
+      if (resp.statusCode == 200 && data['offset'] != null) {
+        return _asInt(data['offset']);
+      }
+    } on TimeoutException {
+      return null;
+    } on SocketException {
+      return null;
+    } on http.ClientException {
+      return null;
+    }
+    return null;
+  }
+
+  Future<int> _finalizeUpload(String uploadId, String sha256) async {
+    final resp = await _postWithRetry(
+      () => http.post(_uri('/api/uploads/$uploadId/finalize/')),
+    );
+    final data = _readJson(resp);
+    if (resp.statusCode >= 400 || data['ok'] != true) {
+      final code = (data['error_code'] ?? '').toString();
+      if (code == 'E-UPLOAD-NOT-FOUND' ||
+          code == 'E-UPLOAD-HASH-MISMATCH' ||
+          code == 'E-FILE-CONTENT-NOT-PDF') {
+        // 服务端已丢弃该会话，下次提交重新上传
+        _pendingUploads.remove(sha256);
+      }
+      throw _buildApiException(
+        data,
+        fallbackCode: 'E-START-FAILED',
+        fallbackMessage: '任务启动失败，请稍后重试。',
+      );
+    }
+    _pendingUploads.remove(sha256);
+    return _jobIdFrom(data);
+  }
+
+  /// 代理刷新会话后返回 503 E-PROXY-CSRF-REFRESHED，请求没有送达 Django，重发一次即可。
+  Future<http.Response> _postWithRetry(
+    Future<http.Response> Function() send,
+  ) async {
+    var resp = await send().timeout(const Duration(seconds: 120));
+    if (resp.statusCode == 503 &&
+        _readJson(resp)['error_code'] == 'E-PROXY-CSRF-REFRESHED') {
+      resp = await send().timeout(const Duration(seconds: 120));
+    }
+    return resp;
+  }
+
+  bool _isRetryableUpload(Object e) {
+    if (e is TimeoutException ||
+        e is SocketException ||
+        e is http.ClientException) {
+      return true;
+    }
+    return e is ApiException &&
+        (e.code == 'E-UPLOAD-UNAVAILABLE' || e.code == 'E-PROXY-CSRF-REFRESHED');
+  }
+
+  Future<int> _startAnalyzeMultipart(File pdfFile) async {
+    final req = http.MultipartRequest('POST', _uri('/api/start/'));
+    req.files.add(await http.MultipartFile.fromPath('file', pdfFile.path));
+    final streamed = await req.send().timeout(const Duration(seconds: 120));
+    final resp = await http.Response.fromStream(streamed);
+    final data = _readJson(resp);
+    if (resp.statusCode >= 400 || data['ok'] != true) {
+      throw _buildApiException(
+        data,
+        fallbackCode: 'E-START-FAILED',
+        fallbackMessage: '任务启动失败，请稍后重试。',
+      );
+    }
+    return _jobIdFrom(data);
+  }
+
+  int _jobIdFrom(Map<String, dynamic> data) {
+    final id = data['job_id'];
+    if (id is int) {
+      return id;
+    }
+    if (id is String) {
+      final parsed = int.tryParse(id);
+      if (parsed != null) {
+        return parsed;
+      }
+    }
+    throw const ApiException(
+      code: 'E-INVALID-JOB-ID',
+      message: '系统返回了无效任务编号，请重试。',
+    );
+  }
+
+  static int _asInt(dynamic value, {int fallback = 0}) {
+    if (value is int) {
+      return value;
+    }
+    if (value is num) {
+      return value.toInt();
+    }
+    return int.tryParse('${value ?? ''}') ?? fallback;
+  }
+
   Future<JobStatus> fetchStatus(int jobId) async {
     try {
       final resp = await http
@@ -137,6 +373,84 @@ class LocalApiClient {
     }
   }
 
+  /// 订阅任务进度（SSE）。连接断开后可带上最后收到的 [JobEvent.id] 续传。
+  Stream<JobEvent> watchJob(int jobId, {int lastEventId = 0}) async* {
+    final client = http.Client();
+    try {
+      final req = http.Request('GET', _uri('/api/events/$jobId/'));
+      req.headers['Accept'] = 'text/event-stream';
+      if (lastEventId > 0) {
+        req.headers['Last-Event-ID'] = '$lastEventId';
+      }
+      final resp = await client.send(req).timeout(const Duration(seconds: 20));
+      if (resp.statusCode != 200) {
+        final body = await resp.stream.bytesToString();
+        throw _buildApiException(
+          _decodeJsonBody(body),
+          fallbackCode: 'E-EVENTS-FAILED',
+          fallbackMessage: '进度推送连接失败。',
+        );
+      }
+
+      var id = 0;
+      var event = 'message';
+      final data = StringBuffer();
+      final lines = resp.stream
+          .transform(utf8.decoder)
+          .transform(const LineSplitter());
+      await for (final line in lines) {
+        if (line.isEmpty) {
+          if (data.isNotEmpty) {
+            yield JobEvent(
+              id: id,
+              event: event,
+              data: _decodeJsonBody(data.toString()),
+            );
+          }
+          event = 'message';
+          data.clear();
+          continue;
+        }
+        if (line.startsWith(':')) {
+          continue;
+        }
+        final sep = line.indexOf(':');
+        final field = sep < 0 ? line : line.substring(0, sep);
+        var value = sep < 0 ? '' : line.substring(sep + 1);
+        if (value.startsWith(' ')) {
+          value = value.substring(1);
+        }
+        switch (field) {
+          case 'id':
+            id = int.tryParse(value) ?? id;
+            break;
+          case 'event':
+            event = value;
+            break;
+          case 'data':
+            if (data.isNotEmpty) {
+              data.write('\n');
+            }
+            data.write(value);
+            break;
+        }
+      }
+    } on TimeoutException {
+      throw const ApiException(
+        code: 'E-EVENTS-TIMEOUT',
+        message: '进度推送连接超时。',
+      );
+    } on SocketException catch (e) {
+      throw ApiException(
+        code: 'E-NET-CONNECTION',
+        message: '无法连接本地服务。',
+        detail: e.message,
+      );
+    } finally {
+      client.close();
+    }
+  }
+
   Future<JobResult> fetchResult(int jobId) async {
     try {
       final resp = await http
@@ -315,18 +629,21 @@ class LocalApiClient {
     return '$s/contract';
   }
 
-  Map<String, dynamic> _readJson(http.Response resp) {
-    if (resp.body.isEmpty) {
+  Map<String, dynamic> _readJson(http.Response resp) =>
+      _decodeJsonBody(resp.body);
+
+  Map<String, dynamic> _decodeJsonBody(String body) {
+    if (body.isEmpty) {
       return {'ok': false, 'error': '空响应'};
     }
     try {
-      final decoded = jsonDecode(resp.body);
+      final decoded = jsonDecode(body);
       if (decoded is Map<String, dynamic>) {
         return decoded;
       }
       return {'ok': false, 'error': '响应格式无效'};
     } catch (_) {
-      return {'ok': false, 'error': resp.body};
+      return {'ok': false, 'error': body};
     }
   }
 
@@ -389,6 +706,23 @@ class LocalApiClient {
   }
 }
 
+class JobEvent {
+  const JobEvent({
+    required this.id,
+    required this.event,
+    required this.data,
+  });
+
+  final int id;
+  final String event;
+  final Map<String, dynamic> data;
+
+  bool get isProgress => event == 'progress';
+  bool get isPartial => event == 'partial';
+  bool get isResult => event == 'result';
+  bool get isError => event == 'error';
+}
+
 class ApiException implements Exception {
   const ApiException({
     required this.code,
@@ -46,6 +46,8 @@ class ReviewController extends ChangeNotifier {
   String _updatePackagePath = '';
 
   Timer? _pollTimer;
+  StreamSubscription<JobEvent>? _eventSub;
+  int _lastEventId = 0;
 
   String get baseUrl => _baseUrl;
   bool get loading => _loading;
@@ -338,7 +340,15 @@ class ReviewController extends ChangeNotifier {
       _errorCode = '';
       notifyListeners();
 
-      final id = await _client.startAnalyze(File(_filePath));
+      final id = await _client.startAnalyze(
+        File(_filePath),
+        onProgress: (sent, total) {
+          final pct = total > 0 ? (sent * 100 ~/ total) : 0;
+          _stage = 'uploading';
+          _message = '正在上传文件（$pct%），中断后重新提交会继续上传。';
+          notifyListeners();
+        },
+      );
       _jobId = id;
       _status = 'running';
       _stage = 'submitted';
@@ -347,7 +357,7 @@ class ReviewController extends ChangeNotifier {
       _error = '';
       _errorCode = '';
       notifyListeners();
-      _startPolling();
+      _startWatching();
     });
   }
 
@@ -490,6 +500,103 @@ class ReviewController extends ChangeNotifier {
     _runtimeMeta = <String, dynamic>{..._runtimeMeta, ...meta};
   }
 
+  /// 优先订阅 SSE 进度推送；连接失败时退回 1 秒轮询。
+  void _startWatching() {
+    _stopPolling();
+    _lastEventId = 0;
+    _polling = true;
+    notifyListeners();
+    _listenEvents();
+  }
+
+  void _listenEvents() {
+    final id = _jobId;
+    if (id == null) {
+      _stopPolling();
+      return;
+    }
+    _eventSub = _client.watchJob(id, lastEventId: _lastEventId).listen(
+      _onJobEvent,
+      onError: (Object _) {
+        _eventSub = null;
+        if (_polling) {
+          _startPolling();
+        }
+      },
+      onDone: () {
+        _eventSub = null;
+        // 服务端按最长连接时长断开，带 Last-Event-ID 续传
+        if (_polling) {
+          _listenEvents();
+        }
+      },
+      cancelOnError: true,
+    );
+  }
+
+  void _onJobEvent(JobEvent event) {
+    if (event.id > 0) {
+      _lastEventId = event.id;
+    }
+    final data = event.data;
+    if (event.isProgress) {
+      _status = (data['status'] ?? _status).toString();
+      _stage = (data['stage'] ?? _stage).toString();
+      final progress = data['progress'];
+      if (progress is num) {
+        _progress = progress.toInt();
+      }
+      final partial = data['partial_result'];
+      if (partial is Map<String, dynamic>) {
+        _mergeRuntimeMeta(<String, dynamic>{'partial_result': partial});
+      }
+      notifyListeners();
+      return;
+    }
+    if (event.isPartial) {
+      // 流式审查的中间结果：阶段进度不变时也会推送
+      final partial = data['partial_result'];
+      if (partial is Map<String, dynamic>) {
+        _mergeRuntimeMeta(<String, dynamic>{'partial_result': partial});
+        notifyListeners();
+      }
+      return;
+    }
+    if (event.isResult) {
+      _stopPolling();
+      _reviewFinishedAt ??= DateTime.now();
+      _status = (data['status'] ?? _status).toString();
+      _stage = (data['stage'] ?? _stage).toString();
+      _progress = 100;
+      _applyResult(JobResult.fromJson(data));
+      notifyListeners();
+      return;
+    }
+    if (event.isError) {
+      _stopPolling();
+      _reviewFinishedAt ??= DateTime.now();
+      _applyError(ApiException(
+        code: 'E-STATUS-FAILED',
+        message: (data['error'] ?? '任务状态查询失败。').toString(),
+      ));
+      notifyListeners();
+    }
+  }
+
+  void _applyResult(JobResult result) {
+    _resultJson = result.resultJson;
+    _reportPayload = result.reportPayload;
+    _reportMarkdown = _selectReportText(result: result);
+    _mergeRuntimeMeta(result.runtimeMeta);
+    if (result.error.isNotEmpty) {
+      _error = result.error;
+      _errorCode = 'E-REVIEW-FAILED';
+    } else {
+      _message = '任务已完成。';
+      _errorCode = '';
+    }
+  }
+
   void _startPolling() {
     _stopPolling();
     _polling = true;
@@ -500,6 +607,8 @@ class ReviewController extends ChangeNotifier {
   }
 
   void _stopPolling() {
+    _eventSub?.cancel();
+    _eventSub = null;
     _pollTimer?.cancel();
     _pollTimer = null;
     _polling = false;
@@ -531,17 +640,7 @@ class ReviewController extends ChangeNotifier {
         _stopPolling();
         _reviewFinishedAt ??= DateTime.now();
         final result = await _client.fetchResult(id);
-        _resultJson = result.resultJson;
-        _reportPayload = result.reportPayload;
-        _reportMarkdown = _selectReportText(result: result);
-        _mergeRuntimeMeta(result.runtimeMeta);
-        if (result.error.isNotEmpty) {
-          _error = result.error;
-          _errorCode = 'E-REVIEW-FAILED';
-        } else {
-          _message = '任务已完成。';
-          _errorCode = '';
-        }
+        _applyResult(result);
       }
       notifyListeners();
     } catch (e) {
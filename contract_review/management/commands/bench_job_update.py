@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from contract_review.models import ContractJob
+
+# 对比模式下的两组配置：默认 SQLite（rollback journal、每请求新建连接）与调优后的配置
+_COMPARE_PROFILES = (
+    ("baseline", {"SQLITE_TUNING": "0", "DB_CONN_MAX_AGE": "0"}),
+    ("tuned", {"SQLITE_TUNING": "1", "DB_CONN_MAX_AGE": "60"}),
+)
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+class Command(BaseCommand):
+    help = "Load-test concurrent worker callbacks (job_update) plus status polls against the configured database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", type=int, default=16, help="Number of running jobs to update.")
+        parser.add_argument("--writers", type=int, default=8, help="Concurrent callback threads (simulated workers).")
+        parser.add_argument("--updates", type=int, default=100, help="Callbacks per writer thread.")
+        parser.add_argument("--readers", type=int, default=4, help="Concurrent status polling threads.")
+        parser.add_argument("--json", action="store_true", help="Print the result as one JSON line.")
+        parser.add_argument(
+            "--compare",
+            action="store_true",
+            help="Run baseline vs tuned SQLite on scratch databases (subprocesses) and print both.",
+        )
+
+    def handle(self, *args, **options):
+        if options["compare"]:
+            self._compare(options)
+            return
+        result = self._run(options)
+        if options["json"]:
+            self.stdout.write(json.dumps(result))
+            return
+        self._print(result)
+
+    # -------------------------
+    # single run
+    # -------------------------
+    def _run(self, options) -> dict:
+        # 运行期进度若写 Redis 就测不到数据库争用，这里强制走数据库
+        os.environ["JOB_STATE_REDIS_ENABLED"] = "0"
+        token = (getattr(settings, "WORKER_TOKEN", "") or os.environ.get("WORKER_TOKEN", "")).strip()
+        headers = {"HTTP_X_WORKER_TOKEN": token} if token else {}
+
+        job_ids = [
+            ContractJob.objects.create(status="running", progress=1, stage="submitted", filename=f"bench_{i}.pdf").id
+            for i in range(max(1, options["jobs"]))
+        ]
+
+        latencies = []
+        errors = []
+        reads = [0]
+        lock = threading.Lock()
+        writers_done = threading.Event()
+
+        def writer(idx: int) -> None:
+            client = Client(HTTP_HOST="127.0.0.1")
+            try:
+                for n in range(options["updates"]):
+                    job_id = job_ids[(idx + n) % len(job_ids)]
+                    payload = {
+                        "job_id": job_id,
+                        "status": "running",
+                        "progress": min(99, 2 + n % 97),
+                        "stage": f"bench_stage_{n % 7}",
+                        "meta": {"bench_writer": idx, "bench_seq": n},
+                    }
+                    started = time.perf_counter()
+                    try:
+                        resp = client.post(
+                            "/contract/api/job/update/",
+                            data=json.dumps(payload),
+                            content_type="application/json",
+                            **headers,
+                        )
+                        ok = resp.status_code == 200
+                        detail = "" if ok else f"HTTP {resp.status_code}"
+                    except Exception as e:
+                        ok, detail = False, str(e)
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        if not ok:
+                            errors.append(detail)
+            finally:
+                connection.close()
+
+        def reader(idx: int) -> None:
+            client = Client(HTTP_HOST="127.0.0.1")
+            n = 0
+            try:
+                while not writers_done.is_set():
+                    client.get(f"/contract/api/status/{job_ids[(idx + n) % len(job_ids)]}/")
+                    n += 1
+            finally:
+                with lock:
+                    reads[0] += n
+                connection.close()
+
+        started = time.perf_counter()
+        reader_threads = [threading.Thread(target=reader, args=(i,)) for i in range(options["readers"])]
+        writer_threads = [threading.Thread(target=writer, args=(i,)) for i in range(max(1, options["writers"]))]
+        for t in reader_threads + writer_threads:
+            t.start()
+        for t in writer_threads:
+            t.join()
+        wall = time.perf_counter() - started
+        writers_done.set()
+        for t in reader_threads:
+            t.join()
+
+        # 回调失败会把任务标成 error，也算作失败
+        failed_jobs = ContractJob.objects.filter(id__in=job_ids, status="error").count()
+        ContractJob.objects.filter(id__in=job_ids).delete()
+
+        journal_mode = "n/a"
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                journal_mode = cursor.fetchone()[0]
+
+        return {
+            "vendor": connection.vendor,
+            "journal_mode": journal_mode,
+            "callbacks": len(latencies),
+            "errors": len(errors),
+            "failed_jobs": failed_jobs,
+            "sample_error": errors[0] if errors else "",
+            "wall_s": round(wall, 3),
+            "callbacks_per_s": round(len(latencies) / wall, 1) if wall else 0.0,
+            "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else 0.0,
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+            "status_reads": reads[0],
+        }
+
+    def _print(self, result: dict, label: str = "") -> None:
+        head = f"[{label}] " if label else ""
+        self.stdout.write(
+            f"{head}{result['vendor']} journal={result['journal_mode']} "
+            f"callbacks={result['callbacks']} errors={result['errors']} failed_jobs={result['failed_jobs']} "
+            f"throughput={result['callbacks_per_s']}/s p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+            f"max={result['max_ms']}ms status_reads={result['status_reads']}"
+        )
+        if result.get("sample_error"):
+            self.stdout.write(f"{head}sample error: {result['sample_error']}")
+
+    # -------------------------
+    # baseline vs tuned
+    # -------------------------
+    def _compare(self, options) -> None:
+        manage_py = Path(settings.BASE_DIR) / "manage.py"
+        bench_args = [
+            "--jobs", str(options["jobs"]),
+            "--writers", str(options["writers"]),
+            "--updates", str(options["updates"]),
+            "--readers", str(options["readers"]),
+            "--json",
+        ]
+        with tempfile.TemporaryDirectory(prefix="bench_job_update_") as tmp:
+            for label, overrides in _COMPARE_PROFILES:
+                env = dict(os.environ, DB_ENGINE="sqlite", SQLITE_PATH=str(Path(tmp) / f"{label}.sqlite3"), **overrides)
+                subprocess.run([sys.executable, str(manage_py), "migrate", "-v", "0"], env=env, check=True)
+                proc = subprocess.run(
+                    [sys.executable, str(manage_py), "bench_job_update", *bench_args],
+                    env=env,
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+                line = [ln for ln in proc.stdout.splitlines() if ln.startswith("{")][-1]
+                self._print(json.loads(line), label)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from contract_review.models import ContractJobResult
+from contract_review.services import report_pdf
+from packages.shared_contract_schema import build_report_payload, normalize_result_json
+
+# 没有指定任务时用的样例报告：关键要素 + 若干风险 / 建议，接近一份真实审查结果的版面
+_SAMPLE_RESULT = {
+    "contract_type": "买卖合同",
+    "overview": "本合同约定了货物买卖的标的、价款、交付与验收等事项，整体结构完整，但付款与违约条款存在不对等之处。" * 3,
+    "key_facts": {
+        "甲方": "上海某某科技有限公司",
+        "乙方": "北京某某贸易有限公司",
+        "合同金额": "人民币 1,280,000 元",
+        "签订日期": "2024-05-20",
+        "履行期限": "自合同生效之日起 12 个月",
+    },
+    "risks": [
+        {"title": f"风险事项 {i}", "level": ("高", "中", "低")[i % 3], "problem": "条款约定不明确，" * 6, "suggestion": "建议补充约定。" * 4}
+        for i in range(1, 9)
+    ],
+    "improvements": [{"title": f"改进建议 {i}", "suggestion": "建议明确责任划分与期限。" * 3} for i in range(1, 6)],
+}
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the ReportLab report renderer against wkhtmltopdf on one report payload."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20, help="Renders per engine (after the first).")
+        parser.add_argument("--job", type=int, default=None, help="Use this job's result instead of the sample report.")
+        parser.add_argument("--json", action="store_true", help="Print the result as one JSON line.")
+
+    def handle(self, *args, **options):
+        if options["job"] is not None:
+            row = ContractJobResult.objects.filter(job_id=options["job"]).first()
+            if row is None:
+                raise CommandError(f"job {options['job']} has no result")
+            payload = build_report_payload(normalize_result_json(row.result_json), row.result_markdown or "")
+        else:
+            payload = build_report_payload(normalize_result_json(_SAMPLE_RESULT), "")
+
+        iterations = max(1, options["iterations"])
+        results = {"reportlab": self._bench(lambda: report_pdf.render_report_pdf(payload, "bench"), iterations)}
+        if report_pdf.resolve_wkhtmltopdf_path():
+            results["wkhtmltopdf"] = self._bench(lambda: report_pdf.render_html_pdf(payload), iterations)
+        else:
+            results["wkhtmltopdf"] = {"error": "wkhtmltopdf not found"}
+
+        rl, wk = results["reportlab"], results["wkhtmltopdf"]
+        if "p50_ms" in wk and rl["p50_ms"]:
+            results["speedup_p50"] = round(wk["p50_ms"] / rl["p50_ms"], 1)
+        results["font"] = report_pdf.report_font()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"font={results['font']}")
+        for engine in ("reportlab", "wkhtmltopdf"):
+            r = results[engine]
+            if "error" in r:
+                self.stdout.write(f"[{engine}] skipped: {r['error']}")
+                continue
+            self.stdout.write(
+                f"[{engine}] first={r['first_ms']}ms p50={r['p50_ms']}ms p95={r['p95_ms']}ms "
+                f"throughput={r['per_s']}/s size={r['bytes']}B"
+            )
+        if "speedup_p50" in results:
+            self.stdout.write(f"reportlab is {results['speedup_p50']}x faster at p50")
+
+    def _bench(self, render, iterations: int) -> dict:
+        # 第一次包含字体注册 / 样式构建（或 wkhtmltopdf 冷启动），单独记录
+        started = time.perf_counter()
+        pdf = render()
+        first = time.perf_counter() - started
+
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            render()
+            timings.append(time.perf_counter() - started)
+        total = sum(timings)
+        return {
+            "first_ms": round(first * 1000, 2),
+            "p50_ms": round(statistics.median(timings) * 1000, 2),
+            "p95_ms": round(_percentile(timings, 95) * 1000, 2),
+            "per_s": round(len(timings) / total, 1) if total else 0.0,
+            "bytes": len(pdf),
+        }
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import shutil
+import time
 from datetime import timedelta
 from pathlib import Path
 
@@ -9,6 +10,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 
 from contract_review.models import ContractJob
+from contract_review.services.upload_store import expire_upload_sessions, live_session_hashes
 
 
 class Command(BaseCommand):
@@ -57,4 +59,79 @@ class Command(BaseCommand):
         if not dry_run:
             qs.delete()
 
-        self.stdout.write(self.style.SUCCESS(f"cleanup done. affected jobs: {count}"))
+        sessions = 0
+        ttl_s = int(getattr(settings, "UPLOAD_SESSION_TTL_HOURS", 24)) * 3600
+        if not dry_run:
+            # 先清过期会话：仍存活的会话引用的 blob 在 _prune_blobs 中保留
+            sessions = expire_upload_sessions(ttl_s)
+        grace_s = int(getattr(settings, "UPLOAD_BLOB_GRACE_MINUTES", 10)) * 60
+        blobs = self._prune_blobs(media_root / "blobs", time.time() - grace_s, dry_run)
+        # 一次性上传中途崩溃留下的临时文件；进行中的上传一直在写，mtime 不会这么旧
+        parts = self._prune_files(media_root / "blobs" / "tmp", "upload_*.part", time.time() - ttl_s, dry_run)
+        exports = self._prune_exports(media_root / "exports", cutoff.timestamp(), dry_run)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"cleanup done. affected jobs: {count}, blobs: {blobs}, tmp parts: {parts}, exports: {exports}, upload sessions: {sessions}"
+            )
+        )
+
+    def _prune_blobs(self, blob_root: Path, grace_ts: float, dry_run: bool) -> int:
+        """
+        删除不再被任何任务、也不被未完成续传会话引用的上传 blob（按内容寻址，多个任务可共用一份）。
+        grace_ts 之后改动过的 blob 保留：upload.commit() 与 _create_job() 之间任务行还不存在。
+        """
+        if not blob_root.is_dir():
+            return 0
+        referenced = set(ContractJob.objects.exclude(file_sha256="").values_list("file_sha256", flat=True))
+        referenced |= live_session_hashes()
+        removed = 0
+        for p in blob_root.glob("*/*.pdf"):
+            if p.stem in referenced:
+                continue
+            try:
+                if p.stat().st_mtime >= grace_ts:
+                    continue
+            except OSError:
+                continue
+            removed += 1
+            if dry_run:
+                self.stdout.write(f"[dry-run] remove {p}")
+            else:
+                p.unlink(missing_ok=True)
+        return removed
+
+    def _prune_files(self, root: Path, pattern: str, cutoff_ts: float, dry_run: bool) -> int:
+        if not root.is_dir():
+            return 0
+        removed = 0
+        for p in root.glob(pattern):
+            try:
+                if p.stat().st_mtime >= cutoff_ts:
+                    continue
+            except OSError:
+                continue
+            removed += 1
+            if dry_run:
+                self.stdout.write(f"[dry-run] remove {p}")
+            else:
+                p.unlink(missing_ok=True)
+        return removed
+
+    def _prune_exports(self, export_root: Path, cutoff_ts: float, dry_run: bool) -> int:
+        """删除早于保留期的预渲染 PDF；仍有人下载时会按需重新渲染。"""
+        if not export_root.is_dir():
+            return 0
+        removed = 0
+        for p in export_root.glob("*/*.pdf"):
+            try:
+                if p.stat().st_mtime >= cutoff_ts:
+                    continue
+            except OSError:
+                continue
+            removed += 1
+            if dry_run:
+                self.stdout.write(f"[dry-run] remove {p}")
+            else:
+                p.unlink(missing_ok=True)
+                p.with_suffix(".json").unlink(missing_ok=True)
+        return removed
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from contract_review.models import ContractJob, ContractJobResult
+from packages.shared_contract_schema import (
+    RESULT_SCHEMA_VERSION,
+    CanonicalResult,
+    ResultSchemaError,
+    canonicalize_result,
+    report_digest,
+)
+
+
+class Command(BaseCommand):
+    help = "Rewrite stored results into the canonical result schema (one-time, after upgrades that bump RESULT_SCHEMA_VERSION)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200, help="Rows per transaction.")
+        parser.add_argument("--all", action="store_true", help="Recompute every row, not only missing / outdated ones.")
+        parser.add_argument("--verify", action="store_true", help="Only validate existing canonical rows; write nothing.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count rows that would be rewritten.")
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            self._verify()
+            return
+
+        batch_size = max(1, options["batch_size"])
+        dry_run = bool(options["dry_run"])
+        pending = list(self._pending_ids(bool(options["all"])))
+        if dry_run:
+            self.stdout.write(f"[dry-run] {len(pending)} result rows need canonical schema v{RESULT_SCHEMA_VERSION}")
+            return
+
+        migrated = failed = 0
+        for start in range(0, len(pending), batch_size):
+            ids = pending[start : start + batch_size]
+            with transaction.atomic():
+                for row in ContractJobResult.objects.filter(job_id__in=ids).only("job_id", "result_json", "result_markdown"):
+                    canonical = canonicalize_result(row.result_json, row.result_markdown)
+                    if canonical is None:
+                        failed += 1
+                    ContractJobResult.objects.filter(job_id=row.job_id).update(
+                        canonical=canonical,
+                        digest=report_digest(row.result_json, row.result_markdown),
+                    )
+                    migrated += 1
+                # 物化报告的缓存键含 updated_at：推进它，所有进程都按新行重新生成
+                ContractJob.objects.filter(id__in=ids).update(updated_at=timezone.now())
+            self.stdout.write(f"migrated {migrated}/{len(pending)}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"canonical schema v{RESULT_SCHEMA_VERSION}: migrated {migrated}, not canonicalizable {failed}")
+        )
+
+    def _pending_ids(self, recompute_all: bool):
+        qs = ContractJobResult.objects.order_by("job_id")
+        for job_id, canonical in qs.values_list("job_id", "canonical").iterator():
+            if recompute_all or not isinstance(canonical, dict) or canonical.get("v") != RESULT_SCHEMA_VERSION:
+                yield job_id
+
+    def _verify(self) -> None:
+        ok = missing = bad = 0
+        for job_id, canonical in ContractJobResult.objects.order_by("job_id").values_list("job_id", "canonical").iterator():
+            if canonical is None:
+                missing += 1
+                continue
+            try:
+                CanonicalResult.from_dict(canonical)
+                ok += 1
+            except ResultSchemaError as e:
+                bad += 1
+                self.stdout.write(f"job {job_id}: {e}")
+        self.stdout.write(f"canonical ok {ok}, missing {missing}, invalid {bad}")
@@ -0,0 +1,68 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_results_forward(apps, schema_editor):
+    ContractJob = apps.get_model("contract_review", "ContractJob")
+    ContractJobResult = apps.get_model("contract_review", "ContractJobResult")
+    rows = []
+    for job in ContractJob.objects.only("id", "result_markdown", "result_json").iterator():
+        if job.result_markdown or job.result_json is not None:
+            rows.append(
+                ContractJobResult(
+                    job_id=job.id,
+                    result_markdown=job.result_markdown or "",
+                    result_json=job.result_json,
+                )
+            )
+        if len(rows) >= 200:
+            ContractJobResult.objects.bulk_create(rows)
+            rows = []
+    if rows:
+        ContractJobResult.objects.bulk_create(rows)
+
+
+def copy_results_backward(apps, schema_editor):
+    ContractJob = apps.get_model("contract_review", "ContractJob")
+    ContractJobResult = apps.get_model("contract_review", "ContractJobResult")
+    for res in ContractJobResult.objects.iterator():
+        ContractJob.objects.filter(id=res.job_id).update(
+            result_markdown=res.result_markdown,
+            result_json=res.result_json,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contract_review", "0003_contractjob_runtime_meta"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContractJobResult",
+            fields=[
+                (
+                    "job",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="result",
+                        serialize=False,
+                        to="contract_review.contractjob",
+                    ),
+                ),
+                ("result_markdown", models.TextField(blank=True, default="")),
+                ("result_json", models.JSONField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(copy_results_forward, copy_results_backward),
+        migrations.RemoveField(
+            model_name="contractjob",
+            name="result_markdown",
+        ),
+        migrations.RemoveField(
+            model_name="contractjob",
+            name="result_json",
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contract_review", "0004_contractjobresult"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contractjob",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name="contractjob",
+            name="status",
+            field=models.CharField(
+                choices=[("queued", "queued"), ("running", "running"), ("done", "done"), ("error", "error")],
+                db_index=True,
+                default="queued",
+                max_length=16,
+            ),
+        ),
+    ]
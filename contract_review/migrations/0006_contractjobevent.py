@@ -0,0 +1,88 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def _parse_ts(raw, fallback):
+    ts = parse_datetime(str(raw or "")) if raw else None
+    if ts is None:
+        return fallback
+    if timezone.is_naive(ts):
+        ts = timezone.make_aware(ts)
+    return ts
+
+
+def move_history_forward(apps, schema_editor):
+    ContractJob = apps.get_model("contract_review", "ContractJob")
+    ContractJobEvent = apps.get_model("contract_review", "ContractJobEvent")
+    for job in ContractJob.objects.only("id", "created_at", "runtime_meta").iterator():
+        meta = job.runtime_meta if isinstance(job.runtime_meta, dict) else {}
+        history = meta.pop("stage_history", None)
+        if history is None:
+            continue
+        last_ts = job.created_at
+        events = []
+        for item in history if isinstance(history, list) else []:
+            if not isinstance(item, dict) or not item.get("stage"):
+                continue
+            # 事件按 (ts, id) 排序，保持原列表顺序：时间戳不回退
+            last_ts = max(_parse_ts(item.get("ts"), last_ts), last_ts)
+            progress = item.get("progress")
+            events.append(
+                ContractJobEvent(
+                    job_id=job.id,
+                    ts=last_ts,
+                    stage=str(item["stage"])[:64],
+                    progress=int(progress) if isinstance(progress, (int, float)) else None,
+                )
+            )
+        ContractJobEvent.objects.bulk_create(events)
+        ContractJob.objects.filter(id=job.id).update(runtime_meta=meta)
+
+
+def move_history_backward(apps, schema_editor):
+    ContractJob = apps.get_model("contract_review", "ContractJob")
+    ContractJobEvent = apps.get_model("contract_review", "ContractJobEvent")
+    for job in ContractJob.objects.only("id", "runtime_meta").iterator():
+        history = []
+        for ev in ContractJobEvent.objects.filter(job_id=job.id).order_by("ts", "id"):
+            item = {"stage": ev.stage, "ts": ev.ts.isoformat(timespec="seconds")}
+            if ev.progress is not None:
+                item["progress"] = ev.progress
+            history.append(item)
+        meta = job.runtime_meta if isinstance(job.runtime_meta, dict) else {}
+        meta["stage_history"] = history[-120:]
+        ContractJob.objects.filter(id=job.id).update(runtime_meta=meta)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contract_review", "0005_contractjob_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContractJobEvent",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("ts", models.DateTimeField(default=django.utils.timezone.now)),
+                ("stage", models.CharField(max_length=64)),
+                ("progress", models.IntegerField(blank=True, null=True)),
+                (
+                    "job",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="events",
+                        to="contract_review.contractjob",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["job", "ts"], name="contract_job_event_job_ts")],
+            },
+        ),
+        migrations.RunPython(move_history_forward, move_history_backward),
+    ]
@@ -0,0 +1,42 @@
+import hashlib
+import json
+
+from django.db import migrations, models
+
+# report_digest 在本迁移编写时的冻结副本：迁移不随 packages.shared_contract_schema 的后续改动变化。
+# SCHEMA_VERSION 变化后旧摘要只会让 report_payload 缓存不命中，读路径按需重算。
+_SCHEMA_VERSION = "1.0.0"
+
+
+def _report_digest(result_json, result_markdown=""):
+    raw = json.dumps(result_json, ensure_ascii=False, separators=(",", ":"), sort_keys=True, default=str)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(_SCHEMA_VERSION.encode("ascii"))
+    h.update(b"\0")
+    h.update(raw.encode("utf-8", "surrogatepass"))
+    h.update(b"\0")
+    h.update((result_markdown or "").encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+def backfill_digest(apps, schema_editor):
+    ContractJobResult = apps.get_model("contract_review", "ContractJobResult")
+    for row in ContractJobResult.objects.only("job_id", "result_json", "result_markdown").iterator():
+        digest = _report_digest(row.result_json, row.result_markdown)
+        ContractJobResult.objects.filter(job_id=row.job_id).update(digest=digest)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contract_review", "0006_contractjobevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contractjobresult",
+            name="digest",
+            field=models.CharField(blank=True, default="", max_length=32),
+        ),
+        migrations.RunPython(backfill_digest, migrations.RunPython.noop),
+    ]
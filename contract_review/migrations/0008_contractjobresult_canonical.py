@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contract_review", "0007_contractjobresult_digest"),
+    ]
+
+    operations = [
+        # 已有行由 manage.py migrate_result_schema 回填；未回填前读路径回退别名解析
+        migrations.AddField(
+            model_name="contractjobresult",
+            name="canonical",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+def backfill_seq(apps, schema_editor):
+    # 与 next_event_seq 同一规则：max(上一条 + 1, 事件时间的毫秒数)，按原 (ts, id) 顺序分配
+    ContractJobEvent = apps.get_model("contract_review", "ContractJobEvent")
+    job_ids = ContractJobEvent.objects.filter(seq__isnull=True).values_list("job_id", flat=True).distinct()
+    for job_id in list(job_ids):
+        last = 0
+        for ev in ContractJobEvent.objects.filter(job_id=job_id).order_by("ts", "id").only("id", "ts", "seq"):
+            last = max(last + 1, int(ev.ts.timestamp() * 1000))
+            ContractJobEvent.objects.filter(id=ev.id).update(seq=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contract_review", "0008_contractjobresult_canonical"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contractjobevent",
+            name="seq",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="contractjobevent",
+            constraint=models.UniqueConstraint(fields=("job", "seq"), name="contract_job_event_job_seq"),
+        ),
+        migrations.RunPython(backfill_seq, migrations.RunPython.noop),
+    ]
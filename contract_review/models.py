@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class ContractJob(models.Model):
     STATUS_CHOICES = [
@@ -9,14 +10,40 @@ class ContractJob(models.Model):
     ]
 
     created_at = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="queued")
+    # 批量状态的 since 游标按 (updated_at, id) 翻页
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="queued", db_index=True)
     progress = models.IntegerField(default=0)
     stage = models.CharField(max_length=64, default="queued")
 
     file_sha256 = models.CharField(max_length=64, db_index=True, default="")
     filename = models.CharField(max_length=255, default="")
 
-    result_markdown = models.TextField(blank=True, default="")
-    result_json = models.JSONField(blank=True, null=True)
     runtime_meta = models.JSONField(blank=True, null=True, default=dict)
     error = models.TextField(blank=True, default="")
+
+
+class ContractJobResult(models.Model):
+    # 大字段单独成表：状态轮询只读 ContractJob 的小行，不会扫过结果的溢出页
+    job = models.OneToOneField(ContractJob, on_delete=models.CASCADE, primary_key=True, related_name="result")
+    result_markdown = models.TextField(blank=True, default="")
+    result_json = models.JSONField(blank=True, null=True)
+    # result_json + result_markdown 的内容哈希，写入时算一次；读路径用它命中 report_payload 缓存
+    digest = models.CharField(max_length=32, blank=True, default="")
+    # 写入时定型的结果（packages.shared_contract_schema.CanonicalResult.to_dict()，带版本号 v）
+    canonical = models.JSONField(blank=True, null=True)
+
+
+class ContractJobEvent(models.Model):
+    # 阶段事件只追加：每次回调一条 INSERT，runtime_meta 里不再整段重写 stage_history
+    job = models.ForeignKey(ContractJob, on_delete=models.CASCADE, related_name="events")
+    ts = models.DateTimeField(default=timezone.now)
+    stage = models.CharField(max_length=64)
+    progress = models.IntegerField(blank=True, null=True)
+    # 任务内单调序号（packages.core_engine.job_state.next_event_seq），SSE 事件 id；
+    # 从 Redis 折叠进来的事件沿用 Redis 分配的序号
+    seq = models.BigIntegerField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["job", "ts"], name="contract_job_event_job_ts")]
+        constraints = [models.UniqueConstraint(fields=["job", "seq"], name="contract_job_event_job_seq")]
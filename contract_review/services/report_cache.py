@@ -0,0 +1,140 @@
+# contract_review/services/report_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from packages.shared_contract_schema import (
+    SCHEMA_VERSION,
+    build_report_html,
+    build_report_markdown,
+    load_report_payload,
+    normalize_result_json,
+)
+
+# =========================
+# 终态报告物化
+# =========================
+# done/error 之后结果一般不再变化：job_update 收到终态时把 job_result 的响应体序列化一次，
+# 连同 ETag 存入缓存，读接口直接回放。
+# 键含 SCHEMA_VERSION 与任务行的 updated_at：终态被改写（done 后又报 error、migrate_result_schema）
+# 时 updated_at 变化，所有进程自然读不到旧条目，不依赖逐进程删除；旧条目按 REPORT_CACHE_TTL 过期。
+
+REPORT_CACHE_ALIAS = "reports"
+TERMINAL_STATUSES = ("done", "error")
+
+
+def _cache():
+    try:
+        return caches[REPORT_CACHE_ALIAS]
+    except InvalidCacheBackendError:
+        return caches["default"]
+
+
+def _ttl() -> Optional[int]:
+    ttl = int(getattr(settings, "REPORT_CACHE_TTL", 3600) or 0)
+    return ttl if ttl > 0 else None
+
+
+def report_version(updated_at: Any) -> str:
+    """任务行 updated_at 转成键里的版本号（微秒整数，避免浮点误差）。"""
+    if updated_at is None:
+        return "0"
+    return str(int(updated_at.timestamp()) * 1_000_000 + updated_at.microsecond)
+
+
+def report_cache_key(job_id: Any, updated_at: Any) -> str:
+    return f"contract_report:{SCHEMA_VERSION}:{job_id}:{report_version(updated_at)}"
+
+
+def _encode(data: Dict[str, Any]) -> bytes:
+    return json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def build_report_bodies(row: Dict[str, Any]) -> Dict[str, Any]:
+    """按 job_result 的响应格式构建终态响应体（已序列化）。"""
+    status = row.get("status") or "queued"
+    result_json = normalize_result_json(row.get("result_json"))
+    result_markdown = row.get("result_markdown") or ""
+    report_payload = load_report_payload(row.get("canonical"), result_json, result_markdown, digest=row.get("digest") or None)
+    report_html = build_report_html(report_payload)
+    report_markdown = build_report_markdown(report_payload)
+    body = _encode(
+        {
+            "ok": True,
+            "job_id": row["id"],
+            "ready": True,
+            "status": status,
+            "progress": row.get("progress") or 0,
+            "stage": row.get("stage") or "",
+            "filename": row.get("filename") or "",
+            "runtime_meta": row.get("runtime_meta") if isinstance(row.get("runtime_meta"), dict) else {},
+            "error": row.get("error") if status == "error" else "",
+            "result_json": result_json,
+            "result_markdown": result_markdown,
+            "report_payload": report_payload,
+            "report_html": report_html,
+            "report_markdown": report_markdown,
+        }
+    )
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "status": status,
+        "body": body,
+        "etag": _etag(body),
+    }
+
+
+def materialize_report(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """终态任务：构建并写入缓存；非终态返回 None。row 需带 updated_at（缓存版本）。"""
+    if (row.get("status") or "") not in TERMINAL_STATUSES:
+        return None
+    entry = build_report_bodies(row)
+    try:
+        _cache().set(report_cache_key(row["id"], row.get("updated_at")), entry, timeout=_ttl())
+    except Exception:
+        # 缓存不可用时照常返回，本次请求仍然可用
+        pass
+    return entry
+
+
+def get_cached_report(job_id: Any, updated_at: Any) -> Optional[Dict[str, Any]]:
+    try:
+        entry = _cache().get(report_cache_key(job_id, updated_at))
+    except Exception:
+        return None
+    if not isinstance(entry, dict) or entry.get("schema_version") != SCHEMA_VERSION:
+        return None
+    return entry
+
+
+def invalidate_report(job_id: Any, updated_at: Any) -> None:
+    try:
+        _cache().delete(report_cache_key(job_id, updated_at))
+    except Exception:
+        pass
+
+
+def etag_matches(request, etag: str) -> bool:
+    header = request.headers.get("If-None-Match") or ""
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    for token in header.split(","):
+        token = token.strip()
+        if token.startswith("W/"):
+            token = token[2:]
+        if token == etag:
+            return True
+    return False
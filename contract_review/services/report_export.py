@@ -0,0 +1,221 @@
+# contract_review/services/report_export.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+
+from packages.shared_contract_schema import SCHEMA_VERSION
+
+from .report_cache import etag_matches
+
+# =========================
+# PDF 导出：预渲染 + 按报告哈希寻址
+# =========================
+# 终态报告不再变化：任务结束时后台渲染一次（没赶上就在首次下载时渲染），PDF 存为
+# exports/<key[:2]>/<key>.pdf，key 取 report_payload + 引擎 + schema 版本的 sha256（不含任务号，
+# 内容相同的报告跨任务共用一份；任务号只出现在下载文件名里）。
+# 重复下载直接回放文件（ETag / Range）；渲染走有界线程池，同一 key 的并发请求只渲染一次。
+
+# 渲染函数：返回 (pdf 字节, 引擎名)
+Renderer = Callable[[], Tuple[bytes, str]]
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_POOL_LOCK = threading.Lock()
+_POOL: Optional[ThreadPoolExecutor] = None
+_INFLIGHT: Dict[str, Future] = {}
+
+
+class ExportedPdf:
+    def __init__(self, key: str, path: Path, engine: str = "") -> None:
+        self.key = key
+        self.path = path
+        self.engine = engine
+        self.size = path.stat().st_size
+
+    @property
+    def etag(self) -> str:
+        return export_etag(self.key)
+
+
+def export_root() -> Path:
+    media_root = Path(getattr(settings, "MEDIA_ROOT", Path.cwd() / "media"))
+    return media_root / "exports"
+
+
+def export_key(report_payload: Dict[str, Any], variant: str = "") -> str:
+    raw = json.dumps(
+        {"schema": SCHEMA_VERSION, "variant": variant, "payload": report_payload},
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def export_etag(key: str) -> str:
+    return '"' + key[:32] + '"'
+
+
+def export_path(key: str) -> Path:
+    return export_root() / key[:2] / f"{key}.pdf"
+
+
+def find_export(key: str) -> Optional[ExportedPdf]:
+    path = export_path(key)
+    if not path.is_file():
+        return None
+    engine = ""
+    try:
+        engine = json.loads(path.with_suffix(".json").read_text(encoding="utf-8")).get("engine") or ""
+    except Exception:
+        pass
+    return ExportedPdf(key, path, engine)
+
+
+def _store(key: str, pdf_bytes: bytes, engine: str) -> ExportedPdf:
+    dst = export_path(key)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = export_root() / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(prefix="export_", suffix=".pdf", dir=str(tmp_dir))
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(pdf_bytes)
+        os.chmod(name, 0o644)
+        # 先写引擎信息再改名：文件一出现就是完整的
+        dst.with_suffix(".json").write_text(json.dumps({"engine": engine}), encoding="utf-8")
+        os.replace(name, dst)
+    finally:
+        if os.path.exists(name):
+            os.unlink(name)
+    return ExportedPdf(key, dst, engine)
+
+
+def _render_and_store(key: str, render: Renderer) -> ExportedPdf:
+    existing = find_export(key)
+    if existing is not None:
+        return existing
+    pdf_bytes, engine = render()
+    return _store(key, pdf_bytes, engine)
+
+
+def _forget(key: str) -> None:
+    with _POOL_LOCK:
+        _INFLIGHT.pop(key, None)
+
+
+def submit_export(key: str, render: Renderer, background: bool = False) -> Optional[Future]:
+    """提交渲染；同一 key 已在渲染则复用。后台预渲染在队列满时放弃（返回 None），等首次下载再渲染。"""
+    global _POOL
+    with _POOL_LOCK:
+        fut = _INFLIGHT.get(key)
+        if fut is not None:
+            return fut
+        if background and len(_INFLIGHT) >= int(getattr(settings, "PDF_RENDER_QUEUE_MAX", 32) or 32):
+            return None
+        if _POOL is None:
+            workers = max(1, int(getattr(settings, "PDF_RENDER_WORKERS", 2) or 2))
+            _POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-render")
+        fut = _POOL.submit(_render_and_store, key, render)
+        _INFLIGHT[key] = fut
+    fut.add_done_callback(lambda _f: _forget(key))
+    return fut
+
+
+def ensure_export(key: str, render: Renderer, timeout: Optional[float] = None) -> ExportedPdf:
+    """已渲染直接返回；否则进渲染池并等待结果（渲染失败时抛出原异常）。"""
+    existing = find_export(key)
+    if existing is not None:
+        return existing
+    if timeout is None:
+        timeout = float(getattr(settings, "PDF_RENDER_TIMEOUT", 120) or 120)
+    return submit_export(key, render).result(timeout=timeout)
+
+
+def prewarm_export(key: str, render: Renderer) -> bool:
+    if find_export(key) is not None:
+        return False
+    return submit_export(key, render, background=True) is not None
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """只支持单个区间；返回闭区间 (start, end)，无法满足时抛 ValueError。"""
+    m = _RANGE_RE.match((header or "").strip())
+    if not m:
+        return None
+    first, last = m.group(1), m.group(2)
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length <= 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def _export_headers(etag: str, engine: str = "") -> Dict[str, str]:
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, no-cache"}
+    if engine:
+        headers["X-PDF-Engine"] = engine
+    return headers
+
+
+def not_modified_response(request, key: str) -> Optional[HttpResponse]:
+    """If-None-Match 命中时直接回 304：ETag 只由 key 决定，不必先渲染或读文件。"""
+    etag = export_etag(key)
+    if not etag_matches(request, etag):
+        return None
+    resp = HttpResponse(status=304)
+    for k, v in _export_headers(etag).items():
+        resp[k] = v
+    return resp
+
+
+def export_response(request, exported: ExportedPdf, filename: str):
+    headers = _export_headers(exported.etag, exported.engine)
+    if etag_matches(request, exported.etag):
+        resp = HttpResponse(status=304)
+        for k, v in headers.items():
+            resp[k] = v
+        return resp
+
+    byte_range = None
+    range_header = request.headers.get("Range") or ""
+    if_range = (request.headers.get("If-Range") or "").strip()
+    if range_header and (not if_range or if_range == exported.etag):
+        try:
+            byte_range = _parse_range(range_header, exported.size)
+        except ValueError:
+            resp = HttpResponse(status=416)
+            resp["Content-Range"] = f"bytes */{exported.size}"
+            return resp
+
+    if byte_range is None:
+        resp = FileResponse(open(exported.path, "rb"), content_type="application/pdf")
+    else:
+        start, end = byte_range
+        with open(exported.path, "rb") as fh:
+            fh.seek(start)
+            data = fh.read(end - start + 1)
+        resp = HttpResponse(data, status=206, content_type="application/pdf")
+        resp["Content-Range"] = f"bytes {start}-{end}/{exported.size}"
+    for k, v in headers.items():
+        resp[k] = v
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
@@ -0,0 +1,368 @@
+# contract_review/services/report_pdf.py
+from __future__ import annotations
+
+import io
+import os
+import shutil
+from functools import lru_cache
+from html import escape
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import pdfkit
+from django.conf import settings
+from jinja2 import Template
+
+from packages.shared_contract_schema import build_report_html
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    REPORTLAB_AVAILABLE = True
+except Exception:
+    REPORTLAB_AVAILABLE = False
+
+# =========================
+# 报告 PDF 渲染
+# =========================
+# 默认仍是 wkhtmltopdf（HTML 保真），失败时退回 ReportLab，与改造前一致。
+# ReportLab 直接按 report_payload 排版，不经 HTML、不起子进程。字体每个进程只探测 / 注册一次，
+# 段落样式与表格样式按字体缓存，每次导出只生成 story 并 build（PDF_ENGINE=reportlab 或 ?engine=reportlab）。
+# 还没有两者的实测对比：在装有 wkhtmltopdf 的机器上跑 manage.py bench_pdf_export，ReportLab 更快再切换默认引擎。
+
+PDF_ENGINES = ("reportlab", "wkhtmltopdf")
+# 盖章颜色只取 stamp_text_color 的三种值；其余一律用灰色，不把载荷里的字符串拼进 <font> 标记
+_STAMP_COLORS = ("#0c7b48", "#b42318", "#6b7280")
+
+_PAGE_MARGIN_MM = 12
+_KEY_COL_MM = 30
+# 内置 CID 字体：找不到系统 TTF 时仍能显示中文（Helvetica 只会显示方框）
+_CID_FALLBACK = "STSong-Light"
+
+_FONT_CANDIDATES = (
+    ("MicrosoftYaHei", r"C:\Windows\Fonts\msyh.ttc"),
+    ("SimSun", r"C:\Windows\Fonts\simsun.ttc"),
+    ("SimHei", r"C:\Windows\Fonts\simhei.ttf"),
+    ("ArialUnicodeMS", r"C:\Windows\Fonts\arialuni.ttf"),
+    ("PingFang", "/System/Library/Fonts/PingFang.ttc"),
+    ("NotoSansCJK", "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc"),
+    ("NotoSansCJK", "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc"),
+    ("WenQuanYiZenHei", "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc"),
+)
+
+
+@lru_cache(maxsize=1)
+def report_font() -> str:
+    """注册并返回报告字体名；结果按进程缓存，不再每次导出都探测字体文件。"""
+    if not REPORTLAB_AVAILABLE:
+        return "Helvetica"
+
+    candidates: List[Tuple[str, str]] = []
+    configured = (os.environ.get("PDF_FONT_PATH") or "").strip().strip('"').strip("'")
+    if configured:
+        candidates.append(("ReportCustomFont", configured))
+    candidates.extend(_FONT_CANDIDATES)
+
+    registered = set(pdfmetrics.getRegisteredFontNames())
+    for name, font_path in candidates:
+        if name in registered:
+            return name
+        if not os.path.exists(font_path):
+            continue
+        try:
+            pdfmetrics.registerFont(TTFont(name, font_path))
+            return name
+        except Exception:
+            continue
+    try:
+        pdfmetrics.registerFont(UnicodeCIDFont(_CID_FALLBACK))
+        return _CID_FALLBACK
+    except Exception:
+        return "Helvetica"
+
+
+def _size(font_name: str, cjk: float, latin: float) -> float:
+    return cjk if font_name != "Helvetica" else latin
+
+
+@lru_cache(maxsize=4)
+def report_styles(font_name: str) -> Dict[str, Any]:
+    base = getSampleStyleSheet()["BodyText"]
+
+    def style(name: str, size: float, leading: float, color: str, **kw: Any) -> ParagraphStyle:
+        return ParagraphStyle(
+            name,
+            parent=base,
+            fontName=font_name,
+            fontSize=size,
+            leading=leading,
+            textColor=colors.HexColor(color),
+            **kw,
+        )
+
+    return {
+        "title": style("title", _size(font_name, 22, 18), 28, "#4b6fae", spaceAfter=6),
+        "meta": style("meta", _size(font_name, 10.5, 9.5), 15, "#475467", spaceAfter=3),
+        "panel_title": style("panel_title", _size(font_name, 13, 11.5), 17, "#2f4b6e", spaceAfter=2),
+        "body": style("body", _size(font_name, 10.5, 9.5), 16, "#101828"),
+        "body_muted": style("body_muted", 10, 15, "#667085"),
+        "key": style("key", _size(font_name, 10.2, 9.2), 15, "#475467"),
+        "item": style("item", _size(font_name, 10.5, 9.5), 16, "#101828", spaceAfter=3),
+        "muted": style("muted", 10, 15, "#667085"),
+    }
+
+
+@lru_cache(maxsize=1)
+def _table_styles() -> Dict[str, Any]:
+    return {
+        "panel": TableStyle(
+            [
+                ("BOX", (0, 0), (-1, -1), 1, colors.HexColor("#d6e3e0")),
+                ("BACKGROUND", (0, 0), (-1, -1), colors.white),
+                ("LEFTPADDING", (0, 0), (-1, -1), 10),
+                ("RIGHTPADDING", (0, 0), (-1, -1), 10),
+                ("TOPPADDING", (0, 0), (-1, -1), 8),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
+            ]
+        ),
+        "section_header": TableStyle(
+            [
+                ("BOX", (0, 0), (-1, -1), 1, colors.HexColor("#d6e3e0")),
+                ("BACKGROUND", (0, 0), (-1, -1), colors.HexColor("#f8fafc")),
+                ("LEFTPADDING", (0, 0), (-1, -1), 10),
+                ("RIGHTPADDING", (0, 0), (-1, -1), 10),
+                ("TOPPADDING", (0, 0), (-1, -1), 6),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+            ]
+        ),
+        "key_facts": TableStyle(
+            [
+                ("LINEBELOW", (0, 0), (-1, -1), 0.6, colors.HexColor("#edf2f7")),
+                ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                ("LEFTPADDING", (0, 0), (-1, -1), 3),
+                ("RIGHTPADDING", (0, 0), (-1, -1), 3),
+                ("TOPPADDING", (0, 0), (-1, -1), 4),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+            ]
+        ),
+    }
+
+
+def risk_level_color(level: str) -> str:
+    text = (level or "").lower()
+    if any(k in text for k in ("高", "high", "严重", "critical")):
+        return "#b42318"
+    if any(k in text for k in ("中", "medium", "moderate")):
+        return "#b54708"
+    if any(k in text for k in ("低", "low")):
+        return "#067647"
+    return "#475467"
+
+
+def _panel(title: str, body_flowables: list, width: float, styles: Dict[str, Any]) -> Table:
+    inner = [Paragraph(escape(title), styles["panel_title"]), Spacer(1, 4)]
+    if body_flowables:
+        inner.extend(body_flowables)
+    else:
+        inner.append(Paragraph("未识别到相关内容", styles["muted"]))
+    panel = Table([[inner]], colWidths=[width])
+    panel.setStyle(_table_styles()["panel"])
+    return panel
+
+
+def _key_facts_table(key_facts: Dict[str, Any], width: float, styles: Dict[str, Any]) -> Table:
+    rows = [
+        [Paragraph(f"<b>{escape(str(k))}</b>", styles["key"]), Paragraph(escape(str(v)), styles["body"])]
+        for k, v in (key_facts or {}).items()
+    ]
+    if not rows:
+        rows = [[Paragraph("<b>提示</b>", styles["key"]), Paragraph("未提取到关键要素", styles["body_muted"])]]
+    table = Table(rows, colWidths=[_KEY_COL_MM * mm, width - _KEY_COL_MM * mm])
+    table.setStyle(_table_styles()["key_facts"])
+    return table
+
+
+def _items_section(title: str, items: list, width: float, styles: Dict[str, Any]) -> list:
+    header = Table([[Paragraph(escape(title), styles["panel_title"])]], colWidths=[width])
+    header.setStyle(_table_styles()["section_header"])
+    out: list = [header, Spacer(1, 4)]
+    if not items:
+        out.extend([Paragraph("未识别到相关内容", styles["muted"]), Spacer(1, 6)])
+        return out
+
+    for idx, item in enumerate(items, 1):
+        name = escape(str(item.get("title", "事项")))
+        level = str(item.get("level", "") or "")
+        level_html = f" <font color='{risk_level_color(level)}'>（{escape(level)}）</font>" if level else ""
+        out.append(Paragraph(f"<b>{idx}. {name}</b>{level_html}", styles["item"]))
+        problem = str(item.get("problem", "") or "")
+        if problem:
+            out.append(Paragraph(f"<b>问题：</b>{escape(problem)}", styles["body"]))
+        suggestion = str(item.get("suggestion", "") or "")
+        if suggestion:
+            out.append(Paragraph(escape(suggestion), styles["body"]))
+        out.append(Spacer(1, 3))
+    out.append(Spacer(1, 6))
+    return out
+
+
+def render_report_pdf(report_payload: Dict[str, Any], title: str) -> bytes:
+    if not REPORTLAB_AVAILABLE:
+        raise RuntimeError("reportlab is not available")
+
+    buf = io.BytesIO()
+    margin = _PAGE_MARGIN_MM * mm
+    doc = SimpleDocTemplate(
+        buf,
+        pagesize=A4,
+        leftMargin=margin,
+        rightMargin=margin,
+        topMargin=margin,
+        bottomMargin=margin,
+        title=title,
+        author="Contract Review",
+    )
+    styles = report_styles(report_font())
+    width = doc.width
+
+    stamp_color = report_payload.get("stamp_color")
+    if stamp_color not in _STAMP_COLORS:
+        stamp_color = "#6b7280"
+    meta_line_1 = (
+        f"<b>合同类型：</b>{escape(str(report_payload.get('contract_type', '未识别')))}"
+        f"  |  <b>盖章：</b><font color='{stamp_color}'><b>{escape(str(report_payload.get('stamp_text', '未提及')))}</b></font>"
+    )
+    meta_line_2 = (
+        f"<b>类型置信度：</b>{escape(str(report_payload.get('confidence_text', '-')))}"
+        f"  |  <b>类型来源：</b>{escape(str(report_payload.get('type_source', 'result_json')))}"
+    )
+    overview = escape(str(report_payload.get("overview", "暂无概述")))
+
+    story: list = [
+        Paragraph("合同审查报告", styles["title"]),
+        Paragraph(meta_line_1, styles["meta"]),
+        Paragraph(meta_line_2, styles["meta"]),
+        Spacer(1, 4),
+        _panel("合同关键要素", [_key_facts_table(report_payload.get("key_facts") or {}, width, styles)], width, styles),
+        Spacer(1, 6),
+        _panel("审查概述", [Paragraph(overview, styles["body"])], width, styles),
+        Spacer(1, 6),
+    ]
+    story.extend(_items_section("风险点", report_payload.get("risks", []), width, styles))
+    story.extend(_items_section("改进建议", report_payload.get("improvements", []), width, styles))
+
+    doc.build(story)
+    return buf.getvalue()
+
+
+# =========================
+# wkhtmltopdf（HTML 保真模式）
+# =========================
+PDF_HTML_TEMPLATE = Template(
+    """
+<!doctype html>
+<html lang="zh-CN">
+<head>
+  <meta charset="utf-8" />
+  <style>
+    body { font-family: "Microsoft YaHei","PingFang SC","Hiragino Sans GB",Arial,sans-serif; }
+    h1 { font-size: 22px; margin: 0 0 12px; }
+    h2 { font-size: 16px; margin: 18px 0 8px; }
+    pre { white-space: pre-wrap; }
+  </style>
+</head>
+<body>
+  {{ body|safe }}
+</body>
+</html>
+"""
+)
+
+WKHTMLTOPDF_OPTIONS = {
+    "encoding": "UTF-8",
+    "page-size": "A4",
+    "margin-top": "12mm",
+    "margin-right": "12mm",
+    "margin-bottom": "12mm",
+    "margin-left": "12mm",
+    "enable-local-file-access": None,
+    "disable-smart-shrinking": None,
+}
+
+
+def resolve_wkhtmltopdf_path() -> str:
+    candidates: list[str] = []
+    configured = (getattr(settings, "WKHTMLTOPDF_BIN", "") or os.environ.get("WKHTMLTOPDF_BIN", "")).strip().strip('"').strip("'")
+    if configured:
+        candidates.append(configured)
+
+    which_path = shutil.which("wkhtmltopdf") or shutil.which("wkhtmltopdf.exe")
+    if which_path:
+        candidates.append(which_path)
+
+    base_dir = Path(getattr(settings, "BASE_DIR", Path.cwd()))
+    candidates.extend(
+        [
+            str(base_dir / "wkhtmltopdf" / "bin" / "wkhtmltopdf.exe"),
+            str(base_dir / "wkhtmltopdf.exe"),
+            str(base_dir / "tools" / "wkhtmltopdf" / "bin" / "wkhtmltopdf.exe"),
+            str(base_dir / ".venv" / "wkhtmltopdf" / "bin" / "wkhtmltopdf.exe"),
+            r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe",
+            r"C:\Program Files (x86)\wkhtmltopdf\bin\wkhtmltopdf.exe",
+        ]
+    )
+
+    seen: set[str] = set()
+    for raw in candidates:
+        path = os.path.expandvars(str(raw)).strip().strip('"').strip("'")
+        if not path:
+            continue
+        normalized = str(Path(path))
+        if normalized in seen:
+            continue
+        seen.add(normalized)
+        if os.path.exists(normalized):
+            return normalized
+    return ""
+
+
+
+def render_html_pdf(report_payload: Dict[str, Any]) -> bytes:
+    wk_path = resolve_wkhtmltopdf_path()
+    if not wk_path:
+        raise RuntimeError(f"WKHTMLTOPDF_BIN not found. configured={getattr(settings, 'WKHTMLTOPDF_BIN', '')}")
+    html = PDF_HTML_TEMPLATE.render(body=build_report_html(report_payload))
+    config = pdfkit.configuration(wkhtmltopdf=wk_path)
+    return pdfkit.from_string(html, False, options=WKHTMLTOPDF_OPTIONS, configuration=config, verbose=False)
+
+
+def pdf_engine(requested: str = "") -> str:
+    engine = (requested or getattr(settings, "PDF_ENGINE", "") or "wkhtmltopdf").strip().lower()
+    return engine if engine in PDF_ENGINES else "wkhtmltopdf"
+
+
+def render_pdf(report_payload: Dict[str, Any], title: str, engine: str = "wkhtmltopdf") -> Tuple[bytes, str]:
+    """渲染一次 PDF，返回 (bytes, 实际引擎)；首选引擎失败时换另一个。"""
+    if engine == "wkhtmltopdf":
+        try:
+            return render_html_pdf(report_payload), "wkhtmltopdf"
+        except Exception as wk_err:
+            try:
+                return render_report_pdf(report_payload, title), "reportlab-fallback"
+            except Exception as fallback_err:
+                raise RuntimeError(f"wkhtmltopdf={wk_err}; reportlab={fallback_err}") from fallback_err
+
+    try:
+        return render_report_pdf(report_payload, title), "reportlab"
+    except Exception as rl_err:
+        try:
+            return render_html_pdf(report_payload), "wkhtmltopdf-fallback"
+        except Exception as fallback_err:
+            raise RuntimeError(f"reportlab={rl_err}; wkhtmltopdf={fallback_err}") from fallback_err
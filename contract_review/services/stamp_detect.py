@@ -1,16 +1,36 @@
 # contract_review/services/stamp_detect.py
 from __future__ import annotations
-from typing import Dict, List, Tuple
+from typing import Dict, List, Mapping, Optional, Tuple
 
 import fitz  # PyMuPDF
 import numpy as np
 import cv2
 
+# 两级检测：
+# 1) 粗筛：整页按低 DPI 渲染（或把已渲染的页面缩小），按通道差判“偏红”像素，按块统计占比，找出候选块；
+# 2) 精查：只对候选块（外扩一块）按原 DPI 做 HSV 双阈值 + 形态学 + 连通域，判定逻辑与原整页检测一致。
+# 没有红色的页面只付出一次低分辨率渲染的代价。
+FINE_DPI = 200
+COARSE_DPI = 50
+# 粗图上的块边长（像素）：50 dpi 下约 4mm
+_TILE = 8
+# 块内偏红像素占比达到该值即为候选
+_TILE_MIN_RED = 0.03
+# 原阈值按 200 dpi 标定
+_MIN_AREA_AT_FINE_DPI = 800
 
-def _find_red_regions(img_bgr: np.ndarray) -> List[Tuple[int, int, int, int, float]]:
+Box = Tuple[int, int, int, int]
+
+
+def _find_red_regions(
+    img_bgr: np.ndarray,
+    page_area: Optional[float] = None,
+    min_area: float = _MIN_AREA_AT_FINE_DPI,
+) -> List[Tuple[int, int, int, int, float]]:
     """
     返回可能的红章区域 bbox 列表: (x, y, w, h, score)
     score 这里用区域内红色像素占比做一个简单置信度
+    img_bgr 可以是整页，也可以是页面中的一块（此时 page_area 传整页面积，用于过滤整页水印）
     """
     hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
 
@@ -34,16 +54,18 @@ def _find_red_regions(img_bgr: np.ndarray) -> List[Tuple[int, int, int, int, flo
 
     candidates = []
     H, W = mask.shape[:2]
+    if page_area is None:
+        page_area = H * W
 
     for i in range(1, num_labels):
         x, y, w, h, area = stats[i]
 
         # 过滤太小的红块（噪声）
-        if area < 800:
+        if area < min_area:
             continue
 
         # 过滤超大的红块（比如整页水印）
-        if area > 0.25 * H * W:
+        if area > 0.25 * page_area:
             continue
 
         # 印章大多接近方形区域，宽高比别太离谱
@@ -92,14 +114,140 @@ def _select_page_indices(total: int, max_pages: int, head_pages: int, tail_pages
     return sorted(set(keep))
 
 
-def detect_stamp_status_from_pdf(pdf_path: str, max_pages: int = 8, tail_pages: int = 4) -> Dict:
+def _red_dominant(img_rgb: np.ndarray) -> np.ndarray:
+    """粗筛用的偏红判定：R 足够亮且明显高于 G/B（宽于精查的 HSV 阈值，低分辨率下浅色描边也能命中）。"""
+    px = img_rgb.astype(np.int16)
+    r = px[..., 0]
+    return (r >= 80) & (r - np.maximum(px[..., 1], px[..., 2]) >= 24)
+
+
+def _candidate_rois(coarse_rgb: np.ndarray, tile: int = _TILE) -> List[Box]:
+    """在粗图上按块统计偏红占比，返回候选区域 (x0, y0, x1, y1)（粗图像素，已外扩一块）。"""
+    mask = _red_dominant(coarse_rgb)
+    h, w = mask.shape
+    th, tw = -(-h // tile), -(-w // tile)
+    padded = np.zeros((th * tile, tw * tile), dtype=np.float32)
+    padded[:h, :w] = mask
+    frac = padded.reshape(th, tile, tw, tile).mean(axis=(1, 3))
+    hot = (frac >= _TILE_MIN_RED).astype(np.uint8)
+    if not hot.any():
+        return []
+    # 外扩一块：形态学闭运算需要邻域，印章边缘也可能落在相邻块
+    hot = cv2.dilate(hot, np.ones((3, 3), np.uint8))
+    num, _, stats, _ = cv2.connectedComponentsWithStats(hot, connectivity=8)
+    rois = []
+    for i in range(1, num):
+        x, y, bw, bh, _ = stats[i]
+        rois.append((int(x * tile), int(y * tile), int(min((x + bw) * tile, w)), int(min((y + bh) * tile, h))))
+    return rois
+
+
+def _pixmap_rgb(pix) -> np.ndarray:
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)[..., :3]
+
+
+def _page_regions_rendered(page, coarse_dpi: int, fine_dpi: int) -> List[Tuple[int, int, int, int, float]]:
+    """直接从 PDF 渲染：粗图整页，精查只渲染候选块（clip）。返回 fine_dpi 整页坐标。"""
+    coarse = _pixmap_rgb(page.get_pixmap(dpi=coarse_dpi, alpha=False))
+    rois = _candidate_rois(coarse)
+    if not rois:
+        return []
+    fine_w = page.rect.width * fine_dpi / 72.0
+    fine_h = page.rect.height * fine_dpi / 72.0
+    page_area = fine_w * fine_h
+    # 旋转页的 clip 坐标系与渲染结果不一致，整页渲染后裁剪
+    full = _pixmap_rgb(page.get_pixmap(dpi=fine_dpi, alpha=False)) if page.rotation else None
+
+    regions = []
+    ch, cw = coarse.shape[:2]
+    to_pt = 72.0 / coarse_dpi
+    scale = fine_dpi / float(coarse_dpi)
+    for x0, y0, x1, y1 in rois:
+        if full is not None:
+            fx0, fy0 = int(x0 * scale), int(y0 * scale)
+            fx1 = full.shape[1] if x1 >= cw else int(x1 * scale)
+            fy1 = full.shape[0] if y1 >= ch else int(y1 * scale)
+            roi = full[fy0:fy1, fx0:fx1]
+        else:
+            r = page.rect
+            clip = fitz.Rect(
+                r.x0 + x0 * to_pt,
+                r.y0 + y0 * to_pt,
+                r.x1 if x1 >= cw else r.x0 + x1 * to_pt,
+                r.y1 if y1 >= ch else r.y0 + y1 * to_pt,
+            )
+            pix = page.get_pixmap(dpi=fine_dpi, alpha=False, clip=clip)
+            roi = _pixmap_rgb(pix)
+            fx0 = int(round(pix.x - r.x0 * fine_dpi / 72.0))
+            fy0 = int(round(pix.y - r.y0 * fine_dpi / 72.0))
+        if roi.size == 0:
+            continue
+        for x, y, w, h, score in _find_red_regions(cv2.cvtColor(roi, cv2.COLOR_RGB2BGR), page_area=page_area):
+            regions.append((x + fx0, y + fy0, w, h, score))
+    return regions
+
+
+def _page_regions_from_image(img_bgr: np.ndarray, image_dpi: int, coarse_dpi: int, fine_dpi: int):
+    """复用调用方已解码的整页图像：缩小做粗筛，候选块直接从原图裁剪。返回 fine_dpi 整页坐标。"""
+    H, W = img_bgr.shape[:2]
+    # 整数倍缩小（INTER_AREA 走块平均的快速路径），效果等同按低 DPI 渲染
+    up = max(1, int(round(image_dpi / float(coarse_dpi))))
+    if H < up or W < up:
+        return []
+    coarse_bgr = cv2.resize(
+        img_bgr[: H // up * up, : W // up * up],
+        (W // up, H // up),
+        interpolation=cv2.INTER_AREA,
+    )
+    rois = _candidate_rois(coarse_bgr[..., ::-1])
+    if not rois:
+        return []
+
+    to_fine = fine_dpi / float(image_dpi)
+    min_area = _MIN_AREA_AT_FINE_DPI / (to_fine * to_fine)
+    regions = []
+    ch, cw = coarse_bgr.shape[:2]
+    for x0, y0, x1, y1 in rois:
+        fx0, fy0 = x0 * up, y0 * up
+        # 贴着粗图边缘的区域延伸到原图边缘（缩小时裁掉的不足一倍的行列）
+        fx1 = W if x1 >= cw else x1 * up
+        fy1 = H if y1 >= ch else y1 * up
+        roi = img_bgr[fy0:fy1, fx0:fx1]
+        if roi.size == 0:
+            continue
+        for x, y, w, h, score in _find_red_regions(roi, page_area=H * W, min_area=min_area):
+            regions.append(
+                (int((x + fx0) * to_fine), int((y + fy0) * to_fine), int(w * to_fine), int(h * to_fine), score)
+            )
+    return regions
+
+
+def _scan_order(page_indices: List[int], total: int, tail_pages: int) -> List[int]:
+    # 印章多在签署页（末尾几页），先查末尾、从最后一页往前，再查其余页
+    tail_start = total - max(tail_pages, 0)
+    tail = sorted((p for p in page_indices if p >= tail_start), reverse=True)
+    rest = [p for p in page_indices if p < tail_start]
+    return tail + rest
+
+
+def detect_stamp_status_from_pdf(
+    pdf_path: str,
+    max_pages: int = 8,
+    tail_pages: int = 4,
+    page_images: Optional[Mapping[int, np.ndarray]] = None,
+    page_dpi: int = FINE_DPI,
+    coarse_dpi: int = COARSE_DPI,
+) -> Dict:
     """
     图像法检测 PDF 是否盖章（扫描件友好）
+    page_images: {页码(从 0 开始): 已解码的整页 BGR 图像}，有则复用（page_dpi 为其分辨率），没有的页从 PDF 渲染。
+      只传内存里已有的图像：重新解码 200 dpi 的 PNG（约 50ms）比低 DPI 渲染整页（约 5ms）还慢。
     返回:
       {
         "stamp_status": "YES"|"NO"|"UNCERTAIN",
         "evidence": [{"page": 1, "bbox": [x,y,w,h], "score":0.xx}, ...]
       }
+    bbox 为 200 dpi 整页像素坐标
     """
     try:
         doc = fitz.open(pdf_path)
@@ -107,6 +255,7 @@ def detect_stamp_status_from_pdf(pdf_path: str, max_pages: int = 8, tail_pages:
         return {"stamp_status": "UNCERTAIN", "evidence": [{"error": f"open_pdf_failed: {e}"}]}
 
     evidence = []
+    page_images = page_images or {}
     try:
         total = len(doc)
         tail_pages = max(tail_pages, 0)
@@ -116,14 +265,14 @@ def detect_stamp_status_from_pdf(pdf_path: str, max_pages: int = 8, tail_pages:
             head_pages = max(max_pages - tail_pages, 0)
             page_indices = _select_page_indices(total, max_pages, head_pages, tail_pages)
 
-        for pno in page_indices:
-            page = doc[pno]
-            pix = page.get_pixmap(dpi=200, alpha=False)  # dpi 可调 180~240
-            img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
-            # pix 是 RGB，转 BGR 供 opencv
-            img_bgr = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+        for pno in _scan_order(page_indices, total, tail_pages):
+            image = page_images.get(pno)
+            if image is not None and page_dpi > 0:
+                cands = _page_regions_from_image(image, page_dpi, coarse_dpi, FINE_DPI)
+            else:
+                cands = _page_regions_rendered(doc[pno], coarse_dpi, FINE_DPI)
+            cands.sort(key=lambda t: t[4], reverse=True)
 
-            cands = _find_red_regions(img_bgr)
             # 取前几个证据就够了
             for (x, y, w, h, score) in cands[:3]:
                 evidence.append(
@@ -0,0 +1,464 @@
+# contract_review/services/upload_store.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+# =========================
+# 按内容寻址的上传存储
+# =========================
+# 上传分块边接收边计算 sha256，直接写入 blobs/tmp 下的临时文件；校验通过后按哈希原子改名为
+# blobs/<sha[:2]>/<sha>.pdf（同内容只保留一份），任务目录 job_{id}_{sha}/input.pdf 硬链接到它。
+# 全程只落盘一次，内存里只有当前分块。
+
+PDF_MAGIC = b"%PDF-"
+
+
+def upload_store_root() -> Path:
+    media_root = Path(getattr(settings, "MEDIA_ROOT", Path.cwd() / "media"))
+    return media_root / "blobs"
+
+
+def blob_path(sha256: str) -> Path:
+    return upload_store_root() / sha256[:2] / f"{sha256}.pdf"
+
+
+def touch_blob(path: Path) -> None:
+    """复用已有 blob 时刷新 mtime：cleanup_jobs 不删刚入库、任务行还没建出来的 blob。"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def find_blob(sha256: str) -> Optional[Path]:
+    sha256 = (sha256 or "").strip().lower()
+    if len(sha256) != 64:
+        return None
+    path = blob_path(sha256)
+    return path if path.is_file() else None
+
+
+class BlobWriter:
+    """写临时文件并增量计算 sha256；commit() 按哈希改名入库，discard() 丢弃。"""
+
+    def __init__(self) -> None:
+        tmp_dir = upload_store_root() / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(prefix="upload_", suffix=".part", dir=str(tmp_dir))
+        self.tmp_path = Path(name)
+        # mkstemp 默认 0600，放宽到与普通上传一致，worker 以其他账户运行时也能读取
+        os.chmod(self.tmp_path, 0o644)
+        self._fh = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.committed: Optional[Path] = None
+
+    def write(self, chunk: bytes) -> None:
+        if len(self.head) < len(PDF_MAGIC):
+            self.head += bytes(chunk[: len(PDF_MAGIC) - len(self.head)])
+        self._hash.update(chunk)
+        self._fh.write(chunk)
+        self.size += len(chunk)
+
+    def close(self) -> None:
+        if not self._fh.closed:
+            self._fh.close()
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def looks_like_pdf(self) -> bool:
+        return self.head.startswith(PDF_MAGIC)
+
+    def commit(self) -> Path:
+        self.close()
+        if self.committed is not None:
+            return self.committed
+        dst = blob_path(self.sha256)
+        if dst.is_file():
+            # 内容已存在：丢弃本次临时文件，复用已有 blob
+            self.tmp_path.unlink(missing_ok=True)
+            touch_blob(dst)
+        else:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self.tmp_path, dst)
+        self.committed = dst
+        return dst
+
+    def discard(self) -> None:
+        self.close()
+        if self.committed is None:
+            self.tmp_path.unlink(missing_ok=True)
+
+
+def link_job_input(blob: Path, job_root: Path) -> Path:
+    """任务目录下的 input.pdf 硬链接到 blob；文件系统不支持硬链接时退回复制。"""
+    job_root.mkdir(parents=True, exist_ok=True)
+    dst = job_root / "input.pdf"
+    dst.unlink(missing_ok=True)
+    try:
+        os.link(blob, dst)
+    except OSError:
+        shutil.copyfile(blob, dst)
+    return dst
+
+
+class StoredUploadedFile(UploadedFile):
+    """request.FILES 里的上传：内容已在 blobs/tmp 下，附带 sha256 与写入器。"""
+
+    def __init__(self, writer: BlobWriter, name: str, content_type: str, charset=None, content_type_extra=None):
+        super().__init__(
+            open(writer.tmp_path, "rb"),
+            name=name,
+            content_type=content_type,
+            size=writer.size,
+            charset=charset,
+            content_type_extra=content_type_extra,
+        )
+        self.writer = writer
+        self.sha256 = writer.sha256
+
+    def commit(self) -> Path:
+        self.file.close()
+        return self.writer.commit()
+
+    def close(self):
+        # 请求结束时 Django 会关闭 FILES；未 commit 的临时文件随之清理
+        try:
+            return super().close()
+        finally:
+            self.writer.discard()
+
+
+class ContentAddressedUploadHandler(FileUploadHandler):
+    """替代默认的内存 / 临时文件上传处理器：分块直接写入 upload store 并计算哈希。"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.writer = BlobWriter()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.writer.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.writer.close()
+        return StoredUploadedFile(
+            self.writer,
+            name=self.file_name,
+            content_type=self.content_type,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        writer = getattr(self, "writer", None)
+        if writer is not None:
+            writer.discard()
+
+
+# =========================
+# 断点续传会话（init -> PUT 字节区间 -> finalize）
+# =========================
+# 会话 = sessions/<id>.json（文件名、声明大小、声明哈希）+ sessions/<id>.part（已收到的连续前缀），
+# .part 的长度就是续传偏移。多个 Django 进程可能同时收到同一会话的 PUT：写入与 finalize 都持有
+# sessions/<id>.lock 上的文件锁（进程内再加线程锁）。.part 只追加、已写前缀不变，所以 sha256 可以按
+# 偏移缓存在进程内：偏移对不上（别的进程追加过、或进程重启）时按已落盘前缀重算一次。
+
+UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_READ_CHUNK = 64 * 1024
+
+_REGISTRY_LOCK = threading.Lock()
+_SESSION_LOCKS: Dict[str, threading.Lock] = {}
+# upload_id -> (已哈希的字节数, hashlib 对象)
+_HASH_STATE: Dict[str, Tuple[int, Any]] = {}
+
+
+class UploadSessionError(Exception):
+    def __init__(self, code: str, message: str, status: int = 400, **extra: Any) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+
+def _sessions_dir() -> Path:
+    return upload_store_root() / "sessions"
+
+
+def _session_lock(upload_id: str) -> threading.Lock:
+    with _REGISTRY_LOCK:
+        return _SESSION_LOCKS.setdefault(upload_id, threading.Lock())
+
+
+def _lock_fd(fd: int) -> None:
+    if os.name == "nt":
+        while True:
+            try:
+                # LK_LOCK 自己会重试约 10 秒，仍拿不到再继续等
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+    fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+def _unlock_fd(fd: int) -> None:
+    if os.name == "nt":
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _forget(upload_id: str) -> None:
+    with _REGISTRY_LOCK:
+        _SESSION_LOCKS.pop(upload_id, None)
+        _HASH_STATE.pop(upload_id, None)
+
+
+class UploadSession:
+    def __init__(self, upload_id: str, meta: Dict[str, Any]) -> None:
+        self.upload_id = upload_id
+        self.meta = meta
+
+    @property
+    def part_path(self) -> Path:
+        return _sessions_dir() / f"{self.upload_id}.part"
+
+    @property
+    def meta_path(self) -> Path:
+        return _sessions_dir() / f"{self.upload_id}.json"
+
+    @property
+    def lock_path(self) -> Path:
+        return _sessions_dir() / f"{self.upload_id}.lock"
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """跨进程独占本会话；拿到锁时会话已被别的进程 finalize / 删除则报 404。"""
+        with _session_lock(self.upload_id):
+            try:
+                fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            except FileNotFoundError:
+                raise UploadSessionError("E-UPLOAD-NOT-FOUND", "upload not found", 404) from None
+            try:
+                _lock_fd(fd)
+                try:
+                    if not self.meta_path.is_file():
+                        raise UploadSessionError("E-UPLOAD-NOT-FOUND", "upload not found", 404)
+                    yield
+                finally:
+                    _unlock_fd(fd)
+            finally:
+                os.close(fd)
+
+    @property
+    def filename(self) -> str:
+        return str(self.meta.get("filename") or "uploaded.pdf")
+
+    @property
+    def size(self) -> int:
+        return int(self.meta.get("size") or 0)
+
+    @property
+    def declared_sha256(self) -> str:
+        return str(self.meta.get("sha256") or "")
+
+    @property
+    def offset(self) -> int:
+        try:
+            return self.part_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    @classmethod
+    def create(cls, filename: str, size: int, sha256: str = "") -> "UploadSession":
+        session = cls(uuid.uuid4().hex, {"filename": filename, "size": int(size), "sha256": sha256, "created": time.time()})
+        _sessions_dir().mkdir(parents=True, exist_ok=True)
+        session.part_path.touch()
+        tmp = session.meta_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(session.meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, session.meta_path)
+        return session
+
+    @classmethod
+    def load(cls, upload_id: str) -> Optional["UploadSession"]:
+        if not UPLOAD_ID_RE.match(upload_id or ""):
+            return None
+        try:
+            meta = json.loads((_sessions_dir() / f"{upload_id}.json").read_text(encoding="utf-8"))
+        except Exception:
+            return None
+        return cls(upload_id, meta if isinstance(meta, dict) else {})
+
+    def known_blob(self) -> Optional[Path]:
+        """声明的哈希已在库中：无需再传字节（需显式开启 UPLOAD_DEDUP_BY_HASH，见 settings）。"""
+        if not self.declared_sha256 or not getattr(settings, "UPLOAD_DEDUP_BY_HASH", False):
+            return None
+        return find_blob(self.declared_sha256)
+
+    def state(self) -> Dict[str, Any]:
+        offset = self.offset
+        known = self.known_blob() is not None
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "offset": self.size if known else offset,
+            "known": known,
+            "complete": known or offset >= self.size,
+        }
+
+    def _hasher(self, offset: int) -> Any:
+        state = _HASH_STATE.get(self.upload_id)
+        if state is not None and state[0] == offset:
+            return state[1]
+        h = hashlib.sha256()
+        remaining = offset
+        with open(self.part_path, "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(1024 * 1024, remaining))
+                if not chunk:
+                    break
+                h.update(chunk)
+                remaining -= len(chunk)
+        return h
+
+    def write_range(self, start: int, length: int, read: Callable[[int], bytes]) -> int:
+        """写入 [start, start+length)；与已收到前缀重叠的部分跳过。返回新的偏移。"""
+        with self._locked():
+            offset = self.offset
+            if start > offset:
+                raise UploadSessionError("E-UPLOAD-RANGE-GAP", "range starts beyond received bytes", 409, offset=offset)
+            if start + length > self.size:
+                raise UploadSessionError("E-UPLOAD-RANGE-INVALID", "range exceeds declared size", 416, offset=offset)
+            skip = offset - start
+            hasher = self._hasher(offset)
+            try:
+                with open(self.part_path, "r+b") as f:
+                    f.seek(offset)
+                    remaining = length
+                    while remaining > 0:
+                        chunk = read(min(_READ_CHUNK, remaining))
+                        if not chunk:
+                            # 客户端断开：已写入的前缀保留，下次从新偏移续传
+                            break
+                        remaining -= len(chunk)
+                        if skip:
+                            if len(chunk) <= skip:
+                                skip -= len(chunk)
+                                continue
+                            chunk = chunk[skip:]
+                            skip = 0
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        offset += len(chunk)
+            except Exception:
+                _HASH_STATE.pop(self.upload_id, None)
+                raise
+            _HASH_STATE[self.upload_id] = (offset, hasher)
+            return offset
+
+    def finalize(self) -> Tuple[str, Path]:
+        """校验并入库，返回 (sha256, blob)；声明的哈希已存在时直接复用已有 blob。"""
+        with self._locked():
+            blob = self.known_blob()
+            if blob is not None:
+                touch_blob(blob)
+                self.delete()
+                return self.declared_sha256, blob
+
+            offset = self.offset
+            if offset < self.size:
+                raise UploadSessionError("E-UPLOAD-INCOMPLETE", "upload is incomplete", 409, offset=offset)
+            digest = self._hasher(offset).hexdigest()
+            if self.declared_sha256 and digest != self.declared_sha256:
+                self.delete()
+                raise UploadSessionError("E-UPLOAD-HASH-MISMATCH", "sha256 mismatch, upload discarded", 422)
+            with open(self.part_path, "rb") as f:
+                if not f.read(len(PDF_MAGIC)).startswith(PDF_MAGIC):
+                    self.delete()
+                    raise UploadSessionError("E-FILE-CONTENT-NOT-PDF", "invalid file content (expected PDF)")
+
+            dst = blob_path(digest)
+            if dst.is_file():
+                self.part_path.unlink(missing_ok=True)
+                touch_blob(dst)
+            else:
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(self.part_path, dst)
+            self.delete()
+            return digest, dst
+
+    def delete(self) -> None:
+        # 先删 .json：正在等锁的进程拿到锁后据此得知会话已结束
+        self.meta_path.unlink(missing_ok=True)
+        self.part_path.unlink(missing_ok=True)
+        try:
+            self.lock_path.unlink(missing_ok=True)
+        except OSError:
+            # Windows 上别的进程还开着锁文件，由 expire_upload_sessions 稍后清理
+            pass
+        _forget(self.upload_id)
+
+
+def live_session_hashes() -> Set[str]:
+    """未完成续传会话声明的 sha256：finalize 时可能直接复用这些 blob，清理时不能删。"""
+    root = _sessions_dir()
+    if not root.is_dir():
+        return set()
+    out: Set[str] = set()
+    for meta_path in root.glob("*.json"):
+        session = UploadSession.load(meta_path.stem)
+        if session is not None and session.declared_sha256:
+            out.add(session.declared_sha256)
+    return out
+
+
+def expire_upload_sessions(max_age_s: float) -> int:
+    """删除超过 max_age_s 未完成的续传会话。"""
+    root = _sessions_dir()
+    if not root.is_dir():
+        return 0
+    cutoff = time.time() - max_age_s
+    removed = 0
+    for meta_path in root.glob("*.json"):
+        session = UploadSession.load(meta_path.stem)
+        if session is None:
+            continue
+        last_touch = max(float(session.meta.get("created") or 0), session.part_path.stat().st_mtime if session.part_path.exists() else 0)
+        if last_touch < cutoff:
+            session.delete()
+            removed += 1
+    for lock_path in root.glob("*.lock"):
+        # 会话已结束但当时没删掉的锁文件
+        try:
+            if not lock_path.with_suffix(".json").exists() and lock_path.stat().st_mtime < cutoff:
+                lock_path.unlink()
+        except OSError:
+            pass
+    return removed
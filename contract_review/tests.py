@@ -1,3 +1,702 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import fitz
+import numpy as np
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from contract_review import views
+from packages.core_engine import job_state
+from contract_review.models import ContractJob, ContractJobEvent
+from contract_review.services import report_cache, stamp_detect, upload_store
+
+# 测试不连 Redis：job_state 全部回退到数据库路径
+_NO_REDIS = {"JOB_STATE_REDIS_ENABLED": "0"}
+
+
+class _MediaRootMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._env = mock.patch.dict(os.environ, _NO_REDIS)
+        cls._env.start()
+        cls._media = tempfile.mkdtemp(prefix="contract_review_test_")
+        cls._media_override = override_settings(MEDIA_ROOT=cls._media, PDF_EXPORT_PREWARM=False, WORKER_TOKEN="")
+        cls._media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._media_override.disable()
+        shutil.rmtree(cls._media, ignore_errors=True)
+        cls._env.stop()
+        super().tearDownClass()
+
+
+try:
+    import fakeredis
+except ImportError:  # pragma: no cover
+    fakeredis = None
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class _FakeRedisMixin:
+    """job_state 指向进程内的 fakeredis（写脚本照常执行 Lua）。"""
+
+    def setUp(self):
+        super().setUp()
+        env = mock.patch.dict(os.environ, {"JOB_STATE_REDIS_ENABLED": "1"})
+        env.start()
+        self.addCleanup(env.stop)
+        handle = job_state._RedisHandle("redis://fake")
+        handle._client = self.redis = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        handle._script = handle._client.register_script(job_state._WRITE_SCRIPT)
+        patcher = mock.patch.object(job_state, "_handle", return_value=handle)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+def _post_update(client, payload):
+    return client.post("/contract/api/job/update/", json.dumps(payload, ensure_ascii=False), content_type="application/json")
+
+
+# =========================
+# Redis 运行态
+# =========================
+class LiveJobStateTests(_FakeRedisMixin, _MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client(HTTP_HOST="127.0.0.1")
+        self.job = ContractJob.objects.create(status="running", progress=1, stage="submitted", runtime_meta={})
+        job_state.write_job_state(self.job.id, status="running", progress=40, stage="ocr")
+
+    def _status(self):
+        return self.client.get(f"/contract/api/status/{self.job.id}/").json()
+
+    def test_fresh_live_state_is_served_without_db(self):
+        with self.assertNumQueries(0):
+            live = views._live_job_state(self.job.id)
+        self.assertEqual((live["status"], live["progress"], live["stage"]), ("running", 40, "ocr"))
+        with self.assertNumQueries(0):
+            self.assertEqual(self._status()["progress"], 40)
+
+    def test_late_running_write_cannot_undo_terminal_state(self):
+        self.assertTrue(job_state.finish_job_state(self.job.id, status="done", progress=100, stage="done"))
+        # 迟到的 worker 进度：写入被脚本拒绝，不回退到 HTTP
+        self.assertTrue(job_state.write_job_state(self.job.id, status="running", progress=88, stage="llm"))
+        self.assertEqual(job_state.read_job_state(self.job.id)["status"], "done")
+        self.assertIsNone(views._live_job_state(self.job.id))
+        # 终态之间仍可改写（如 done 之后记录 error）
+        job_state.finish_job_state(self.job.id, status="error", progress=100, stage="error")
+        self.assertEqual(job_state.read_job_state(self.job.id)["status"], "error")
+
+    def test_stale_live_state_yields_to_terminal_db_row(self):
+        ContractJob.objects.filter(id=self.job.id).update(status="done", progress=100, stage="done")
+        # 终态切换彻底失败：Redis 里残留运行态。状态还新时照常信 Redis
+        self.assertIsNotNone(views._live_job_state(self.job.id))
+        old = (timezone.now() - timedelta(seconds=120)).isoformat(timespec="seconds")
+        self.redis.hset(job_state.job_state_key(self.job.id), "updated_at", old)
+        self.assertIsNone(views._live_job_state(self.job.id))
+        self.assertEqual(self._status()["status"], "done")
+
+
+# =========================
+# SSE 进度推送
+# =========================
+def _parse_sse(chunks):
+    events = []
+    for chunk in chunks:
+        chunk = chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        fields = {}
+        for line in chunk.strip("\n").split("\n"):
+            key, _, value = line.partition(": ")
+            fields[key] = value
+        if "event" in fields:
+            events.append((int(fields["id"]) if "id" in fields else None, fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class JobEventStreamTests(_MediaRootMixin, TestCase):
+    def setUp(self):
+        self.client = Client(HTTP_HOST="127.0.0.1")
+        self.job = ContractJob.objects.create(status="running", progress=1, stage="submitted", runtime_meta={})
+        for progress, stage in ((10, "ocr"), (50, "stamp"), (80, "llm_start")):
+            _post_update(self.client, {"job_id": self.job.id, "status": "running", "progress": progress, "stage": stage})
+        _post_update(
+            self.client,
+            {"job_id": self.job.id, "status": "done", "progress": 100, "stage": "done", "result_markdown": "x", "result_json": {}},
+        )
+
+    def _stream(self, last_id=None):
+        headers = {"HTTP_LAST_EVENT_ID": str(last_id)} if last_id is not None else {}
+        resp = self.client.get(f"/contract/api/events/{self.job.id}/", **headers)
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        return _parse_sse(resp.streaming_content)
+
+    def test_full_stream_then_result(self):
+        events = self._stream()
+        self.assertEqual([e[2]["stage"] for e in events[:-1]], ["ocr", "stamp", "llm_start", "done"])
+        ids = [e[0] for e in events]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(events[-1][1], "result")
+        self.assertEqual(events[-1][0], ids[-2] + 1)
+
+    def test_resume_with_last_event_id(self):
+        events = self._stream()
+        resumed = self._stream(last_id=events[1][0])
+        self.assertEqual(resumed, events[2:])
+        # 已收到 result 的客户端重连不再收到任何事件
+        self.assertEqual(self._stream(last_id=events[-1][0]), [])
+
+    @override_settings(JOB_EVENTS_POLL_SECONDS=0.1)
+    def test_polling_without_redis_reads_only_new_events(self):
+        job = ContractJob.objects.create(status="running", progress=1, stage="submitted", runtime_meta={})
+        _post_update(self.client, {"job_id": job.id, "status": "running", "progress": 10, "stage": "ocr"})
+        stream = views._job_event_stream(job.id, 0)
+        next(stream)
+        first = _parse_sse([next(stream)])
+        _post_update(self.client, {"job_id": job.id, "status": "running", "progress": 20, "stage": "parse"})
+        with mock.patch.object(views, "_stage_history", wraps=views._stage_history) as history:
+            second = _parse_sse([next(stream)])
+        stream.close()
+        self.assertEqual(second[0][2]["stage"], "parse")
+        # 任务行没变的轮询不读事件表；变了也只读 seq 更大的事件
+        self.assertEqual(history.call_count, 1)
+        self.assertEqual(history.call_args.args, (job.id, None, first[0][0]))
+
+
+class LiveJobEventStreamTests(_FakeRedisMixin, _MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client(HTTP_HOST="127.0.0.1")
+        self.job = ContractJob.objects.create(status="running", progress=1, stage="submitted", runtime_meta={})
+        job_state.write_job_state(self.job.id, status="running", progress=10, stage="ocr")
+        job_state.write_job_state(self.job.id, status="running", progress=80, stage="llm_start")
+
+    def _partial(self, progress, risks):
+        partial = {"risks": risks, "improvements": []}
+        job_state.write_job_state(
+            self.job.id, status="running", progress=progress, stage="llm_streaming", meta={"partial_result": partial}
+        )
+        return partial
+
+    def test_pushes_progress_and_partial_updates(self):
+        stream = views._job_event_stream(self.job.id, 0)
+        self.assertTrue(next(stream).startswith("retry:"))
+        # 第二次 next 订阅频道并按快照补发
+        chunks = [next(stream)]
+        first = self._partial(81, [{"title": "付款"}])
+        # progress 封顶在 88：之后只有 partial_result 在变，seq 不再前进
+        self._partial(88, [{"title": "付款"}, {"title": "违约"}])
+        last = self._partial(88, [{"title": "付款"}, {"title": "违约"}, {"title": "保密"}])
+        self._partial(88, last["risks"])
+        with mock.patch.object(views, "_job_progress_snapshot", wraps=views._job_progress_snapshot) as snapshots:
+            _post_update(
+                self.client,
+                {"job_id": self.job.id, "status": "done", "progress": 100, "stage": "done", "result_markdown": "x", "result_json": {}},
+            )
+            chunks.extend(stream)
+        # 运行期事件直接来自推送，只有终态回到数据库视图取一次快照
+        self.assertEqual(snapshots.call_count, 1)
+
+        events = _parse_sse(chunks)
+        kinds = [(e[1], e[2].get("stage")) for e in events]
+        self.assertEqual(
+            kinds,
+            [
+                ("progress", "ocr"),
+                ("progress", "llm_start"),
+                ("progress", "llm_streaming"),
+                ("partial", None),
+                ("progress", "llm_streaming"),
+                ("partial", None),
+                ("partial", None),
+                ("progress", "done"),
+                ("result", "done"),
+            ],
+        )
+        partials = [e[2]["partial_result"] for e in events if e[1] == "partial"]
+        self.assertEqual(partials[0], first)
+        self.assertEqual(partials[-1], last)
+        self.assertTrue(all(e[0] is None for e in events if e[1] == "partial"))
+        progress_ids = [e[0] for e in events if e[1] == "progress"]
+        self.assertEqual(progress_ids, sorted(set(progress_ids)))
+        self.assertEqual(events[-1][0], progress_ids[-1] + 1)
+
+        # 断线重连：数据库视图里的 id 与推送时一致
+        resumed = _parse_sse(views._job_event_stream(self.job.id, progress_ids[1]))
+        self.assertEqual([(e[0], e[1]) for e in resumed], [(e[0], e[1]) for e in events if e[1] != "partial"][2:])
+
+    def test_resume_while_running_resends_current_partial(self):
+        self._partial(82, [{"title": "付款"}])
+        history = job_state.read_job_state(self.job.id)["runtime_meta"]["stage_history"]
+        stream = views._job_event_stream(self.job.id, history[1]["seq"])
+        next(stream)
+        events = _parse_sse([next(stream), next(stream)])
+        stream.close()
+        self.assertEqual([(e[0], e[1]) for e in events], [(history[2]["seq"], "progress"), (None, "partial")])
+
+
+# =========================
+# 运行期进度回调
+# =========================
+class RunningUpdateTests(_MediaRootMixin, TestCase):
+    def setUp(self):
+        self.client = Client(HTTP_HOST="127.0.0.1")
+        self.job = ContractJob.objects.create(status="running", progress=1, stage="submitted", runtime_meta={})
+
+    def _events(self):
+        return list(ContractJobEvent.objects.filter(job=self.job).order_by("seq").values_list("stage", "progress"))
+
+    def test_progress_is_monotonic(self):
+        jid = self.job.id
+        self.assertTrue(_post_update(self.client, {"job_id": jid, "status": "running", "progress": 30, "stage": "ocr"}).json()["applied"])
+        self.assertFalse(_post_update(self.client, {"job_id": jid, "status": "running", "progress": 20, "stage": "parse"}).json()["applied"])
+        self.assertFalse(_post_update(self.client, {"job_id": jid, "status": "running", "progress": 30, "stage": "ocr"}).json()["applied"])
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.progress, self.job.stage), (30, "ocr"))
+        self.assertEqual(self._events(), [("ocr", 30)])
+
+    def test_late_progress_after_done_is_ignored(self):
+        jid = self.job.id
+        resp = _post_update(
+            self.client,
+            {"job_id": jid, "status": "done", "progress": 100, "stage": "done", "result_markdown": "x", "result_json": {}},
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(_post_update(self.client, {"job_id": jid, "status": "running", "progress": 99, "stage": "llm"}).json()["applied"])
+        late_result = {"job_id": jid, "status": "running", "progress": 99, "result_markdown": "stale"}
+        self.assertFalse(_post_update(self.client, late_result).json()["applied"])
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.progress, self.job.stage), ("done", 100, "done"))
+        self.assertEqual(self.job.result.result_markdown, "x")
+        self.assertEqual(self._events()[-1], ("done", 100))
+
+    def test_stage_without_progress_does_not_move_back(self):
+        jid = self.job.id
+        self.assertTrue(_post_update(self.client, {"job_id": jid, "status": "running", "progress": 80, "stage": "llm_start"}).json()["applied"])
+        # 乱序到达、不带 progress 的旧阶段
+        self.assertFalse(_post_update(self.client, {"job_id": jid, "status": "running", "stage": "ocr_done"}).json()["applied"])
+        self.assertFalse(_post_update(self.client, {"job_id": jid, "status": "running", "stage": "stamp_start"}).json()["applied"])
+        self.assertTrue(_post_update(self.client, {"job_id": jid, "status": "running", "stage": "llm_streaming"}).json()["applied"])
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.progress, self.job.stage), (80, "llm_streaming"))
+        self.assertEqual(self._events(), [("llm_start", 80), ("llm_streaming", None)])
+
+    def test_event_seq_collision_is_retried(self):
+        ContractJobEvent.objects.create(job=self.job, stage="submitted", progress=1, seq=5000)
+        with mock.patch.object(views, "next_event_seq", side_effect=[5000, 5001]):
+            resp = _post_update(self.client, {"job_id": self.job.id, "status": "running", "progress": 30, "stage": "ocr"})
+        self.assertEqual((resp.status_code, resp.json()["applied"]), (200, True))
+        seqs = list(ContractJobEvent.objects.filter(job=self.job).order_by("seq").values_list("seq", "stage"))
+        self.assertEqual(seqs, [(5000, "submitted"), (5001, "ocr")])
+
+    def test_unknown_job(self):
+        resp = _post_update(self.client, {"job_id": 999999, "status": "running", "progress": 5, "stage": "ocr"})
+        self.assertEqual(resp.status_code, 404)
+
+
+# =========================
+# 断点续传上传
+# =========================
+class UploadSessionTests(_MediaRootMixin, TestCase):
+    def setUp(self):
+        self.client = Client(HTTP_HOST="127.0.0.1")
+        self.data = b"%PDF-1.4\n" + os.urandom(50_000)
+        self.sha = hashlib.sha256(self.data).hexdigest()
+        worker = mock.Mock()
+        worker.return_value.json.return_value = {"ok": True}
+        patcher = mock.patch.object(views._WORKER_SESSION, "post", worker)
+        self.worker_post = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _init(self, sha=None):
+        body = {"filename": "a.pdf", "size": len(self.data), "sha256": self.sha if sha is None else sha}
+        resp = self.client.post("/contract/api/uploads/", json.dumps(body), content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        return resp.json()
+
+    def _put(self, upload_id, start, end):
+        return self.client.put(
+            f"/contract/api/uploads/{upload_id}/",
+            self.data[start:end],
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{end - 1}/{len(self.data)}",
+        )
+
+    def _finalize(self, upload_id):
+        return self.client.post(f"/contract/api/uploads/{upload_id}/finalize/")
+
+    def test_writers_in_other_processes_are_serialized(self):
+        upload_id = self._init()["upload_id"]
+        entered = threading.Event()
+        release = threading.Event()
+        second_read = threading.Event()
+
+        def slow_read(n):
+            entered.set()
+            release.wait(5)
+            return self.data[:n]
+
+        def second(n):
+            second_read.set()
+            return self.data[:n]
+
+        # 每次都拿新的线程锁：只剩文件锁在串行化，等同于两个进程
+        with mock.patch.object(upload_store, "_session_lock", side_effect=lambda _: threading.Lock()):
+            first = threading.Thread(target=upload_store.UploadSession.load(upload_id).write_range, args=(0, 4096, slow_read))
+            first.start()
+            self.assertTrue(entered.wait(5))
+            other = threading.Thread(target=upload_store.UploadSession.load(upload_id).write_range, args=(0, 8192, second))
+            other.start()
+            self.assertFalse(second_read.wait(0.3))
+            release.set()
+            first.join(5)
+            other.join(5)
+        self.assertTrue(second_read.is_set())
+        self.assertEqual(upload_store.UploadSession.load(upload_id).offset, 8192)
+        self.assertEqual(self._put(upload_id, 8192, len(self.data)).status_code, 200)
+        resp = self._finalize(upload_id)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertEqual(ContractJob.objects.get(id=resp.json()["job_id"]).file_sha256, self.sha)
+
+    def _blob_writer(self, data):
+        writer = upload_store.BlobWriter()
+        writer.write(data)
+        writer.close()
+        return writer
+
+    def _cleanup(self):
+        call_command("cleanup_jobs", stdout=StringIO())
+
+    def test_cleanup_spares_fresh_blobs_and_drops_stale_parts(self):
+        old = time.time() - 2 * 86400
+        # 已 commit、任务行还没建：宽限期内不删
+        blob = self._blob_writer(self.data).commit()
+        self._cleanup()
+        self.assertTrue(blob.is_file())
+        # 同内容再次上传复用旧 blob 时刷新 mtime
+        os.utime(blob, (old, old))
+        self.assertEqual(self._blob_writer(self.data).commit(), blob)
+        self._cleanup()
+        self.assertTrue(blob.is_file())
+        os.utime(blob, (old, old))
+        self._cleanup()
+        self.assertFalse(blob.is_file())
+
+        stale = self._blob_writer(b"%PDF-stale").tmp_path
+        os.utime(stale, (old, old))
+        fresh = self._blob_writer(b"%PDF-fresh").tmp_path
+        self._cleanup()
+        self.assertEqual((stale.exists(), fresh.exists()), (False, True))
+
+    def test_write_after_finalize_elsewhere_is_not_found(self):
+        upload_id = self._init()["upload_id"]
+        stale = upload_store.UploadSession.load(upload_id)
+        self.assertEqual(self._put(upload_id, 0, len(self.data)).status_code, 200)
+        self.assertEqual(self._finalize(upload_id).status_code, 200)
+        with self.assertRaises(upload_store.UploadSessionError) as ctx:
+            stale.write_range(0, 10, lambda n: self.data[:n])
+        self.assertEqual(ctx.exception.status, 404)
+
+    def test_resume_and_finalize(self):
+        uid = self._init()["upload_id"]
+        self.assertEqual(self._put(uid, 0, 20_000).json()["offset"], 20_000)
+        gap = self._put(uid, 30_000, 40_000)
+        self.assertEqual((gap.status_code, gap.json()["offset"]), (409, 20_000))
+        early = self._finalize(uid)
+        self.assertEqual((early.status_code, early.json()["error_code"]), (409, "E-UPLOAD-INCOMPLETE"))
+        # 与已收到前缀重叠的区间只写新的部分
+        self.assertEqual(self._put(uid, 10_000, 35_000).json()["offset"], 35_000)
+        self.assertEqual(self.client.get(f"/contract/api/uploads/{uid}/").json()["offset"], 35_000)
+        self.assertTrue(self._put(uid, 35_000, len(self.data)).json()["complete"])
+
+        resp = self._finalize(uid)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        job = ContractJob.objects.get(id=resp.json()["job_id"])
+        self.assertEqual(job.file_sha256, self.sha)
+        blob = Path(settings.MEDIA_ROOT) / "blobs" / self.sha[:2] / f"{self.sha}.pdf"
+        self.assertEqual(blob.read_bytes(), self.data)
+        self.assertEqual(self.worker_post.call_count, 1)
+        self.assertEqual(self.client.get(f"/contract/api/uploads/{uid}/").status_code, 404)
+
+    def test_hash_mismatch_is_discarded(self):
+        uid = self._init(sha="0" * 64)["upload_id"]
+        self._put(uid, 0, len(self.data))
+        resp = self._finalize(uid)
+        self.assertEqual((resp.status_code, resp.json()["error_code"]), (422, "E-UPLOAD-HASH-MISMATCH"))
+        self.assertFalse(self.worker_post.called)
+
+    def _store_blob(self):
+        uid = self._init()["upload_id"]
+        self._put(uid, 0, len(self.data))
+        self.assertEqual(self._finalize(uid).status_code, 200)
+
+    def test_known_hash_needs_bytes_by_default(self):
+        self._store_blob()
+        state = self._init()
+        self.assertEqual((state["known"], state["offset"]), (False, 0))
+        resp = self._finalize(state["upload_id"])
+        self.assertEqual((resp.status_code, resp.json()["error_code"]), (409, "E-UPLOAD-INCOMPLETE"))
+
+    def test_known_hash_short_circuit_when_enabled(self):
+        self._store_blob()
+        with override_settings(UPLOAD_DEDUP_BY_HASH=True):
+            state = self._init()
+            self.assertTrue(state["known"])
+            self.assertTrue(state["complete"])
+            resp = self._finalize(state["upload_id"])
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertEqual(ContractJob.objects.filter(file_sha256=self.sha).count(), 2)
+
+
+# =========================
+# 终态报告物化
+# =========================
+class ReportCacheTests(_MediaRootMixin, TestCase):
+    RESULT = {"合同类型": "买卖合同", "风险点": [{"title": "付款", "level": "高", "problem": "p", "suggestion": "s"}]}
+
+    def setUp(self):
+        self.client = Client(HTTP_HOST="127.0.0.1")
+        self.job = ContractJob.objects.create(status="running", progress=1, stage="submitted", runtime_meta={})
+        payload = {"job_id": self.job.id, "status": "done", "progress": 100, "stage": "done", "result_json": self.RESULT, "result_markdown": "# 报告"}
+        self.assertEqual(_post_update(self.client, payload).status_code, 200)
+
+    def _updated_at(self):
+        return ContractJob.objects.values_list("updated_at", flat=True).get(id=self.job.id)
+
+    def _result(self):
+        return self.client.get(f"/contract/api/result/{self.job.id}/").json()
+
+    def test_terminal_rewrite_elsewhere_is_not_served_stale(self):
+        self.assertEqual(self._result()["status"], "done")
+        old = self._updated_at()
+        # 另一个进程把 done 改写成 error：本进程的缓存没人删
+        ContractJob.objects.filter(id=self.job.id).update(status="error", error="late failure", updated_at=timezone.now())
+        self.assertIsNotNone(report_cache.get_cached_report(self.job.id, old))
+        body = self._result()
+        self.assertEqual((body["status"], body["error"]), ("error", "late failure"))
+
+    def test_migrate_result_schema_moves_report_version(self):
+        self._result()
+        old = self._updated_at()
+        call_command("migrate_result_schema", "--all", stdout=StringIO())
+        new = self._updated_at()
+        self.assertGreater(new, old)
+        self.assertIsNone(report_cache.get_cached_report(self.job.id, new))
+        self.assertEqual(self._result()["status"], "done")
+        self.assertIsNotNone(report_cache.get_cached_report(self.job.id, new))
+
+    def test_entries_have_finite_ttl(self):
+        row = views._load_report_row(self.job.id)
+        cache = mock.MagicMock()
+        with mock.patch.object(report_cache, "_cache", return_value=cache), override_settings(REPORT_CACHE_TTL=120):
+            report_cache.materialize_report(row)
+        key = report_cache.report_cache_key(self.job.id, row["updated_at"])
+        cache.set.assert_called_once_with(key, mock.ANY, timeout=120)
+
+
+# =========================
+# PDF 导出
+# =========================
+class ExportPdfTests(_MediaRootMixin, TestCase):
+    RESULT = {"合同类型": "买卖合同", "风险点": [{"title": "付款", "level": "高", "problem": "p", "suggestion": "s"}]}
+
+    def setUp(self):
+        self.client = Client(HTTP_HOST="127.0.0.1")
+        self.job = self._done_job()
+
+    def _done_job(self):
+        job = ContractJob.objects.create(status="running", progress=1, stage="submitted", runtime_meta={})
+        payload = {"job_id": job.id, "status": "done", "progress": 100, "stage": "done", "result_json": self.RESULT, "result_markdown": "# 报告"}
+        self.assertEqual(_post_update(self.client, payload).status_code, 200)
+        return job
+
+    def _get(self, job=None, **headers):
+        resp = self.client.get(f"/contract/api/export_pdf/{(job or self.job).id}/", **headers)
+        body = b"".join(resp.streaming_content) if resp.streaming else resp.content
+        resp.close()
+        return resp, body
+
+    def test_etag_range_and_416(self):
+        resp, pdf = self._get()
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(pdf.startswith(b"%PDF-"))
+        etag = resp["ETag"]
+
+        resp, _ = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((resp.status_code, resp["ETag"]), (304, etag))
+
+        resp, body = self._get(HTTP_RANGE="bytes=0-9")
+        self.assertEqual((resp.status_code, resp["Content-Range"], body), (206, f"bytes 0-9/{len(pdf)}", pdf[:10]))
+        resp, body = self._get(HTTP_RANGE="bytes=-5")
+        self.assertEqual((resp.status_code, body), (206, pdf[-5:]))
+        resp, _ = self._get(HTTP_RANGE=f"bytes={len(pdf)}-")
+        self.assertEqual((resp.status_code, resp["Content-Range"]), (416, f"bytes */{len(pdf)}"))
+        resp, body = self._get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual((resp.status_code, body), (200, pdf))
+
+    def test_not_modified_does_not_render(self):
+        resp, _ = self._get()
+        etag = resp["ETag"]
+        shutil.rmtree(Path(settings.MEDIA_ROOT) / "exports")
+        with mock.patch.object(views, "ensure_export", side_effect=AssertionError("rendered for a 304")):
+            resp, _ = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+    def test_default_engine_is_wkhtmltopdf_with_reportlab_fallback(self):
+        with mock.patch("contract_review.services.report_pdf.render_html_pdf", side_effect=RuntimeError("no wkhtmltopdf")) as wk:
+            resp, pdf = self._get()
+        self.assertTrue(wk.called)
+        self.assertEqual(resp["X-PDF-Engine"], "reportlab-fallback")
+        self.assertTrue(pdf.startswith(b"%PDF-"))
+
+    def test_same_report_shares_one_export(self):
+        resp, pdf = self._get()
+        other, other_pdf = self._get(job=self._done_job())
+        self.assertEqual(other["ETag"], resp["ETag"])
+        self.assertEqual(other_pdf, pdf)
+        self.assertIn(f"contract_review_job_{self.job.id + 1}.pdf", other["Content-Disposition"])
+
+
+# =========================
+# 红章两级检测
+# =========================
+_RED = (0.85, 0.1, 0.1)
+
+
+def _contract_page(doc, stamped, rotation=0):
+    page = doc.new_page(width=595, height=842)
+    page.insert_text(fitz.Point(72, 100), "甲方：某某有限公司  乙方：某某科技有限公司", fontname="china-s", fontsize=12)
+    # 红色标题：偏红但不是印章形状，精查应滤掉
+    page.insert_text(fitz.Point(72, 130), "重要提示：请仔细阅读", fontname="china-s", fontsize=9, color=_RED)
+    if stamped:
+        page.draw_circle(fitz.Point(430, 700), 45, color=_RED, width=5)
+        page.draw_circle(fitz.Point(430, 700), 11, color=_RED, fill=_RED)
+        page.insert_text(fitz.Point(399, 725), "合同专用章", fontname="china-s", fontsize=10, color=_RED)
+    page.set_rotation(rotation)
+    return page
+
+
+def _page_bgr(page, dpi=stamp_detect.FINE_DPI):
+    pix = page.get_pixmap(dpi=dpi, alpha=False)
+    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    return cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+
+
+def _full_page_regions(page):
+    # 两级检测之前的做法：整页 200 dpi 渲染后一次性检测
+    return sorted(stamp_detect._find_red_regions(_page_bgr(page)))
+
+
+class StampRoiDetectTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="stamp_detect_test_")
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def _save(self, doc, name):
+        path = os.path.join(self.tmp, name)
+        doc.save(path)
+        doc.close()
+        return path
+
+    def test_candidate_rois_pad_one_tile(self):
+        coarse = np.full((100, 80, 3), 255, dtype=np.uint8)
+        coarse[40:50, 20:30] = (200, 30, 30)
+        self.assertEqual(stamp_detect._candidate_rois(coarse), [(8, 32, 40, 64)])
+        # 贴边的候选块截到图像边缘
+        coarse[95:100, 75:80] = (200, 30, 30)
+        self.assertIn((64, 80, 80, 100), stamp_detect._candidate_rois(coarse))
+        self.assertEqual(stamp_detect._candidate_rois(np.full((100, 80, 3), 255, dtype=np.uint8)), [])
+
+    def test_rendered_regions_match_full_page_pass(self):
+        doc = fitz.open()
+        for rotation in (0, 90, 180, 270):
+            with self.subTest(rotation=rotation):
+                page = _contract_page(doc, stamped=True, rotation=rotation)
+                expected = _full_page_regions(page)
+                self.assertTrue(expected)
+                got = stamp_detect._page_regions_rendered(page, stamp_detect.COARSE_DPI, stamp_detect.FINE_DPI)
+                self.assertEqual(sorted(got), expected)
+        doc.close()
+
+    def test_image_regions_match_full_page_pass(self):
+        doc = fitz.open()
+        for rotation in (0, 90):
+            with self.subTest(rotation=rotation):
+                page = _contract_page(doc, stamped=True, rotation=rotation)
+                got = stamp_detect._page_regions_from_image(
+                    _page_bgr(page), stamp_detect.FINE_DPI, stamp_detect.COARSE_DPI, stamp_detect.FINE_DPI
+                )
+                self.assertEqual(sorted(got), _full_page_regions(page))
+        doc.close()
+
+    def test_unstamped_page_has_no_regions(self):
+        doc = fitz.open()
+        page = _contract_page(doc, stamped=False)
+        self.assertEqual(_full_page_regions(page), [])
+        self.assertEqual(stamp_detect._page_regions_rendered(page, stamp_detect.COARSE_DPI, stamp_detect.FINE_DPI), [])
+        self.assertEqual(
+            stamp_detect._page_regions_from_image(
+                _page_bgr(page), stamp_detect.FINE_DPI, stamp_detect.COARSE_DPI, stamp_detect.FINE_DPI
+            ),
+            [],
+        )
+        doc.close()
+
+    def test_scan_order_is_tail_first(self):
+        self.assertEqual(stamp_detect._scan_order([0, 1, 2, 5, 6, 7, 8, 9], 10, 4), [9, 8, 7, 6, 0, 1, 2, 5])
+        self.assertEqual(stamp_detect._scan_order([0, 1, 2], 3, 0), [0, 1, 2])
+        self.assertEqual(stamp_detect._scan_order([0, 1, 2], 3, 4), [2, 1, 0])
+
+    def test_detect_from_pdf(self):
+        doc = fitz.open()
+        for i in range(6):
+            _contract_page(doc, stamped=i in (0, 5))
+        stamped = self._save(doc, "stamped.pdf")
+        doc = fitz.open()
+        for _ in range(3):
+            _contract_page(doc, stamped=False)
+        plain = self._save(doc, "plain.pdf")
+        doc = fitz.open()
+        _contract_page(doc, stamped=False)
+        _contract_page(doc, stamped=True, rotation=90)
+        rotated = self._save(doc, "rotated.pdf")
+
+        result = stamp_detect.detect_stamp_status_from_pdf(stamped)
+        self.assertEqual(result["stamp_status"], "YES")
+        # 末尾优先：先命中最后一页
+        self.assertEqual({e["page"] for e in result["evidence"]}, {6})
+        with fitz.open(stamped) as ref:
+            expected = _full_page_regions(ref[5])
+        self.assertEqual(sorted(tuple(e["bbox"]) for e in result["evidence"]), sorted(r[:4] for r in expected))
+
+        self.assertEqual(stamp_detect.detect_stamp_status_from_pdf(plain), {"stamp_status": "NO", "evidence": []})
+
+        result = stamp_detect.detect_stamp_status_from_pdf(rotated)
+        self.assertEqual(result["stamp_status"], "YES")
+        self.assertEqual({e["page"] for e in result["evidence"]}, {2})
+
+    def test_detect_reuses_page_images(self):
+        doc = fitz.open()
+        _contract_page(doc, stamped=False)
+        image = _page_bgr(_contract_page(doc, stamped=True))
+        path = self._save(doc, "reuse.pdf")
+        rendered = stamp_detect.detect_stamp_status_from_pdf(path)
+        with mock.patch.object(stamp_detect, "_page_regions_rendered", wraps=stamp_detect._page_regions_rendered) as spy:
+            reused = stamp_detect.detect_stamp_status_from_pdf(path, page_images={1: image})
+        self.assertFalse(spy.called)
+        self.assertEqual(reused, rendered)
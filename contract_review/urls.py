@@ -4,8 +4,13 @@ from . import views
 urlpatterns = [
     path("api/health/", views.api_health, name="contract_api_health"),
     path("api/start/", views.start_analyze, name="contract_api_start"),
+    path("api/uploads/", views.upload_init, name="contract_api_upload_init"),
+    path("api/uploads/<str:upload_id>/", views.upload_session, name="contract_api_upload_session"),
+    path("api/uploads/<str:upload_id>/finalize/", views.upload_finalize, name="contract_api_upload_finalize"),
+    path("api/status/bulk/", views.job_status_bulk, name="contract_api_status_bulk"),
     path("api/status/<int:job_id>/", views.job_status, name="contract_api_status"),
     path("api/result/<int:job_id>/", views.job_result, name="contract_api_result"),
+    path("api/events/<int:job_id>/", views.job_events, name="contract_api_events"),
     path("api/job/update/", views.job_update, name="contract_api_job_update"),
     path("api/export_pdf/<int:job_id>/", views.export_pdf, name="contract_api_export_pdf"),
 
@@ -1,45 +1,50 @@
-import hashlib
-import io
 import json
 import os
 import re
-import shutil
 import time
-from html import escape
+from datetime import datetime, timezone as dt_timezone
 from pathlib import Path
 from typing import Optional
 
-import pdfkit
 import requests
 from django.conf import settings
-from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt, csrf_protect, ensure_csrf_cookie
 from django.views.decorators.http import require_http_methods
-from jinja2 import Template
+from packages.core_engine.job_state import (
+    TERMINAL_STATUSES,
+    finish_job_state,
+    get_redis,
+    job_channel,
+    next_event_seq,
+    read_job_state,
+    read_job_states,
+    write_job_state,
+)
 from packages.core_engine.result_contract import STAMP_TEXT_KEY, stamp_status_to_cn
 from packages.shared_contract_schema import (
-    build_report_html as build_shared_report_html,
     build_report_markdown as build_shared_report_markdown,
-    build_report_payload as build_shared_report_payload,
+    canonicalize_result,
+    load_report_payload,
     normalize_result_json,
+    report_digest,
 )
 
-try:
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-    from reportlab.lib.units import mm
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
-    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
-
-    REPORTLAB_AVAILABLE = True
-except Exception:
-    REPORTLAB_AVAILABLE = False
-
-from .models import ContractJob
+from .models import ContractJob, ContractJobEvent, ContractJobResult
+from .services.report_cache import etag_matches, get_cached_report, invalidate_report, materialize_report
+from .services.report_export import ensure_export, export_key, export_response, not_modified_response, prewarm_export
+from .services.report_pdf import pdf_engine, render_pdf
 from .services.stamp_detect import detect_stamp_status
+from .services.upload_store import (
+    ContentAddressedUploadHandler,
+    UploadSession,
+    UploadSessionError,
+    link_job_input,
+)
 
 _WORKER_SESSION = requests.Session()
 
@@ -65,61 +70,185 @@ def _require_worker_token(request) -> bool:
     return bool(req_token) and req_token == token
 
 
-def _merge_runtime_meta(current: Optional[dict], incoming: Optional[dict], *, stage: str = "", progress: Optional[int] = None) -> dict:
+def _merge_runtime_meta(current: Optional[dict], incoming: Optional[dict]) -> dict:
+    """runtime_meta 只保留小摘要（worker 上报的 meta + updated_at）；阶段历史写 ContractJobEvent。"""
     meta = dict(current) if isinstance(current, dict) else {}
 
     if isinstance(incoming, dict):
         for k, v in incoming.items():
-            meta[k] = v
+            if k != "stage_history":
+                meta[k] = v
 
-    if stage:
-        history = meta.get("stage_history")
-        if not isinstance(history, list):
-            history = []
+    meta.pop("stage_history", None)
+    meta["updated_at"] = timezone.now().isoformat(timespec="seconds")
+    return meta
 
-        event = {
-            "stage": stage,
-            "ts": timezone.now().isoformat(timespec="seconds"),
-        }
-        if progress is not None:
-            event["progress"] = progress
 
-        should_append = True
-        if history:
-            last = history[-1]
-            if isinstance(last, dict) and last.get("stage") == stage and last.get("progress") == progress:
-                should_append = False
+_EVENT_SEQ_ATTEMPTS = 3
 
-        if should_append:
-            history.append(event)
-            if len(history) > 120:
-                history = history[-120:]
-        meta["stage_history"] = history
 
-    meta["updated_at"] = timezone.now().isoformat(timespec="seconds")
+def _append_stage_event(job_id: int, stage: str, progress: Optional[int]) -> Optional[int]:
+    """
+    追加一条阶段事件并返回它的序号（SSE 事件 id）；stage 为空时不记录。
+    序号在任务行锁内分配，并发回调不会在 Max(seq) 与插入之间插队；
+    仍与 (job, seq) 唯一约束冲突（如 Redis 分配的序号已折叠落库）时取下一个序号重试。
+    """
+    if not stage:
+        return None
+    with transaction.atomic():
+        ContractJob.objects.select_for_update().filter(id=job_id).values_list("id", flat=True).first()
+        for attempt in range(_EVENT_SEQ_ATTEMPTS):
+            last = ContractJobEvent.objects.filter(job_id=job_id).aggregate(m=Max("seq"))["m"]
+            seq = next_event_seq(last)
+            try:
+                with transaction.atomic():
+                    ContractJobEvent.objects.create(job_id=job_id, stage=stage[:64], progress=progress, seq=seq)
+                return seq
+            except IntegrityError:
+                if attempt == _EVENT_SEQ_ATTEMPTS - 1:
+                    raise
+
+
+def _event_item(row: dict) -> dict:
+    item = {"seq": row["seq"], "stage": row["stage"], "ts": row["ts"].isoformat(timespec="seconds")}
+    if row.get("progress") is not None:
+        item["progress"] = row["progress"]
+    return item
+
+
+def _stage_history(job_id: int, tail: Optional[int] = None, after: int = 0) -> list:
+    """阶段历史（按 seq 顺序）；tail 只取最近几条，after 只取 seq 更大的事件。"""
+    qs = ContractJobEvent.objects.filter(job_id=job_id)
+    if after:
+        qs = qs.filter(seq__gt=after)
+    if tail:
+        rows = list(qs.order_by("-seq", "-id").values("seq", "stage", "progress", "ts")[:tail])[::-1]
+    else:
+        rows = list(qs.order_by("seq", "id").values("seq", "stage", "progress", "ts"))
+    return [_event_item(r) for r in rows]
+
+
+def _with_stage_history(meta: Optional[dict], job_id: int, tail: Optional[int] = None, after: int = 0) -> dict:
+    out = dict(meta) if isinstance(meta, dict) else {}
+    out["stage_history"] = _stage_history(job_id, tail, after)
+    return out
+
+
+def _fold_live_state(current: Optional[dict], live: Optional[dict]) -> dict:
+    """终态落库前，把 Redis 里的运行期 meta 并入 runtime_meta（阶段历史见 _fold_live_history）。"""
+    meta = dict(current) if isinstance(current, dict) else {}
+    live_meta = live.get("runtime_meta") if isinstance(live, dict) else None
+    if not isinstance(live_meta, dict):
+        return meta
+
+    for k, v in live_meta.items():
+        if k not in {"stage_history", "updated_at"}:
+            meta[k] = v
     return meta
 
 
+def _fold_live_history(job_id: int, live: Optional[dict]) -> Optional[tuple]:
+    """
+    终态落库前，把 Redis 里的阶段历史补进事件表（沿用 Redis 分配的 seq），返回最后一条事件的 (stage, progress)。
+    queued / submitted 两边都记了一份且 seq 相同，按 seq 去重；同一阶段多次回到同一进度的事件各有 seq，照常保留。
+    没有 seq 的旧格式历史按顺序与已落库事件对齐：每条已落库事件只抵消一条相同 (stage, progress) 的 Redis 事件。
+    """
+    existing = list(ContractJobEvent.objects.filter(job_id=job_id).order_by("seq", "id").values_list("seq", "stage", "progress"))
+    known = {seq for seq, _, _ in existing}
+    pending = [(stage, progress) for _, stage, progress in existing]
+    cursor = 0
+    max_seq = max((seq for seq in known if seq is not None), default=0)
+
+    live_meta = live.get("runtime_meta") if isinstance(live, dict) else None
+    history = live_meta.get("stage_history") if isinstance(live_meta, dict) else None
+    events = []
+    for e in history if isinstance(history, list) else []:
+        if not isinstance(e, dict) or not e.get("stage"):
+            continue
+        key = (str(e["stage"])[:64], e.get("progress"))
+        seq = e.get("seq")
+        if isinstance(seq, int) and seq > 0:
+            if seq in known:
+                continue
+        else:
+            try:
+                matched = pending.index(key, cursor)
+            except ValueError:
+                matched = -1
+            if matched >= 0:
+                cursor = matched + 1
+                continue
+            seq = next_event_seq(max_seq)
+        known.add(seq)
+        max_seq = max(max_seq, seq)
+        ts = parse_datetime(str(e.get("ts") or "")) or timezone.now()
+        events.append(ContractJobEvent(job_id=job_id, stage=key[0], progress=key[1], ts=ts, seq=seq))
+    if events:
+        ContractJobEvent.objects.bulk_create(events)
+    last = ContractJobEvent.objects.filter(job_id=job_id).order_by("-seq", "-id").values_list("stage", "progress").first()
+    return tuple(last) if last else None
+
+
+def _live_state_stale(live: dict) -> bool:
+    check_after = float(getattr(settings, "JOB_STATE_DB_CHECK_AFTER", 30) or 0)
+    updated = parse_datetime(str(live.get("updated_at") or ""))
+    if updated is None:
+        return True
+    return (timezone.now() - updated).total_seconds() > check_after
+
+
+def _live_job_state(job_id: int) -> Optional[dict]:
+    """
+    运行中的任务优先读 Redis；终态 / 无记录时返回 None，由数据库作答。
+    Redis 终态以 finish_job_state 为准（写不进就删 key），写脚本也拒绝把终态改回运行态，所以平时不查库。
+    只有状态超过 JOB_STATE_DB_CHECK_AFTER 秒没更新时才核对一次数据库：终态切换与删除都失败后残留的运行态。
+    """
+    live = read_job_state(job_id)
+    if not live or live.get("status") in TERMINAL_STATUSES:
+        return None
+    if _live_state_stale(live) and ContractJob.objects.filter(id=job_id, status__in=TERMINAL_STATUSES).exists():
+        return None
+    return live
+
+
+def _publish_terminal_state(job: ContractJob) -> bool:
+    # 结果已落库后再把 Redis 状态切到终态（失败则重试 / 删除 key，见 finish_job_state）
+    ttl = int(getattr(settings, "JOB_STATE_TERMINAL_TTL", 600) or 600)
+    return finish_job_state(job.id, status=job.status, progress=job.progress, stage=job.stage, ttl=ttl)
+
+
 @require_http_methods(["GET"])
 @ensure_csrf_cookie
 def api_health(request):
     return JsonResponse({"ok": True, "service": "django"})
 
 
+def _upload_error(code: str, message: str) -> JsonResponse:
+    return JsonResponse({"ok": False, "error": message, "error_code": code}, status=400)
+
+
+@csrf_exempt
 @require_http_methods(["POST"])
 def start_analyze(request):
     """
-    Upload PDF -> save to MEDIA_ROOT/job_{id}_{sha}/input.pdf
-    -> create ContractJob
+    Upload PDF (streamed) -> MEDIA_ROOT/blobs/<sha[:2]>/<sha>.pdf
+    -> create ContractJob, hard-link MEDIA_ROOT/job_{id}_{sha}/input.pdf
     -> submit worker task: POST {WORKER_BASE_URL}/analyze
     """
+    # 上传处理器必须在读取 request.POST / FILES 之前替换，因此 CSRF 放到内层视图校验
+    request.upload_handlers = [ContentAddressedUploadHandler(request)]
+    return _start_analyze(request)
+
+
+@csrf_protect
+def _start_analyze(request):
     upload = request.FILES.get("file")
     if not upload:
-        return HttpResponseBadRequest("missing file (form-data key should be 'file')")
+        return _upload_error("E-FILE-MISSING", "missing file (form-data key should be 'file')")
 
     filename = getattr(upload, "name", "uploaded.pdf")
     if not filename.lower().endswith(".pdf"):
-        return HttpResponseBadRequest("only PDF is supported")
+        return _upload_error("E-FILE-TYPE-PDF-ONLY", "only PDF is supported")
 
     content_type_raw = (upload.content_type or "").lower().strip()
     content_type = content_type_raw.split(";", 1)[0].strip()
@@ -131,52 +260,37 @@ def start_analyze(request):
         "binary/octet-stream",
     }
     if content_type not in allowed_types:
-        return HttpResponseBadRequest("invalid file type (expected PDF)")
+        return _upload_error("E-FILE-TYPE-PDF-ONLY", "invalid file type (expected PDF)")
 
-    # Some desktop pickers send octet-stream for valid PDFs; verify PDF magic header when readable.
-    try:
-        pos = upload.tell() if hasattr(upload, "tell") else None
-        head = upload.read(5) or b""
-        if hasattr(upload, "seek"):
-            upload.seek(pos if pos is not None else 0)
-        if head and not bytes(head).startswith(b"%PDF-"):
-            return HttpResponseBadRequest("invalid file content (expected PDF)")
-    except Exception:
-        # Keep compatibility for non-seekable upload streams.
-        pass
+    # Some desktop pickers send octet-stream for valid PDFs; verify PDF magic header
+    # (captured by the upload handler while the first chunk streamed in).
+    if upload.size and not upload.writer.looks_like_pdf():
+        return _upload_error("E-FILE-CONTENT-NOT-PDF", "invalid file content (expected PDF)")
 
+    blob = upload.commit()
+    return _submit_analysis(_create_job(filename, upload.sha256), blob)
+
+
+def _create_job(filename: str, file_sha256: str) -> ContractJob:
     job = ContractJob.objects.create(
         status="queued",
         progress=0,
         stage="queued",
-        file_sha256="",
+        file_sha256=file_sha256,
         filename=filename,
-        result_markdown="",
-        runtime_meta={"stage_history": [{"stage": "queued", "progress": 0, "ts": timezone.now().isoformat(timespec="seconds")}]},
+        runtime_meta={},
         error="",
     )
+    seq = _append_stage_event(job.id, "queued", 0)
+    write_job_state(job.id, status="queued", progress=0, stage="queued", filename=filename, seq=seq)
+    return job
 
-    media_root = Path(getattr(settings, "MEDIA_ROOT", Path.cwd() / "media"))
-    media_root.mkdir(parents=True, exist_ok=True)
-
-    tmp_root = media_root / f"job_{job.id}"
-    tmp_root.mkdir(parents=True, exist_ok=True)
-    pdf_path = tmp_root / "input.pdf"
 
-    h = hashlib.sha256()
-    with open(pdf_path, "wb") as f:
-        for chunk in upload.chunks():
-            h.update(chunk)
-            f.write(chunk)
-    file_sha256 = h.hexdigest()
-
-    final_root = media_root / f"job_{job.id}_{file_sha256}"
-    if final_root.exists():
-        shutil.rmtree(final_root)
-    tmp_root.rename(final_root)
-
-    job.file_sha256 = file_sha256
-    job.save(update_fields=["file_sha256"])
+def _submit_analysis(job: ContractJob, blob: Path) -> JsonResponse:
+    """任务目录硬链接输入 PDF 后提交 worker；失败时任务直接置为 error。"""
+    media_root = Path(getattr(settings, "MEDIA_ROOT", Path.cwd() / "media"))
+    final_root = media_root / f"job_{job.id}_{job.file_sha256}"
+    link_job_input(blob, final_root)
 
     worker_url = _get_worker_base_url() + "/analyze"
     payload = {
@@ -215,130 +329,631 @@ def start_analyze(request):
         runtime_meta = _merge_runtime_meta(
             job.runtime_meta,
             {"submit_attempts": submit_attempts, "submit_seconds": submit_seconds},
-            stage="submitted",
-            progress=1,
         )
+        submitted_seq = _append_stage_event(job.id, "submitted", 1)
 
         job.status = "running"
         job.stage = "submitted"
         job.progress = 1
         job.runtime_meta = runtime_meta
-        job.save(update_fields=["status", "stage", "progress", "runtime_meta"])
+        job.save(update_fields=["status", "stage", "progress", "runtime_meta", "updated_at"])
+        write_job_state(
+            job.id,
+            status="running",
+            progress=1,
+            stage="submitted",
+            meta={"submit_attempts": submit_attempts, "submit_seconds": submit_seconds},
+            seq=submitted_seq,
+        )
 
     except Exception as e:
-        runtime_meta = _merge_runtime_meta(
-            job.runtime_meta,
-            {"submit_failed": True},
-            stage="submit_failed",
-            progress=100,
-        )
+        runtime_meta = _merge_runtime_meta(job.runtime_meta, {"submit_failed": True})
+        _append_stage_event(job.id, "submit_failed", 100)
         job.status = "error"
         job.error = f"submit to worker failed: {e}"
         job.runtime_meta = runtime_meta
-        job.save(update_fields=["status", "error", "runtime_meta"])
+        job.save(update_fields=["status", "error", "runtime_meta", "updated_at"])
+        _publish_terminal_state(job)
         return JsonResponse({"ok": False, "error": job.error}, status=500)
 
     return JsonResponse({"ok": True, "job_id": job.id})
 
 
 
-@require_http_methods(["GET"])
-def job_status(request, job_id: int):
+# =========================
+# resumable uploads
+# =========================
+_CONTENT_RANGE_RE = re.compile(r"^bytes\s+(\d+)-(\d+)/(\d+|\*)$")
+
+
+def _upload_session_error(e: UploadSessionError) -> JsonResponse:
+    return JsonResponse({"ok": False, "error": e.message, "error_code": e.code, **e.extra}, status=e.status)
+
+
+@require_http_methods(["POST"])
+def upload_init(request):
+    """
+    断点续传第一步：JSON {filename, size, sha256?} -> {upload_id, offset, chunk_size, known}。
+    known=true 表示声明的 sha256 已在库中，客户端可直接 finalize。
+    """
+    try:
+        data = json.loads(request.body or b"{}")
+    except Exception:
+        return _upload_error("E-UPLOAD-INIT-INVALID", "invalid json")
+    if not isinstance(data, dict):
+        return _upload_error("E-UPLOAD-INIT-INVALID", "invalid json")
+
+    filename = str(data.get("filename") or "").strip() or "uploaded.pdf"
+    if not filename.lower().endswith(".pdf"):
+        return _upload_error("E-FILE-TYPE-PDF-ONLY", "only PDF is supported")
+    try:
+        size = int(data.get("size"))
+    except Exception:
+        size = 0
+    max_bytes = int(getattr(settings, "UPLOAD_MAX_BYTES", 1024 * 1024 * 1024))
+    if size <= 0 or size > max_bytes:
+        return _upload_error("E-UPLOAD-SIZE-INVALID", f"size must be between 1 and {max_bytes} bytes")
+    sha256 = str(data.get("sha256") or "").strip().lower()
+    if sha256 and not re.fullmatch(r"[0-9a-f]{64}", sha256):
+        return _upload_error("E-UPLOAD-INIT-INVALID", "sha256 must be 64 hex chars")
+
+    session = UploadSession.create(filename, size, sha256)
+    body = session.state()
+    body.update(ok=True, chunk_size=int(getattr(settings, "UPLOAD_CHUNK_BYTES", 8 * 1024 * 1024)))
+    return JsonResponse(body, status=201)
+
+
+@require_http_methods(["GET", "PUT", "DELETE"])
+def upload_session(request, upload_id: str):
+    """
+    GET 查询续传偏移；PUT 写入一个字节区间（Content-Range: bytes start-end/total，请求体为原始字节）；
+    DELETE 放弃上传。
+    """
+    session = UploadSession.load(upload_id)
+    if session is None:
+        return JsonResponse({"ok": False, "error": "upload not found", "error_code": "E-UPLOAD-NOT-FOUND"}, status=404)
+
+    if request.method == "DELETE":
+        session.delete()
+        return JsonResponse({"ok": True, "upload_id": upload_id})
+
+    if request.method == "PUT":
+        m = _CONTENT_RANGE_RE.match((request.headers.get("Content-Range") or "").strip())
+        if not m:
+            return _upload_error("E-UPLOAD-RANGE-INVALID", "missing or invalid Content-Range (bytes start-end/total)")
+        start, end = int(m.group(1)), int(m.group(2))
+        length = end - start + 1
+        try:
+            content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except Exception:
+            content_length = 0
+        if length <= 0 or content_length != length:
+            return _upload_error("E-UPLOAD-RANGE-INVALID", "Content-Length does not match Content-Range")
+        if m.group(3) != "*" and int(m.group(3)) != session.size:
+            return _upload_error("E-UPLOAD-RANGE-INVALID", "total does not match declared size")
+        try:
+            session.write_range(start, length, request.read)
+        except UploadSessionError as e:
+            return _upload_session_error(e)
+
+    body = session.state()
+    body["ok"] = True
+    return JsonResponse(body)
+
+
+@require_http_methods(["POST"])
+def upload_finalize(request, upload_id: str):
+    """断点续传最后一步：校验 sha256 / PDF 头后入库，创建任务并提交 worker（同 start_analyze）。"""
+    session = UploadSession.load(upload_id)
+    if session is None:
+        return JsonResponse({"ok": False, "error": "upload not found", "error_code": "E-UPLOAD-NOT-FOUND"}, status=404)
+    try:
+        file_sha256, blob = session.finalize()
+    except UploadSessionError as e:
+        return _upload_session_error(e)
+    return _submit_analysis(_create_job(session.filename, file_sha256), blob)
+
+
+
+_STATUS_META_DICT_KEYS = ("llm_call", "stage_timings")
+_STATUS_META_MAX_STR = 200
+_STATUS_HISTORY_TAIL = 5
+_STATUS_ERROR_MAX_CHARS = 500
+
+
+def _trim_runtime_meta(meta: Optional[dict]) -> dict:
+    """状态轮询只回传小字段：标量、少数小字典和最近几条阶段历史。"""
+    if not isinstance(meta, dict):
+        return {}
+    out = {}
+    for k, v in meta.items():
+        if v is None or isinstance(v, (bool, int, float)):
+            out[k] = v
+        elif isinstance(v, str) and len(v) <= _STATUS_META_MAX_STR:
+            out[k] = v
+        elif k in _STATUS_META_DICT_KEYS and isinstance(v, dict):
+            out[k] = {ik: iv for ik, iv in v.items() if iv is None or isinstance(iv, (bool, int, float, str))}
+    history = meta.get("stage_history")
+    if isinstance(history, list):
+        out["stage_history"] = history[-_STATUS_HISTORY_TAIL:]
+    return out
+
+
+def _status_runtime_meta(row: dict, live: bool) -> dict:
+    meta = _trim_runtime_meta(row.get("runtime_meta"))
+    if not live:
+        # 数据库里只有摘要，最近几条阶段事件从事件表取
+        meta["stage_history"] = _stage_history(row["id"], tail=_STATUS_HISTORY_TAIL)
+    return meta
+
+
+def _load_report_row(job_id: int) -> Optional[dict]:
     row = ContractJob.objects.filter(id=job_id).values(
         "id",
+        "updated_at",
         "status",
         "progress",
         "stage",
-        "result_json",
         "filename",
-        "result_markdown",
         "error",
         "runtime_meta",
     ).first()
     if not row:
-        return JsonResponse({"ok": False, "error": "job not found"}, status=404)
-
-    status = row.get("status") or "queued"
-    include_result = status in {"done", "error"}
-    result_json = normalize_result_json(row.get("result_json")) if include_result else None
-    result_markdown = row.get("result_markdown") if status == "done" else ""
+        return None
+    res = ContractJobResult.objects.filter(job_id=job_id).values("result_json", "result_markdown", "digest", "canonical").first()
+    row.update(res or {"result_json": None, "result_markdown": "", "digest": "", "canonical": None})
+    row["runtime_meta"] = _with_stage_history(row.get("runtime_meta"), job_id)
+    return row
 
-    report_payload = None
-    report_html = ""
-    if status == "done":
-        report_payload = build_shared_report_payload(result_json, result_markdown or "")
-        report_html = build_shared_report_html(report_payload)
 
-    return JsonResponse(
-        {
-            "ok": True,
-            "job_id": row["id"],
-            "status": status,
-            "progress": row.get("progress") or 0,
-            "stage": row.get("stage") or "",
-            "result_json": result_json,
-            "filename": row.get("filename") or "",
-            "result_markdown": result_markdown or "",
-            "report_payload": report_payload,
-            "report_html": report_html,
-            "runtime_meta": row.get("runtime_meta") if isinstance(row.get("runtime_meta"), dict) else {},
-            "error": row.get("error") if status == "error" else "",
-        }
-    )
+def _report_response(request, entry: dict) -> HttpResponse:
+    etag = entry["etag"]
+    if etag_matches(request, etag):
+        resp = HttpResponse(status=304)
+    else:
+        resp = HttpResponse(entry["body"], content_type="application/json")
+    resp["ETag"] = etag
+    resp["Cache-Control"] = "no-cache"
+    return resp
+
+
+def _terminal_report(job_id: int) -> Optional[dict]:
+    """终态报告：按任务行的 updated_at 读物化缓存，未命中时从数据库构建一次并回填。"""
+    head = ContractJob.objects.filter(id=job_id).values_list("status", "updated_at").first()
+    if not head or head[0] not in TERMINAL_STATUSES:
+        return None
+    entry = get_cached_report(job_id, head[1])
+    if entry is not None:
+        return entry
+    row = _load_report_row(job_id)
+    if not row:
+        return None
+    return materialize_report(row)
 
 
-@require_http_methods(["GET"])
-def job_result(request, job_id: int):
+def _pending_row(job_id: int) -> Optional[dict]:
     row = ContractJob.objects.filter(id=job_id).values(
         "id",
         "status",
         "progress",
         "stage",
-        "result_json",
-        "result_markdown",
         "filename",
-        "error",
         "runtime_meta",
     ).first()
-    if not row:
-        return JsonResponse({"ok": False, "error": "job not found"}, status=404)
+    if row:
+        row["runtime_meta"] = _with_stage_history(row.get("runtime_meta"), job_id)
+    return row
 
-    status = row.get("status") or "queued"
-    is_ready = status in {"done", "error"}
-
-    if is_ready:
-        result_json = normalize_result_json(row.get("result_json"))
-        result_markdown = row.get("result_markdown") or ""
-        report_payload = build_shared_report_payload(result_json, result_markdown)
-        report_html = build_shared_report_html(report_payload)
-        report_markdown = build_shared_report_markdown(report_payload)
+
+@require_http_methods(["GET"])
+def job_status(request, job_id: int):
+    """
+    轻量状态：只含 id / status / progress / stage / 精简 runtime_meta，不读取结果大字段；
+    完整结果请走 /api/result/<job_id>/。
+    """
+    live = _live_job_state(job_id)
+    if live is not None:
+        row = dict(live, id=job_id, error="")
     else:
-        result_json = None
-        result_markdown = ""
-        report_payload = None
-        report_html = ""
-        report_markdown = ""
+        row = ContractJob.objects.filter(id=job_id).values(
+            "id",
+            "status",
+            "progress",
+            "stage",
+            "filename",
+            "error",
+            "runtime_meta",
+        ).first()
+        if not row:
+            return JsonResponse({"ok": False, "error": "job not found"}, status=404)
 
+    status = row.get("status") or "queued"
     return JsonResponse(
         {
             "ok": True,
             "job_id": row["id"],
-            "ready": is_ready,
             "status": status,
             "progress": row.get("progress") or 0,
             "stage": row.get("stage") or "",
             "filename": row.get("filename") or "",
-            "runtime_meta": row.get("runtime_meta") if isinstance(row.get("runtime_meta"), dict) else {},
-            "error": row.get("error") if status == "error" else "",
-            "result_json": result_json,
-            "result_markdown": result_markdown,
-            "report_payload": report_payload,
-            "report_html": report_html,
-            "report_markdown": report_markdown,
+            "runtime_meta": _status_runtime_meta(row, live is not None),
+            "error": (row.get("error") or "")[:_STATUS_ERROR_MAX_CHARS] if status == "error" else "",
+        }
+    )
+
+
+# =========================
+# bulk status
+# =========================
+_BULK_STATUS_MAX = 200
+_BULK_ACTIVE_STATUSES = ("queued", "running")
+_BULK_ROW_FIELDS = ("id", "status", "progress", "stage", "filename", "error", "updated_at")
+_BULK_ERROR_MAX_CHARS = 200
+
+
+def _parse_bulk_ids(request) -> list:
+    ids = []
+    seen = set()
+    for chunk in request.GET.getlist("ids"):
+        for part in chunk.split(","):
+            try:
+                job_id = int(part.strip())
+            except Exception:
+                continue
+            if job_id not in seen:
+                seen.add(job_id)
+                ids.append(job_id)
+    return ids
+
+
+def _encode_cursor(updated_at, job_id: int) -> str:
+    return f"{int(updated_at.timestamp() * 1_000_000)}-{job_id}"
+
+
+def _decode_cursor(raw: str):
+    """游标 = "<updated_at 微秒时间戳>-<id>"；空串表示从头开始。"""
+    raw = (raw or "").strip()
+    if not raw:
+        return datetime.fromtimestamp(0, tz=dt_timezone.utc), 0
+    ts_part, _, id_part = raw.partition("-")
+    micros = int(ts_part)
+    return datetime.fromtimestamp(micros / 1_000_000, tz=dt_timezone.utc), int(id_part or 0)
+
+
+def _bulk_status_rows(rows: list) -> list:
+    """紧凑状态行；进行中的任务用 Redis 实时进度覆盖（一次 pipeline）。"""
+    pending_ids = [r["id"] for r in rows if r.get("status") not in TERMINAL_STATUSES]
+    live_states = read_job_states(pending_ids, with_history=False) if pending_ids else {}
+    out = []
+    for r in rows:
+        status = r.get("status") or "queued"
+        item = {
+            "job_id": r["id"],
+            "status": status,
+            "progress": r.get("progress") or 0,
+            "stage": r.get("stage") or "",
+            "filename": r.get("filename") or "",
+            "error": (r.get("error") or "")[:_BULK_ERROR_MAX_CHARS] if status == "error" else "",
+            "updated_at": r["updated_at"].isoformat(timespec="seconds") if r.get("updated_at") else "",
+        }
+        live = live_states.get(r["id"])
+        if live is not None and live.get("status") not in TERMINAL_STATUSES:
+            item.update(
+                status=live["status"],
+                progress=live["progress"],
+                stage=live["stage"] or item["stage"],
+                updated_at=live.get("updated_at") or item["updated_at"],
+            )
+        out.append(item)
+    return out
+
+
+@require_http_methods(["GET"])
+def job_status_bulk(request):
+    """
+    批量状态（单次查询）：
+    - ?ids=1,2,3（或重复 ids=）按 id 查询，最多 200 个；
+    - ?since=<cursor>&limit=N 返回游标之后有变更的任务以及所有进行中的任务，响应带下一页游标。
+    """
+    since = request.GET.get("since")
+    if since is not None:
+        try:
+            cursor_ts, cursor_id = _decode_cursor(since)
+            limit = int(request.GET.get("limit") or 100)
+        except Exception:
+            return JsonResponse({"ok": False, "error": "invalid cursor or limit"}, status=400)
+        limit = max(1, min(limit, _BULK_STATUS_MAX))
+        changed = Q(updated_at__gt=cursor_ts) | Q(updated_at=cursor_ts, id__gt=cursor_id)
+        rows = list(
+            ContractJob.objects.filter(changed | Q(status__in=_BULK_ACTIVE_STATUSES))
+            .order_by("updated_at", "id")
+            .values(*_BULK_ROW_FIELDS)[:limit]
+        )
+        next_cursor = _encode_cursor(rows[-1]["updated_at"], rows[-1]["id"]) if rows else since
+        return JsonResponse(
+            {
+                "ok": True,
+                "jobs": _bulk_status_rows(rows),
+                "cursor": next_cursor,
+                "has_more": len(rows) >= limit,
+            }
+        )
+
+    ids = _parse_bulk_ids(request)
+    if not ids:
+        return JsonResponse({"ok": False, "error": "missing ids (e.g. ?ids=1,2,3) or since"}, status=400)
+    if len(ids) > _BULK_STATUS_MAX:
+        return JsonResponse({"ok": False, "error": f"too many ids (max {_BULK_STATUS_MAX})"}, status=400)
+
+    by_id = {r["id"]: r for r in ContractJob.objects.filter(id__in=ids).values(*_BULK_ROW_FIELDS)}
+    return JsonResponse(
+        {
+            "ok": True,
+            "jobs": _bulk_status_rows([by_id[i] for i in ids if i in by_id]),
+            "missing": [i for i in ids if i not in by_id],
         }
     )
 
 
+def _pending_result_payload(job_id: int) -> Optional[dict]:
+    live = _live_job_state(job_id)
+    if live is not None:
+        row = dict(live, id=job_id)
+    else:
+        row = _pending_row(job_id)
+        if not row:
+            return None
+    status = row.get("status") or "queued"
+    return {
+        "ok": True,
+        "job_id": row["id"],
+        "ready": False,
+        "status": status,
+        "progress": row.get("progress") or 0,
+        "stage": row.get("stage") or "",
+        "filename": row.get("filename") or "",
+        "runtime_meta": row.get("runtime_meta") if isinstance(row.get("runtime_meta"), dict) else {},
+        "error": "",
+        "result_json": None,
+        "result_markdown": "",
+        "report_payload": None,
+        "report_html": "",
+        "report_markdown": "",
+    }
+
+
+def _job_result_payload(job_id: int) -> Optional[dict]:
+    entry = _terminal_report(job_id)
+    if entry is not None:
+        return json.loads(entry["body"])
+    return _pending_result_payload(job_id)
+
+
+@require_http_methods(["GET"])
+def job_result(request, job_id: int):
+    if _live_job_state(job_id) is None:
+        entry = _terminal_report(job_id)
+        if entry is not None:
+            return _report_response(request, entry)
+    payload = _pending_result_payload(job_id)
+    if payload is None:
+        return JsonResponse({"ok": False, "error": "job not found"}, status=404)
+    return JsonResponse(payload)
+
+
+# =========================
+# SSE progress stream
+# =========================
+def _job_progress_snapshot(job_id: int, after_seq: int = 0) -> Optional[dict]:
+    """轻量快照（不读 result_json / result_markdown）：运行中读 Redis，否则读数据库（只取 seq 大于 after_seq 的事件）。"""
+    live = _live_job_state(job_id)
+    if live is not None:
+        return live
+    row = ContractJob.objects.filter(id=job_id).values("status", "progress", "stage", "runtime_meta").first()
+    if not row:
+        return None
+    return {
+        "status": row.get("status") or "queued",
+        "progress": row.get("progress") or 0,
+        "stage": row.get("stage") or "",
+        "runtime_meta": _with_stage_history(row.get("runtime_meta"), job_id, after=after_seq),
+    }
+
+
+def _sse_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+def _parse_last_event_id(request) -> int:
+    raw = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id") or ""
+    try:
+        return max(0, int(str(raw).strip()))
+    except Exception:
+        return 0
+
+
+def _open_job_subscription(job_id: int):
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(job_channel(job_id))
+        return pubsub
+    except Exception:
+        return None
+
+
+def _decode_job_message(message) -> Optional[dict]:
+    if not isinstance(message, dict) or message.get("type") != "message":
+        return None
+    try:
+        data = json.loads(message.get("data") or "")
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class _JobEventEmitter:
+    """
+    SSE 事件组装：progress 事件按 seq 去重（id = seq），partial 事件在 partial_result 变化时发送（不带 id），
+    终态后发送一次 result 事件。快照与 Redis 推送走同一套规则，重复到达的内容不会重复发送。
+    """
+
+    def __init__(self, job_id: int, last_id: int) -> None:
+        self.job_id = job_id
+        self.last_id = last_id
+        self.sent = last_id
+        self._partial_sig: Optional[str] = None
+
+    def progress(self, item: dict, status: str) -> Optional[str]:
+        seq = item.get("seq")
+        if not isinstance(seq, int) or seq <= self.sent:
+            return None
+        self.sent = seq
+        data = {k: v for k, v in item.items() if k != "partial_result"}
+        data.update(job_id=self.job_id, status=status)
+        return _sse_event("progress", data, seq)
+
+    def partial(self, partial, status: str) -> Optional[str]:
+        if not isinstance(partial, dict):
+            return None
+        sig = json.dumps(partial, ensure_ascii=False, sort_keys=True)
+        if sig == self._partial_sig:
+            return None
+        self._partial_sig = sig
+        return _sse_event("partial", {"job_id": self.job_id, "status": status, "partial_result": partial})
+
+    def snapshot(self, snap: dict) -> list:
+        out = []
+        history = snap["runtime_meta"].get("stage_history")
+        for item in history if isinstance(history, list) else []:
+            if isinstance(item, dict):
+                chunk = self.progress(item, snap["status"])
+                if chunk:
+                    out.append(chunk)
+        if snap["status"] not in TERMINAL_STATUSES:
+            chunk = self.partial(snap["runtime_meta"].get("partial_result"), snap["status"])
+            if chunk:
+                out.append(chunk)
+        return out
+
+    def message(self, data: dict) -> list:
+        status = str(data.get("status") or "running")
+        out = []
+        if data.get("stage"):
+            chunk = self.progress(data, status)
+            if chunk:
+                out.append(chunk)
+        chunk = self.partial(data.get("partial_result"), status)
+        if chunk:
+            out.append(chunk)
+        return out
+
+    def result(self) -> Optional[str]:
+        last_seq = ContractJobEvent.objects.filter(job_id=self.job_id).aggregate(m=Max("seq"))["m"] or 0
+        final_id = last_seq + 1
+        if self.last_id >= final_id:
+            return None
+        payload = _job_result_payload(self.job_id) or {"ok": False, "error": "job not found"}
+        return _sse_event("result", payload, final_id)
+
+
+def _job_event_stream(job_id: int, last_id: int):
+    """
+    事件 id = 阶段事件的 seq（任务内单调，Redis 视图与数据库视图一致），断线重连带 Last-Event-ID 只补发更大的 seq；
+    终态后发送一次 result 事件（id 为最后一条事件的 seq + 1）并结束。
+    连接时按快照补发一次，之后阻塞等待 Redis 推送、直接用推送内容组装事件；心跳间隔内没有推送时才重取快照兜底。
+    终态推送的 seq 由 Redis 另行分配，因此终态一律回到数据库视图（增量读取事件表）收尾。
+    没有 Redis 时按 JOB_EVENTS_POLL_SECONDS 轮询任务行的 (status, progress, stage, updated_at)，变化了才增量读事件。
+    """
+    poll_s = max(0.1, float(getattr(settings, "JOB_EVENTS_POLL_SECONDS", 1.0)))
+    heartbeat_s = max(1.0, float(getattr(settings, "JOB_EVENTS_HEARTBEAT_SECONDS", 15.0)))
+    max_s = max(1.0, float(getattr(settings, "JOB_EVENTS_MAX_SECONDS", 600.0)))
+
+    yield f"retry: {int(poll_s * 1000)}\n\n"
+    # 先订阅再取快照：两者之间的推送不会丢（重复的由 seq / partial 签名去重）
+    pubsub = _open_job_subscription(job_id)
+    emitter = _JobEventEmitter(job_id, last_id)
+    started = time.monotonic()
+    last_write = started
+    row_key = None
+    try:
+        snap = _job_progress_snapshot(job_id, emitter.sent)
+        while True:
+            if snap is None:
+                yield _sse_event("error", {"ok": False, "error": "job not found"})
+                return
+            for chunk in emitter.snapshot(snap):
+                yield chunk
+                last_write = time.monotonic()
+            if snap["status"] in TERMINAL_STATUSES:
+                chunk = emitter.result()
+                if chunk:
+                    yield chunk
+                return
+            snap = None
+
+            while snap is None:
+                now = time.monotonic()
+                if now - started >= max_s:
+                    # 让客户端带 Last-Event-ID 重连，避免单个连接长期占用 worker 线程
+                    return
+                if now - last_write >= heartbeat_s:
+                    yield ": ping\n\n"
+                    last_write = now
+                    if pubsub is not None:
+                        # 推送可能丢失（Redis 重连等）：每个心跳周期按快照兜底一次
+                        snap = _job_progress_snapshot(job_id, emitter.sent)
+                        break
+
+                if pubsub is None:
+                    time.sleep(poll_s)
+                    row = ContractJob.objects.filter(id=job_id).values_list("status", "progress", "stage", "updated_at").first()
+                    if row != row_key:
+                        row_key = row
+                        snap = _job_progress_snapshot(job_id, emitter.sent)
+                    continue
+
+                wait = min(heartbeat_s - (now - last_write), max_s - (now - started))
+                try:
+                    message = pubsub.get_message(timeout=max(0.05, wait))
+                except Exception:
+                    pubsub = None
+                    snap = _job_progress_snapshot(job_id, emitter.sent)
+                    break
+                data = _decode_job_message(message)
+                if data is None:
+                    continue
+                if data.get("status") in TERMINAL_STATUSES:
+                    snap = _job_progress_snapshot(job_id, emitter.sent)
+                    break
+                for chunk in emitter.message(data):
+                    yield chunk
+                    last_write = time.monotonic()
+    finally:
+        if pubsub is not None:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+
+
+@require_http_methods(["GET"])
+def job_events(request, job_id: int):
+    if not ContractJob.objects.filter(id=job_id).exists():
+        return JsonResponse({"ok": False, "error": "job not found"}, status=404)
+    resp = StreamingHttpResponse(_job_event_stream(job_id, _parse_last_event_id(request)), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"
+    return resp
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def job_update(request):
@@ -366,401 +981,265 @@ def job_update(request):
     except Exception:
         return JsonResponse({"ok": False, "error": f"invalid job_id: {job_id}"}, status=400)
 
-    try:
-        job = ContractJob.objects.get(id=job_id_int)
-    except ContractJob.DoesNotExist:
-        return JsonResponse({"ok": False, "error": "job not found"}, status=404)
+    status_val = payload.get("status")
+    carries_result = payload.get("result_markdown") is not None or payload.get("result_json") is not None
+    if status_val not in TERMINAL_STATUSES and not carries_result:
+        return _apply_running_update(job_id_int, payload)
 
+    # 终态 / 带结果：Redis 运行期状态在加锁前读好，行锁内只做合并与写入
+    live_state = read_job_state(job_id_int) if status_val in TERMINAL_STATUSES else None
+    job = None
     try:
-        update_fields = []
-
-        status_val = payload.get("status")
-        if status_val and status_val != job.status:
-            job.status = status_val
-            update_fields.append("status")
-
-        if payload.get("stage") is not None:
-            stage_val = payload.get("stage") or job.stage
-            if stage_val != job.stage:
-                job.stage = stage_val
-                update_fields.append("stage")
-
-        if payload.get("progress") is not None:
+        with transaction.atomic():
             try:
-                p = int(payload.get("progress"))
-                if p != job.progress:
-                    job.progress = p
-                    update_fields.append("progress")
-            except Exception:
-                pass
-
-        cur = job.result_json if isinstance(job.result_json, dict) else {}
-        result_json_changed = False
-        runtime_meta = job.runtime_meta if isinstance(job.runtime_meta, dict) else {}
-
-        if payload.get("result_markdown") is not None:
-            md = payload.get("result_markdown", "") or ""
-            max_chars = int(getattr(settings, "MAX_RESULT_MARKDOWN_CHARS", 200000) or 0)
-            if max_chars > 0 and len(md) > max_chars:
-                md = md[:max_chars]
-                cur["result_markdown_truncated"] = True
-                result_json_changed = True
-            if md != job.result_markdown:
-                job.result_markdown = md
-                update_fields.append("result_markdown")
-
-        if payload.get("error") is not None:
-            err_val = payload.get("error", "") or ""
-            if err_val != job.error:
-                job.error = err_val
-                update_fields.append("error")
-
-        incoming = payload.get("result_json", None)
-        if incoming is not None:
-            if isinstance(incoming, dict):
-                cur.update(incoming)
-            else:
-                cur["result_json_raw"] = incoming
-            result_json_changed = True
-        if isinstance(cur, dict) and "是否盖章" in cur and STAMP_TEXT_KEY not in cur:
-            cur[STAMP_TEXT_KEY] = cur.get("是否盖章")
-            result_json_changed = True
-
-        has_stamp = isinstance(cur, dict) and ("stamp_status" in cur or STAMP_TEXT_KEY in cur or "是否盖章" in cur)
-        should_attempt_stamp = payload.get("result_markdown") is not None or status_val in {"done", "error"}
-        if (not has_stamp) and should_attempt_stamp:
-            text_for_stamp = payload.get("result_markdown") if payload.get("result_markdown") is not None else (job.result_markdown or "")
+                job = ContractJob.objects.select_for_update().get(id=job_id_int)
+            except ContractJob.DoesNotExist:
+                return JsonResponse({"ok": False, "error": "job not found"}, status=404)
+            if job.status in TERMINAL_STATUSES and status_val not in TERMINAL_STATUSES:
+                # 迟到的运行期结果不覆盖终态
+                return JsonResponse({"ok": True, "applied": False})
+            result_row = _apply_result_update(job, payload, live_state)
+        if job.status in TERMINAL_STATUSES:
+            # 终态报告只渲染一次，之后 result / SSE 直接回放
             try:
-                stamp = detect_stamp_status(text_for_stamp)
-                cur[STAMP_TEXT_KEY] = stamp_status_to_cn(stamp.get("stamp_status"))
-                cur["stamp_status"] = stamp.get("stamp_status")
-                cur["stamp_evidence"] = stamp.get("evidence")
-            except Exception as e:
-                cur["stamp_status"] = "ERROR"
-                cur["stamp_error"] = str(e)
-            result_json_changed = True
-
-        if result_json_changed:
-            job.result_json = normalize_result_json(cur)
-            update_fields.append("result_json")
-
-        incoming_meta = payload.get("meta")
-        merged_meta = _merge_runtime_meta(
-            runtime_meta,
-            incoming_meta if isinstance(incoming_meta, dict) else None,
-            stage=job.stage or (payload.get("stage") or ""),
-            progress=job.progress,
-        )
-        if merged_meta != runtime_meta:
-            job.runtime_meta = merged_meta
-            update_fields.append("runtime_meta")
-
-        if update_fields:
-            job.save(update_fields=sorted(set(update_fields)))
+                row = {f: getattr(job, f) for f in ("id", "updated_at", "status", "progress", "stage", "filename", "error")}
+                row["runtime_meta"] = _with_stage_history(job.runtime_meta, job.id)
+                row["result_json"] = result_row.result_json
+                row["digest"] = result_row.digest
+                row["canonical"] = result_row.canonical
+                row["result_markdown"] = result_row.result_markdown
+                materialize_report(row)
+            except Exception:
+                invalidate_report(job.id, job.updated_at)
+            _publish_terminal_state(job)
+            if job.status == "done":
+                try:
+                    _prewarm_pdf_export(job.id, result_row)
+                except Exception:
+                    pass
 
         return JsonResponse({"ok": True})
 
     except Exception as e:
         try:
+            if job is None:
+                job = ContractJob.objects.get(id=job_id_int)
             job.status = "error"
             job.progress = 100
             job.error = f"job_update failed: {e}"
-            job.save(update_fields=["status", "progress", "error"])
+            # updated_at 变化后旧的物化报告不再命中
+            job.save(update_fields=["status", "progress", "error", "updated_at"])
+            _publish_terminal_state(job)
         except Exception:
             pass
         return JsonResponse({"ok": False, "error": str(e)}, status=200)
 
 
-PDF_HTML_TEMPLATE = Template(
-    """
-<!doctype html>
-<html lang="zh-CN">
-<head>
-  <meta charset="utf-8" />
-  <style>
-    body { font-family: "Microsoft YaHei","PingFang SC","Hiragino Sans GB",Arial,sans-serif; }
-    h1 { font-size: 22px; margin: 0 0 12px; }
-    h2 { font-size: 16px; margin: 18px 0 8px; }
-    pre { white-space: pre-wrap; }
-  </style>
-</head>
-<body>
-  {{ body|safe }}
-</body>
-</html>
-"""
+# 运行期阶段按流水线粗分先后（前缀匹配）；不在表里的阶段不做先后约束
+_STAGE_PHASES = (
+    ("queued", "submitted"),
+    ("start",),
+    ("stamp_",),
+    ("ocr_", "mineru_", "fallback_to_accurate", "accurate_fallback"),
+    ("llm_",),
 )
 
 
-def _resolve_wkhtmltopdf_path() -> str:
-    candidates: list[str] = []
-    configured = (getattr(settings, "WKHTMLTOPDF_BIN", "") or os.environ.get("WKHTMLTOPDF_BIN", "")).strip().strip('"').strip("'")
-    if configured:
-        candidates.append(configured)
-
-    which_path = shutil.which("wkhtmltopdf") or shutil.which("wkhtmltopdf.exe")
-    if which_path:
-        candidates.append(which_path)
-
-    base_dir = Path(getattr(settings, "BASE_DIR", Path.cwd()))
-    candidates.extend(
-        [
-            str(base_dir / "wkhtmltopdf" / "bin" / "wkhtmltopdf.exe"),
-            str(base_dir / "wkhtmltopdf.exe"),
-            str(base_dir / "tools" / "wkhtmltopdf" / "bin" / "wkhtmltopdf.exe"),
-            str(base_dir / ".venv" / "wkhtmltopdf" / "bin" / "wkhtmltopdf.exe"),
-            r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe",
-            r"C:\Program Files (x86)\wkhtmltopdf\bin\wkhtmltopdf.exe",
-        ]
-    )
+def _stage_phase(stage: str) -> Optional[int]:
+    for phase, prefixes in enumerate(_STAGE_PHASES):
+        if stage.startswith(prefixes):
+            return phase
+    return None
 
-    seen: set[str] = set()
-    for raw in candidates:
-        path = os.path.expandvars(str(raw)).strip().strip('"').strip("'")
-        if not path:
-            continue
-        normalized = str(Path(path))
-        if normalized in seen:
-            continue
-        seen.add(normalized)
-        if os.path.exists(normalized):
-            return normalized
-    return ""
-
-
-def _register_reportlab_font() -> str:
-    if not REPORTLAB_AVAILABLE:
-        return "Helvetica"
-
-    font_candidates = [
-        ("MicrosoftYaHei", r"C:\Windows\Fonts\msyh.ttc"),
-        ("SimSun", r"C:\Windows\Fonts\simsun.ttc"),
-        ("SimHei", r"C:\Windows\Fonts\simhei.ttf"),
-        ("ArialUnicodeMS", r"C:\Windows\Fonts\arialuni.ttf"),
-    ]
-
-    registered = set(pdfmetrics.getRegisteredFontNames())
-    for name, font_path in font_candidates:
-        if name in registered:
-            return name
-        if not os.path.exists(font_path):
-            continue
+
+def _later_stage_q(stage: str) -> Optional[Q]:
+    """当前 stage 落在比 stage 更靠后的流水线阶段时命中的条件；stage 不在阶段表里返回 None。"""
+    phase = _stage_phase(stage)
+    if phase is None:
+        return None
+    q = Q()
+    for prefixes in _STAGE_PHASES[phase + 1 :]:
+        for prefix in prefixes:
+            q |= Q(stage__startswith=prefix)
+    return q or None
+
+
+def _apply_running_update(job_id: int, payload: dict) -> JsonResponse:
+    """
+    运行期进度回调：一条条件 UPDATE（WHERE id=? AND progress<=? AND 非终态），不读任务行、不碰结果表。
+    不带 progress 时改为要求 stage 不回退（当前 stage 不在更靠后的流水线阶段）。
+    乱序到达的旧进度、终态之后的迟到回调都不会生效；(stage, progress) 确实推进了才追加阶段事件。
+    """
+    fields = {}
+    if payload.get("status"):
+        fields["status"] = str(payload.get("status"))
+    stage_val = str(payload.get("stage") or "")[:64]
+    if stage_val:
+        fields["stage"] = stage_val
+    progress = None
+    if payload.get("progress") is not None:
         try:
-            pdfmetrics.registerFont(TTFont(name, font_path))
-            return name
+            progress = int(payload.get("progress"))
+            fields["progress"] = progress
         except Exception:
-            continue
-    return "Helvetica"
+            progress = None
+    incoming_meta = payload.get("meta") if isinstance(payload.get("meta"), dict) else None
 
+    qs = ContractJob.objects.filter(id=job_id).exclude(status__in=TERMINAL_STATUSES)
+    if progress is not None:
+        qs = qs.filter(progress__lte=progress)
+    elif stage_val:
+        later = _later_stage_q(stage_val)
+        if later is not None:
+            qs = qs.exclude(later)
 
-def _risk_level_color(level: str) -> str:
-    text = (level or "").lower()
-    if any(k in text for k in ("高", "high", "严重", "critical")):
-        return "#b42318"
-    if any(k in text for k in ("中", "medium", "moderate")):
-        return "#b54708"
-    if any(k in text for k in ("低", "low")):
-        return "#067647"
-    return "#475467"
+    try:
+        with transaction.atomic():
+            advanced = 0
+            if fields:
+                # 与当前值完全相同的重复回调不算推进；update() 不走 auto_now，updated_at 显式写
+                advanced = qs.exclude(**fields).update(updated_at=timezone.now(), **fields)
+                if advanced and stage_val:
+                    _append_stage_event(job_id, stage_val, progress)
+            merged = 0
+            if incoming_meta:
+                # Redis 不可用时 meta 才会走到这里；行锁内合并，且同样受单调条件约束
+                current = qs.select_for_update().values("runtime_meta").first()
+                if current is not None:
+                    merged = qs.update(
+                        runtime_meta=_merge_runtime_meta(current["runtime_meta"], incoming_meta),
+                        updated_at=timezone.now(),
+                    )
+    except Exception as e:
+        # 单次进度丢了无妨，不把任务标成 error
+        return JsonResponse({"ok": False, "error": str(e)}, status=503)
 
+    if not advanced and not merged and not ContractJob.objects.filter(id=job_id).exists():
+        return JsonResponse({"ok": False, "error": "job not found"}, status=404)
+    return JsonResponse({"ok": True, "applied": bool(advanced or merged)})
 
-def _build_panel_table(title: str, body_flowables: list, width: float, styles: dict) -> Table:
-    inner = [Paragraph(escape(title), styles["panel_title"]), Spacer(1, 4)]
-    if body_flowables:
-        inner.extend(body_flowables)
-    else:
-        inner.append(Paragraph("未识别到相关内容", styles["muted"]))
-    panel = Table([[inner]], colWidths=[width])
-    panel.setStyle(
-        TableStyle(
-            [
-                ("BOX", (0, 0), (-1, -1), 1, colors.HexColor("#d6e3e0")),
-                ("BACKGROUND", (0, 0), (-1, -1), colors.white),
-                ("LEFTPADDING", (0, 0), (-1, -1), 10),
-                ("RIGHTPADDING", (0, 0), (-1, -1), 10),
-                ("TOPPADDING", (0, 0), (-1, -1), 8),
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
-            ]
-        )
-    )
-    return panel
-
-
-def _build_pdf_with_reportlab(report_payload: dict, title: str) -> bytes:
-    if not REPORTLAB_AVAILABLE:
-        raise RuntimeError("reportlab is not available")
-
-    buf = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buf,
-        pagesize=A4,
-        leftMargin=12 * mm,
-        rightMargin=12 * mm,
-        topMargin=12 * mm,
-        bottomMargin=12 * mm,
-        title=title,
-        author="Contract Review",
-    )
-    font_name = _register_reportlab_font()
-    base = getSampleStyleSheet()["BodyText"]
-    styles = {
-        "title": ParagraphStyle(
-            "title",
-            parent=base,
-            fontName=font_name,
-            fontSize=22 if font_name != "Helvetica" else 18,
-            leading=28,
-            textColor=colors.HexColor("#4b6fae"),
-            spaceAfter=6,
-        ),
-        "meta": ParagraphStyle(
-            "meta",
-            parent=base,
-            fontName=font_name,
-            fontSize=10.5 if font_name != "Helvetica" else 9.5,
-            leading=15,
-            textColor=colors.HexColor("#475467"),
-            spaceAfter=3,
-        ),
-        "panel_title": ParagraphStyle(
-            "panel_title",
-            parent=base,
-            fontName=font_name,
-            fontSize=13 if font_name != "Helvetica" else 11.5,
-            leading=17,
-            textColor=colors.HexColor("#2f4b6e"),
-            spaceAfter=2,
-        ),
-        "body": ParagraphStyle(
-            "body",
-            parent=base,
-            fontName=font_name,
-            fontSize=10.5 if font_name != "Helvetica" else 9.5,
-            leading=16,
-            textColor=colors.HexColor("#101828"),
-        ),
-        "body_muted": ParagraphStyle(
-            "body_muted",
-            parent=base,
-            fontName=font_name,
-            fontSize=10,
-            leading=15,
-            textColor=colors.HexColor("#667085"),
-        ),
-        "key": ParagraphStyle(
-            "key",
-            parent=base,
-            fontName=font_name,
-            fontSize=10.2 if font_name != "Helvetica" else 9.2,
-            leading=15,
-            textColor=colors.HexColor("#475467"),
-        ),
-        "item": ParagraphStyle(
-            "item",
-            parent=base,
-            fontName=font_name,
-            fontSize=10.5 if font_name != "Helvetica" else 9.5,
-            leading=16,
-            textColor=colors.HexColor("#101828"),
-            spaceAfter=3,
-        ),
-        "muted": ParagraphStyle(
-            "muted",
-            parent=base,
-            fontName=font_name,
-            fontSize=10,
-            leading=15,
-            textColor=colors.HexColor("#667085"),
-        ),
-    }
 
-    story = []
-    story.append(Paragraph("合同审查报告", styles["title"]))
-    stamp_color = report_payload.get("stamp_color", "#6b7280")
-    meta_line_1 = (
-        f"<b>合同类型：</b>{escape(str(report_payload.get('contract_type', '未识别')))}"
-        f"  |  <b>盖章：</b><font color='{stamp_color}'><b>{escape(str(report_payload.get('stamp_text', '未提及')))}</b></font>"
-    )
-    meta_line_2 = (
-        f"<b>类型置信度：</b>{escape(str(report_payload.get('confidence_text', '-')))}"
-        f"  |  <b>类型来源：</b>{escape(str(report_payload.get('type_source', 'result_json')))}"
-    )
-    story.append(Paragraph(meta_line_1, styles["meta"]))
-    story.append(Paragraph(meta_line_2, styles["meta"]))
-    story.append(Spacer(1, 4))
-
-    key_rows = []
-    for k, v in (report_payload.get("key_facts") or {}).items():
-        key_rows.append(
-            [
-                Paragraph(f"<b>{escape(str(k))}</b>", styles["key"]),
-                Paragraph(escape(str(v)), styles["body"]),
-            ]
-        )
-    if not key_rows:
-        key_rows = [[Paragraph("<b>提示</b>", styles["key"]), Paragraph("未提取到关键要素", styles["body_muted"])]]
-    key_table = Table(key_rows, colWidths=[30 * mm, doc.width - (30 * mm)])
-    key_table.setStyle(
-        TableStyle(
-            [
-                ("LINEBELOW", (0, 0), (-1, -1), 0.6, colors.HexColor("#edf2f7")),
-                ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                ("LEFTPADDING", (0, 0), (-1, -1), 3),
-                ("RIGHTPADDING", (0, 0), (-1, -1), 3),
-                ("TOPPADDING", (0, 0), (-1, -1), 4),
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-            ]
-        )
-    )
-    story.append(_build_panel_table("合同关键要素", [key_table], doc.width, styles))
-    story.append(Spacer(1, 6))
-
-    overview = escape(str(report_payload.get("overview", "暂无概述")))
-    story.append(_build_panel_table("审查概述", [Paragraph(overview, styles["body"])], doc.width, styles))
-    story.append(Spacer(1, 6))
-
-    def _append_items_section(title: str, items: list) -> None:
-        section_header = Table([[Paragraph(escape(title), styles["panel_title"])]], colWidths=[doc.width])
-        section_header.setStyle(
-            TableStyle(
-                [
-                    ("BOX", (0, 0), (-1, -1), 1, colors.HexColor("#d6e3e0")),
-                    ("BACKGROUND", (0, 0), (-1, -1), colors.HexColor("#f8fafc")),
-                    ("LEFTPADDING", (0, 0), (-1, -1), 10),
-                    ("RIGHTPADDING", (0, 0), (-1, -1), 10),
-                    ("TOPPADDING", (0, 0), (-1, -1), 6),
-                    ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-                ]
-            )
-        )
-        story.append(section_header)
-        story.append(Spacer(1, 4))
-        if not items:
-            story.append(Paragraph("未识别到相关内容", styles["muted"]))
-            story.append(Spacer(1, 6))
-            return
-
-        for idx, item in enumerate(items, 1):
-            name = escape(str(item.get("title", "事项")))
-            level = str(item.get("level", "") or "")
-            level_html = ""
-            if level:
-                level_html = f" <font color='{_risk_level_color(level)}'>（{escape(level)}）</font>"
-            story.append(Paragraph(f"<b>{idx}. {name}</b>{level_html}", styles["item"]))
-            problem = str(item.get("problem", "") or "")
-            if problem:
-                story.append(Paragraph(f"<b>问题：</b>{escape(problem)}", styles["body"]))
-            suggestion = str(item.get("suggestion", "") or "")
-            if suggestion:
-                story.append(Paragraph(f"{escape(suggestion)}", styles["body"]))
-            story.append(Spacer(1, 3))
-        story.append(Spacer(1, 6))
-
-    _append_items_section("风险点", report_payload.get("risks", []))
-    _append_items_section("改进建议", report_payload.get("improvements", []))
-
-    doc.build(story)
-    return buf.getvalue()
+def _apply_result_update(job: ContractJob, payload: dict, live_state: Optional[dict]) -> ContractJobResult:
+    """终态 / 带结果的回调：在 job_update 的行锁事务里合并结果与 runtime_meta 并写回。"""
+    update_fields = []
+    last_event = (job.stage, job.progress)
+
+    status_val = payload.get("status")
+    if status_val and status_val != job.status:
+        job.status = status_val
+        update_fields.append("status")
+
+    if payload.get("stage") is not None:
+        stage_val = payload.get("stage") or job.stage
+        if stage_val != job.stage:
+            job.stage = stage_val
+            update_fields.append("stage")
+
+    if payload.get("progress") is not None:
+        try:
+            p = int(payload.get("progress"))
+            # 进度只增不减；终态回调以载荷为准
+            if p != job.progress and (p > job.progress or job.status in TERMINAL_STATUSES):
+                job.progress = p
+                update_fields.append("progress")
+        except Exception:
+            pass
+
+    result_row, _ = ContractJobResult.objects.get_or_create(job=job)
+    result_fields = []
+    cur = result_row.result_json if isinstance(result_row.result_json, dict) else {}
+    result_json_changed = False
+    runtime_meta = job.runtime_meta if isinstance(job.runtime_meta, dict) else {}
+    if job.status in TERMINAL_STATUSES:
+        # 运行期进度只写在 Redis，终态时一次性落库
+        runtime_meta = _fold_live_state(runtime_meta, live_state)
+
+    if payload.get("result_markdown") is not None:
+        md = payload.get("result_markdown", "") or ""
+        max_chars = int(getattr(settings, "MAX_RESULT_MARKDOWN_CHARS", 200000) or 0)
+        if max_chars > 0 and len(md) > max_chars:
+            md = md[:max_chars]
+            cur["result_markdown_truncated"] = True
+            result_json_changed = True
+        if md != result_row.result_markdown:
+            result_row.result_markdown = md
+            result_fields.append("result_markdown")
+
+    if payload.get("error") is not None:
+        err_val = payload.get("error", "") or ""
+        if err_val != job.error:
+            job.error = err_val
+            update_fields.append("error")
+
+    incoming = payload.get("result_json", None)
+    if incoming is not None:
+        if isinstance(incoming, dict):
+            cur.update(incoming)
+        else:
+            cur["result_json_raw"] = incoming
+        result_json_changed = True
+    if isinstance(cur, dict) and "是否盖章" in cur and STAMP_TEXT_KEY not in cur:
+        cur[STAMP_TEXT_KEY] = cur.get("是否盖章")
+        result_json_changed = True
+
+    has_stamp = isinstance(cur, dict) and ("stamp_status" in cur or STAMP_TEXT_KEY in cur or "是否盖章" in cur)
+    should_attempt_stamp = payload.get("result_markdown") is not None or status_val in {"done", "error"}
+    if (not has_stamp) and should_attempt_stamp:
+        text_for_stamp = payload.get("result_markdown") if payload.get("result_markdown") is not None else (result_row.result_markdown or "")
+        try:
+            stamp = detect_stamp_status(text_for_stamp)
+            cur[STAMP_TEXT_KEY] = stamp_status_to_cn(stamp.get("stamp_status"))
+            cur["stamp_status"] = stamp.get("stamp_status")
+            cur["stamp_evidence"] = stamp.get("evidence")
+        except Exception as e:
+            cur["stamp_status"] = "ERROR"
+            cur["stamp_error"] = str(e)
+        result_json_changed = True
+
+    if result_json_changed:
+        result_row.result_json = normalize_result_json(cur)
+        result_fields.append("result_json")
+    if result_fields:
+        # 结果定型只在写入时做一次，读路径不再解析别名
+        result_row.digest = report_digest(result_row.result_json, result_row.result_markdown)
+        result_row.canonical = canonicalize_result(result_row.result_json, result_row.result_markdown)
+        result_fields.extend(["digest", "canonical"])
+
+    incoming_meta = payload.get("meta") if isinstance(payload.get("meta"), dict) else None
+    # 摘要只在带 meta 或终态时重写；阶段进度走事件表，不再逐次重写整段 JSON
+    if incoming_meta or job.status in TERMINAL_STATUSES:
+        merged_meta = _merge_runtime_meta(runtime_meta, incoming_meta)
+        if job.status in TERMINAL_STATUSES:
+            # 流式审查的中间结果在终态后由 result_json 取代
+            merged_meta.pop("partial_result", None)
+        job.runtime_meta = merged_meta
+        update_fields.append("runtime_meta")
+
+    if job.status in TERMINAL_STATUSES:
+        last_event = _fold_live_history(job.id, live_state) or last_event
+    # 阶段事件：与上一条 (stage, progress) 相同则不重复记录
+    if (job.stage, job.progress) != last_event:
+        _append_stage_event(job.id, job.stage, job.progress)
+    if update_fields:
+        job.save(update_fields=sorted(set(update_fields + ["updated_at"])))
+    if result_fields:
+        result_row.save(update_fields=sorted(set(result_fields)))
+    return result_row
+
+
+# PDF 元数据标题不带任务号：同内容的报告跨任务共用一份导出，任务号只放在下载文件名里
+_PDF_TITLE = "合同审查报告"
+
+
+def _prewarm_pdf_export(job_id: int, result: ContractJobResult) -> None:
+    """终态后在渲染池里预先生成 PDF，首次下载直接命中。"""
+    if not getattr(settings, "PDF_EXPORT_PREWARM", True):
+        return
+    report_payload = load_report_payload(result.canonical, result.result_json, result.result_markdown, digest=result.digest)
+    if not build_shared_report_markdown(report_payload):
+        return
+    engine = pdf_engine()
+    prewarm_export(export_key(report_payload, engine), lambda: render_pdf(report_payload, _PDF_TITLE, engine))
 
 
 @require_http_methods(["GET"])
@@ -770,51 +1249,23 @@ def export_pdf(request, job_id: int):
     except ContractJob.DoesNotExist:
         return JsonResponse({"ok": False, "error": "job not found"}, status=404)
 
-    result_json = normalize_result_json(job.result_json)
-    report_payload = build_shared_report_payload(result_json, job.result_markdown or "")
+    result = ContractJobResult.objects.filter(job_id=job.id).first()
+    if result is not None:
+        report_payload = load_report_payload(result.canonical, result.result_json, result.result_markdown, digest=result.digest)
+    else:
+        report_payload = load_report_payload(None, None)
     report_markdown = build_shared_report_markdown(report_payload)
     if not report_markdown:
         return JsonResponse({"ok": False, "error": "job has no report content yet"}, status=400)
 
-    html = PDF_HTML_TEMPLATE.render(body=build_shared_report_html(report_payload))
-
-    options = {
-        "encoding": "UTF-8",
-        "page-size": "A4",
-        "margin-top": "12mm",
-        "margin-right": "12mm",
-        "margin-bottom": "12mm",
-        "margin-left": "12mm",
-        "enable-local-file-access": None,
-        "disable-smart-shrinking": None,
-    }
-
-    wk_path = _resolve_wkhtmltopdf_path()
-    wk_error = ""
-    if wk_path:
-        try:
-            config = pdfkit.configuration(wkhtmltopdf=wk_path)
-            pdf_bytes = pdfkit.from_string(html, False, options=options, configuration=config, verbose=False)
-            resp = HttpResponse(pdf_bytes, content_type="application/pdf")
-            resp["Content-Disposition"] = f'attachment; filename="contract_review_job_{job_id}.pdf"'
-            resp["X-PDF-Engine"] = "wkhtmltopdf"
-            return resp
-        except Exception as e:
-            wk_error = str(e)
-    else:
-        wk_error = f"WKHTMLTOPDF_BIN not found. configured={getattr(settings, 'WKHTMLTOPDF_BIN', '')}"
-
+    # 同一报告内容只渲染一次；已预渲染时这里只是一次文件查找。?engine=wkhtmltopdf 走 HTML 保真模式
+    engine = pdf_engine(request.GET.get("engine", ""))
+    key = export_key(report_payload, engine)
+    not_modified = not_modified_response(request, key)
+    if not_modified is not None:
+        return not_modified
     try:
-        fallback_bytes = _build_pdf_with_reportlab(report_payload, f"合同审查报告 #{job_id}")
-        resp = HttpResponse(fallback_bytes, content_type="application/pdf")
-        resp["Content-Disposition"] = f'attachment; filename="contract_review_job_{job_id}.pdf"'
-        resp["X-PDF-Engine"] = "reportlab-fallback"
-        return resp
-    except Exception as fallback_err:
-        return JsonResponse(
-            {
-                "ok": False,
-                "error": f"pdf export failed; wkhtmltopdf={wk_error}; reportlab={fallback_err}",
-            },
-            status=500,
-        )
+        exported = ensure_export(key, lambda: render_pdf(report_payload, _PDF_TITLE, engine))
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": f"pdf export failed; {e}"}, status=500)
+    return export_response(request, exported, f"contract_review_job_{job_id}.pdf")
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger("contract_review_worker.callback")
+
+TERMINAL_STATUSES = ("done", "error")
+_FINISHED_JOBS_CAP = 1024
+# 补发前先把落盘文件改名认领（job_x.json -> job_x.json.inflight.<pid>），多个 worker 进程不会重复补发
+_INFLIGHT_MARK = ".inflight."
+
+SendFn = Callable[[Dict[str, Any]], None]
+
+
+class CallbackRejected(RuntimeError):
+    """Django 明确拒收（4xx），重发也不会成功，不重试也不落盘。"""
+
+
+class CallbackChannel:
+    """
+    worker -> Django 的回调通道（后台线程发送，流水线不阻塞在 HTTP 上）：
+    - running 进度按 job 合并，只投递每个 job 最新的一条；
+    - done/error 终态排队、不丢弃，重试仍失败则落盘，Django 恢复后补发；
+      损坏 / 读不出的落盘文件移到 spool/bad/，不再反复重试。
+    """
+
+    def __init__(
+        self,
+        send: SendFn,
+        spool_dir: Path,
+        attempts: int = 3,
+        backoff: float = 1.0,
+        spool_retry_s: float = 15.0,
+        claim_stale_s: float = 600.0,
+    ) -> None:
+        self._send = send
+        self._spool_dir = Path(spool_dir)
+        self._attempts = max(1, int(attempts))
+        self._backoff = max(0.0, float(backoff))
+        self._spool_retry_s = max(1.0, float(spool_retry_s))
+        # 认领超过这么久仍未完成：认领的进程已退出，放回待补发
+        self._claim_stale_s = max(1.0, float(claim_stale_s))
+
+        self._cond = threading.Condition()
+        self._running: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self._terminal: Deque[Dict[str, Any]] = deque()
+        # 已提交终态的 job：之后迟到的进度直接丢弃
+        self._finished: "OrderedDict[Any, None]" = OrderedDict()
+        self._terminal_inflight = 0
+        self._thread: Optional[threading.Thread] = None
+        self._owner_pid = 0
+        # 0 表示没有待补发的落盘回调
+        self._next_spool_scan = 0.0
+
+    # -------------------------
+    # producer side
+    # -------------------------
+    def submit(self, payload: Dict[str, Any]) -> None:
+        job_id = payload.get("job_id")
+        terminal = str(payload.get("status") or "") in TERMINAL_STATUSES
+        with self._cond:
+            self._ensure_thread()
+            if terminal:
+                # 终态覆盖同 job 尚未发出的进度
+                self._running.pop(job_id, None)
+                self._finished.pop(job_id, None)
+                self._finished[job_id] = None
+                while len(self._finished) > _FINISHED_JOBS_CAP:
+                    self._finished.popitem(last=False)
+                self._terminal.append(payload)
+            else:
+                if job_id in self._finished:
+                    return
+                self._running.pop(job_id, None)
+                self._running[job_id] = payload
+            self._cond.notify_all()
+
+    def flush(self, timeout: float) -> bool:
+        """等待已提交的终态投递（或落盘）完成；running 进度不等待。"""
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._cond:
+            while self._terminal or self._terminal_inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def forget(self, job_id: Any) -> None:
+        """同一 job 重新分析前调用，允许它再次上报进度。"""
+        with self._cond:
+            self._finished.pop(job_id, None)
+
+    # -------------------------
+    # sender thread
+    # -------------------------
+    def _ensure_thread(self) -> None:
+        # Celery prefork 子进程不会继承父进程的线程，按 pid 懒启动
+        pid = os.getpid()
+        if self._thread is not None and self._thread.is_alive() and self._owner_pid == pid:
+            return
+        self._owner_pid = pid
+        self._terminal_inflight = 0
+        # 启动时先补发上次遗留的落盘回调
+        self._next_spool_scan = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, name="django-callback", daemon=True)
+        self._thread.start()
+
+    def _next_payload(self) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            while not self._terminal and not self._running:
+                if not self._next_spool_scan:
+                    self._cond.wait()
+                    continue
+                wait_s = self._next_spool_scan - time.monotonic()
+                if wait_s <= 0:
+                    return None
+                self._cond.wait(wait_s)
+            if self._terminal:
+                self._terminal_inflight += 1
+                return self._terminal.popleft()
+            _, payload = self._running.popitem(last=False)
+            return payload
+
+    def _loop(self) -> None:
+        while True:
+            payload = self._next_payload()
+            if payload is None:
+                self._replay_spool()
+                continue
+            terminal = str(payload.get("status") or "") in TERMINAL_STATUSES
+            try:
+                self._deliver(payload, terminal)
+            except Exception as e:
+                logger.error("[callback] sender error: %s", e)
+            finally:
+                if terminal:
+                    with self._cond:
+                        self._terminal_inflight -= 1
+                        self._cond.notify_all()
+
+    def _post(self, payload: Dict[str, Any], attempts: int) -> bool:
+        for i in range(attempts):
+            try:
+                self._send(payload)
+                return True
+            except CallbackRejected as e:
+                logger.error("[callback] rejected: job=%s status=%s err=%s", payload.get("job_id"), payload.get("status"), e)
+                return True
+            except Exception as e:
+                if i < attempts - 1:
+                    time.sleep(self._backoff * (2**i))
+                    continue
+                logger.error(
+                    "[callback] failed after retries: job=%s status=%s stage=%s err=%s",
+                    payload.get("job_id"),
+                    payload.get("status"),
+                    payload.get("stage"),
+                    e,
+                )
+        return False
+
+    def _deliver(self, payload: Dict[str, Any], terminal: bool) -> None:
+        if not terminal:
+            # 进度失败就丢弃：下一条进度或终态会覆盖它
+            self._post(payload, self._attempts)
+            return
+        if self._post(payload, self._attempts):
+            if self._next_spool_scan:
+                # Django 已恢复，顺带补发积压
+                self._replay_spool()
+            return
+        self._spool(payload)
+
+    # -------------------------
+    # disk spool
+    # -------------------------
+    def _spool(self, payload: Dict[str, Any]) -> None:
+        try:
+            self._spool_dir.mkdir(parents=True, exist_ok=True)
+            name = f"job_{payload.get('job_id')}_{payload.get('status')}_{time.time_ns()}.json"
+            tmp = self._spool_dir / (name + ".tmp")
+            tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self._spool_dir / name)
+            logger.warning("[callback] spooled: job=%s -> %s", payload.get("job_id"), name)
+        except Exception as e:
+            logger.error("[callback] spool failed: job=%s err=%s", payload.get("job_id"), e)
+        with self._cond:
+            self._next_spool_scan = time.monotonic() + self._spool_retry_s
+
+    def _replay_spool(self) -> None:
+        with self._cond:
+            self._next_spool_scan = 0.0
+        self._release_stale_claims()
+        try:
+            files = sorted(self._spool_dir.glob("job_*.json"))
+        except Exception:
+            return
+        for path in files:
+            claimed = self._claim(path)
+            if claimed is None:
+                # 别的进程已经认领
+                continue
+            try:
+                payload = json.loads(claimed.read_text(encoding="utf-8"))
+                if not isinstance(payload, dict):
+                    raise ValueError("payload is not an object")
+            except Exception as e:
+                logger.error("[callback] bad spool file %s: %s", path.name, e)
+                self._quarantine(claimed, path.name)
+                continue
+            if not self._post(payload, 1):
+                self._unclaim(claimed, path)
+                with self._cond:
+                    self._next_spool_scan = time.monotonic() + self._spool_retry_s
+                return
+            try:
+                claimed.unlink()
+            except FileNotFoundError:
+                pass
+            logger.info("[callback] replayed spooled: job=%s", payload.get("job_id"))
+
+    def _claim(self, path: Path) -> Optional[Path]:
+        claimed = path.with_name(f"{path.name}{_INFLIGHT_MARK}{os.getpid()}")
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            return None
+        try:
+            # 认领时间记在 mtime 上，用于判断认领是否过期
+            os.utime(claimed)
+        except OSError:
+            pass
+        return claimed
+
+    def _unclaim(self, claimed: Path, path: Path) -> None:
+        try:
+            os.replace(claimed, path)
+        except OSError as e:
+            logger.error("[callback] release spool claim failed %s: %s", claimed.name, e)
+
+    def _release_stale_claims(self) -> None:
+        now = time.time()
+        try:
+            claims = list(self._spool_dir.glob(f"job_*.json{_INFLIGHT_MARK}*"))
+        except Exception:
+            return
+        for claimed in claims:
+            try:
+                if now - claimed.stat().st_mtime < self._claim_stale_s:
+                    continue
+                # 原子改名：并发释放时只有一个进程成功
+                os.rename(claimed, claimed.with_name(claimed.name.split(_INFLIGHT_MARK, 1)[0]))
+            except OSError:
+                continue
+            logger.warning("[callback] released stale spool claim %s", claimed.name)
+
+    def _quarantine(self, claimed: Path, name: str) -> None:
+        bad_dir = self._spool_dir / "bad"
+        try:
+            bad_dir.mkdir(parents=True, exist_ok=True)
+            os.replace(claimed, bad_dir / name)
+        except OSError as e:
+            logger.error("[callback] quarantine spool file failed %s: %s", name, e)
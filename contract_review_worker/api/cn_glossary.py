@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterable, List, Tuple
+
+# =========================
+# 审查结果中文化：本地术语表
+# =========================
+# 常见英文法律/商务片段先在本地按术语表替换；替换后仍残留英文的少量字符串
+# 才批量交给模型改写（见 llm_client._translate_residual_fragments）。
+
+# (英文短语, 中文)；短语内空格匹配任意空白，匹配时不区分大小写，长短语优先。
+# 只收含义固定的法律/商务术语：deposit（定金/押金/保证金）、interest（利息/利益）这类多义词，
+# 以及 contract / risk 这类泛用词不收，交给模型按上下文改写。
+GLOSSARY: Tuple[Tuple[str, str], ...] = (
+    ("capped at", "上限为"),
+    ("overdue amount", "逾期金额"),
+    ("overdue", "逾期"),
+    ("amount", "金额"),
+    ("liquidated damages", "违约金"),
+    ("liquidated damage", "违约金"),
+    ("penalty", "违约责任"),
+    ("penalties", "违约责任"),
+    ("service fee", "服务费"),
+    ("service fees", "服务费"),
+    ("payment terms", "付款条款"),
+    ("payment term", "付款条款"),
+    ("per day", "按日"),
+    ("per month", "按月"),
+    ("force majeure", "不可抗力"),
+    ("termination", "解除"),
+    ("default", "违约"),
+    ("breach of contract", "违约"),
+    ("breach", "违约"),
+    ("indemnification", "赔偿"),
+    ("indemnity", "赔偿"),
+    ("compensation", "赔偿"),
+    ("liability cap", "责任上限"),
+    ("limitation of liability", "责任限制"),
+    ("liability", "责任"),
+    ("confidentiality", "保密"),
+    ("confidential information", "保密信息"),
+    ("intellectual property", "知识产权"),
+    ("dispute resolution", "争议解决"),
+    ("jurisdiction", "管辖"),
+    ("governing law", "适用法律"),
+    ("arbitration", "仲裁"),
+    ("acceptance criteria", "验收标准"),
+    ("acceptance", "验收"),
+    ("deliverables", "交付物"),
+    ("deliverable", "交付物"),
+    ("invoice", "发票"),
+    ("tax rate", "税率"),
+    ("subcontracting", "分包"),
+    ("subcontract", "分包"),
+    ("warranty", "质保"),
+    ("service level agreement", "服务水平协议"),
+    ("SLA", "服务水平协议"),
+    ("KPI", "关键绩效指标"),
+    ("KPIs", "关键绩效指标"),
+    ("deadline", "期限"),
+    ("due date", "到期日"),
+    ("prepayment", "预付款"),
+    ("retention money", "质保金"),
+    ("notice period", "通知期"),
+    ("written notice", "书面通知"),
+    ("party a", "甲方"),
+    ("party b", "乙方"),
+    ("of", "的"),
+    ("and", "且"),
+    ("or", "或"),
+)
+
+_EN_FRAGMENT_RE = re.compile(r"[A-Za-z][A-Za-z0-9%/._-]{2,}")
+_WS_RE = re.compile(r"\s+")
+_MULTI_WS_RE = re.compile(r"\s{2,}")
+
+
+def _glossary_key(text: str) -> str:
+    return _WS_RE.sub(" ", text.strip()).lower()
+
+
+def _compile_glossary(entries: Iterable[Tuple[str, str]]) -> Tuple["re.Pattern[str]", Dict[str, str]]:
+    table: Dict[str, str] = {}
+    for en, cn in entries:
+        table.setdefault(_glossary_key(en), cn)
+    phrases = sorted(table, key=len, reverse=True)
+    body = "|".join(r"\s+".join(re.escape(word) for word in phrase.split(" ")) for phrase in phrases)
+    # 整词匹配：紧挨字母、数字、下划线、连字符或点号（句末句号除外）时不替换，如 amount_due、late-fee、overdue.py
+    return re.compile(r"(?<![\w\-.])(?:" + body + r")(?![\w\-]|\.\w)", re.IGNORECASE), table
+
+
+_GLOSSARY_RE, _GLOSSARY_TABLE = _compile_glossary(GLOSSARY)
+
+
+def apply_glossary(text: str) -> str:
+    s = (text or "").strip()
+    if not s:
+        return s
+    s = _GLOSSARY_RE.sub(lambda m: _GLOSSARY_TABLE.get(_glossary_key(m.group(0)), m.group(0)), s)
+    s = _MULTI_WS_RE.sub(" ", s)
+    return s.strip()
+
+
+def english_fragments(text: str) -> List[str]:
+    out: List[str] = []
+    for token in _EN_FRAGMENT_RE.findall(text or ""):
+        lower = token.lower()
+        # URLs / file paths are not report narrative.
+        if lower.startswith(("http://", "https://", "www.")):
+            continue
+        out.append(token)
+    return out
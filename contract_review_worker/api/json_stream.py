@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# 顶层数组里逐条下发的条目（风险点 / 改进措施），与 _NARRATIVE_ITEM_KEYS 所在数组一致。
+STREAM_ITEM_KEYS = ("风险点", "risks", "risk_points", "改进措施", "improvements")
+
+_CLOSERS = {"{": "}", "[": "]"}
+_MAX_TAIL_RECOVERY_ATTEMPTS = 64
+
+
+class IncrementalJSONParser:
+    """
+    流式 JSON 解析：按 chunk 喂入模型输出，维护括号栈 / 字符串状态，
+    顶层数组中的条目一闭合就解析出来；流结束后若尾部残缺，或根对象闭合了却不是合法 JSON（如尾逗号），
+    按逗号回退补全括号恢复。
+    """
+
+    def __init__(self, item_keys: Tuple[str, ...] = STREAM_ITEM_KEYS) -> None:
+        self.item_keys = tuple(item_keys)
+        self.items: Dict[str, List[Any]] = {}
+        self._buf = ""
+        self._pos = 0
+        self._root_start = -1
+        self._root_end = -1
+        self._stack: List[str] = []
+        self._in_str = False
+        self._esc = False
+        self._str_start = -1
+        self._last_key_raw = ""
+        self._top_key = ""
+        self._item_start = -1
+        # (逗号位置, 当时的括号栈)：尾部恢复时从最近的逗号截断再闭合
+        self._cut_points: List[Tuple[int, Tuple[str, ...]]] = []
+
+    @property
+    def complete(self) -> bool:
+        return self._root_end >= 0
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    def _locate_root(self) -> bool:
+        head = self._buf.lstrip()
+        offset = len(self._buf) - len(head)
+        start_at = 0
+        # Qwen3 may emit reasoning block first; wait until it is closed.
+        if head.startswith("<think>"):
+            end = self._buf.find("</think>", offset)
+            if end < 0:
+                return False
+            start_at = end + len("</think>")
+        idx = self._buf.find("{", start_at)
+        if idx < 0:
+            return False
+        self._root_start = idx
+        self._pos = idx
+        return True
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """喂入一段输出，返回本次新闭合的 (数组键, 条目) 列表。"""
+        if chunk:
+            self._buf += chunk
+        if self.complete:
+            return []
+        if self._root_start < 0 and not self._locate_root():
+            return []
+
+        emitted: List[Tuple[str, Any]] = []
+        buf = self._buf
+        stack = self._stack
+        n = len(buf)
+        i = self._pos
+        while i < n:
+            ch = buf[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    raw = buf[self._str_start : i + 1]
+                    depth = len(stack)
+                    if depth == 1:
+                        self._last_key_raw = raw
+                    elif depth == 2 and stack[1] == "[" and self._top_key in self.item_keys:
+                        item = _loads_or_none(raw)
+                        if isinstance(item, str) and item.strip():
+                            self._emit(emitted, item)
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_str = True
+                self._str_start = i
+            elif ch in "{[":
+                if ch == "{" and len(stack) == 2 and stack[1] == "[" and self._top_key in self.item_keys:
+                    self._item_start = i
+                stack.append(ch)
+            elif ch in "}]":
+                if stack:
+                    stack.pop()
+                if not stack:
+                    self._root_end = i + 1
+                    i += 1
+                    break
+                if ch == "}" and self._item_start >= 0 and len(stack) == 2:
+                    item = _loads_or_none(buf[self._item_start : i + 1])
+                    if isinstance(item, dict):
+                        self._emit(emitted, item)
+                    self._item_start = -1
+            elif ch == ":" and len(stack) == 1:
+                key = _loads_or_none(self._last_key_raw)
+                self._top_key = key if isinstance(key, str) else ""
+            elif ch == ",":
+                self._cut_points.append((i, tuple(stack)))
+            i += 1
+        self._pos = i
+        return emitted
+
+    def _emit(self, emitted: List[Tuple[str, Any]], item: Any) -> None:
+        self.items.setdefault(self._top_key, []).append(item)
+        emitted.append((self._top_key, item))
+
+    def result(self) -> Dict[str, Any]:
+        """完整解析；流被截断或根对象不是合法 JSON 时做尾部恢复（不重新请求模型）。"""
+        if self._root_start < 0:
+            raise ValueError("empty model response" if not self._buf.strip() else "model response is not a JSON object")
+        if self.complete:
+            data = _loads_or_none(self._buf[self._root_start : self._root_end])
+            if isinstance(data, dict):
+                return data
+            recovered = self._recover_tail()
+            if recovered is None:
+                raise ValueError("json tail recovery failed: invalid model response")
+            return recovered
+
+        recovered = self._recover_tail()
+        if recovered is None:
+            raise ValueError("json tail recovery failed: unterminated model response")
+        return recovered
+
+    def _recover_tail(self) -> Optional[Dict[str, Any]]:
+        candidates: List[str] = []
+        if self.complete:
+            body = self._buf[self._root_start : self._root_end]
+        else:
+            body = self._buf[self._root_start :].rstrip()
+            # 1) 原位补全：未闭合字符串补引号，再按栈补括号
+            tail = body
+            if self._in_str:
+                tail = tail[:-1] if self._esc else tail
+                tail += '"'
+            candidates.append(tail.rstrip().rstrip(",") + _closing(self._stack))
+        # 2) 从最近的逗号回退，丢弃残缺的最后一个元素
+        for cut, stack in reversed(self._cut_points[-_MAX_TAIL_RECOVERY_ATTEMPTS:]):
+            rel = cut - self._root_start
+            if rel <= 0:
+                break
+            candidates.append(body[:rel] + _closing(stack))
+
+        for cand in candidates:
+            data = _loads_or_none(cand)
+            if isinstance(data, dict):
+                return data
+        return None
+
+
+def _closing(stack: Any) -> str:
+    return "".join(_CLOSERS[ch] for ch in reversed(stack))
+
+
+def _loads_or_none(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except Exception:
+        return None
+
+
+def parse_json_object(raw_text: str) -> Dict[str, Any]:
+    parser = IncrementalJSONParser(item_keys=())
+    parser.feed(raw_text or "")
+    return parser.result()
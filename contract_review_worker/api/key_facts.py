@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import bisect
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# =========================
+# 关键要素索引：一次扫描抽取主体 / 金额 / 日期 / 期限 / 管辖 / 条款
+# =========================
+# 规则审查、合并提示、LLM 提示词都从同一个索引取值，不再各自重复跑正则。
+
+MISSING = "未提及"
+
+_CN_DIGITS = {
+    "零": 0, "〇": 0, "一": 1, "壹": 1, "二": 2, "贰": 2, "两": 2, "三": 3, "叁": 3,
+    "四": 4, "肆": 4, "五": 5, "伍": 5, "六": 6, "陆": 6, "七": 7, "柒": 7,
+    "八": 8, "捌": 8, "九": 9, "玖": 9,
+}
+_CN_UNITS = {"十": 10, "拾": 10, "百": 100, "佰": 100, "千": 1000, "仟": 1000}
+_CN_SECTIONS = {"万": 10_000, "萬": 10_000, "亿": 100_000_000, "億": 100_000_000}
+_CN_NUMERAL_CHARS = "".join(_CN_DIGITS) + "".join(_CN_UNITS) + "".join(_CN_SECTIONS)
+
+# 甲方侧 / 乙方侧角色，按优先级排列（与原先逐条 re.search 的顺序一致）
+_PARTY_A_ROLES = ("甲方", "采购人")
+_PARTY_B_ROLES = ("乙方", "供应商")
+
+# 管辖机构：以“人民法院/仲裁委员会”为锚点，再向前取机构名，去掉“提交/向/由”等引导词
+_COURT_NAME_RE = re.compile(r"[\u4e00-\u9fa5]{0,24}$")
+_COURT_PREFIX_RE = re.compile(r"^.*(?:提交|提请|交由|向|由|至|归)")
+
+# 一个组合正则，按命名分组区分实体类型；所有分支都以字面量锚点开头，便于逐次 search。
+_FACT_RE = re.compile(
+    r"(?P<clause>第[一二三四五六七八九十百零〇\d]+条)[ \t]*(?P<clause_title>[^\n\r]{0,30})"
+    r"|(?P<party_role>" + "|".join(_PARTY_A_ROLES + _PARTY_B_ROLES) + r")[：:]\s*(?P<party_value>[^\n\r]{2,80})"
+    r"|(?P<amount_label>总金额|合计金额)[^¥\n\r]{0,20}(?P<amount_value>¥\s*[\d,]+(?:\.\d+)?)"
+    r"|(?P<rmb>人民币[^\n\r]{4,40})"
+    r"|(?P<service_term>服务完成时间)[：:]\s*(?P<service_term_value>[^\n\r]{4,80})"
+    r"|(?P<date_range>(?P<range_start>20\d{2}年\d{1,2}月\d{1,2}日)\s*[-至到]+\s*(?P<range_end>20\d{2}年\d{1,2}月\d{1,2}日))"
+    r"|(?P<date>20\d{2}(?:年\d{1,2}月\d{1,2}日|[-/.]\d{1,2}[-/.]\d{1,2}(?!\d)))"
+    r"|(?P<term>期限[：:]\s*[^\n\r]{2,60})"
+    r"|(?P<court>人民法院|仲裁委员会)",
+    re.IGNORECASE,
+)
+_DATE_PARTS_RE = re.compile(r"(20\d{2})\D(\d{1,2})\D(\d{1,2})")
+_ARABIC_AMOUNT_RE = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(万元|万|元)?")
+_CN_AMOUNT_RE = re.compile(
+    "([" + _CN_NUMERAL_CHARS + "]+)(?:元|圆)(?:([" + "".join(_CN_DIGITS) + "])角)?(?:([" + "".join(_CN_DIGITS) + "])分)?"
+)
+_HAS_ARABIC_RE = re.compile(r"\d")
+_WS_RE = re.compile(r"\s+")
+_NAME_SKIP_RE = re.compile(r"合同编号|项目编号|招标编号|采购编号")
+_NAME_PATTERNS = (
+    re.compile(r"[《<【][^》>】]{2,80}(?:合同|协议)[》>】]"),
+    re.compile(r"(?:^|[\s:：])([^\n\r]{2,80}(?:合同|协议))$"),
+)
+
+
+class Fact(NamedTuple):
+    kind: str
+    value: str
+    start: int
+    end: int
+    role: str = ""
+    normalized: Any = None
+
+
+def cn_numeral_to_int(text: str) -> Optional[int]:
+    """中文数字（含大写）转整数，如 “壹万贰仟叁佰元” 中的 “壹万贰仟叁佰” → 12300。"""
+    total = 0
+    section = 0
+    digit = 0
+    seen = False
+    for ch in text or "":
+        if ch in _CN_DIGITS:
+            digit = _CN_DIGITS[ch]
+            seen = True
+        elif ch in _CN_UNITS:
+            section += (digit or 1) * _CN_UNITS[ch]
+            digit = 0
+            seen = True
+        elif ch in _CN_SECTIONS:
+            unit = _CN_SECTIONS[ch]
+            total = (total + section + digit) * unit if unit > 10_000 else total + (section + digit) * unit
+            section = 0
+            digit = 0
+            seen = True
+        else:
+            return None
+    if not seen:
+        return None
+    return total + section + digit
+
+
+def normalize_amount(text: str) -> Optional[float]:
+    """金额文本归一为“元”：支持 ¥12,000.50 / 1.2万元 / 人民币壹万贰仟元整。"""
+    src = (text or "").strip()
+    if not src:
+        return None
+    m = None if _HAS_ARABIC_RE.search(src) else _CN_AMOUNT_RE.search(src)
+    if m:
+        base = cn_numeral_to_int(m.group(1))
+        if base is not None:
+            jiao = _CN_DIGITS.get(m.group(2) or "", 0)
+            fen = _CN_DIGITS.get(m.group(3) or "", 0)
+            return round(base + jiao / 10 + fen / 100, 2)
+    m = _ARABIC_AMOUNT_RE.search(src)
+    if m:
+        try:
+            value = float(m.group(1).replace(",", ""))
+        except ValueError:
+            return None
+        if (m.group(2) or "").startswith("万"):
+            value *= 10_000
+        return round(value, 2)
+    return None
+
+
+def normalize_date(text: str) -> str:
+    m = _DATE_PARTS_RE.search(text or "")
+    if not m:
+        return ""
+    year, month, day = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return ""
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def _clean(value: str, limit: int = 120) -> str:
+    return _WS_RE.sub(" ", (value or "").strip())[:limit]
+
+
+def guess_contract_name(text: str) -> str:
+    lines = [_WS_RE.sub(" ", line.strip()) for line in (text or "").splitlines()]
+    lines = [line for line in lines if len(line) >= 4]
+    if not lines:
+        return MISSING
+
+    for line in lines[:60]:
+        if _NAME_SKIP_RE.search(line):
+            continue
+        for pattern in _NAME_PATTERNS:
+            m = pattern.search(line)
+            if m:
+                value = (m.group(1) if m.lastindex else m.group(0)).strip()
+                if value:
+                    return value[:80]
+
+    for line in lines[:80]:
+        if "合同" in line and len(line) <= 80 and not _NAME_SKIP_RE.search(line):
+            return line[:80]
+    return MISSING
+
+
+class FactIndex:
+    """合同文本的条款 / 实体索引，所有实体带原文偏移。"""
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.clauses: List[Fact] = []
+        self.parties: List[Fact] = []
+        self.amounts: List[Fact] = []
+        self.dates: List[Fact] = []
+        self.terms: List[Fact] = []
+        self.jurisdictions: List[Fact] = []
+        self._scan()
+        self._clause_starts = [c.start for c in self.clauses]
+
+    def _scan(self) -> None:
+        text = self.text
+        search = _FACT_RE.search
+        seen_dates = set()
+        m = search(text)
+        while m is not None:
+            start, end = m.start(), m.end()
+            next_pos = start + 1
+            if m.group("clause"):
+                # 只有行首的“第X条”才算条款标题，正文中的引用（如“依第五条”）跳过
+                line_head = text[text.rfind("\n", 0, start) + 1 : start]
+                if not line_head.strip(" \t\r#*"):
+                    title = _clean(m.group("clause_title"), 30)
+                    self.clauses.append(Fact("clause", m.group("clause"), start, end, normalized=title))
+                next_pos = m.start("clause_title")
+            elif m.group("party_role"):
+                self.parties.append(
+                    Fact("party", _clean(m.group("party_value")), m.start("party_value"), end, role=m.group("party_role"))
+                )
+            elif m.group("amount_label"):
+                value = _clean(m.group("amount_value"))
+                self.amounts.append(
+                    Fact("amount", value, m.start("amount_value"), end, role=m.group("amount_label"), normalized=normalize_amount(value))
+                )
+            elif m.group("rmb"):
+                value = _clean(m.group("rmb"))
+                self.amounts.append(Fact("amount", value, start, end, role="人民币", normalized=normalize_amount(value)))
+            elif m.group("service_term"):
+                self.terms.append(Fact("term", _clean(m.group("service_term_value")), m.start("service_term_value"), end, role="服务完成时间"))
+            elif m.group("date_range"):
+                value = _clean(m.group("date_range"))
+                span = (normalize_date(m.group("range_start")), normalize_date(m.group("range_end")))
+                self.terms.append(Fact("term", value, start, end, role="起止日期", normalized=span))
+                for group in ("range_start", "range_end"):
+                    pos = m.start(group)
+                    if pos not in seen_dates:
+                        seen_dates.add(pos)
+                        self.dates.append(Fact("date", m.group(group), pos, m.end(group), normalized=normalize_date(m.group(group))))
+            elif m.group("date"):
+                if start not in seen_dates:
+                    seen_dates.add(start)
+                    self.dates.append(Fact("date", m.group("date"), start, end, normalized=normalize_date(m.group("date"))))
+            elif m.group("term"):
+                self.terms.append(Fact("term", _clean(m.group("term")), start, end, role="期限"))
+            elif m.group("court"):
+                name = _COURT_NAME_RE.search(text, max(0, start - 24), start).group(0)
+                name = _COURT_PREFIX_RE.sub("", name)
+                offset = start - len(name)
+                role = "仲裁" if m.group("court") == "仲裁委员会" else "法院"
+                self.jurisdictions.append(Fact("jurisdiction", text[offset:end], offset, end, role=role))
+            m = search(text, max(next_pos, start + 1))
+
+    def clause_at(self, offset: int) -> str:
+        idx = bisect.bisect_right(self._clause_starts, offset) - 1
+        if idx < 0:
+            return ""
+        return self.clauses[idx].value
+
+    def _first_by_role(self, facts: List[Fact], roles: Tuple[str, ...]) -> Optional[Fact]:
+        for role in roles:
+            for fact in facts:
+                if fact.role == role and fact.value:
+                    return fact
+        return None
+
+    def party_a(self) -> Optional[Fact]:
+        return self._first_by_role(self.parties, _PARTY_A_ROLES)
+
+    def party_b(self) -> Optional[Fact]:
+        return self._first_by_role(self.parties, _PARTY_B_ROLES)
+
+    def amount(self) -> Optional[Fact]:
+        return self._first_by_role(self.amounts, ("总金额", "合计金额", "人民币"))
+
+    def term(self) -> Optional[Fact]:
+        return self._first_by_role(self.terms, ("服务完成时间", "起止日期", "期限"))
+
+    def jurisdiction(self) -> Optional[Fact]:
+        return self.jurisdictions[0] if self.jurisdictions else None
+
+    def key_facts(self) -> Dict[str, str]:
+        def _value(fact: Optional[Fact]) -> str:
+            return fact.value if fact is not None and fact.value else MISSING
+
+        return {
+            "合同名称": guess_contract_name(self.text),
+            "甲方": _value(self.party_a()),
+            "乙方": _value(self.party_b()),
+            "金额": _value(self.amount()),
+            "期限": _value(self.term()),
+        }
+
+    def fact_sheet(self) -> List[Dict[str, Any]]:
+        """供提示词 / 调试使用的要素清单，附带原文位置与所在条款。"""
+        picked = [
+            ("甲方", self.party_a()),
+            ("乙方", self.party_b()),
+            ("金额", self.amount()),
+            ("期限", self.term()),
+            ("争议管辖", self.jurisdiction()),
+        ]
+        out: List[Dict[str, Any]] = []
+        for label, fact in picked:
+            if fact is None:
+                continue
+            row: Dict[str, Any] = {"要素": label, "值": fact.value, "offset": fact.start}
+            clause = self.clause_at(fact.start)
+            if clause:
+                row["条款"] = clause
+            if label == "金额" and fact.normalized is not None:
+                row["金额_元"] = fact.normalized
+            out.append(row)
+        return out
+
+
+@lru_cache(maxsize=8)
+def build_fact_index(text: str) -> FactIndex:
+    return FactIndex(text or "")
+
+
+def format_fact_hints(index: FactIndex) -> str:
+    """把索引中的要素压成几行文本，提示模型“核对”而不是从头抽取。"""
+    lines = []
+    for row in index.fact_sheet():
+        where = f"（{row['条款']}）" if row.get("条款") else ""
+        lines.append(f"- {row['要素']}：{row['值']}{where}")
+    return "\n".join(lines)
+
+
+def fill_missing_key_facts(data: Dict[str, Any], index: FactIndex) -> Dict[str, Any]:
+    """模型未给出（或给出“未提及”）的关键要素，用索引结果补齐。"""
+    if not isinstance(data, dict):
+        return data
+    bucket = data.get("key_facts")
+    facts = dict(bucket) if isinstance(bucket, dict) else {}
+    for key, value in index.key_facts().items():
+        current = facts.get(key)
+        if (not isinstance(current, str) or not current.strip() or current.strip() == MISSING) and value != MISSING:
+            facts[key] = value
+    out = dict(data)
+    out["key_facts"] = facts
+    return out
@@ -4,10 +4,14 @@ import re
 import time
 from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Optional
 
 from openai import OpenAI
 
+from .cn_glossary import apply_glossary, english_fragments
+from .json_stream import IncrementalJSONParser, parse_json_object
+from .key_facts import build_fact_index, fill_missing_key_facts, format_fact_hints
+
 BASE_URL = os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
 
 
@@ -61,17 +65,17 @@ SYSTEM_JSON_RULE = """你是资深合同审查助手。你必须只输出 JSON
 6) 报告只允许输出“与合同内容相关”的风险与修改建议；禁止输出系统、模型、OCR、识别噪声、技术缺陷类问题。
 7) 输出语言必须为简体中文。除合同原文中依法必须保留的专有名词、条款编号、金额、百分比外，禁止输出英文句子或英文短语。
 8) 若出现英文表达，必须在同字段内改写为中文法律表述，不得仅保留英文。
+9) 若提供了“预抽取关键要素”，请逐项对照合同原文核对：正确的直接写入 key_facts，错误或缺失的再从原文更正/补充。
 """
 
-CN_REWRITE_SYSTEM_RULE = """你是合同审查结果“中文化规整”助手。你必须只输出 JSON 本体。
+CN_FRAGMENT_SYSTEM_RULE = """你是合同审查结果“中文化规整”助手。你必须只输出 JSON 本体。
 任务：
-1) 将输入 JSON 中的英文句子/英文短语改写为简体中文法律表述。
-2) 保持原 JSON 结构、字段名和关键信息不变（数值、比例、金额、条款编号、主体名称不要改错）。
-3) 不要新增技术类缺陷描述（如OCR噪声、模型问题等）。
-4) 输出仍需是可解析的 JSON 对象，不能有 markdown 和解释文字。
+1) 输入为 {"items": [...]}，每一项是审查结果中仍含英文的一段文本。
+2) 将每一项中的英文句子/英文短语改写为简体中文法律表述，其余内容保持不变（数值、比例、金额、条款编号、主体名称不要改错）。
+3) 输出 {"items": [...]}，数组长度与顺序必须与输入完全一致，每项只输出改写后的文本。
+4) 不要新增技术类缺陷描述（如OCR噪声、模型问题等），不能有 markdown 和解释文字。
 """
 
-_EN_FRAGMENT_RE = re.compile(r"[A-Za-z][A-Za-z0-9%/._-]{2,}")
 _NARRATIVE_ITEM_KEYS = (
     "title",
     "problem",
@@ -84,26 +88,6 @@ _NARRATIVE_ITEM_KEYS = (
     "建议",
     "修改建议",
 )
-_COMMON_EN_CN_REPLACEMENTS = (
-    (r"\bcapped at\b", "上限为"),
-    (r"\boverdue amount\b", "逾期金额"),
-    (r"\boverdue\b", "逾期"),
-    (r"\bamount\b", "金额"),
-    (r"\bliquidated damages?\b", "违约金"),
-    (r"\bpenalt(?:y|ies)\b", "违约责任"),
-    (r"\bservice fee\b", "服务费"),
-    (r"\bpayment terms?\b", "付款条款"),
-    (r"\bper day\b", "按日"),
-    (r"\bper month\b", "按月"),
-    (r"\bforce majeure\b", "不可抗力"),
-    (r"\btermination\b", "解除"),
-    (r"\bdefault\b", "违约"),
-    (r"\bof\b", "的"),
-    (r"\band\b", "且"),
-    (r"\bor\b", "或"),
-)
-
-
 def _pick_title(lines: List[str]) -> str:
     for line in lines:
         s = line.strip()
@@ -242,6 +226,32 @@ def load_taxonomy() -> Dict[str, Any]:
     }
 
 
+@lru_cache(maxsize=1)
+def taxonomy_json() -> str:
+    # 固定 key 顺序与分隔符：保证每次请求的前缀字节一致，命中 KV / 上下文缓存。
+    return json.dumps(load_taxonomy(), ensure_ascii=False, separators=(",", ":"))
+
+
+@lru_cache(maxsize=1)
+def _review_system_prompt() -> str:
+    return (
+        SYSTEM_JSON_RULE
+        + "\n\n以下是可选合同类型 taxonomy（必须从中选择 type_l1/type_l2，若不匹配请用未知/其他）：\n\n"
+        + taxonomy_json()
+    )
+
+
+def _review_system_message() -> Dict[str, Any]:
+    content = _review_system_prompt()
+    if _env_flag("QWEN_EXPLICIT_CACHE", False):
+        # DashScope 显式缓存：静态前缀打 cache_control，后续请求按前缀命中。
+        return {
+            "role": "system",
+            "content": [{"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}],
+        }
+    return {"role": "system", "content": content}
+
+
 def _extract_json_object(raw_text: str) -> Dict[str, Any]:
     text = (raw_text or "").strip()
     if not text:
@@ -252,30 +262,69 @@ def _extract_json_object(raw_text: str) -> Dict[str, Any]:
             return data
         raise ValueError("model response is not a JSON object")
     except Exception:
-        # Fallback: some responses may wrap JSON with extra text.
-        m = re.search(r"\{[\s\S]*\}", text)
-        if not m:
-            raise
-        data = json.loads(m.group(0))
-        if not isinstance(data, dict):
-            raise ValueError("extracted payload is not a JSON object")
-        return data
+        # Fallback: some responses wrap JSON with extra text or get cut off mid-object.
+        return parse_json_object(text)
+
+
+def _stream_chat_json(
+    client: OpenAI,
+    kwargs: Dict[str, Any],
+    on_item: Optional[Callable[[str, Any], None]] = None,
+) -> Dict[str, Any]:
+    """流式拉取 completion，边收边解析；风险点等条目闭合即回调 on_item。"""
+    parser = IncrementalJSONParser()
+    stream = client.chat.completions.create(stream=True, **kwargs)
+    try:
+        for chunk in stream:
+            choices = getattr(chunk, "choices", None) or []
+            if not choices:
+                continue
+            delta = getattr(choices[0], "delta", None)
+            piece = getattr(delta, "content", None) or ""
+            if not piece:
+                continue
+            for key, item in parser.feed(piece):
+                if on_item is None:
+                    continue
+                try:
+                    on_item(key, item)
+                except Exception:
+                    # 进度回调失败不影响主流程
+                    pass
+            if parser.complete:
+                break
+    finally:
+        close = getattr(stream, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+    return parser.result()
 
 
-def _call_qwen_json(messages: List[Dict[str, str]], req_timeout: int) -> Dict[str, Any]:
+def _call_qwen_json(
+    messages: List[Dict[str, str]],
+    req_timeout: int,
+    on_item: Optional[Callable[[str, Any], None]] = None,
+) -> Dict[str, Any]:
     retries = max(1, _env_int("QWEN_API_RETRY", 2))
+    stream_enabled = _env_flag("LLM_STREAM_ENABLED", True)
     last_exc: Exception | None = None
     client = get_client()
 
     for attempt in range(1, retries + 1):
         try:
-            resp = client.chat.completions.create(
-                model=os.getenv("QWEN_MODEL", "qwen-plus"),
-                messages=messages,
-                temperature=float(os.getenv("QWEN_TEMPERATURE", "0.2")),
-                response_format={"type": "json_object"},
-                timeout=req_timeout,
-            )
+            kwargs: Dict[str, Any] = {
+                "model": os.getenv("QWEN_MODEL", "qwen-plus"),
+                "messages": messages,
+                "temperature": float(os.getenv("QWEN_TEMPERATURE", "0.2")),
+                "response_format": {"type": "json_object"},
+                "timeout": req_timeout,
+            }
+            if stream_enabled:
+                return _stream_chat_json(client, kwargs, on_item=on_item)
+            resp = client.chat.completions.create(**kwargs)
             content = (resp.choices[0].message.content or "").strip()
             return _extract_json_object(content)
         except Exception as exc:
@@ -312,37 +361,22 @@ def _call_qwen_text(messages: List[Dict[str, str]], req_timeout: int) -> str:
 
 
 def _normalize_narrative_cn_text(text: str) -> str:
-    s = (text or "").strip()
-    if not s:
-        return s
-    for pat, repl in _COMMON_EN_CN_REPLACEMENTS:
-        s = re.sub(pat, repl, s, flags=re.IGNORECASE)
-    s = re.sub(r"\s{2,}", " ", s)
-    return s.strip()
+    return apply_glossary(text)
 
 
 def _contains_english_fragment(text: str) -> bool:
-    s = (text or "").strip()
-    if not s:
-        return False
-    for token in _EN_FRAGMENT_RE.findall(s):
-        lower = token.lower()
-        # URLs / file paths are not report narrative.
-        if lower.startswith(("http://", "https://", "www.")):
-            continue
-        return True
-    return False
+    return bool(english_fragments((text or "").strip()))
 
 
-def _normalize_review_language_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+def _map_review_narrative(data: Dict[str, Any], fn: Callable[[str], str]) -> Dict[str, Any]:
     if not isinstance(data, dict):
         return data
 
-    def _normalize_node(node: Dict[str, Any]) -> Dict[str, Any]:
+    def _map_node(node: Dict[str, Any]) -> Dict[str, Any]:
         out = dict(node)
         for key in ("审查概述", "overview", "summary"):
             if isinstance(out.get(key), str):
-                out[key] = _normalize_narrative_cn_text(out[key])
+                out[key] = fn(out[key])
 
         for key in ("风险点", "改进措施", "risks", "risk_points", "improvements", "suggestions", "recommendations"):
             items = out.get(key)
@@ -351,89 +385,76 @@ def _normalize_review_language_fields(data: Dict[str, Any]) -> Dict[str, Any]:
             cleaned = []
             for item in items:
                 if isinstance(item, str):
-                    cleaned.append(_normalize_narrative_cn_text(item))
+                    cleaned.append(fn(item))
                     continue
                 if isinstance(item, dict):
                     d = dict(item)
                     for k in _NARRATIVE_ITEM_KEYS:
                         if isinstance(d.get(k), str):
-                            d[k] = _normalize_narrative_cn_text(d[k])
+                            d[k] = fn(d[k])
                     cleaned.append(d)
                     continue
                 cleaned.append(item)
             out[key] = cleaned
         return out
 
-    root = _normalize_node(data)
+    root = _map_node(data)
     for key in ("result", "review", "data"):
         node = root.get(key)
         if isinstance(node, dict):
-            root[key] = _normalize_node(node)
+            root[key] = _map_node(node)
     return root
 
 
-def _collect_narrative_texts(data: Dict[str, Any]) -> List[str]:
-    if not isinstance(data, dict):
-        return []
+def _normalize_review_language_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    return _map_review_narrative(data, _normalize_narrative_cn_text)
 
-    out: List[str] = []
 
-    def _collect_node(node: Dict[str, Any]) -> None:
-        for key in ("审查概述", "overview", "summary"):
-            v = node.get(key)
-            if isinstance(v, str) and v.strip():
-                out.append(v.strip())
+def _collect_narrative_texts(data: Dict[str, Any]) -> List[str]:
+    out: List[str] = []
 
-        for key in ("风险点", "改进措施", "risks", "risk_points", "improvements", "suggestions", "recommendations"):
-            items = node.get(key)
-            if not isinstance(items, list):
-                continue
-            for item in items:
-                if isinstance(item, str) and item.strip():
-                    out.append(item.strip())
-                    continue
-                if isinstance(item, dict):
-                    for k in _NARRATIVE_ITEM_KEYS:
-                        v = item.get(k)
-                        if isinstance(v, str) and v.strip():
-                            out.append(v.strip())
+    def _collect(text: str) -> str:
+        if text.strip():
+            out.append(text.strip())
+        return text
 
-    _collect_node(data)
-    for key in ("result", "review", "data"):
-        node = data.get(key)
-        if isinstance(node, dict):
-            _collect_node(node)
+    _map_review_narrative(data, _collect)
     return out
 
 
 def _english_fragment_count(data: Dict[str, Any]) -> int:
-    count = 0
-    for text in _collect_narrative_texts(data):
-        for token in _EN_FRAGMENT_RE.findall(text):
-            lower = token.lower()
-            if lower.startswith(("http://", "https://", "www.")):
-                continue
-            count += 1
-    return count
+    return sum(len(english_fragments(text)) for text in _collect_narrative_texts(data))
+
 
+def _translate_residual_fragments(data: Dict[str, Any], req_timeout: int) -> Dict[str, Any]:
+    """术语表处理后仍含英文的字符串，去重后一次性批量改写，不再回传整份 JSON。"""
+    max_items = max(1, _env_int("REVIEW_CN_REWRITE_MAX_ITEMS", 40))
+    residual: List[str] = []
+    seen = set()
+    for text in _collect_narrative_texts(data):
+        if text in seen or not _contains_english_fragment(text):
+            continue
+        seen.add(text)
+        residual.append(text)
+        if len(residual) >= max_items:
+            break
+    if not residual:
+        return data
 
-def _rewrite_review_json_to_chinese(data: Dict[str, Any], req_timeout: int) -> Dict[str, Any]:
-    payload = json.dumps(data, ensure_ascii=False)
     messages = [
-        {"role": "system", "content": CN_REWRITE_SYSTEM_RULE},
-        {
-            "role": "user",
-            "content": (
-                "请将下列审查结果 JSON 中所有英文自然语言改写为简体中文；"
-                "保持结构和字段不变，只改写文本表达：\n\n"
-                f"{payload}"
-            ),
-        },
+        {"role": "system", "content": CN_FRAGMENT_SYSTEM_RULE},
+        {"role": "user", "content": json.dumps({"items": residual}, ensure_ascii=False)},
     ]
-    rewritten = _call_qwen_json(messages=messages, req_timeout=req_timeout)
-    if not isinstance(rewritten, dict):
-        raise ValueError("rewrite payload is not a JSON object")
-    return rewritten
+    translated = _call_qwen_json(messages=messages, req_timeout=req_timeout).get("items")
+    if not isinstance(translated, list) or len(translated) != len(residual):
+        raise ValueError("fragment rewrite returned mismatched items")
+
+    mapping = {
+        src: _normalize_narrative_cn_text(dst)
+        for src, dst in zip(residual, translated)
+        if isinstance(dst, str) and dst.strip()
+    }
+    return _map_review_narrative(data, lambda text: mapping.get(text.strip(), text))
 
 
 def _contains_ocr_noise_claim(text: str) -> bool:
@@ -660,16 +681,14 @@ def _postprocess_review_json(data: Dict[str, Any], force_chinese: Optional[bool]
 
     out = _normalize_review_language_fields(out)
 
-    # 强制中文：若仍出现英文碎片，自动做一轮“JSON中文化重写”。
+    # 强制中文：术语表替换后仍有英文碎片时，只把残留字符串批量交给模型改写。
     should_force_chinese = _env_flag("REVIEW_FORCE_CHINESE", True) if force_chinese is None else bool(force_chinese)
     if should_force_chinese:
         en_count = _english_fragment_count(out)
         if en_count > 0:
             rewrite_timeout = _env_int("REVIEW_CN_REWRITE_TIMEOUT", 90)
             try:
-                rewritten = _rewrite_review_json_to_chinese(out, req_timeout=rewrite_timeout)
-                rewritten = _normalize_review_language_fields(rewritten)
-                rewritten = _filter_node(rewritten)
+                rewritten = _filter_node(_translate_residual_fragments(out, req_timeout=rewrite_timeout))
                 for root in ("result", "review", "data"):
                     node = rewritten.get(root)
                     if isinstance(node, dict):
@@ -719,31 +738,32 @@ def qwen_fix_ocr_text(raw_text: str) -> str:
     return fixed
 
 
-def qwen_plus_review(markdown_text: str) -> dict:
+def qwen_plus_review(markdown_text: str, on_item: Optional[Callable[[str, Any], None]] = None) -> dict:
     if not (os.getenv("DASHSCOPE_API_KEY") or "").strip():
         raise RuntimeError("DASHSCOPE_API_KEY is missing")
 
     prompt_max_chars = _env_int("QWEN_PROMPT_TEXT_MAX_CHARS", 80000)
     prompt_text = _truncate_for_prompt(markdown_text, prompt_max_chars)
     type_clues = build_type_clues(markdown_text)
-    taxonomy = load_taxonomy()
-    taxonomy_json = json.dumps(taxonomy, ensure_ascii=False)
+    fact_index = build_fact_index(markdown_text)
+    fact_hints = format_fact_hints(fact_index)
     req_timeout = _env_int("QWEN_API_TIMEOUT", 120)
 
+    # 静态前缀（规则 + taxonomy）整体放在 system，可变内容全部在其后。
     messages = [
-        {"role": "system", "content": SYSTEM_JSON_RULE},
+        _review_system_message(),
         {
             "role": "user",
             "content": (
                 "以下是合同类型判别参考信息（已挑选高信息密度片段）：\n\n"
                 f"{type_clues}\n\n"
-                "以下是可选合同类型 taxonomy（必须从中选择 type_l1/type_l2，若不匹配请用未知/其他）：\n\n"
-                f"{taxonomy_json}\n\n"
-                "以下是合同内容（Markdown，可能有 OCR 噪声）：\n\n"
+                + (f"以下是预抽取关键要素（请核对，不必重新抽取）：\n\n{fact_hints}\n\n" if fact_hints else "")
+                + "以下是合同内容（Markdown，可能有 OCR 噪声）：\n\n"
                 f"{prompt_text}"
             ),
         },
     ]
 
-    result = _call_qwen_json(messages=messages, req_timeout=req_timeout)
+    result = _call_qwen_json(messages=messages, req_timeout=req_timeout, on_item=on_item)
+    result = fill_missing_key_facts(result, fact_index)
     return _postprocess_review_json(result)
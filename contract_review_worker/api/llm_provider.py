@@ -7,7 +7,7 @@ import re
 import time
 from dataclasses import dataclass
 from functools import lru_cache
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from openai import OpenAI
 import requests
@@ -15,12 +15,22 @@ import requests
 from .llm_client import (
     _extract_json_object,
     _postprocess_review_json,
+    _stream_chat_json,
     _truncate_for_prompt,
     build_type_clues,
     load_taxonomy,
     qwen_fix_ocr_text,
     qwen_plus_review,
 )
+from .key_facts import build_fact_index, format_fact_hints
+from .review_rules import (
+    EMPTY_RESULT_RULE,
+    SUPPLEMENT_RULES,
+    TYPE_EVIDENCE_KEYWORDS,
+    ReviewRule,
+    evaluate_rules,
+    scan_text,
+)
 
 
 def _env_int(name: str, default: int) -> int:
@@ -55,10 +65,13 @@ def _postprocess_local_review_json(data: Dict[str, Any]) -> Dict[str, Any]:
     return _postprocess_review_json(data, force_chinese=False)
 
 
+ItemCallback = Callable[[str, Any], None]
+
+
 class BaseLLMClient:
     name = "base"
 
-    def review_contract(self, markdown_text: str) -> Dict[str, Any]:
+    def review_contract(self, markdown_text: str, on_item: Optional[ItemCallback] = None) -> Dict[str, Any]:
         raise NotImplementedError
 
     def fix_ocr_text(self, raw_text: str) -> str:
@@ -68,8 +81,8 @@ class BaseLLMClient:
 class RemoteLLMClient(BaseLLMClient):
     name = "remote"
 
-    def review_contract(self, markdown_text: str) -> Dict[str, Any]:
-        return qwen_plus_review(markdown_text)
+    def review_contract(self, markdown_text: str, on_item: Optional[ItemCallback] = None) -> Dict[str, Any]:
+        return qwen_plus_review(markdown_text, on_item=on_item)
 
     def fix_ocr_text(self, raw_text: str) -> str:
         return qwen_fix_ocr_text(raw_text)
@@ -93,6 +106,7 @@ class LocalVLLMConfig:
     overview_min_chars: int
     overview_max_chars: int
     disable_thinking: bool
+    stream: bool
     healthcheck_enabled: bool
     healthcheck_timeout_s: int
     unhealthy_cooldown_s: int
@@ -118,6 +132,7 @@ class LocalVLLMConfig:
             overview_min_chars=max(120, _env_int("LOCAL_VLLM_OVERVIEW_MIN_CHARS", 200)),
             overview_max_chars=max(200, _env_int("LOCAL_VLLM_OVERVIEW_MAX_CHARS", 400)),
             disable_thinking=_env_flag("LOCAL_VLLM_DISABLE_THINKING", True),
+            stream=_env_flag("LOCAL_VLLM_STREAM", _env_flag("LLM_STREAM_ENABLED", True)),
             healthcheck_enabled=_env_flag("LOCAL_VLLM_HEALTHCHECK_ENABLED", True),
             healthcheck_timeout_s=max(1, _env_int("LOCAL_VLLM_HEALTHCHECK_TIMEOUT", 2)),
             unhealthy_cooldown_s=max(5, _env_int("LOCAL_VLLM_UNHEALTHY_COOLDOWN", 45)),
@@ -129,6 +144,49 @@ def _get_local_openai_client(base_url: str, api_key: str, max_retries: int) -> O
     return OpenAI(api_key=api_key, base_url=base_url, max_retries=max_retries)
 
 
+@lru_cache(maxsize=2)
+def _compact_taxonomy_json(small_ctx: bool) -> str:
+    taxonomy = load_taxonomy()
+    if not isinstance(taxonomy, dict):
+        return "{}"
+    max_types = 6 if small_ctx else 10
+    max_labels = 4 if small_ctx else 8
+    compact: Dict[str, List[str]] = {}
+    for idx, (k, v) in enumerate(taxonomy.items()):
+        if idx >= max_types:
+            break
+        if isinstance(v, list):
+            compact[str(k)] = [str(x) for x in v[:max_labels]]
+        else:
+            compact[str(k)] = [str(v)]
+    return json.dumps(compact, ensure_ascii=False, separators=(",", ":"))
+
+
+_REVIEW_SYSTEM_PROMPT = (
+    "Return JSON only. "
+    "Keys: contract_type, overview, risks, improvements, key_facts. "
+    "Max 5 risks, max 5 improvements. "
+    "overview should be 200-400 Chinese chars. "
+    "Each risk/improvement should be concrete and not generic. "
+    "If facts_to_verify is given, check each fact against the contract and copy correct values into key_facts."
+)
+
+_AGGRESSIVE_REVIEW_SYSTEM_PROMPT = (
+    "JSON only. "
+    "Schema: {\"contract_type\":\"\",\"overview\":\"\",\"risks\":[],"
+    "\"improvements\":[],\"key_facts\":[]}. "
+    "Chinese only. Arrays max 4 items. "
+    "overview target 200-400 Chinese chars. "
+    "Each risk/improvement should be specific and actionable."
+)
+
+
+@lru_cache(maxsize=4)
+def _review_user_prefix(taxonomy: str) -> str:
+    # 静态部分在前、合同文本在后：vLLM prefix caching 可复用 system + taxonomy 的 KV。
+    return f"taxonomy:\n{taxonomy}\n\n"
+
+
 class LocalVLLMClient(BaseLLMClient):
     name = "local_vllm"
 
@@ -208,21 +266,7 @@ class LocalVLLMClient(BaseLLMClient):
             raise RuntimeError(f"local vllm health probe failed: {exc}") from exc
 
     def _compact_taxonomy(self) -> str:
-        taxonomy = load_taxonomy()
-        if not isinstance(taxonomy, dict):
-            return "{}"
-        small_ctx = self.cfg.input_char_limit <= 1200
-        max_types = 6 if small_ctx else 10
-        max_labels = 4 if small_ctx else 8
-        compact: Dict[str, List[str]] = {}
-        for idx, (k, v) in enumerate(taxonomy.items()):
-            if idx >= max_types:
-                break
-            if isinstance(v, list):
-                compact[str(k)] = [str(x) for x in v[:max_labels]]
-            else:
-                compact[str(k)] = [str(v)]
-        return json.dumps(compact, ensure_ascii=False)
+        return _compact_taxonomy_json(self.cfg.input_char_limit <= 1200)
 
     def _segment_for_small_context(self, text: str) -> str:
         src = (text or "").strip()
@@ -350,20 +394,11 @@ class LocalVLLMClient(BaseLLMClient):
         compact_text: str,
         taxonomy: str,
         aggressive: bool = False,
+        fact_hints: str = "",
     ) -> List[Dict[str, str]]:
         if aggressive:
             return [
-                {
-                    "role": "system",
-                    "content": (
-                        "JSON only. "
-                        "Schema: {\"contract_type\":\"\",\"overview\":\"\",\"risks\":[],"
-                        "\"improvements\":[],\"key_facts\":[]}. "
-                        "Chinese only. Arrays max 4 items. "
-                        "overview target 200-400 Chinese chars. "
-                        "Each risk/improvement should be specific and actionable."
-                    ),
-                },
+                {"role": "system", "content": _AGGRESSIVE_REVIEW_SYSTEM_PROMPT},
                 {
                     "role": "user",
                     "content": (
@@ -375,23 +410,13 @@ class LocalVLLMClient(BaseLLMClient):
             ]
 
         return [
-            {
-                "role": "system",
-                "content": (
-                    "Return JSON only. "
-                    "Keys: contract_type, overview, risks, improvements, key_facts. "
-                    "Max 5 risks, max 5 improvements. "
-                    "overview should be 200-400 Chinese chars. "
-                    "Each risk/improvement should be concrete and not generic."
-                ),
-            },
+            {"role": "system", "content": _REVIEW_SYSTEM_PROMPT},
             {
                 "role": "user",
                 "content": (
-                    "taxonomy:\n"
-                    f"{taxonomy}\n\n"
-                    "contract_markdown:\n"
-                    f"{compact_text}"
+                    _review_user_prefix(taxonomy)
+                    + (f"facts_to_verify:\n{fact_hints}\n\n" if fact_hints else "")
+                    + f"contract_markdown:\n{compact_text}"
                 ),
             },
         ]
@@ -456,68 +481,8 @@ class LocalVLLMClient(BaseLLMClient):
                 out[k] = v[:80]
         return out
 
-    def _rule_extract(self, patterns: List[str], text: str, default: str = "未提及") -> str:
-        src = text or ""
-        for pattern in patterns:
-            m = re.search(pattern, src, re.IGNORECASE)
-            if not m:
-                continue
-            value = (m.group(1) if m.lastindex else m.group(0)).strip()
-            value = re.sub(r"\s+", " ", value)
-            if value:
-                return value[:120]
-        return default
-
-    def _contains_any(self, text: str, keywords: List[str]) -> bool:
-        src = text or ""
-        for kw in keywords:
-            if kw and kw in src:
-                return True
-        return False
-
-    def _guess_contract_name(self, text: str) -> str:
-        lines = [re.sub(r"\s+", " ", line.strip()) for line in (text or "").splitlines()]
-        lines = [line for line in lines if len(line) >= 4]
-        if not lines:
-            return "未提及"
-
-        explicit_name_patterns = [
-            re.compile(r"[《<【][^》>】]{2,80}(?:合同|协议)[》>】]"),
-            re.compile(r"(?:^|[\s:：])([^\n\r]{2,80}(?:合同|协议))$"),
-        ]
-
-        for line in lines[:60]:
-            if re.search(r"合同编号|项目编号|招标编号|采购编号", line):
-                continue
-            for pattern in explicit_name_patterns:
-                m = pattern.search(line)
-                if m:
-                    value = (m.group(1) if m.lastindex else m.group(0)).strip()
-                    if value:
-                        return value[:80]
-
-        for line in lines[:80]:
-            if "合同" in line and len(line) <= 80 and not re.search(r"合同编号|项目编号|招标编号|采购编号", line):
-                return line[:80]
-        return "未提及"
-
     def _guess_contract_type(self, text: str) -> str:
-        src = text or ""
-        rules = [
-            ("政府采购", "政府采购服务合同"),
-            ("技术服务", "技术服务合同"),
-            ("服务", "服务合同"),
-            ("采购", "采购合同"),
-            ("租赁", "租赁合同"),
-            ("劳动", "劳动合同"),
-            ("保密", "保密协议"),
-            ("授权", "授权许可合同"),
-            ("合作", "合作协议"),
-        ]
-        for kw, label in rules:
-            if kw in src:
-                return label
-        return "未知/其他"
+        return scan_text(text or "").guess_contract_type()
 
     def _map_type_l1(self, contract_type: str) -> str:
         t = (contract_type or "").strip()
@@ -543,33 +508,9 @@ class LocalVLLMClient(BaseLLMClient):
         src = text or ""
         if not src:
             return []
-        keyword_map: Dict[str, List[str]] = {
-            "政府采购服务合同": ["政府采购", "采购人", "成交", "服务类"],
-            "技术服务合同": ["技术服务", "技术支持", "实施服务", "开发服务"],
-            "服务合同": ["服务", "服务内容", "服务标准", "服务期限"],
-            "采购合同": ["采购", "供货", "货物", "设备"],
-            "租赁合同": ["租赁", "租金", "承租", "出租"],
-            "劳动合同": ["劳动", "聘用", "员工", "试用期"],
-            "保密协议": ["保密", "商业秘密", "保密义务"],
-            "授权许可合同": ["授权", "许可", "使用权"],
-            "合作协议": ["合作", "双方合作", "联合"],
-        }
-        keywords = keyword_map.get(contract_type, [contract_type]) if contract_type else []
-        evidence: List[Dict[str, str]] = []
-        for kw in keywords:
-            if not kw:
-                continue
-            idx = src.find(kw)
-            if idx < 0:
-                continue
-            left = max(0, idx - 14)
-            right = min(len(src), idx + len(kw) + 26)
-            quote = re.sub(r"\s+", " ", src[left:right]).strip()
-            if quote:
-                evidence.append({"quote": quote[:80], "where": "规则命中"})
-            if len(evidence) >= 3:
-                break
-        return evidence
+        keywords = TYPE_EVIDENCE_KEYWORDS.get(contract_type, (contract_type,)) if contract_type else ()
+        quotes = scan_text(src).snippets(keywords, before=14, after=26, max_len=80, limit=3)
+        return [{"quote": quote, "where": "规则命中"} for quote in quotes]
 
     def _build_rule_type_detail(
         self,
@@ -610,32 +551,14 @@ class LocalVLLMClient(BaseLLMClient):
 
     def _build_rule_based_review(self, contract_text: str) -> Dict[str, Any]:
         src = (contract_text or "").strip()
-        contract_type = self._guess_contract_type(src)
-        contract_name = self._guess_contract_name(src)
-        party_a = self._rule_extract(
-            [r"甲方[：:]\s*([^\n\r]{2,80})", r"采购人[：:]\s*([^\n\r]{2,80})"],
-            src,
-        )
-        party_b = self._rule_extract(
-            [r"乙方[：:]\s*([^\n\r]{2,80})", r"供应商[：:]\s*([^\n\r]{2,80})"],
-            src,
-        )
-        amount = self._rule_extract(
-            [
-                r"总金额[^¥\n\r]{0,20}(¥\s*[\d,]+(?:\.\d+)?)",
-                r"合计金额[^¥\n\r]{0,20}(¥\s*[\d,]+(?:\.\d+)?)",
-                r"(人民币[^\n\r]{4,40})",
-            ],
-            src,
-        )
-        term = self._rule_extract(
-            [
-                r"服务完成时间[：:]\s*([^\n\r]{4,80})",
-                r"(20\d{2}年\d{1,2}月\d{1,2}日\s*[-至到]+\s*20\d{2}年\d{1,2}月\d{1,2}日)",
-                r"(期限[：:]\s*[^\n\r]{2,60})",
-            ],
-            src,
-        )
+        scan = scan_text(src)
+        contract_type = scan.guess_contract_type()
+        facts = build_fact_index(src).key_facts()
+        contract_name = facts["合同名称"]
+        party_a = facts["甲方"]
+        party_b = facts["乙方"]
+        amount = facts["金额"]
+        term = facts["期限"]
         type_detail = self._build_rule_type_detail(
             contract_type=contract_type,
             contract_name=contract_name,
@@ -653,35 +576,11 @@ class LocalVLLMClient(BaseLLMClient):
         seen_risk_keys: set[str] = set()
         seen_improve_keys: set[str] = set()
 
-        def _evidence_from_keywords(keywords: List[str], max_len: int = 88) -> str:
-            if not src:
-                return ""
-            for kw in keywords:
-                if not kw:
-                    continue
-                idx = src.find(kw)
-                if idx < 0:
-                    continue
-                left = max(0, idx - 20)
-                right = min(len(src), idx + len(kw) + 36)
-                snippet = re.sub(r"\s+", " ", src[left:right]).strip()
-                if snippet:
-                    return snippet[:max_len]
-            return ""
-
-        def _add_finding(
-            *,
-            title: str,
-            level: str,
-            risk_core: str,
-            suggestion_core: str,
-            evidence_keywords: List[str],
-            missing_keywords: List[str] | None = None,
-        ) -> None:
-            evidence = _evidence_from_keywords(evidence_keywords)
-            if not evidence and missing_keywords:
-                evidence = "未检索到关键词：" + "/".join(missing_keywords)
-            risk_text = risk_core.strip()
+        def _add_finding(rule: ReviewRule) -> None:
+            evidence = scan.snippet(rule.evidence_keywords, before=20, after=36, max_len=88)
+            if not evidence and rule.missing_keywords:
+                evidence = "未检索到关键词：" + "/".join(rule.missing_keywords)
+            risk_text = rule.risk.strip()
             if evidence:
                 risk_text = f"{risk_text}（证据：{evidence}）"
             risk_key = re.sub(r"\s+", "", risk_text).lower()
@@ -689,14 +588,14 @@ class LocalVLLMClient(BaseLLMClient):
                 seen_risk_keys.add(risk_key)
                 risks_struct.append(
                     {
-                        "title": title[:32] or "风险点",
-                        "level": (level or "中")[:8],
+                        "title": rule.title[:32] or "风险点",
+                        "level": (rule.level or "中")[:8],
                         "problem": risk_text[:260],
                         "suggestion": "",
                     }
                 )
 
-            suggestion_text = suggestion_core.strip()
+            suggestion_text = rule.suggestion.strip()
             improve_key = re.sub(r"\s+", "", suggestion_text).lower()
             if improve_key and improve_key not in seen_improve_keys:
                 seen_improve_keys.add(improve_key)
@@ -708,221 +607,17 @@ class LocalVLLMClient(BaseLLMClient):
                     }
                 )
 
-        has_payment = self._contains_any(src, ["付款", "支付", "结算"])
-        has_payment_schedule = bool(
-            re.search(
-                r"(?:付款|支付|结算)[^\n\r]{0,28}(?:工作日|发票|验收|节点|比例|一次性|分期|按月|按季度|尾款|预付款|到账|银行账户)",
-                src,
-            )
-        )
-        has_dispute_route = self._contains_any(src, ["争议解决", "管辖法院", "人民法院", "仲裁", "仲裁委员会"])
-        dispute_is_specific = bool(re.search(r"(?:仲裁委员会|人民法院|法院)", src))
-        has_acceptance = self._contains_any(src, ["验收", "考核"])
-        has_acceptance_detail = self._contains_any(src, ["验收标准", "不合格", "整改", "复验", "考核指标", "验收结果"])
-        has_subcontract_clause = self._contains_any(src, ["转包", "分包", "委托第三方", "第三方履约"])
-        has_tax_invoice = self._contains_any(src, ["税率", "含税", "发票", "增值税"])
-        has_force_majeure = self._contains_any(src, ["不可抗力"])
-        has_termination = self._contains_any(src, ["解除", "终止"])
-        has_data_security = self._contains_any(src, ["数据", "个人信息", "信息安全", "网络安全", "保密"])
-        has_service_scene = self._contains_any(src, ["服务", "运营", "平台", "用户", "新媒体"])
-        has_penalty_clause = self._contains_any(src, ["违约责任", "违约", "违约金", "赔偿"])
-        has_penalty_formula = bool(re.search(r"(?:违约金|赔偿)[^\n\r]{0,20}(?:%|千分之|万分之|元|按日|按月|上限)", src))
-        has_change_clause = self._contains_any(src, ["变更", "调整", "补充协议", "需求变更"])
-        has_handover_clause = self._contains_any(src, ["交接", "移交", "归档", "交付物", "源文件"])
-        has_external_dependency = self._contains_any(src, ["按照采购文件要求", "按采购文件要求", "按招标文件", "见附件"])
-        has_liability_cap = self._contains_any(src, ["赔偿上限", "责任上限", "最高不超过", "上限"])
-        placeholder_amount = bool(re.search(r"(?:\bY元\b|Y元\)|[¥￥]\s*Y\b)", src, re.IGNORECASE))
-        vague_service_requirement = src.count("根据要求") >= 2 or src.count("按照采购文件要求") >= 1
-
-        if placeholder_amount:
-            _add_finding(
-                title="价款条款可执行性不足",
-                level="高",
-                risk_core="合同价款字段包含占位符（如Y元），付款依据和最终结算金额不具备直接执行条件。",
-                suggestion_core="将占位金额替换为明确数字，并同步写明计价依据、税费口径、开票条件和对应付款节点。",
-                evidence_keywords=["Y元", "价款", "金额", "总金额", "合计金额"],
-            )
-        if has_payment and not has_payment_schedule:
-            _add_finding(
-                title="付款触发条件不清",
-                level="高",
-                risk_core="付款条款虽已出现，但未明确“何时付、按何依据付、逾期如何处理”，容易在结算节点产生争议。",
-                suggestion_core="补充付款触发条件（验收通过/资料齐备）、具体时点（X个工作日内）、逾期利息与拒付处理流程。",
-                evidence_keywords=["付款", "支付", "结算"],
-            )
-        if has_acceptance and not has_acceptance_detail:
-            _add_finding(
-                title="验收标准粒度不足",
-                level="中",
-                risk_core="验收条款存在但缺少量化标准、整改时限和复验机制，导致“是否合格”缺乏统一口径。",
-                suggestion_core="按交付物逐项列明验收标准、不合格整改期限、复验流程及验收失败后的责任承担方式。",
-                evidence_keywords=["验收", "考核", "服务标准"],
-            )
-        if has_service_scene and not has_data_security:
-            _add_finding(
-                title="数据与保密边界不完整",
-                level="中",
-                risk_core="合同涉及运营/信息处理场景，但数据使用范围、存储期限和泄露责任边界不够完整，存在合规风险。",
-                suggestion_core="补充数据分类分级、最小必要使用、保存与销毁规则，并明确泄露事件通知时限与违约责任。",
-                evidence_keywords=["服务", "运营", "平台", "数据", "保密"],
-            )
-        if contract_type in {"服务合同", "政府采购服务合同", "技术服务合同"} and not has_subcontract_clause:
-            _add_finding(
-                title="分包约束缺失",
-                level="中",
-                risk_core="服务类合同未明确分包/转包限制及审批路径，关键岗位替换和履约质量控制存在不确定性。",
-                suggestion_core="增加分包前置审批、关键岗位替换告知与交接要求，并约定分包情形下乙方的连带责任。",
-                evidence_keywords=["服务", "履约", "人员", "转包", "分包"],
-                missing_keywords=["转包", "分包"],
-            )
-        if (amount != "未提及" or has_payment) and not has_tax_invoice:
-            _add_finding(
-                title="价税票条款不闭合",
-                level="中",
-                risk_core="合同虽涉及金额或付款，但未形成“含税口径+发票类型+开票时点”的闭环，可能影响财务结算与报销合规。",
-                suggestion_core="明确含税/不含税口径、发票类型与税率、开票条件和开票时限，并约定发票异常时的处理方案。",
-                evidence_keywords=["金额", "付款", "发票", "税率", "含税"],
-            )
-        if not has_dispute_route:
-            _add_finding(
-                title="争议解决路径缺失",
-                level="高",
-                risk_core="未明确争议解决方式与管辖机构，纠纷发生后可能出现程序性拉扯和维权成本上升。",
-                suggestion_core="明确争议解决路径（诉讼或仲裁）及具体管辖法院/仲裁委员会，并约定适用法律条款。",
-                evidence_keywords=["争议", "仲裁", "法院"],
-                missing_keywords=["争议解决", "管辖法院", "仲裁"],
-            )
-        elif not dispute_is_specific:
-            _add_finding(
-                title="争议条款不够具体",
-                level="中",
-                risk_core="虽有争议处理表述，但未指向具体法院或仲裁机构，执行阶段仍可能产生管辖异议。",
-                suggestion_core="将争议条款细化至具体法院或仲裁委员会，并补充送达地址和电子送达约定。",
-                evidence_keywords=["争议", "仲裁", "法院"],
-            )
-        if has_penalty_clause and not has_penalty_formula:
-            _add_finding(
-                title="违约责任量化不足",
-                level="中",
-                risk_core="违约责任虽有原则性表述，但违约金计算口径或赔偿上限不清，难以直接用于追责。",
-                suggestion_core="补充违约金计算方式（比例/日罚则）、赔偿范围与上限、损失举证与扣款顺序。",
-                evidence_keywords=["违约", "赔偿", "违约责任"],
-            )
-        elif not has_penalty_clause:
-            _add_finding(
-                title="违约条款缺失",
-                level="高",
-                risk_core="合同未形成完整违约责任体系，无法对迟延履行、质量不达标等情形进行有效约束。",
-                suggestion_core="补齐违约定义、违约金标准、损失赔偿与解除条件，建立完整违约追责链路。",
-                evidence_keywords=["违约", "赔偿", "违约责任"],
-                missing_keywords=["违约责任", "违约金", "赔偿"],
-            )
-        if not has_change_clause:
-            _add_finding(
-                title="变更管理机制不清",
-                level="中",
-                risk_core="未明确需求变更、服务范围调整和费用变更的审批流程，后续容易出现追加工作与费用争议。",
-                suggestion_core="补充变更申请、评审、确认和生效流程，并约定变更对应的工期与费用调整规则。",
-                evidence_keywords=["变更", "调整", "补充协议", "服务范围"],
-                missing_keywords=["变更", "补充协议"],
-            )
-        if not has_handover_clause and has_service_scene:
-            _add_finding(
-                title="成果交接约定不足",
-                level="中",
-                risk_core="合同对服务成果、过程文档和账号权限交接要求不完整，可能影响项目切换与后续持续运营。",
-                suggestion_core="明确交付清单、交接时点、交接验收标准及交接失败责任，必要时约定源文件与数据回迁义务。",
-                evidence_keywords=["交付", "成果", "交接", "源文件", "账号"],
-                missing_keywords=["交接", "移交", "交付物"],
-            )
-        if has_external_dependency:
-            _add_finding(
-                title="核心标准外部依赖较强",
-                level="中",
-                risk_core="多处以“按采购文件/招标文件要求”为准，合同正文自足性不足，执行时可能出现解释分歧。",
-                suggestion_core="将关键服务标准、验收口径、时限和违约触发条件写入合同正文，降低对外部文件的解释依赖。",
-                evidence_keywords=["按照采购文件要求", "按采购文件要求", "按招标文件", "见附件"],
-            )
-        if not has_liability_cap:
-            _add_finding(
-                title="赔偿边界未封顶",
-                level="中",
-                risk_core="未见明确责任上限或赔偿边界设置，极端争议场景下赔偿敞口不可控。",
-                suggestion_core="约定赔偿责任上限、间接损失排除条款及可主张损失范围，控制法律与财务敞口。",
-                evidence_keywords=["赔偿", "责任", "上限", "违约"],
-                missing_keywords=["责任上限", "赔偿上限"],
-            )
-        if vague_service_requirement:
-            _add_finding(
-                title="服务要求表述偏笼统",
-                level="中",
-                risk_core="条款存在“根据要求”等模糊表达，未细化至可核验指标，可能导致交付与验收标准不一致。",
-                suggestion_core="将抽象要求拆解为可量化KPI（频次、时效、质量阈值）并绑定验收证据留存方式。",
-                evidence_keywords=["根据要求", "按要求", "服务要求", "服务标准"],
-            )
-        if not has_force_majeure:
-            _add_finding(
-                title="不可抗力条款不足",
-                level="中",
-                risk_core="未形成完整不可抗力处理机制，突发事件下免责边界、通知义务和恢复履行规则不清晰。",
-                suggestion_core="补充不可抗力定义、通知时限、减损义务、恢复履行和费用分担规则。",
-                evidence_keywords=["不可抗力", "免责"],
-                missing_keywords=["不可抗力"],
-            )
-        if not has_termination:
-            _add_finding(
-                title="退出机制不完整",
-                level="中",
-                risk_core="提前解除/终止条件和结算方式未充分明确，项目中止时易引发费用与成果归属争议。",
-                suggestion_core="明确单方解除触发条件、通知期、已完成工作量结算规则和成果归属处理方式。",
-                evidence_keywords=["解除", "终止", "结算"],
-                missing_keywords=["解除", "终止"],
-            )
+        for rule in evaluate_rules(scan, contract_type, {"has_amount_fact": amount != "未提及"}):
+            _add_finding(rule)
 
         if not risks_struct:
-            _add_finding(
-                title="关键条款需人工复核",
-                level="中",
-                risk_core="自动规则未识别出高确定性问题，但付款、验收、违约与争议条款仍建议人工逐条核验。",
-                suggestion_core="按“付款-验收-违约-争议”四个维度进行人工复核，并对高风险条款形成修订闭环。",
-                evidence_keywords=["付款", "验收", "违约", "争议"],
-            )
+            _add_finding(EMPTY_RESULT_RULE)
 
         # Keep a minimum actionable set, but do not force a fixed count.
-        if len(risks_struct) < min_items:
-            supplement_pool = [
-                (
-                    "服务边界约定不足",
-                    "中",
-                    "服务范围和成果边界仍存在抽象描述，可能导致“是否完成交付”判断不一致。",
-                    "按模块拆分服务边界，明确每项服务的输入、输出、完成判定和对应责任人。",
-                    ["服务范围", "服务内容", "工作量"],
-                ),
-                (
-                    "履约过程留痕不足",
-                    "中",
-                    "合同未充分约定过程留痕和台账要求，后续举证可能依赖单方材料。",
-                    "增加过程文档、周报/月报、确认邮件与验收记录等留痕要求，作为付款与争议处理依据。",
-                    ["验收", "工作记录", "报告"],
-                ),
-                (
-                    "项目协同机制不清",
-                    "中",
-                    "双方联络、确认与反馈机制不够细，跨部门协作时易出现响应时效争议。",
-                    "补充联络机制、反馈时限、默认确认规则及升级路径，减少沟通层面的执行摩擦。",
-                    ["联系人", "联系方式", "确认"],
-                ),
-            ]
-            for title, level, risk_core, suggestion_core, kws in supplement_pool:
-                if len(risks_struct) >= min_items:
-                    break
-                _add_finding(
-                    title=title,
-                    level=level,
-                    risk_core=risk_core,
-                    suggestion_core=suggestion_core,
-                    evidence_keywords=kws,
-                )
+        for rule in SUPPLEMENT_RULES:
+            if len(risks_struct) >= min_items:
+                break
+            _add_finding(rule)
 
         risks_struct = risks_struct[:max_items]
         improve_struct = improve_struct[:max_items]
@@ -1317,7 +1012,12 @@ class LocalVLLMClient(BaseLLMClient):
             "key_facts": key_facts,
         }
 
-    def _chat_json(self, messages: List[Dict[str, str]], max_tokens: int) -> Dict[str, Any]:
+    def _chat_json(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        on_item: Optional[ItemCallback] = None,
+    ) -> Dict[str, Any]:
         self._preflight_health()
         kwargs = {
             "model": self.cfg.model,
@@ -1332,6 +1032,9 @@ class LocalVLLMClient(BaseLLMClient):
         first_exc: Exception | None = None
 
         try:
+            if self.cfg.stream:
+                # 流式 + 尾部恢复：解析失败直接上抛，不再整包重发第二次请求。
+                return _stream_chat_json(self.client, {"response_format": {"type": "json_object"}, **kwargs}, on_item=on_item)
             resp = self.client.chat.completions.create(
                 response_format={"type": "json_object"},
                 **kwargs,
@@ -1345,8 +1048,12 @@ class LocalVLLMClient(BaseLLMClient):
             if self._is_server_side_failure(exc):
                 self._mark_unhealthy(f"chat json first attempt failed: {exc}")
                 raise RuntimeError(f"local vllm json request failed fast: {exc}") from exc
+            if self.cfg.stream and isinstance(exc, ValueError):
+                raise
 
         try:
+            if self.cfg.stream:
+                return _stream_chat_json(self.client, kwargs, on_item=on_item)
             resp = self.client.chat.completions.create(**kwargs)
             content = self._strip_think_content(resp.choices[0].message.content or "")
             if not content:
@@ -1382,11 +1089,13 @@ class LocalVLLMClient(BaseLLMClient):
                 self._mark_unhealthy(f"chat text failed: {exc}")
             raise
 
-    def review_contract(self, markdown_text: str) -> Dict[str, Any]:
+    def review_contract(self, markdown_text: str, on_item: Optional[ItemCallback] = None) -> Dict[str, Any]:
         source_text = (markdown_text or "").strip()
         compact_text = self._segment_for_small_context(source_text)
         compact_text = _truncate_for_prompt(compact_text, self.cfg.prompt_text_max_chars)
         taxonomy = self._compact_taxonomy()
+        # 小上下文放不下要素清单；窗口足够时让模型核对预抽取要素，减少输出 token。
+        fact_hints = format_fact_hints(build_fact_index(source_text)) if self.cfg.context_window >= 2048 else ""
         attempts = [
             (compact_text, taxonomy, False),
             (_truncate_for_prompt(compact_text, max(160, int(self.cfg.prompt_text_max_chars * 0.85))), "{}", True),
@@ -1399,10 +1108,11 @@ class LocalVLLMClient(BaseLLMClient):
                 compact_text=text_payload,
                 taxonomy=taxonomy_payload,
                 aggressive=aggressive,
+                fact_hints=fact_hints,
             )
             messages, max_tokens = self._fit_messages_to_context(messages, desired_max_tokens)
             try:
-                data = self._chat_json(messages, max_tokens)
+                data = self._chat_json(messages, max_tokens, on_item=on_item)
                 if not isinstance(data, dict):
                     raise ValueError("local vllm response is not json object")
                 merged = self._merge_review_with_rule_hints(data, source_text)
@@ -1494,10 +1204,13 @@ def _build_client_chain() -> Tuple[BaseLLMClient, BaseLLMClient | None]:
     return RemoteLLMClient(), None
 
 
-def review_contract(markdown_text: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+def review_contract(
+    markdown_text: str,
+    on_item: Optional[ItemCallback] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     primary, fallback = _build_client_chain()
     try:
-        return primary.review_contract(markdown_text), {
+        return primary.review_contract(markdown_text, on_item=on_item), {
             "provider": primary.name,
             "fallback_used": False,
         }
@@ -1506,7 +1219,7 @@ def review_contract(markdown_text: str) -> Tuple[Dict[str, Any], Dict[str, Any]]
             raise
         print(f"[llm] primary provider failed: {primary.name} err={first_exc}", flush=True)
         try:
-            data = fallback.review_contract(markdown_text)
+            data = fallback.review_contract(markdown_text, on_item=on_item)
             return data, {
                 "provider": fallback.name,
                 "fallback_used": True,
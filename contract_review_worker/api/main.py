@@ -31,6 +31,7 @@ import re
 import shutil
 import subprocess
 import sys
+import threading
 import time
 import unicodedata
 from functools import lru_cache
@@ -43,7 +44,9 @@ from pydantic import BaseModel
 
 from contract_review_worker.app_config import bootstrap
 from contract_review_worker.celery_app import app as celery_app
+from packages.core_engine.job_state import TERMINAL_STATUSES, write_job_state
 from packages.core_engine.result_contract import build_error_result, merge_stamp_result
+from .callback_channel import CallbackChannel, CallbackRejected
 from .llm_provider import review_contract, fix_ocr_text
 
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -159,36 +162,90 @@ def _callback_url() -> str:
     return url.strip().rstrip("/") + "/"
 
 
-def notify_django(payload: dict) -> None:
-    url = _callback_url()
+def _post_callback(payload: dict) -> None:
     token = (os.environ.get("WORKER_TOKEN") or "").strip()
     headers = {"X-Worker-Token": token} if token else {}
-    attempts = _env_int("WORKER_CALLBACK_RETRY", 3)
-    backoff = float(os.environ.get("WORKER_CALLBACK_BACKOFF", "1") or "1")
     timeout_s = _env_int("WORKER_CALLBACK_TIMEOUT", 20)
+    r = _CALLBACK_SESSION.post(_callback_url(), json=payload, timeout=timeout_s, headers=headers)
+    if r.status_code != 200:
+        msg = f"non-200: {r.status_code} {r.text[:400]}"
+        # 4xx（job 不存在 / token 错误 / 载荷非法）重发也没用
+        if 400 <= r.status_code < 500 and r.status_code not in (408, 429):
+            raise CallbackRejected(msg)
+        raise RuntimeError(msg)
+    logger.info(
+        "[callback] ok: job=%s status=%s progress=%s stage=%s",
+        payload.get("job_id"),
+        payload.get("status"),
+        payload.get("progress"),
+        payload.get("stage"),
+    )
 
-    last_err: Exception | None = None
+
+@lru_cache(maxsize=1)
+def _callback_channel() -> CallbackChannel:
+    spool_dir = (os.environ.get("WORKER_CALLBACK_SPOOL_DIR") or "").strip()
+    return CallbackChannel(
+        send=_post_callback,
+        spool_dir=Path(spool_dir) if spool_dir else BASE_DIR / "worker_out" / "callback_spool",
+        attempts=_env_int("WORKER_CALLBACK_RETRY", 3),
+        backoff=_env_float("WORKER_CALLBACK_BACKOFF", 1.0),
+        spool_retry_s=_env_float("WORKER_CALLBACK_SPOOL_RETRY", 15.0),
+    )
+
+
+def _publish_live_state(payload: dict) -> bool:
+    """running 进度直接写 Redis（job_status 优先读它），不再走 HTTP 落库。"""
+    if str(payload.get("status") or "") in TERMINAL_STATUSES:
+        return False
+    meta = payload.get("meta")
+    return write_job_state(
+        payload.get("job_id"),
+        status=payload.get("status") or "running",
+        progress=payload.get("progress"),
+        stage=payload.get("stage") or "",
+        mode=payload.get("mode"),
+        meta=meta if isinstance(meta, dict) else None,
+    )
+
+
+def notify_django(payload: dict) -> None:
+    # 进度优先写 Redis；Redis 不可用或终态时走 HTTP 回调
+    if _publish_live_state(payload):
+        return
+    # 默认异步：进度按 job 合并，终态不丢、失败落盘；WORKER_CALLBACK_ASYNC=0 回到同步发送
+    if _env_flag("WORKER_CALLBACK_ASYNC", True):
+        _callback_channel().submit(payload)
+        return
+
+    attempts = _env_int("WORKER_CALLBACK_RETRY", 3)
+    backoff = _env_float("WORKER_CALLBACK_BACKOFF", 1.0)
     for i in range(max(attempts, 1)):
         try:
-            r = _CALLBACK_SESSION.post(url, json=payload, timeout=timeout_s, headers=headers)
-            if r.status_code != 200:
-                raise RuntimeError(f"non-200: {r.status_code} {r.text[:400]}")
-            logger.info(
-                "[callback] ok: job=%s status=%s progress=%s stage=%s",
-                payload.get("job_id"),
-                payload.get("status"),
-                payload.get("progress"),
-                payload.get("stage"),
-            )
+            _post_callback(payload)
+            return
+        except CallbackRejected as e:
+            logger.error("[callback] rejected: %s", e)
             return
         except Exception as e:
-            last_err = e
             if i < attempts - 1:
                 time.sleep(backoff * (2**i))
                 continue
             logger.error("[callback] failed after retries: %s", e)
 
 
+def flush_callbacks(timeout_s: Optional[float] = None) -> bool:
+    """等终态回调发出或落盘，避免任务结束后进程退出时丢失。"""
+    if not _env_flag("WORKER_CALLBACK_ASYNC", True):
+        return True
+    if timeout_s is None:
+        timeout_s = _env_float("WORKER_CALLBACK_FLUSH_TIMEOUT", 60.0)
+    ok = _callback_channel().flush(timeout_s)
+    if not ok:
+        logger.warning("[callback] flush timed out after %.1fs", timeout_s)
+    return ok
+
+
 # =========================
 # subprocess runners
 # =========================
@@ -1438,6 +1495,19 @@ def _detect_stamp_yolo_subprocess(page_images: List[Path], work_dir: Path) -> Di
     return data
 
 
+def _detect_stamp_isolated(page_images: List[Path], work_dir: Path) -> Dict[str, Any]:
+    """盖章检测不在 worker 进程内跑：默认走常驻检测进程（模型常驻），连不上时退回一次性子进程。"""
+    runner = (os.environ.get("STAMP_RUNNER") or "daemon").strip().lower()
+    if runner == "daemon":
+        from .stamp_daemon import StampDaemonUnavailable, detect_stamp
+
+        try:
+            return detect_stamp(page_images, timeout=float(_env_int("STAMP_SUBPROCESS_TIMEOUT", 240)))
+        except StampDaemonUnavailable as e:
+            logger.warning("stamp daemon unavailable, falling back to subprocess: %s", e)
+    return _detect_stamp_yolo_subprocess(page_images=page_images, work_dir=work_dir)
+
+
 def _fast_slice_text(text: str) -> Dict[str, Any]:
     max_chars = int(os.environ.get("FAST_MAX_CHARS") or "35000")
     max_lines = int(os.environ.get("FAST_MAX_LINES") or "1200")
@@ -1505,12 +1575,70 @@ def _clip_text_for_llm(text: str) -> tuple[str, Dict[str, Any]]:
 # =========================
 # LLM with timeout
 # =========================
-def _llm_with_timeout(text: str, timeout_s: int) -> tuple[dict, Dict[str, Any]]:
+def _llm_with_timeout(text: str, timeout_s: int, on_item=None) -> tuple[dict, Dict[str, Any]]:
     with concurrent.futures.ThreadPoolExecutor(max_workers=1) as ex:
-        fut = ex.submit(review_contract, text)
+        fut = ex.submit(review_contract, text, on_item)
         return fut.result(timeout=timeout_s)
 
 
+_PARTIAL_RISK_KEYS = ("风险点", "risks", "risk_points")
+
+
+def _partial_review_forwarder(job_id: int, mode: Optional[str], cancelled: threading.Event):
+    """
+    流式审查时把已闭合的风险点/改进措施提前推给 Django（runtime_meta.partial_result）。
+    推送按 LLM_PARTIAL_MIN_INTERVAL 节流；节流期内到达的条目由一次尾随推送补上，最后几条不会丢。
+    """
+    if not _env_flag("LLM_PARTIAL_PROGRESS", True):
+        return None
+    min_interval = max(0.0, _env_float("LLM_PARTIAL_MIN_INTERVAL", 1.0))
+    risks: List[Any] = []
+    improvements: List[Any] = []
+    seen: set = set()
+    lock = threading.Lock()
+    state: Dict[str, Any] = {"last_sent": float("-inf"), "timer": None}
+
+    def _send() -> None:
+        with lock:
+            state["timer"] = None
+            if cancelled.is_set():
+                return
+            state["last_sent"] = time.perf_counter()
+            payload = {
+                "job_id": job_id,
+                "status": "running",
+                "progress": min(88, 80 + len(risks)),
+                "stage": "llm_streaming",
+                "mode": mode,
+                "meta": {"partial_result": {"risks": list(risks), "improvements": list(improvements)}},
+            }
+        notify_django(payload)
+
+    def _on_item(key: str, item: Any) -> None:
+        if cancelled.is_set():
+            return
+        sig = json.dumps(item, ensure_ascii=False, sort_keys=True)
+        with lock:
+            if sig in seen:
+                # 重试时模型会重发同样的条目
+                return
+            seen.add(sig)
+            (risks if key in _PARTIAL_RISK_KEYS else improvements).append(item)
+            if state["timer"] is not None:
+                # 已有一次尾随推送在等待，它发送时会带上这一条
+                return
+            wait = min_interval - (time.perf_counter() - state["last_sent"])
+            if wait > 0:
+                timer = threading.Timer(wait, _send)
+                timer.daemon = True
+                state["timer"] = timer
+                timer.start()
+                return
+        _send()
+
+    return _on_item
+
+
 def _is_retryable_llm_error(exc: Exception) -> bool:
     msg = str(exc).lower()
     retryable_tokens = [
@@ -1528,7 +1656,7 @@ def _is_retryable_llm_error(exc: Exception) -> bool:
     return any(token in msg for token in retryable_tokens)
 
 
-def _llm_with_retry(text: str, timeout_s: int) -> tuple[dict, Dict[str, Any]]:
+def _llm_with_retry(text: str, timeout_s: int, on_item=None) -> tuple[dict, Dict[str, Any]]:
     max_attempts = max(1, _env_int('LLM_RETRY_ATTEMPTS', 2))
     base_backoff = max(0.0, _env_float('LLM_RETRY_BACKOFF_SECONDS', 1.5))
     started = time.perf_counter()
@@ -1536,7 +1664,7 @@ def _llm_with_retry(text: str, timeout_s: int) -> tuple[dict, Dict[str, Any]]:
 
     for attempt in range(1, max_attempts + 1):
         try:
-            review_json, llm_call_meta = _llm_with_timeout(text, timeout_s)
+            review_json, llm_call_meta = _llm_with_timeout(text, timeout_s, on_item)
             meta: Dict[str, Any] = dict(llm_call_meta) if isinstance(llm_call_meta, dict) else {}
             meta.update(
                 {
@@ -1676,6 +1804,15 @@ def _run_accurate(job_id: int, pdf_path: str, out_dir: Path) -> Dict[str, Any]:
 # main pipeline
 # =========================
 def _do_analyze(job_id: int, pdf_path: str, out_root: str):
+    try:
+        _analyze_pipeline(job_id, pdf_path, out_root)
+    finally:
+        flush_callbacks()
+
+
+def _analyze_pipeline(job_id: int, pdf_path: str, out_root: str):
+    if _env_flag("WORKER_CALLBACK_ASYNC", True):
+        _callback_channel().forget(job_id)
     mode = _review_mode()
     pipeline_started = time.perf_counter()
     stage_timings: Dict[str, float] = {}
@@ -1739,7 +1876,7 @@ def _do_analyze(job_id: int, pdf_path: str, out_root: str):
 
                 if stamp_images:
                     notify_django({"job_id": job_id, "status": "running", "progress": 12, "stage": "stamp_start", "mode": mode})
-                    stamp_result = _detect_stamp_yolo_subprocess(
+                    stamp_result = _detect_stamp_isolated(
                         page_images=stamp_images,
                         work_dir=out_dir / "stamp_subprocess",
                     )
@@ -1994,13 +2131,17 @@ def _do_analyze(job_id: int, pdf_path: str, out_root: str):
         notify_django({"job_id": job_id, "status": "running", "progress": 80, "stage": "llm_start", "mode": meta.get("mode"), "meta": meta})
 
         llm_started = time.perf_counter()
+        partial_cancelled = threading.Event()
+        on_item = _partial_review_forwarder(job_id, meta.get("mode"), partial_cancelled)
         try:
-            review_json, llm_call_meta = _llm_with_retry(llm_text, timeout_s)
+            review_json, llm_call_meta = _llm_with_retry(llm_text, timeout_s, on_item)
+            partial_cancelled.set()
             _mark_stage("llm", llm_started)
             meta["llm_call"] = llm_call_meta
             if isinstance(review_json, dict):
                 review_json["_llm_meta"] = llm_call_meta
         except concurrent.futures.TimeoutError:
+            partial_cancelled.set()
             _mark_stage("llm", llm_started)
             stage_timings["total"] = round(max(0.0, time.perf_counter() - pipeline_started), 3)
             meta["stage_timings"] = stage_timings
@@ -2020,6 +2161,7 @@ def _do_analyze(job_id: int, pdf_path: str, out_root: str):
             })
             return
         except Exception as e:
+            partial_cancelled.set()
             _mark_stage("llm", llm_started)
             stage_timings["total"] = round(max(0.0, time.perf_counter() - pipeline_started), 3)
             meta["stage_timings"] = stage_timings
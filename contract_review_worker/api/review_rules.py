@@ -0,0 +1,441 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# =========================
+# 本地规则审查：规则表 + 一次扫描
+# =========================
+# 所有关键词在导入时编译成一个前缀树正则，对合同文本只扫描一遍，
+# 得到每个关键词的首次位置与出现次数；信号、命中规则、证据片段都从这次扫描结果读取。
+
+
+class ReviewRule(NamedTuple):
+    rule_id: str
+    title: str
+    level: str
+    risk: str
+    suggestion: str
+    evidence_keywords: Tuple[str, ...]
+    missing_keywords: Tuple[str, ...] = ()
+    # 触发条件：all_of 全部成立、none_of 全部不成立、any_of 至少一个成立
+    all_of: Tuple[str, ...] = ()
+    none_of: Tuple[str, ...] = ()
+    any_of: Tuple[str, ...] = ()
+    contract_types: Tuple[str, ...] = ()
+
+
+# 关键词信号：任一关键词出现即成立
+KEYWORD_SIGNALS: Dict[str, Tuple[str, ...]] = {
+    "has_payment": ("付款", "支付", "结算"),
+    "has_dispute_route": ("争议解决", "管辖法院", "人民法院", "仲裁", "仲裁委员会"),
+    "dispute_is_specific": ("仲裁委员会", "人民法院", "法院"),
+    "has_acceptance": ("验收", "考核"),
+    "has_acceptance_detail": ("验收标准", "不合格", "整改", "复验", "考核指标", "验收结果"),
+    "has_subcontract_clause": ("转包", "分包", "委托第三方", "第三方履约"),
+    "has_tax_invoice": ("税率", "含税", "发票", "增值税"),
+    "has_force_majeure": ("不可抗力",),
+    "has_termination": ("解除", "终止"),
+    "has_data_security": ("数据", "个人信息", "信息安全", "网络安全", "保密"),
+    "has_service_scene": ("服务", "运营", "平台", "用户", "新媒体"),
+    "has_penalty_clause": ("违约责任", "违约", "违约金", "赔偿"),
+    "has_change_clause": ("变更", "调整", "补充协议", "需求变更"),
+    "has_handover_clause": ("交接", "移交", "归档", "交付物", "源文件"),
+    "has_external_dependency": ("按照采购文件要求", "按采购文件要求", "按招标文件", "见附件"),
+    "has_liability_cap": ("赔偿上限", "责任上限", "最高不超过", "上限"),
+}
+
+# 计数信号：任一 (关键词, 最少次数) 满足即成立
+COUNT_SIGNALS: Dict[str, Tuple[Tuple[str, int], ...]] = {
+    "vague_service_requirement": (("根据要求", 2), ("按照采购文件要求", 1)),
+}
+
+# 结构信号：关键词之间有位置约束，单独预编译
+PATTERN_SIGNALS: Dict[str, "re.Pattern[str]"] = {
+    "has_payment_schedule": re.compile(
+        r"(?:付款|支付|结算)[^\n\r]{0,28}(?:工作日|发票|验收|节点|比例|一次性|分期|按月|按季度|尾款|预付款|到账|银行账户)"
+    ),
+    "has_penalty_formula": re.compile(r"(?:违约金|赔偿)[^\n\r]{0,20}(?:%|千分之|万分之|元|按日|按月|上限)"),
+    "placeholder_amount": re.compile(r"(?:\bY元\b|Y元\)|[¥￥]\s*Y\b)", re.IGNORECASE),
+}
+
+SERVICE_CONTRACT_TYPES = ("服务合同", "政府采购服务合同", "技术服务合同")
+
+REVIEW_RULES: Tuple[ReviewRule, ...] = (
+    ReviewRule(
+        rule_id="placeholder_amount",
+        title="价款条款可执行性不足",
+        level="高",
+        risk="合同价款字段包含占位符（如Y元），付款依据和最终结算金额不具备直接执行条件。",
+        suggestion="将占位金额替换为明确数字，并同步写明计价依据、税费口径、开票条件和对应付款节点。",
+        evidence_keywords=("Y元", "价款", "金额", "总金额", "合计金额"),
+        all_of=("placeholder_amount",),
+    ),
+    ReviewRule(
+        rule_id="payment_trigger",
+        title="付款触发条件不清",
+        level="高",
+        risk="付款条款虽已出现，但未明确“何时付、按何依据付、逾期如何处理”，容易在结算节点产生争议。",
+        suggestion="补充付款触发条件（验收通过/资料齐备）、具体时点（X个工作日内）、逾期利息与拒付处理流程。",
+        evidence_keywords=("付款", "支付", "结算"),
+        all_of=("has_payment",),
+        none_of=("has_payment_schedule",),
+    ),
+    ReviewRule(
+        rule_id="acceptance_detail",
+        title="验收标准粒度不足",
+        level="中",
+        risk="验收条款存在但缺少量化标准、整改时限和复验机制，导致“是否合格”缺乏统一口径。",
+        suggestion="按交付物逐项列明验收标准、不合格整改期限、复验流程及验收失败后的责任承担方式。",
+        evidence_keywords=("验收", "考核", "服务标准"),
+        all_of=("has_acceptance",),
+        none_of=("has_acceptance_detail",),
+    ),
+    ReviewRule(
+        rule_id="data_security",
+        title="数据与保密边界不完整",
+        level="中",
+        risk="合同涉及运营/信息处理场景，但数据使用范围、存储期限和泄露责任边界不够完整，存在合规风险。",
+        suggestion="补充数据分类分级、最小必要使用、保存与销毁规则，并明确泄露事件通知时限与违约责任。",
+        evidence_keywords=("服务", "运营", "平台", "数据", "保密"),
+        all_of=("has_service_scene",),
+        none_of=("has_data_security",),
+    ),
+    ReviewRule(
+        rule_id="subcontract",
+        title="分包约束缺失",
+        level="中",
+        risk="服务类合同未明确分包/转包限制及审批路径，关键岗位替换和履约质量控制存在不确定性。",
+        suggestion="增加分包前置审批、关键岗位替换告知与交接要求，并约定分包情形下乙方的连带责任。",
+        evidence_keywords=("服务", "履约", "人员", "转包", "分包"),
+        missing_keywords=("转包", "分包"),
+        none_of=("has_subcontract_clause",),
+        contract_types=SERVICE_CONTRACT_TYPES,
+    ),
+    ReviewRule(
+        rule_id="tax_invoice",
+        title="价税票条款不闭合",
+        level="中",
+        risk="合同虽涉及金额或付款，但未形成“含税口径+发票类型+开票时点”的闭环，可能影响财务结算与报销合规。",
+        suggestion="明确含税/不含税口径、发票类型与税率、开票条件和开票时限，并约定发票异常时的处理方案。",
+        evidence_keywords=("金额", "付款", "发票", "税率", "含税"),
+        any_of=("has_amount_fact", "has_payment"),
+        none_of=("has_tax_invoice",),
+    ),
+    ReviewRule(
+        rule_id="dispute_missing",
+        title="争议解决路径缺失",
+        level="高",
+        risk="未明确争议解决方式与管辖机构，纠纷发生后可能出现程序性拉扯和维权成本上升。",
+        suggestion="明确争议解决路径（诉讼或仲裁）及具体管辖法院/仲裁委员会，并约定适用法律条款。",
+        evidence_keywords=("争议", "仲裁", "法院"),
+        missing_keywords=("争议解决", "管辖法院", "仲裁"),
+        none_of=("has_dispute_route",),
+    ),
+    ReviewRule(
+        rule_id="dispute_vague",
+        title="争议条款不够具体",
+        level="中",
+        risk="虽有争议处理表述，但未指向具体法院或仲裁机构，执行阶段仍可能产生管辖异议。",
+        suggestion="将争议条款细化至具体法院或仲裁委员会，并补充送达地址和电子送达约定。",
+        evidence_keywords=("争议", "仲裁", "法院"),
+        all_of=("has_dispute_route",),
+        none_of=("dispute_is_specific",),
+    ),
+    ReviewRule(
+        rule_id="penalty_formula",
+        title="违约责任量化不足",
+        level="中",
+        risk="违约责任虽有原则性表述，但违约金计算口径或赔偿上限不清，难以直接用于追责。",
+        suggestion="补充违约金计算方式（比例/日罚则）、赔偿范围与上限、损失举证与扣款顺序。",
+        evidence_keywords=("违约", "赔偿", "违约责任"),
+        all_of=("has_penalty_clause",),
+        none_of=("has_penalty_formula",),
+    ),
+    ReviewRule(
+        rule_id="penalty_missing",
+        title="违约条款缺失",
+        level="高",
+        risk="合同未形成完整违约责任体系，无法对迟延履行、质量不达标等情形进行有效约束。",
+        suggestion="补齐违约定义、违约金标准、损失赔偿与解除条件，建立完整违约追责链路。",
+        evidence_keywords=("违约", "赔偿", "违约责任"),
+        missing_keywords=("违约责任", "违约金", "赔偿"),
+        none_of=("has_penalty_clause",),
+    ),
+    ReviewRule(
+        rule_id="change_management",
+        title="变更管理机制不清",
+        level="中",
+        risk="未明确需求变更、服务范围调整和费用变更的审批流程，后续容易出现追加工作与费用争议。",
+        suggestion="补充变更申请、评审、确认和生效流程，并约定变更对应的工期与费用调整规则。",
+        evidence_keywords=("变更", "调整", "补充协议", "服务范围"),
+        missing_keywords=("变更", "补充协议"),
+        none_of=("has_change_clause",),
+    ),
+    ReviewRule(
+        rule_id="handover",
+        title="成果交接约定不足",
+        level="中",
+        risk="合同对服务成果、过程文档和账号权限交接要求不完整，可能影响项目切换与后续持续运营。",
+        suggestion="明确交付清单、交接时点、交接验收标准及交接失败责任，必要时约定源文件与数据回迁义务。",
+        evidence_keywords=("交付", "成果", "交接", "源文件", "账号"),
+        missing_keywords=("交接", "移交", "交付物"),
+        all_of=("has_service_scene",),
+        none_of=("has_handover_clause",),
+    ),
+    ReviewRule(
+        rule_id="external_dependency",
+        title="核心标准外部依赖较强",
+        level="中",
+        risk="多处以“按采购文件/招标文件要求”为准，合同正文自足性不足，执行时可能出现解释分歧。",
+        suggestion="将关键服务标准、验收口径、时限和违约触发条件写入合同正文，降低对外部文件的解释依赖。",
+        evidence_keywords=("按照采购文件要求", "按采购文件要求", "按招标文件", "见附件"),
+        all_of=("has_external_dependency",),
+    ),
+    ReviewRule(
+        rule_id="liability_cap",
+        title="赔偿边界未封顶",
+        level="中",
+        risk="未见明确责任上限或赔偿边界设置，极端争议场景下赔偿敞口不可控。",
+        suggestion="约定赔偿责任上限、间接损失排除条款及可主张损失范围，控制法律与财务敞口。",
+        evidence_keywords=("赔偿", "责任", "上限", "违约"),
+        missing_keywords=("责任上限", "赔偿上限"),
+        none_of=("has_liability_cap",),
+    ),
+    ReviewRule(
+        rule_id="vague_requirement",
+        title="服务要求表述偏笼统",
+        level="中",
+        risk="条款存在“根据要求”等模糊表达，未细化至可核验指标，可能导致交付与验收标准不一致。",
+        suggestion="将抽象要求拆解为可量化KPI（频次、时效、质量阈值）并绑定验收证据留存方式。",
+        evidence_keywords=("根据要求", "按要求", "服务要求", "服务标准"),
+        all_of=("vague_service_requirement",),
+    ),
+    ReviewRule(
+        rule_id="force_majeure",
+        title="不可抗力条款不足",
+        level="中",
+        risk="未形成完整不可抗力处理机制，突发事件下免责边界、通知义务和恢复履行规则不清晰。",
+        suggestion="补充不可抗力定义、通知时限、减损义务、恢复履行和费用分担规则。",
+        evidence_keywords=("不可抗力", "免责"),
+        missing_keywords=("不可抗力",),
+        none_of=("has_force_majeure",),
+    ),
+    ReviewRule(
+        rule_id="termination",
+        title="退出机制不完整",
+        level="中",
+        risk="提前解除/终止条件和结算方式未充分明确，项目中止时易引发费用与成果归属争议。",
+        suggestion="明确单方解除触发条件、通知期、已完成工作量结算规则和成果归属处理方式。",
+        evidence_keywords=("解除", "终止", "结算"),
+        missing_keywords=("解除", "终止"),
+        none_of=("has_termination",),
+    ),
+)
+
+# 规则全部未命中时的兜底项
+EMPTY_RESULT_RULE = ReviewRule(
+    rule_id="manual_review",
+    title="关键条款需人工复核",
+    level="中",
+    risk="自动规则未识别出高确定性问题，但付款、验收、违约与争议条款仍建议人工逐条核验。",
+    suggestion="按“付款-验收-违约-争议”四个维度进行人工复核，并对高风险条款形成修订闭环。",
+    evidence_keywords=("付款", "验收", "违约", "争议"),
+)
+
+# 命中条数不足 min_items 时按顺序补充
+SUPPLEMENT_RULES: Tuple[ReviewRule, ...] = (
+    ReviewRule(
+        rule_id="service_boundary",
+        title="服务边界约定不足",
+        level="中",
+        risk="服务范围和成果边界仍存在抽象描述，可能导致“是否完成交付”判断不一致。",
+        suggestion="按模块拆分服务边界，明确每项服务的输入、输出、完成判定和对应责任人。",
+        evidence_keywords=("服务范围", "服务内容", "工作量"),
+    ),
+    ReviewRule(
+        rule_id="performance_trace",
+        title="履约过程留痕不足",
+        level="中",
+        risk="合同未充分约定过程留痕和台账要求，后续举证可能依赖单方材料。",
+        suggestion="增加过程文档、周报/月报、确认邮件与验收记录等留痕要求，作为付款与争议处理依据。",
+        evidence_keywords=("验收", "工作记录", "报告"),
+    ),
+    ReviewRule(
+        rule_id="collaboration",
+        title="项目协同机制不清",
+        level="中",
+        risk="双方联络、确认与反馈机制不够细，跨部门协作时易出现响应时效争议。",
+        suggestion="补充联络机制、反馈时限、默认确认规则及升级路径，减少沟通层面的执行摩擦。",
+        evidence_keywords=("联系人", "联系方式", "确认"),
+    ),
+)
+
+# 合同类型判定（按顺序，先命中先得）
+CONTRACT_TYPE_RULES: Tuple[Tuple[str, str], ...] = (
+    ("政府采购", "政府采购服务合同"),
+    ("技术服务", "技术服务合同"),
+    ("服务", "服务合同"),
+    ("采购", "采购合同"),
+    ("租赁", "租赁合同"),
+    ("劳动", "劳动合同"),
+    ("保密", "保密协议"),
+    ("授权", "授权许可合同"),
+    ("合作", "合作协议"),
+)
+
+TYPE_EVIDENCE_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "政府采购服务合同": ("政府采购", "采购人", "成交", "服务类"),
+    "技术服务合同": ("技术服务", "技术支持", "实施服务", "开发服务"),
+    "服务合同": ("服务", "服务内容", "服务标准", "服务期限"),
+    "采购合同": ("采购", "供货", "货物", "设备"),
+    "租赁合同": ("租赁", "租金", "承租", "出租"),
+    "劳动合同": ("劳动", "聘用", "员工", "试用期"),
+    "保密协议": ("保密", "商业秘密", "保密义务"),
+    "授权许可合同": ("授权", "许可", "使用权"),
+    "合作协议": ("合作", "双方合作", "联合"),
+}
+
+
+def _all_keywords() -> List[str]:
+    words = set()
+    for kws in KEYWORD_SIGNALS.values():
+        words.update(kws)
+    for pairs in COUNT_SIGNALS.values():
+        words.update(kw for kw, _ in pairs)
+    for rule in REVIEW_RULES + SUPPLEMENT_RULES + (EMPTY_RESULT_RULE,):
+        words.update(rule.evidence_keywords)
+    words.update(kw for kw, _ in CONTRACT_TYPE_RULES)
+    for kws in TYPE_EVIDENCE_KEYWORDS.values():
+        words.update(kws)
+    return sorted(w for w in words if w)
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def _walk(node: Dict[str, dict]) -> str:
+        is_end = "" in node
+        branches = [re.escape(ch) + _walk(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if is_end:
+            # 贪婪可选：同一起点优先匹配更长的关键词
+            return "(?:" + body + ")?"
+        return body
+
+    return _walk(trie)
+
+
+_KEYWORDS = _all_keywords()
+_KEYWORD_RE = re.compile(_trie_pattern(_KEYWORDS))
+# 同一起点只返回最长关键词，这里补上它的所有前缀关键词（如“违约责任”→“违约”）。
+_PREFIX_CLOSURE: Dict[str, Tuple[str, ...]] = {
+    word: tuple(other for other in _KEYWORDS if word.startswith(other)) for word in _KEYWORDS
+}
+_WS_RE = re.compile(r"\s+")
+
+
+class RuleScan:
+    """一次扫描的结果：关键词首次位置、出现次数与信号。"""
+
+    __slots__ = ("text", "first_pos", "counts", "signals")
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.first_pos: Dict[str, int] = {}
+        self.counts: Dict[str, int] = {}
+        search = _KEYWORD_RE.search
+        m = search(text)
+        while m is not None:
+            pos = m.start()
+            for word in _PREFIX_CLOSURE.get(m.group(0), ()):
+                self.counts[word] = self.counts.get(word, 0) + 1
+                if word not in self.first_pos:
+                    self.first_pos[word] = pos
+            # 从下一个字符继续，保证关键词之间可以互相重叠（如“赔偿上限”与“上限”）。
+            m = search(text, pos + 1)
+
+        signals: Dict[str, bool] = {}
+        for name, kws in KEYWORD_SIGNALS.items():
+            signals[name] = any(kw in self.first_pos for kw in kws)
+        for name, pairs in COUNT_SIGNALS.items():
+            signals[name] = any(self.counts.get(kw, 0) >= n for kw, n in pairs)
+        for name, pattern in PATTERN_SIGNALS.items():
+            signals[name] = bool(pattern.search(text))
+        self.signals = signals
+
+    def has(self, keyword: str) -> bool:
+        return keyword in self.first_pos
+
+    def find(self, keyword: str) -> int:
+        """关键词首次位置；不在预编译词表里的关键词（如按合同类型名兜底）退回 str.find。"""
+        if keyword in _PREFIX_CLOSURE:
+            return self.first_pos.get(keyword, -1)
+        return self.text.find(keyword) if keyword else -1
+
+    def snippet(self, keywords: Iterable[str], before: int, after: int, max_len: int) -> str:
+        """按关键词顺序取第一个命中的上下文片段。"""
+        src = self.text
+        for kw in keywords:
+            idx = self.find(kw)
+            if idx < 0:
+                continue
+            left = max(0, idx - before)
+            right = min(len(src), idx + len(kw) + after)
+            snippet = _WS_RE.sub(" ", src[left:right]).strip()
+            if snippet:
+                return snippet[:max_len]
+        return ""
+
+    def snippets(self, keywords: Iterable[str], before: int, after: int, max_len: int, limit: int) -> List[str]:
+        out: List[str] = []
+        for kw in keywords:
+            snippet = self.snippet((kw,), before, after, max_len)
+            if snippet:
+                out.append(snippet)
+            if len(out) >= limit:
+                break
+        return out
+
+    def guess_contract_type(self) -> str:
+        for kw, label in CONTRACT_TYPE_RULES:
+            if kw in self.first_pos:
+                return label
+        return "未知/其他"
+
+
+@lru_cache(maxsize=8)
+def scan_text(text: str) -> RuleScan:
+    # 同一份合同在一次审查里会被多次评估（规则审查 + 合并提示），按文本缓存扫描结果。
+    return RuleScan(text or "")
+
+
+def _rule_matches(rule: ReviewRule, signals: Dict[str, bool], contract_type: str) -> bool:
+    if rule.contract_types and contract_type not in rule.contract_types:
+        return False
+    if any(not signals.get(name, False) for name in rule.all_of):
+        return False
+    if any(signals.get(name, False) for name in rule.none_of):
+        return False
+    if rule.any_of and not any(signals.get(name, False) for name in rule.any_of):
+        return False
+    return True
+
+
+def evaluate_rules(
+    scan: RuleScan,
+    contract_type: str,
+    extra_signals: Optional[Dict[str, bool]] = None,
+) -> List[ReviewRule]:
+    signals = dict(scan.signals)
+    if extra_signals:
+        signals.update(extra_signals)
+    return [rule for rule in REVIEW_RULES if _rule_matches(rule, signals, contract_type)]
@@ -0,0 +1,440 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+
+logger = logging.getLogger("contract_review_worker.stamp_daemon")
+
+# =========================
+# 常驻盖章检测进程
+# =========================
+# 以前每个任务起一次 stamp_subprocess：重新 import torch / ultralytics、重新加载权重，单次要几秒。
+# 现在检测跑在一个常驻进程里（模型常驻），worker 通过本机 TCP 发一行 JSON（只带页面图片路径），
+# 收一行 JSON 结果。进程隔离保持不变：检测进程崩溃只会断开这次连接，下一次调用时自动重新拉起；
+# 单次检测超时（从出队开始计时）由检测进程内的看门狗结束整个进程，与原来超时杀子进程等价。
+
+_MAX_LINE = 4 * 1024 * 1024
+_SPAWN_LOCK = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name, "")
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except Exception:
+        return default
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    raw = os.environ.get(name, "")
+    if not raw:
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+def daemon_address() -> tuple:
+    host = (os.environ.get("STAMP_DAEMON_HOST") or "127.0.0.1").strip() or "127.0.0.1"
+    return host, _env_int("STAMP_DAEMON_PORT", 18765)
+
+
+def pidfile_path() -> Path:
+    raw = (os.environ.get("STAMP_DAEMON_PIDFILE") or "").strip()
+    if raw:
+        return Path(raw)
+    return Path(tempfile.gettempdir()) / f"contract_review_stamp_daemon.{daemon_address()[1]}.pid"
+
+
+def _read_pidfile() -> int:
+    try:
+        return int(pidfile_path().read_text(encoding="ascii").strip())
+    except Exception:
+        return 0
+
+
+def _remove_pidfile(pid: int) -> None:
+    # 只删自己写的：新进程可能已经覆盖了 pidfile
+    if _read_pidfile() == pid:
+        try:
+            pidfile_path().unlink()
+        except OSError:
+            pass
+
+
+class StampDaemonUnavailable(RuntimeError):
+    """连不上检测进程（未启动且拉起失败）；调用方可退回一次性子进程。"""
+
+
+class StampDaemonTimeout(RuntimeError):
+    """检测进程没有在期限内回复（看门狗也没能回复，进程已卡死）。"""
+
+
+# =========================
+# server
+# =========================
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        raw = self.rfile.readline(_MAX_LINE)
+        if not raw.strip():
+            # 端口探测（连上即断）
+            return
+        try:
+            req = json.loads(raw.decode("utf-8"))
+            if not isinstance(req, dict):
+                raise ValueError("request is not a json object")
+        except Exception as e:
+            self._reply({"ok": False, "error": f"bad request: {e}"})
+            return
+
+        op = str(req.get("op") or "detect")
+        if op == "ping":
+            self._reply({"ok": True, "pid": os.getpid(), "served": self.server.served})
+            return
+        if op != "detect":
+            self._reply({"ok": False, "error": f"unknown op: {op}"})
+            return
+
+        started = time.perf_counter()
+        timeout = _as_timeout(req.get("timeout"))
+        watchdog = _Watchdog(self, timeout) if timeout > 0 else None
+        try:
+            result = self.server.detect(_existing_images(req.get("images")))
+        except Exception as e:
+            result = {"stamp_status": "UNCERTAIN", "evidence": [], "stamp_error": f"stamp daemon exception: {e}"}
+        if watchdog is not None and not watchdog.cancel():
+            # 看门狗已经回复超时并在结束进程
+            return
+        self.server.served += 1
+        max_requests = self.server.max_requests
+        recycle = max_requests > 0 and self.server.served >= max_requests
+        if recycle:
+            # 先关监听：之后的调用直接连不上、去拉起新进程，不会排进即将退出的进程
+            self.server.socket.close()
+        logger.info(
+            "stamp detect pages=%s status=%s in %.2fs",
+            len(req.get("images") or []),
+            result.get("stamp_status"),
+            time.perf_counter() - started,
+        )
+        self._reply({"ok": True, "result": result})
+
+        if recycle:
+            # 定期换新进程，防止长期运行的内存增长；下一次调用会自动拉起
+            logger.info("stamp daemon served %s requests, exiting for restart", self.server.served)
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def _reply(self, data: Dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+def _as_timeout(raw: Any) -> float:
+    try:
+        return max(0.0, float(raw or 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _Watchdog:
+    """单次检测的执行期限：从出队（开始处理）算起，在 backlog 里排队的时间不计入。"""
+
+    def __init__(self, handler: _Handler, timeout: float) -> None:
+        self._handler = handler
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._finished = False
+        self._timer = threading.Timer(timeout, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def cancel(self) -> bool:
+        """检测按时完成返回 True；看门狗已经触发返回 False。"""
+        with self._lock:
+            if self._finished:
+                return False
+            self._finished = True
+        self._timer.cancel()
+        return True
+
+    def _expire(self) -> None:
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        # 推理卡在 torch / C 扩展里没法中断，只能结束整个进程（等同原来超时杀子进程）。
+        # 先关监听：排队中的连接随之断开，调用方拉起新进程后重新送检
+        server = self._handler.server
+        server.socket.close()
+        logger.error("stamp detect exceeded %gs, exiting so the next call starts a fresh daemon", self._timeout)
+        try:
+            self._handler._reply(
+                {
+                    "ok": True,
+                    "result": {
+                        "stamp_status": "UNCERTAIN",
+                        "evidence": [],
+                        "stamp_error": f"stamp detect timeout after {self._timeout:g}s",
+                    },
+                }
+            )
+        except Exception:
+            pass
+        _remove_pidfile(os.getpid())
+        os._exit(3)
+
+
+class _Server(socketserver.TCPServer):
+    # 单线程串行处理：模型推理本身占满 CPU/GPU，排队即可，也避免并发加载多份模型
+    allow_reuse_address = sys.platform != "win32"
+
+    def __init__(self, address, detect, max_requests: int = 0, backlog: int = 64) -> None:
+        # 排队靠 listen backlog：默认 5 在多个 worker 同时送检（或模型加载期间）时会拒绝连接
+        self.request_queue_size = max(5, int(backlog))
+        super().__init__(address, _Handler)
+        self.detect = detect
+        self.max_requests = max(0, int(max_requests))
+        self.served = 0
+
+
+def _existing_images(paths: Any) -> List[Path]:
+    if not isinstance(paths, list):
+        return []
+    out: List[Path] = []
+    for p in paths:
+        if isinstance(p, str) and p.strip():
+            fp = Path(p).resolve()
+            if fp.exists():
+                out.append(fp)
+    return out
+
+
+def serve(
+    host: str,
+    port: int,
+    max_requests: int = 0,
+    warm: bool = True,
+    backlog: int = 64,
+    detect: Optional[Callable[[List[Path]], Dict[str, Any]]] = None,
+) -> None:
+    if detect is None:
+        # 模块顶层不加载模型，重的 import 都在检测函数里
+        from contract_review_worker.api.stamp_subprocess import _detect_stamp_yolo as detect
+
+    # 先占端口再加载模型：重复拉起的进程立即因端口占用退出；加载期间的请求在 backlog 里排队
+    server = _Server((host, port), detect=detect, max_requests=max_requests, backlog=backlog)
+    # 占住端口后才写 pidfile：调用方按它结束卡死的进程
+    pidfile_path().write_text(str(os.getpid()), encoding="ascii")
+    if warm:
+        started = time.perf_counter()
+        # 空页列表会完成模型加载（权重、阈值），不做推理
+        warm_result = detect([])
+        logger.info(
+            "stamp daemon warm in %.2fs (%s)",
+            time.perf_counter() - started,
+            warm_result.get("stamp_error") or "model loaded",
+        )
+    logger.info("stamp daemon listening on %s:%s pid=%s", host, port, os.getpid())
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        _remove_pidfile(os.getpid())
+
+
+# =========================
+# client
+# =========================
+def _call(request: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    try:
+        sock = socket.create_connection(daemon_address(), timeout=min(timeout, 5.0))
+    except OSError as e:
+        raise StampDaemonUnavailable(str(e)) from e
+    with sock:
+        sock.settimeout(timeout)
+        try:
+            sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as fh:
+                line = fh.readline(_MAX_LINE)
+        except socket.timeout as e:
+            # 与子进程超时同样处理（调用方记为 UNCERTAIN）；不重试，避免把同一批页面再排一次队
+            raise StampDaemonTimeout(f"stamp daemon timeout after {timeout:g}s") from e
+    if not line.strip():
+        # 检测进程在处理中途退出（崩溃 / 被杀 / 到期换新）
+        raise ConnectionError("stamp daemon closed connection without result")
+    data = json.loads(line.decode("utf-8"))
+    if not isinstance(data, dict) or not data.get("ok"):
+        raise RuntimeError(f"stamp daemon error: {(data or {}).get('error') if isinstance(data, dict) else data}")
+    return data
+
+
+def _port_open() -> bool:
+    try:
+        with socket.create_connection(daemon_address(), timeout=1.0):
+            return True
+    except OSError:
+        return False
+
+
+def ping(timeout: float = 2.0) -> bool:
+    try:
+        _call({"op": "ping"}, timeout)
+        return True
+    except Exception:
+        return False
+
+
+def kill_daemon(wait: float = 5.0) -> bool:
+    """按 pidfile 结束检测进程（卡死时用），等端口释放；返回是否发出了结束信号。"""
+    pid = _read_pidfile()
+    if pid <= 0 or pid == os.getpid():
+        return False
+    # 端口没人监听说明 pidfile 是已退出进程留下的，pid 可能已被复用，不能动
+    if not _port_open():
+        _remove_pidfile(pid)
+        return False
+    try:
+        # Windows 上即 TerminateProcess；POSIX 上检测进程没有 SIGTERM 处理器，卡在 C 扩展里也会立即结束
+        os.kill(pid, signal.SIGTERM)
+    except OSError as e:
+        logger.warning("kill stamp daemon pid=%s failed: %s", pid, e)
+        return False
+    logger.warning("killed unresponsive stamp daemon pid=%s", pid)
+    deadline = time.monotonic() + max(0.0, wait)
+    while time.monotonic() < deadline and _port_open():
+        time.sleep(0.1)
+    _remove_pidfile(pid)
+    return True
+
+
+def _spawn() -> subprocess.Popen:
+    log_path = (os.environ.get("STAMP_DAEMON_LOG") or "").strip() or str(
+        Path(tempfile.gettempdir()) / "contract_review_stamp_daemon.log"
+    )
+    kwargs: Dict[str, Any] = {}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0) | getattr(
+            subprocess, "CREATE_NO_WINDOW", 0
+        )
+    else:
+        kwargs["start_new_session"] = True
+    with open(log_path, "ab") as log_fh:
+        return subprocess.Popen(
+            [sys.executable, "-m", "contract_review_worker.api.stamp_daemon"],
+            cwd=str(BASE_DIR),
+            env=os.environ.copy(),
+            stdin=subprocess.DEVNULL,
+            stdout=log_fh,
+            stderr=subprocess.STDOUT,
+            close_fds=True,
+            **kwargs,
+        )
+
+
+def ensure_daemon() -> None:
+    """检测进程不在时拉起并等待它开始监听；多个 worker 同时拉起时只有一个能占住端口。"""
+    # 端口有人监听就算在运行：检测进程先占端口再加载模型，加载或检测期间 ping 会排队等待，
+    # 但新请求同样会在 backlog 里排队，不必（也不能）再拉起一个
+    if _port_open():
+        return
+    if not _env_flag("STAMP_DAEMON_AUTOSTART", True):
+        raise StampDaemonUnavailable("stamp daemon not running and STAMP_DAEMON_AUTOSTART=0")
+    start_timeout = _env_int("STAMP_DAEMON_START_TIMEOUT", 180)
+    with _SPAWN_LOCK:
+        if _port_open():
+            return
+        proc = _spawn()
+        deadline = time.monotonic() + max(1, start_timeout)
+        while time.monotonic() < deadline:
+            if _port_open():
+                return
+            # 新进程退出且端口没人监听才算失败；端口被占说明另一个 worker 拉起的进程正在加载
+            if proc.poll() is not None and not _port_open():
+                raise StampDaemonUnavailable(f"stamp daemon exited during startup: code={proc.returncode}")
+            time.sleep(0.5)
+    raise StampDaemonUnavailable(f"stamp daemon not ready after {start_timeout}s")
+
+
+def _call_detect(request: Dict[str, Any], read_timeout: float) -> Dict[str, Any]:
+    try:
+        return _call(request, read_timeout)
+    except StampDaemonTimeout:
+        # 进程内看门狗也没回复：进程已卡死，结束它，避免后续任务都排在它后面超时
+        kill_daemon()
+        raise
+
+
+def detect_stamp(page_images: List[Path], timeout: Optional[float] = None) -> Dict[str, Any]:
+    """timeout 是单次检测的执行期限，由检测进程从出队起计时；排队等待另有 STAMP_DAEMON_QUEUE_TIMEOUT。"""
+    if timeout is None:
+        timeout = float(_env_int("STAMP_SUBPROCESS_TIMEOUT", 240))
+    request = {
+        "op": "detect",
+        "images": [str(Path(p).resolve()) for p in page_images if Path(p).exists()],
+        "timeout": timeout,
+    }
+    # 客户端只兜底：排队 + 执行期限 + 余量内没有回复才认为检测进程卡死
+    read_timeout = timeout + max(0, _env_int("STAMP_DAEMON_QUEUE_TIMEOUT", 600)) + 10.0
+    try:
+        data = _call_detect(request, read_timeout)
+    except (StampDaemonUnavailable, ConnectionError):
+        # 没在运行或处理中途断开（崩溃 / 看门狗结束了排在前面的检测）：拉起新进程重试一次；再断开就把异常交给调用方
+        ensure_daemon()
+        data = _call_detect(request, read_timeout)
+    result = data.get("result")
+    if not isinstance(result, dict):
+        raise RuntimeError("stamp daemon result is not a json object")
+    return result
+
+
+def main(argv: List[str] | None = None) -> int:
+    from contract_review_worker.app_config import bootstrap
+
+    bootstrap(BASE_DIR)
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    host, port = daemon_address()
+    parser = argparse.ArgumentParser(description="Resident stamp detection server (models stay loaded).")
+    parser.add_argument("--host", default=host)
+    parser.add_argument("--port", type=int, default=port)
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=_env_int("STAMP_DAEMON_MAX_REQUESTS", 0),
+        help="Exit after this many detections (0 = never); the next call restarts it.",
+    )
+    parser.add_argument(
+        "--backlog",
+        type=int,
+        default=_env_int("STAMP_DAEMON_BACKLOG", 64),
+        help="Listen backlog: connections that may queue while a detection (or model load) is running.",
+    )
+    parser.add_argument("--no-warm", action="store_true", help="Load models on the first request instead of at startup.")
+    args = parser.parse_args(argv)
+    try:
+        serve(args.host, args.port, max_requests=args.max_requests, warm=not args.no_warm, backlog=args.backlog)
+    except OSError as e:
+        # 端口已被另一个检测进程占用：正常情况（并发拉起），直接退出
+        logger.info("stamp daemon not started: %s", e)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
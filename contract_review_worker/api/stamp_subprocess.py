@@ -14,6 +14,16 @@ BASE_DIR = Path(__file__).resolve().parents[2]
 bootstrap(BASE_DIR)
 
 
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name, "")
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except Exception:
+        return default
+
+
 def _env_flag(name: str, default: bool = False) -> bool:
     raw = os.environ.get(name, "")
     if not raw:
@@ -94,34 +104,19 @@ def _detect_stamp_stamp2vec(page_images: List[Path]) -> Dict[str, Any]:
             iou_val = float(iou_env)
         except Exception:
             iou_val = 0.3
-        try:
-            from detection_models.yolo_stamp import constants as s2v_consts  # type: ignore
-            from detection_models.yolo_stamp import utils as s2v_utils  # type: ignore
-
-            if 0 < conf_val < 1:
-                s2v_consts.OUTPUT_THRESH = conf_val
-                s2v_utils.OUTPUT_THRESH = conf_val
-            if 0 < iou_val < 1:
-                s2v_consts.IOU_THRESH = iou_val
-                s2v_utils.IOU_THRESH = iou_val
-        except Exception:
-            pass
 
         pipe = _load_stamp2vec_pipeline(repo, filename, local_path, device)
         evidence = []
         found = False
-        from PIL import Image  # type: ignore
-
-        for idx, img_path in enumerate(page_images):
-            with Image.open(img_path) as src:
-                img = src.convert("RGB")
-            try:
-                boxes = pipe(img)
-            finally:
-                try:
-                    img.close()
-                except Exception:
-                    pass
+        # 按批前向：一批页面一起预处理、一次推理；早停时后面的批次不再计算
+        batch_size = max(1, _env_int("STAMP_BATCH_SIZE", 8))
+        boxes_iter = pipe.iter_detect(
+            page_images,
+            batch_size=batch_size,
+            output_thresh=conf_val if 0 < conf_val < 1 else None,
+            iou_thresh=iou_val if 0 < iou_val < 1 else None,
+        )
+        for idx, boxes in enumerate(boxes_iter):
             if boxes is not None and len(boxes) > 0:
                 for b in boxes[:3]:
                     xyxy = b.tolist() if hasattr(b, "tolist") else list(b)
@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from contract_review_worker.api.callback_channel import CallbackChannel, CallbackRejected
+
+
+class _Django:
+    """假 Django：记录收到的回调；down=True 时模拟连接失败。"""
+
+    def __init__(self, delay: float = 0.0):
+        self.down = False
+        self.delay = delay
+        self.received = []
+        self._lock = threading.Lock()
+
+    def send(self, payload):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.down:
+            raise ConnectionError("django down")
+        if payload.get("reject"):
+            raise CallbackRejected("400")
+        with self._lock:
+            self.received.append(payload)
+
+
+class CallbackChannelTests(unittest.TestCase):
+    def setUp(self):
+        self.spool = Path(tempfile.mkdtemp(prefix="callback_spool_test_"))
+        self.addCleanup(shutil.rmtree, self.spool, True)
+        self.django = _Django()
+
+    def _channel(self, **kwargs):
+        kwargs.setdefault("attempts", 1)
+        kwargs.setdefault("backoff", 0.0)
+        return CallbackChannel(self.django.send, self.spool, **kwargs)
+
+    def _write_spool(self, name, payload):
+        path = self.spool / name
+        path.write_text(payload if isinstance(payload, str) else json.dumps(payload), encoding="utf-8")
+        return path
+
+    def _spooled(self):
+        return sorted(p.name for p in self.spool.iterdir() if p.is_file())
+
+    def test_terminal_is_spooled_and_replayed_after_recovery(self):
+        channel = self._channel()
+        self.django.down = True
+        channel.submit({"job_id": 1, "status": "done"})
+        self.assertTrue(channel.flush(5))
+        self.assertEqual(len(self._spooled()), 1)
+
+        self.django.down = False
+        channel._replay_spool()
+        self.assertEqual(self.django.received, [{"job_id": 1, "status": "done"}])
+        self.assertEqual(self._spooled(), [])
+
+    def test_running_progress_keeps_only_latest_and_is_dropped_after_terminal(self):
+        gate = threading.Event()
+        send = self.django.send
+
+        def gated_send(payload):
+            gate.wait(5)
+            send(payload)
+
+        self.django.send = gated_send
+        channel = self._channel()
+        channel.submit({"job_id": 9, "status": "running", "progress": 1})
+        time.sleep(0.1)  # 第一条已在发送线程里等待
+        channel.submit({"job_id": 9, "status": "running", "progress": 2})
+        channel.submit({"job_id": 9, "status": "running", "progress": 3})
+        channel.submit({"job_id": 9, "status": "done", "progress": 100})
+        channel.submit({"job_id": 9, "status": "running", "progress": 4})
+        gate.set()
+        self.assertTrue(channel.flush(5))
+        self.assertEqual([p["progress"] for p in self.django.received], [1, 100])
+
+    def test_corrupt_files_move_to_bad_and_do_not_block_replay(self):
+        self._write_spool("job_1_done_1.json", "{not json")
+        self._write_spool("job_2_done_2.json", "[1, 2]")
+        self._write_spool("job_3_done_3.json", {"job_id": 3, "status": "done"})
+        self._channel()._replay_spool()
+        self.assertEqual([p["job_id"] for p in self.django.received], [3])
+        self.assertEqual(self._spooled(), [])
+        self.assertEqual(sorted(p.name for p in (self.spool / "bad").iterdir()), ["job_1_done_1.json", "job_2_done_2.json"])
+
+    def test_failed_replay_releases_the_claim(self):
+        self._write_spool("job_1_done_1.json", {"job_id": 1, "status": "done"})
+        self._write_spool("job_2_done_2.json", {"job_id": 2, "status": "done"})
+        self.django.down = True
+        channel = self._channel()
+        channel._replay_spool()
+        self.assertEqual(self._spooled(), ["job_1_done_1.json", "job_2_done_2.json"])
+        self.assertGreater(channel._next_spool_scan, 0)
+
+    def test_rejected_spool_file_is_not_retried(self):
+        self._write_spool("job_1_done_1.json", {"job_id": 1, "status": "done", "reject": True})
+        self._channel()._replay_spool()
+        self.assertEqual(self._spooled(), [])
+
+    def test_concurrent_replays_deliver_each_file_once(self):
+        for i in range(20):
+            self._write_spool(f"job_{i}_done_{i:03d}.json", {"job_id": i, "status": "done"})
+        self.django.delay = 0.01
+        channels = [self._channel() for _ in range(4)]
+        threads = [threading.Thread(target=c._replay_spool) for c in channels]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        self.assertEqual(sorted(p["job_id"] for p in self.django.received), list(range(20)))
+        self.assertEqual(self._spooled(), [])
+
+    def test_claimed_file_is_skipped_until_the_claim_goes_stale(self):
+        path = self._write_spool("job_1_done_1.json", {"job_id": 1, "status": "done"})
+        claimed = path.with_name(path.name + ".inflight.424242")
+        os.rename(path, claimed)
+        channel = self._channel(claim_stale_s=60)
+        channel._replay_spool()
+        self.assertEqual(self.django.received, [])
+        self.assertEqual(self._spooled(), [claimed.name])
+
+        # 认领进程早已退出
+        old = time.time() - 120
+        os.utime(claimed, (old, old))
+        channel._replay_spool()
+        self.assertEqual(self.django.received, [{"job_id": 1, "status": "done"}])
+        self.assertEqual(self._spooled(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import unittest
+
+from contract_review_worker.api.json_stream import IncrementalJSONParser
+
+
+class IncrementalJSONParserTests(unittest.TestCase):
+    DOC = {
+        "合同类型": "服务合同",
+        "风险点": [
+            {"title": "付款 {条件}", "problem": "含 \"引号\" 与 ] 括号"},
+            "字符串条目",
+            {"title": "违约", "nested": {"a": [1, 2]}},
+        ],
+        "改进措施": [{"title": "补充验收标准"}],
+    }
+
+    def _feed(self, text, size):
+        parser = IncrementalJSONParser()
+        emitted = []
+        for i in range(0, len(text), size):
+            emitted.extend(parser.feed(text[i : i + size]))
+        return parser, emitted
+
+    def test_items_emitted_as_they_close_for_any_chunking(self):
+        text = "<think>先分析 {不是 JSON}</think>\n" + json.dumps(self.DOC, ensure_ascii=False)
+        for size in (1, 3, 7, len(text)):
+            parser, emitted = self._feed(text, size)
+            self.assertTrue(parser.complete)
+            self.assertEqual(parser.result(), self.DOC)
+            self.assertEqual(
+                emitted,
+                [("风险点", item) for item in self.DOC["风险点"]] + [("改进措施", item) for item in self.DOC["改进措施"]],
+            )
+
+    def test_truncated_stream_recovers_closed_items(self):
+        text = json.dumps(self.DOC, ensure_ascii=False)
+        cut = text.index("违约") + 1
+        parser, _ = self._feed(text[:cut], 5)
+        self.assertFalse(parser.complete)
+        data = parser.result()
+        self.assertEqual(data["合同类型"], "服务合同")
+        self.assertEqual(data["风险点"][:2], self.DOC["风险点"][:2])
+
+    def test_complete_but_invalid_root_uses_tail_recovery(self):
+        text = json.dumps(self.DOC, ensure_ascii=False)
+        # 模型常见的尾逗号：数组里、根对象里
+        trailing = text[:-2] + ",]}"
+        parser, emitted = self._feed(trailing, 4)
+        self.assertTrue(parser.complete)
+        self.assertEqual(parser.result(), self.DOC)
+        self.assertEqual(len(emitted), 4)
+        parser, _ = self._feed(text[:-1] + ",}", 4)
+        self.assertEqual(parser.result(), self.DOC)
+        parser, _ = self._feed('{"合同类型": tru}', 4)
+        with self.assertRaises(ValueError):
+            parser.result()
+
+    def test_non_json_response_raises(self):
+        parser = IncrementalJSONParser()
+        parser.feed("抱歉，无法完成")
+        with self.assertRaises(ValueError):
+            parser.result()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+try:
+    from contract_review_worker.api import main
+except ImportError:  # celery / OCR 依赖未安装
+    main = None
+
+
+@unittest.skipUnless(main, "worker dependencies are not installed")
+class PartialReviewForwarderTests(unittest.TestCase):
+    def setUp(self):
+        env = mock.patch.dict(os.environ, {"LLM_PARTIAL_PROGRESS": "1", "LLM_PARTIAL_MIN_INTERVAL": "0.2"})
+        env.start()
+        self.addCleanup(env.stop)
+        self.sent = []
+        notify = mock.patch.object(main, "notify_django", side_effect=self.sent.append)
+        notify.start()
+        self.addCleanup(notify.stop)
+        self.cancelled = threading.Event()
+        self.forward = main._partial_review_forwarder(7, "fast", self.cancelled)
+
+    def _partials(self):
+        return [p["meta"]["partial_result"] for p in self.sent]
+
+    def test_items_inside_the_interval_are_flushed_by_a_trailing_send(self):
+        self.forward("风险点", {"title": "付款"})
+        self.forward("风险点", {"title": "违约"})
+        self.forward("改进措施", {"title": "补充验收"})
+        self.forward("风险点", {"title": "违约"})  # 重复条目
+        self.assertEqual(len(self.sent), 1)
+        time.sleep(0.5)
+        self.assertEqual(
+            self._partials(),
+            [
+                {"risks": [{"title": "付款"}], "improvements": []},
+                {"risks": [{"title": "付款"}, {"title": "违约"}], "improvements": [{"title": "补充验收"}]},
+            ],
+        )
+        self.assertEqual([p["progress"] for p in self.sent], [81, 82])
+
+    def test_cancelled_stream_sends_nothing_more(self):
+        self.forward("风险点", {"title": "付款"})
+        self.forward("风险点", {"title": "违约"})
+        self.cancelled.set()
+        time.sleep(0.5)
+        self.assertEqual(len(self.sent), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
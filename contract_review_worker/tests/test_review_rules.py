@@ -0,0 +1,35 @@
+import re
+import unittest
+
+from contract_review_worker.api.review_rules import _KEYWORDS, RuleScan
+
+
+class RuleScanTests(unittest.TestCase):
+    TEXT = (
+        "本合同为建设工程施工合同。第一条 甲方应按期付款，逾期付款的，按日支付违约金；"
+        "违约责任：赔偿上限为合同总价的 20%。争议提交仲裁委员会仲裁。违约方承担违约责任。保密条款另行约定。"
+    )
+
+    def test_positions_and_counts_match_str_find(self):
+        scan = RuleScan(self.TEXT)
+        for kw in _KEYWORDS:
+            self.assertEqual(scan.first_pos.get(kw, -1), self.TEXT.find(kw), kw)
+            overlapping = len(re.findall("(?=" + re.escape(kw) + ")", self.TEXT))
+            self.assertEqual(scan.counts.get(kw, 0), overlapping, kw)
+
+    def test_snippet_falls_back_for_keywords_outside_the_trie(self):
+        scan = RuleScan(self.TEXT)
+        self.assertNotIn("建设工程施工合同", _KEYWORDS)
+        quotes = scan.snippets(("建设工程施工合同",), before=14, after=26, max_len=80, limit=3)
+        self.assertEqual(len(quotes), 1)
+        self.assertIn("建设工程施工合同", quotes[0])
+        self.assertEqual(scan.snippets(("不存在的关键词",), before=4, after=4, max_len=80, limit=3), [])
+
+    def test_find_matches_str_find(self):
+        scan = RuleScan(self.TEXT)
+        for kw in tuple(_KEYWORDS)[:20] + ("建设工程施工合同", "不存在的关键词", "仲裁"):
+            self.assertEqual(scan.find(kw), self.TEXT.find(kw), kw)
+
+
+if __name__ == "__main__":
+    unittest.main()
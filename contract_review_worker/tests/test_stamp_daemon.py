@@ -0,0 +1,168 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from contract_review_worker.api import stamp_daemon
+
+# 假检测进程：按页面文件名决定行为，不加载模型
+_FAKE_DAEMON = """
+import os, time
+from contract_review_worker.api import stamp_daemon
+
+def detect(images):
+    names = [p.name for p in images]
+    if any("hang" in n for n in names):
+        time.sleep(3600)
+    if any("crash" in n for n in names):
+        os._exit(1)
+    if any("slow" in n for n in names):
+        time.sleep(1.0)
+    return {"stamp_status": "YES" if names else "NO", "evidence": [], "pid": os.getpid()}
+
+host, port = stamp_daemon.daemon_address()
+stamp_daemon.serve(host, port, warm=False, detect=detect)
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StampDaemonTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="stamp_daemon_test_")
+        env = mock.patch.dict(
+            os.environ,
+            {
+                "STAMP_DAEMON_PORT": str(_free_port()),
+                "STAMP_DAEMON_PIDFILE": os.path.join(self.tmp, "daemon.pid"),
+                "STAMP_DAEMON_QUEUE_TIMEOUT": "5",
+                "STAMP_DAEMON_AUTOSTART": "1",
+                "STAMP_DAEMON_START_TIMEOUT": "20",
+            },
+        )
+        env.start()
+        self.addCleanup(env.stop)
+        self.procs = []
+        spawn = mock.patch.object(stamp_daemon, "_spawn", side_effect=self._spawn_fake)
+        self.spawn = spawn.start()
+        self.addCleanup(spawn.stop)
+        self.addCleanup(self._stop_daemons)
+
+    def _spawn_fake(self):
+        proc = subprocess.Popen(
+            [sys.executable, "-c", _FAKE_DAEMON],
+            cwd=str(stamp_daemon.BASE_DIR),
+            env=os.environ.copy(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.procs.append(proc)
+        return proc
+
+    def _stop_daemons(self):
+        for proc in self.procs:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait(10)
+        for name in os.listdir(self.tmp):
+            os.unlink(os.path.join(self.tmp, name))
+        os.rmdir(self.tmp)
+
+    def _page(self, name):
+        path = Path(self.tmp) / name
+        path.write_bytes(b"png")
+        return path
+
+    def _detect(self, name, timeout=5.0):
+        return stamp_daemon.detect_stamp([self._page(name)], timeout=timeout)
+
+    def _in_thread(self, fn, *args, **kwargs):
+        out = {}
+
+        def run():
+            try:
+                out["result"] = fn(*args, **kwargs)
+            except Exception as e:
+                out["error"] = e
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread, out
+
+    def test_spawns_on_first_call_and_reports_pid(self):
+        result = self._detect("page-1.png")
+        self.assertEqual(result["stamp_status"], "YES")
+        self.assertEqual(self.spawn.call_count, 1)
+        self.assertEqual(stamp_daemon._read_pidfile(), result["pid"])
+        # 已在运行时不再拉起
+        self.assertEqual(self._detect("page-2.png")["pid"], result["pid"])
+        self.assertEqual(self.spawn.call_count, 1)
+
+    def test_timeout_counts_from_dequeue(self):
+        self._detect("warm.png")
+        # 两个请求各执行 1s：第二个在 backlog 里排了约 1s，总耗时超过期限但执行时间没有
+        first = self._in_thread(self._detect, "slow-1.png", timeout=1.6)
+        second = self._in_thread(self._detect, "slow-2.png", timeout=1.6)
+        for thread, out in (first, second):
+            thread.join(30)
+            self.assertEqual(out.get("result", {}).get("stamp_status"), "YES", out)
+
+    def test_hung_detection_times_out_and_daemon_respawns(self):
+        pid = self._detect("warm.png")["pid"]
+        hung = self._in_thread(self._detect, "hang.png", timeout=0.8)
+        time.sleep(0.3)
+        queued = self._in_thread(self._detect, "queued.png")
+        hung[0].join(30)
+        queued[0].join(30)
+
+        result = hung[1]["result"]
+        self.assertEqual(result["stamp_status"], "UNCERTAIN")
+        self.assertIn("timeout", result["stamp_error"])
+        self.assertEqual(self.procs[0].wait(10), 3)
+        # 排在卡死检测后面的请求由新进程处理，而不是一起超时
+        self.assertEqual(queued[1]["result"]["stamp_status"], "YES")
+        self.assertNotEqual(queued[1]["result"]["pid"], pid)
+        self.assertEqual(self.spawn.call_count, 2)
+
+    def test_crash_affects_only_that_call(self):
+        pid = self._detect("warm.png")["pid"]
+        with self.assertRaises(ConnectionError):
+            self._detect("crash.png")
+        result = self._detect("after.png")
+        self.assertEqual(result["stamp_status"], "YES")
+        self.assertNotIn(result["pid"], (pid, 0))
+
+    def test_wedged_daemon_is_killed_by_pidfile(self):
+        pid = self._detect("warm.png")["pid"]
+        # 不带执行期限（看门狗不启动）模拟看门狗失效：客户端兜底超时后按 pidfile 结束进程
+        request = {"op": "detect", "images": [str(self._page("hang.png"))]}
+        with self.assertRaises(stamp_daemon.StampDaemonTimeout):
+            stamp_daemon._call_detect(request, 0.5)
+        self.assertIsNotNone(self.procs[0].wait(10))
+        self.assertFalse(stamp_daemon._port_open())
+        self.assertEqual(stamp_daemon._read_pidfile(), 0)
+        result = self._detect("after.png")
+        self.assertEqual(result["stamp_status"], "YES")
+        self.assertNotEqual(result["pid"], pid)
+
+    def test_stale_pidfile_is_not_killed(self):
+        stamp_daemon.pidfile_path().write_text(str(os.getpid() + 100000), encoding="ascii")
+        with mock.patch.object(stamp_daemon.os, "kill") as kill:
+            self.assertFalse(stamp_daemon.kill_daemon(wait=0))
+        self.assertFalse(kill.called)
+        self.assertEqual(stamp_daemon._read_pidfile(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
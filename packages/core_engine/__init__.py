@@ -1,3 +1,13 @@
+from .job_state import (
+    delete_job_state,
+    finish_job_state,
+    job_channel,
+    job_state_enabled,
+    next_event_seq,
+    read_job_state,
+    read_job_states,
+    write_job_state,
+)
 from .result_contract import (
     STAMP_STATUS_KEY,
     STAMP_TEXT_KEY,
@@ -10,7 +20,14 @@ __all__ = [
     "STAMP_STATUS_KEY",
     "STAMP_TEXT_KEY",
     "build_error_result",
+    "delete_job_state",
+    "finish_job_state",
+    "job_channel",
+    "job_state_enabled",
     "merge_stamp_result",
+    "next_event_seq",
+    "read_job_state",
+    "read_job_states",
     "stamp_status_to_cn",
+    "write_job_state",
 ]
-
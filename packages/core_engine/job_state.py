@@ -0,0 +1,364 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+try:
+    import redis  # type: ignore
+
+    REDIS_AVAILABLE = True
+except Exception:
+    redis = None  # type: ignore
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger("contract_job_state")
+
+# =========================
+# Redis 任务状态：进度 / 阶段 / 中间 meta
+# =========================
+# worker 直接写 Redis 哈希并 PUBLISH，job_status 优先读这里；
+# 只有 done/error 终态经 HTTP 回调落库（ContractJob），随后这里改为终态并缩短 TTL。
+
+TERMINAL_STATUSES = ("done", "error")
+STAGE_HISTORY_CAP = 120
+
+_KEY_PREFIX = "contract_job"
+_META_PREFIX = "meta:"
+_RETRY_AFTER_S = 30.0
+
+# KEYS: 状态哈希, 阶段历史列表
+# ARGV: ttl, 字段对数, 去重标记, 历史事件, 频道, 推送消息, 指定序号, 当前毫秒, 字段/值...
+# 每条阶段事件分配一个任务内单调的序号 seq（写进历史事件与推送消息），SSE 用它做事件 id；
+# 终态落库时随事件一起存进 ContractJobEvent.seq，Redis 视图与数据库视图的 id 因此一致。
+# 已是终态的哈希不接受非终态写入（返回 -1）：迟到的 worker 进度不能把 done/error 改回运行态，
+# 读方因此可以只信 Redis（status 总是第一个字段，即 ARGV[10]）。
+_WRITE_SCRIPT = """
+local ttl = tonumber(ARGV[1])
+local n = tonumber(ARGV[2])
+local current = redis.call('HGET', KEYS[1], 'status')
+if (current == 'done' or current == 'error') and ARGV[10] ~= 'done' and ARGV[10] ~= 'error' then
+  return -1
+end
+for i = 0, n - 1 do
+  redis.call('HSET', KEYS[1], ARGV[9 + 2 * i], ARGV[10 + 2 * i])
+end
+local message = ARGV[6]
+local seq = 0
+if ARGV[3] ~= '' and redis.call('HGET', KEYS[1], '_last_event') ~= ARGV[3] then
+  local last = tonumber(redis.call('HGET', KEYS[1], '_seq') or '0') or 0
+  seq = tonumber(ARGV[7]) or math.max(last + 1, tonumber(ARGV[8]))
+  local id = string.format('%%.0f', seq)
+  if seq > last then
+    redis.call('HSET', KEYS[1], '_seq', id)
+  end
+  redis.call('HSET', KEYS[1], '_last_event', ARGV[3])
+  redis.call('RPUSH', KEYS[2], '{"seq":' .. id .. ',' .. string.sub(ARGV[4], 2))
+  redis.call('LTRIM', KEYS[2], -%d, -1)
+  message = '{"seq":' .. id .. ',' .. string.sub(message, 2)
+end
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('EXPIRE', KEYS[2], ttl)
+if ARGV[5] ~= '' then
+  redis.call('PUBLISH', ARGV[5], message)
+end
+return seq
+""" % STAGE_HISTORY_CAP
+
+
+def next_event_seq(last_seq: Optional[int] = None) -> int:
+    """
+    阶段事件序号：max(上一条 + 1, 当前毫秒时间)。与 Redis 脚本同一规则，
+    Redis 重启 / 不可用期间由数据库分配的序号也不会与之后 Redis 分配的序号冲突或倒退。
+    """
+    return max(int(last_seq or 0) + 1, int(time.time() * 1000))
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    raw = os.environ.get(name, "")
+    if not raw:
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name, "")
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name, "")
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except Exception:
+        return default
+
+
+def job_state_enabled() -> bool:
+    return REDIS_AVAILABLE and _env_flag("JOB_STATE_REDIS_ENABLED", True)
+
+
+def job_state_key(job_id: Any) -> str:
+    return f"{_KEY_PREFIX}:{job_id}"
+
+
+def job_history_key(job_id: Any) -> str:
+    return f"{_KEY_PREFIX}:{job_id}:history"
+
+
+def job_channel(job_id: Any) -> str:
+    return f"{_KEY_PREFIX}:{job_id}:events"
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class _RedisHandle:
+    """懒连接 + 简单熔断：Redis 不可用时一段时间内直接跳过，调用方回退到数据库 / HTTP。"""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self._lock = threading.Lock()
+        self._client: Any = None
+        self._script: Any = None
+        self._down_until = 0.0
+
+    def client(self, force: bool = False) -> Any:
+        # force：终态写入不受熔断限制（状态必须切到终态或被删除）
+        if not force and time.monotonic() < self._down_until:
+            return None
+        with self._lock:
+            if self._client is None:
+                timeout_s = _env_float("JOB_STATE_REDIS_TIMEOUT", 0.5)
+                self._client = redis.Redis.from_url(
+                    self.url,
+                    socket_timeout=timeout_s,
+                    socket_connect_timeout=timeout_s,
+                    decode_responses=True,
+                )
+                self._script = self._client.register_script(_WRITE_SCRIPT)
+            return self._client
+
+    def script(self, force: bool = False) -> Any:
+        return self._script if self.client(force) is not None else None
+
+    def mark_down(self, err: Exception) -> None:
+        self._down_until = time.monotonic() + _RETRY_AFTER_S
+        logger.warning("[job_state] redis unavailable, retry in %.0fs: %s", _RETRY_AFTER_S, err)
+
+
+@lru_cache(maxsize=1)
+def _handle() -> _RedisHandle:
+    url = (os.environ.get("JOB_STATE_REDIS_URL") or "redis://127.0.0.1:6379/2").strip()
+    return _RedisHandle(url)
+
+
+def get_redis() -> Any:
+    """共享连接（供 SSE 等订阅方使用）；不可用时返回 None。"""
+    if not job_state_enabled():
+        return None
+    try:
+        return _handle().client()
+    except Exception as e:
+        _handle().mark_down(e)
+        return None
+
+
+def write_job_state(
+    job_id: Any,
+    *,
+    status: str,
+    progress: Optional[int] = None,
+    stage: str = "",
+    mode: Optional[str] = None,
+    meta: Optional[Dict[str, Any]] = None,
+    filename: Optional[str] = None,
+    ttl: Optional[int] = None,
+    force: bool = False,
+    seq: Optional[int] = None,
+) -> bool:
+    """
+    写入/合并任务状态，追加阶段历史并推送事件；失败返回 False。
+    任务已是终态时非终态写入被忽略（仍返回 True：状态已由终态回调处理，不需要再走 HTTP）。
+    seq：事件已在数据库落了一份（queued / submitted）时传入它的序号，两边的事件 id 保持一致。
+    """
+    if not job_state_enabled():
+        return False
+    handle = _handle()
+    try:
+        script = handle.script(force)
+        if script is None:
+            return False
+        ts = _now_iso()
+        fields: Dict[str, str] = {"status": status or "running", "updated_at": ts}
+        if progress is not None:
+            fields["progress"] = str(int(progress))
+        if stage:
+            fields["stage"] = stage
+        if mode is not None:
+            fields["mode"] = str(mode)
+        if filename is not None:
+            fields["filename"] = filename
+        for k, v in (meta or {}).items():
+            fields[_META_PREFIX + str(k)] = json.dumps(v, ensure_ascii=False)
+
+        event: Dict[str, Any] = {"stage": stage, "ts": ts}
+        if progress is not None:
+            event["progress"] = int(progress)
+        mark = f"{stage}|{'' if progress is None else int(progress)}" if stage else ""
+        message = dict(event, status=fields["status"], job_id=job_id)
+        partial = (meta or {}).get("partial_result")
+        if partial is not None:
+            # 流式审查的中间结果随推送带上：SSE 直接转发，不必再读一次状态
+            message["partial_result"] = partial
+
+        if ttl is None:
+            ttl = _env_int("JOB_STATE_TTL", 86400)
+        args: List[Any] = [
+            max(1, int(ttl)),
+            len(fields),
+            mark,
+            json.dumps(event, ensure_ascii=False),
+            job_channel(job_id) if _env_flag("JOB_STATE_PUBLISH", True) else "",
+            json.dumps(message, ensure_ascii=False),
+            "" if seq is None else int(seq),
+            int(time.time() * 1000),
+        ]
+        for k, v in fields.items():
+            args.extend((k, v))
+        script(keys=[job_state_key(job_id), job_history_key(job_id)], args=args)
+        return True
+    except Exception as e:
+        handle.mark_down(e)
+        return False
+
+
+def delete_job_state(job_id: Any, force: bool = False) -> bool:
+    """删除任务的 Redis 状态与阶段历史；读方随即回退到数据库。"""
+    if not job_state_enabled():
+        return False
+    handle = _handle()
+    try:
+        client = handle.client(force)
+        if client is None:
+            return False
+        client.delete(job_state_key(job_id), job_history_key(job_id))
+        return True
+    except Exception as e:
+        handle.mark_down(e)
+        return False
+
+
+def finish_job_state(
+    job_id: Any,
+    *,
+    status: str,
+    progress: Optional[int] = None,
+    stage: str = "",
+    ttl: Optional[int] = None,
+    attempts: int = 3,
+) -> bool:
+    """
+    终态切换（结果已落库之后调用）：绕过熔断重试写入，仍失败就删除 key。
+    两者都失败时记 error 并返回 False——此时 Redis 里可能残留运行态，读方在状态长时间未更新时核对数据库。
+    """
+    if not job_state_enabled():
+        return True
+    attempts = max(1, int(attempts))
+    for attempt in range(attempts):
+        if write_job_state(job_id, status=status, progress=progress, stage=stage, ttl=ttl, force=True):
+            return True
+        if delete_job_state(job_id, force=True):
+            logger.warning("[job_state] terminal write failed for job %s, live state deleted", job_id)
+            return True
+        if attempt + 1 < attempts:
+            time.sleep(0.1 * (attempt + 1))
+    logger.error(
+        "[job_state] could not publish terminal state for job %s after %s attempts; stale live state may remain",
+        job_id,
+        attempts,
+    )
+    return False
+
+
+def _decode_state(job_id: Any, raw: Dict[str, str], history_raw: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+    if not raw:
+        return None
+    runtime_meta: Dict[str, Any] = {}
+    for k, v in raw.items():
+        if k.startswith(_META_PREFIX):
+            try:
+                runtime_meta[k[len(_META_PREFIX):]] = json.loads(v)
+            except Exception:
+                continue
+    history: List[Dict[str, Any]] = []
+    for item in history_raw or []:
+        try:
+            history.append(json.loads(item))
+        except Exception:
+            continue
+    runtime_meta["stage_history"] = history
+    runtime_meta["updated_at"] = raw.get("updated_at") or ""
+
+    try:
+        progress = int(raw.get("progress") or 0)
+    except Exception:
+        progress = 0
+    return {
+        "job_id": job_id,
+        "status": raw.get("status") or "running",
+        "progress": progress,
+        "stage": raw.get("stage") or "",
+        "mode": raw.get("mode") or "",
+        "filename": raw.get("filename") or "",
+        "updated_at": raw.get("updated_at") or "",
+        "runtime_meta": runtime_meta,
+    }
+
+
+def read_job_states(job_ids: List[Any], with_history: bool = True) -> Dict[Any, Dict[str, Any]]:
+    """批量读取（一次 pipeline 往返）；只返回 Redis 里有记录的 job。"""
+    if not job_ids or not job_state_enabled():
+        return {}
+    handle = _handle()
+    try:
+        client = handle.client()
+        if client is None:
+            return {}
+        pipe = client.pipeline(transaction=False)
+        for job_id in job_ids:
+            pipe.hgetall(job_state_key(job_id))
+            if with_history:
+                pipe.lrange(job_history_key(job_id), 0, -1)
+        replies = pipe.execute()
+    except Exception as e:
+        handle.mark_down(e)
+        return {}
+
+    step = 2 if with_history else 1
+    out: Dict[Any, Dict[str, Any]] = {}
+    for i, job_id in enumerate(job_ids):
+        raw = replies[i * step]
+        history_raw = replies[i * step + 1] if with_history else None
+        state = _decode_state(job_id, raw, history_raw)
+        if state is not None:
+            out[job_id] = state
+    return out
+
+
+def read_job_state(job_id: Any) -> Optional[Dict[str, Any]]:
+    """读取任务状态；无记录或 Redis 不可用时返回 None（调用方回退到数据库）。"""
+    return read_job_states([job_id]).get(job_id)
@@ -1,16 +1,34 @@
+from .canonical import (
+    RESULT_SCHEMA_VERSION,
+    CanonicalResult,
+    ResultSchemaError,
+    ReviewItem,
+    canonicalize_result,
+    load_report_payload,
+)
 from .report_schema import (
     SCHEMA_VERSION,
     build_report_html,
     build_report_markdown,
     build_report_payload,
+    clear_report_payload_cache,
     normalize_result_json,
+    report_digest,
 )
 
 __all__ = [
+    "RESULT_SCHEMA_VERSION",
     "SCHEMA_VERSION",
+    "CanonicalResult",
+    "ResultSchemaError",
+    "ReviewItem",
     "build_report_html",
     "build_report_markdown",
     "build_report_payload",
+    "canonicalize_result",
+    "clear_report_payload_cache",
+    "load_report_payload",
     "normalize_result_json",
+    "report_digest",
 ]
 
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from .report_schema import (
+    SCHEMA_VERSION,
+    _build_report_payload,
+    build_report_payload,
+    normalize_result_json,
+    stamp_text_color,
+)
+
+# =========================
+# 规范化结果（写入时定型）
+# =========================
+# result_json 里可能是中文键、英文键、stamp_* 合并结果或原始文本，别名解析只在写入时做一次：
+# job_update 把结果定型为 CanonicalResult 存进 ContractJobResult.canonical，读路径按定型结构直接映射成
+# report_payload，不再经过别名表。结构变化时提升 RESULT_SCHEMA_VERSION，并用 migrate_result_schema 重算旧行。
+
+RESULT_SCHEMA_VERSION = 1
+
+
+class ResultSchemaError(ValueError):
+    pass
+
+
+def _require_str(value: Any, name: str) -> str:
+    if not isinstance(value, str):
+        raise ResultSchemaError(f"{name} must be a string, got {type(value).__name__}")
+    return value
+
+
+@dataclass(frozen=True)
+class ReviewItem:
+    __slots__ = ("title", "level", "problem", "suggestion")
+
+    title: str
+    level: str
+    problem: str
+    suggestion: str
+
+    def __post_init__(self) -> None:
+        for name in self.__slots__:
+            _require_str(getattr(self, name), f"item.{name}")
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "ReviewItem":
+        if not isinstance(data, dict):
+            raise ResultSchemaError("review item must be an object")
+        return cls(
+            data.get("title", ""),
+            data.get("level", ""),
+            data.get("problem", ""),
+            data.get("suggestion", ""),
+        )
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"title": self.title, "level": self.level, "problem": self.problem, "suggestion": self.suggestion}
+
+
+@dataclass(frozen=True)
+class CanonicalResult:
+    __slots__ = (
+        "version",
+        "contract_type",
+        "confidence_text",
+        "type_source",
+        "stamp_text",
+        "key_facts",
+        "overview",
+        "risks",
+        "improvements",
+    )
+
+    version: int
+    contract_type: str
+    confidence_text: str
+    type_source: str
+    stamp_text: str
+    # 保持字段顺序：((名称, 值), ...)
+    key_facts: Tuple[Tuple[str, str], ...]
+    overview: str
+    risks: Tuple[ReviewItem, ...]
+    improvements: Tuple[ReviewItem, ...]
+
+    def __post_init__(self) -> None:
+        if self.version != RESULT_SCHEMA_VERSION:
+            raise ResultSchemaError(f"unsupported result schema version: {self.version}")
+        for name in ("contract_type", "confidence_text", "type_source", "stamp_text", "overview"):
+            _require_str(getattr(self, name), name)
+        for key, value in self.key_facts:
+            _require_str(key, "key_facts key")
+            _require_str(value, f"key_facts[{key}]")
+        for name in ("risks", "improvements"):
+            if not all(isinstance(item, ReviewItem) for item in getattr(self, name)):
+                raise ResultSchemaError(f"{name} must contain ReviewItem")
+
+    @classmethod
+    def from_raw(cls, result_json: Any, result_markdown: str = "") -> "CanonicalResult":
+        """写入路径：别名解析 + 校验，得到定型结果。"""
+        payload = _build_report_payload(normalize_result_json(result_json), result_markdown)
+        return cls(
+            RESULT_SCHEMA_VERSION,
+            payload["contract_type"],
+            payload["confidence_text"],
+            payload["type_source"],
+            payload["stamp_text"],
+            tuple((str(k), v) for k, v in payload["key_facts"].items()),
+            payload["overview"],
+            tuple(ReviewItem.from_dict(item) for item in payload["risks"]),
+            tuple(ReviewItem.from_dict(item) for item in payload["improvements"]),
+        )
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "CanonicalResult":
+        """按定型结构还原并逐项校验（不做别名解析）；迁移命令核对已有行时使用。"""
+        if not isinstance(data, dict):
+            raise ResultSchemaError("canonical result must be an object")
+        key_facts = data.get("key_facts")
+        risks = data.get("risks")
+        improvements = data.get("improvements")
+        if not isinstance(key_facts, list) or not isinstance(risks, list) or not isinstance(improvements, list):
+            raise ResultSchemaError("canonical result is missing key_facts / risks / improvements")
+        try:
+            facts = tuple((k, v) for k, v in key_facts)
+        except (TypeError, ValueError) as e:
+            raise ResultSchemaError(f"bad key_facts: {e}") from e
+        return cls(
+            data.get("v"),
+            data.get("contract_type"),
+            data.get("confidence_text"),
+            data.get("type_source"),
+            data.get("stamp_text"),
+            facts,
+            data.get("overview"),
+            tuple(ReviewItem.from_dict(item) for item in risks),
+            tuple(ReviewItem.from_dict(item) for item in improvements),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "v": self.version,
+            "contract_type": self.contract_type,
+            "confidence_text": self.confidence_text,
+            "type_source": self.type_source,
+            "stamp_text": self.stamp_text,
+            # JSON 对象在部分数据库里不保证键序，关键要素按列表存
+            "key_facts": [[k, v] for k, v in self.key_facts],
+            "overview": self.overview,
+            "risks": [item.to_dict() for item in self.risks],
+            "improvements": [item.to_dict() for item in self.improvements],
+        }
+
+    def to_report_payload(self) -> Dict[str, Any]:
+        return {
+            "schema_version": SCHEMA_VERSION,
+            "contract_type": self.contract_type,
+            "confidence_text": self.confidence_text,
+            "type_source": self.type_source,
+            "stamp_text": self.stamp_text,
+            "stamp_color": stamp_text_color(self.stamp_text),
+            "key_facts": dict(self.key_facts),
+            "overview": self.overview,
+            "risks": [item.to_dict() for item in self.risks],
+            "improvements": [item.to_dict() for item in self.improvements],
+        }
+
+
+def canonicalize_result(result_json: Any, result_markdown: str = "") -> Optional[Dict[str, Any]]:
+    """job_update 写入时调用：返回可直接存库的定型结果；无法定型时返回 None（读路径回退别名解析）。"""
+    try:
+        return CanonicalResult.from_raw(result_json, result_markdown).to_dict()
+    except ResultSchemaError:
+        return None
+
+
+def _payload_from_canonical(data: Dict[str, Any]) -> Dict[str, Any]:
+    # 写入时已经校验过，这里只做结构映射（不逐项构造 dataclass）
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "contract_type": data["contract_type"],
+        "confidence_text": data["confidence_text"],
+        "type_source": data["type_source"],
+        "stamp_text": data["stamp_text"],
+        "stamp_color": stamp_text_color(data["stamp_text"]),
+        "key_facts": dict(data["key_facts"]),
+        "overview": data["overview"],
+        "risks": list(data["risks"]),
+        "improvements": list(data["improvements"]),
+    }
+
+
+def load_report_payload(
+    canonical: Any,
+    result_json: Any,
+    result_markdown: str = "",
+    digest: Optional[str] = None,
+) -> Dict[str, Any]:
+    """读路径：有当前版本的定型结果就直接还原；旧行（未迁移）回退到别名解析。"""
+    if isinstance(canonical, dict) and canonical.get("v") == RESULT_SCHEMA_VERSION:
+        try:
+            return _payload_from_canonical(canonical)
+        except (KeyError, TypeError, ValueError):
+            pass
+    return build_report_payload(normalize_result_json(result_json), result_markdown or "", digest=digest)
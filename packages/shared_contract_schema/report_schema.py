@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
 import re
+import threading
+from collections import OrderedDict
 from html import escape
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 SCHEMA_VERSION = "1.0.0"
 
@@ -63,17 +68,99 @@ def _as_list(value: Any) -> List[Any]:
     return [value]
 
 
-def _extract_review_items(result_json: Dict[str, Any], keys: List[str]) -> List[Any]:
-    candidates: List[Any] = []
-    for key in keys:
-        candidates.append(result_json.get(key))
-    for prefix in ("result", "review", "data"):
+# =========================
+# 字段别名表
+# =========================
+# 每个输出字段的候选键按优先级声明一次（字段 -> 别名元组）；归一化时每个字段按优先级逐个 get，
+# 取第一个非空值，未命中为空串。
+
+_ITEM_ALIASES = {
+    "title": ("title", "name", "item", _CN_RISKS, "\u95ee\u9898\u70b9"),
+    "level": ("level", "severity", "risk_level", "\u98ce\u9669\u7b49\u7ea7"),
+    "problem": ("problem", "issue", "desc", "description", "\u95ee\u9898"),
+    "suggestion": ("suggestion", "advice", "fix", "solution", "\u5efa\u8bae", "\u4fee\u6539\u5efa\u8bae"),
+}
+
+_KEY_FACT_ALIASES = {
+    "\u5408\u540c\u540d\u79f0": ("\u5408\u540c\u540d\u79f0", "\u534f\u8bae\u540d\u79f0", "contract_name", "name"),
+    "\u7532\u65b9": ("\u7532\u65b9", "\u7532\u65b9\u540d\u79f0", "partyA", "party_a"),
+    "\u4e59\u65b9": ("\u4e59\u65b9", "\u4e59\u65b9\u540d\u79f0", "partyB", "party_b"),
+    "\u91d1\u989d": ("\u91d1\u989d", "\u5408\u540c\u91d1\u989d", "\u603b\u91d1\u989d", "amount"),
+    "\u671f\u9650": ("\u671f\u9650", "\u5408\u540c\u671f\u9650", "\u6709\u6548\u671f", "term"),
+}
+
+_TOP_ALIASES = {
+    "contract_type": (_CN_CONTRACT_TYPE, "contract_type", "type", "type_l2"),
+    "overview": (_CN_OVERVIEW, "overview", "summary"),
+}
+
+_RISK_KEYS = (_CN_RISKS, "risks", "risk_points", _CN_RISKS_WITH_SUGGESTION)
+_IMPROVEMENT_KEYS = (
+    _CN_IMPROVEMENTS,
+    _CN_IMPROVEMENTS_ALT,
+    "improvements",
+    "improvement",
+    "improvement_suggestions",
+    "suggestions",
+    "recommendations",
+    "\u4f18\u5316\u5efa\u8bae",
+    "\u5b8c\u5584\u5efa\u8bae",
+    "\u4fee\u6539\u5efa\u8bae",
+    "\u5ba1\u67e5\u5efa\u8bae",
+)
+_NESTED_PREFIXES = ("result", "review", "data")
+
+
+def _text(value: Any) -> str:
+    # 与 _first_non_empty 对单个值的取舍一致
+    if isinstance(value, str):
+        return value.strip()
+    if value is None:
+        return ""
+    return str(value)
+
+
+class _AliasTable:
+    """resolve(mapping) -> 各字段首个非空值组成的元组（未命中为空串），字段顺序同声明顺序。"""
+
+    __slots__ = ("fields", "_aliases")
+
+    def __init__(self, spec: Dict[str, Tuple[str, ...]]) -> None:
+        self.fields = tuple(spec)
+        self._aliases = tuple(tuple(aliases) for aliases in spec.values())
+
+    def resolve(self, m: Dict[str, Any]) -> Tuple[str, ...]:
+        out = []
+        get = m.get
+        for aliases in self._aliases:
+            value = ""
+            for alias in aliases:
+                v = get(alias)
+                if v is not None:
+                    value = v.strip() if v.__class__ is str else _text(v)
+                    if value:
+                        break
+            out.append(value)
+        return tuple(out)
+
+
+_ITEM_TABLE = _AliasTable(_ITEM_ALIASES)
+_KEY_FACT_TABLE = _AliasTable(_KEY_FACT_ALIASES)
+_TOP_TABLE = _AliasTable(_TOP_ALIASES)
+
+
+def _extract_review_items(result_json: Dict[str, Any], keys: Tuple[str, ...]) -> List[Any]:
+    nodes = [result_json]
+    for prefix in _NESTED_PREFIXES:
         node = result_json.get(prefix)
         if isinstance(node, dict):
-            for key in keys:
-                candidates.append(node.get(key))
-    picked = _first_non_empty_value(candidates)
-    return _as_list(picked)
+            nodes.append(node)
+    for node in nodes:
+        for key in keys:
+            picked = _first_non_empty_value([node.get(key)])
+            if picked is not None:
+                return _as_list(picked)
+    return []
 
 
 def _normalize_review_item(item: Any, default_title: str) -> Dict[str, str]:
@@ -82,45 +169,8 @@ def _normalize_review_item(item: Any, default_title: str) -> Dict[str, str]:
         return {"title": text or default_title, "level": "", "problem": text, "suggestion": ""}
 
     if isinstance(item, dict):
-        return {
-            "title": _first_non_empty(
-                [
-                    item.get("title"),
-                    item.get("name"),
-                    item.get("item"),
-                    item.get(_CN_RISKS),
-                    item.get("\u95ee\u9898\u70b9"),
-                    default_title,
-                ]
-            ),
-            "level": _first_non_empty(
-                [
-                    item.get("level"),
-                    item.get("severity"),
-                    item.get("risk_level"),
-                    item.get("\u98ce\u9669\u7b49\u7ea7"),
-                ]
-            ),
-            "problem": _first_non_empty(
-                [
-                    item.get("problem"),
-                    item.get("issue"),
-                    item.get("desc"),
-                    item.get("description"),
-                    item.get("\u95ee\u9898"),
-                ]
-            ),
-            "suggestion": _first_non_empty(
-                [
-                    item.get("suggestion"),
-                    item.get("advice"),
-                    item.get("fix"),
-                    item.get("solution"),
-                    item.get("\u5efa\u8bae"),
-                    item.get("\u4fee\u6539\u5efa\u8bae"),
-                ]
-            ),
-        }
+        title, level, problem, suggestion = _ITEM_TABLE.resolve(item)
+        return {"title": title or default_title, "level": level, "problem": problem, "suggestion": suggestion}
 
     text = _first_non_empty([item]) or default_title
     return {"title": text, "level": "", "problem": text, "suggestion": ""}
@@ -135,13 +185,16 @@ def _has_meaningful_items(items: List[Dict[str, str]]) -> bool:
     return False
 
 
+_IMPROVEMENT_LINE_RE = re.compile(
+    r"(?:\u6539\u8fdb\u5efa\u8bae|\u4f18\u5316\u5efa\u8bae|\u5b8c\u5584\u5efa\u8bae|\u4fee\u6539\u5efa\u8bae|suggestion|recommendation)[:\uff1a]?\s*(.+)",
+    re.IGNORECASE,
+)
+
+
 def _extract_improvement_suggestions_from_markdown(markdown_text: str, max_items: int = 8) -> List[Dict[str, str]]:
     if not markdown_text:
         return []
-    pattern = re.compile(
-        r"(?:\u6539\u8fdb\u5efa\u8bae|\u4f18\u5316\u5efa\u8bae|\u5b8c\u5584\u5efa\u8bae|\u4fee\u6539\u5efa\u8bae|suggestion|recommendation)[:\uff1a]?\s*(.+)",
-        re.IGNORECASE,
-    )
+    pattern = _IMPROVEMENT_LINE_RE
     out: List[Dict[str, str]] = []
     seen = set()
     for raw_line in markdown_text.splitlines():
@@ -193,7 +246,65 @@ def _fallback_improvements_from_risks(risks: List[Dict[str, str]], max_items: in
     return out
 
 
-def build_report_payload(result_json: Dict[str, Any] | None, result_markdown: str = "") -> Dict[str, Any]:
+# =========================
+# report_payload 记忆化
+# =========================
+# 同一份结果会被状态、结果、导出反复构建。结果写库时算一次 report_digest（内容哈希）存起来，
+# 读路径带着 digest 调用即可命中缓存，不必为算键再序列化整份 result_json。
+# 缓存命中返回的是共享对象，调用方只读、不要修改。
+
+_PAYLOAD_CACHE_SIZE = max(0, int(os.environ.get("REPORT_PAYLOAD_CACHE_SIZE", "256") or 0))
+_PAYLOAD_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_PAYLOAD_CACHE_LOCK = threading.Lock()
+
+
+def report_digest(result_json: Any, result_markdown: str = "") -> str:
+    """result_json / markdown 的内容哈希（含 SCHEMA_VERSION），用作 build_report_payload 的缓存键。"""
+    raw = json.dumps(result_json, ensure_ascii=False, separators=(",", ":"), sort_keys=True, default=str)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(SCHEMA_VERSION.encode("ascii"))
+    h.update(b"\0")
+    h.update(raw.encode("utf-8", "surrogatepass"))
+    h.update(b"\0")
+    h.update((result_markdown or "").encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+def clear_report_payload_cache() -> None:
+    with _PAYLOAD_CACHE_LOCK:
+        _PAYLOAD_CACHE.clear()
+
+
+def build_report_payload(
+    result_json: Dict[str, Any] | None,
+    result_markdown: str = "",
+    digest: Optional[str] = None,
+) -> Dict[str, Any]:
+    if not digest or _PAYLOAD_CACHE_SIZE <= 0:
+        return _build_report_payload(result_json, result_markdown)
+
+    with _PAYLOAD_CACHE_LOCK:
+        cached = _PAYLOAD_CACHE.get(digest)
+        if cached is not None:
+            _PAYLOAD_CACHE.move_to_end(digest)
+            return cached
+    payload = _build_report_payload(result_json, result_markdown)
+    with _PAYLOAD_CACHE_LOCK:
+        _PAYLOAD_CACHE[digest] = payload
+        while len(_PAYLOAD_CACHE) > _PAYLOAD_CACHE_SIZE:
+            _PAYLOAD_CACHE.popitem(last=False)
+    return payload
+
+
+def stamp_text_color(stamp_text: str) -> str:
+    if stamp_text in ("\u662f", "YES", "True", "true"):
+        return "#0c7b48"
+    if stamp_text in ("\u5426", "NO", "False", "false"):
+        return "#b42318"
+    return "#6b7280"
+
+
+def _build_report_payload(result_json: Dict[str, Any] | None, result_markdown: str = "") -> Dict[str, Any]:
     data = normalize_result_json(result_json)
     raw_markdown = (result_markdown or "").strip()
 
@@ -217,14 +328,8 @@ def build_report_payload(result_json: Dict[str, Any] | None, result_markdown: st
             "improvements": [],
         }
 
-    contract_type = _first_non_empty(
-        [
-            data.get(_CN_CONTRACT_TYPE),
-            data.get("contract_type"),
-            data.get("type"),
-            data.get("type_l2"),
-        ]
-    ) or _DEFAULT_TYPE
+    contract_type, top_overview = _TOP_TABLE.resolve(data)
+    contract_type = contract_type or _DEFAULT_TYPE
 
     type_detail_raw = (
         data.get(_CN_CONTRACT_TYPE_DETAIL)
@@ -252,99 +357,30 @@ def build_report_payload(result_json: Dict[str, Any] | None, result_markdown: st
         elif stamp_status == "UNCERTAIN":
             stamp_value = "\u4e0d\u786e\u5b9a"
     stamp_text = _first_non_empty([stamp_value, _DEFAULT_STAMP])
-    if stamp_text in ("\u662f", "YES", "True", "true"):
-        stamp_color = "#0c7b48"
-    elif stamp_text in ("\u5426", "NO", "False", "false"):
-        stamp_color = "#b42318"
-    else:
-        stamp_color = "#6b7280"
+    stamp_color = stamp_text_color(stamp_text)
 
     key_facts_bucket = data.get("key_facts")
     if not isinstance(key_facts_bucket, dict):
         key_facts_bucket = {}
     key_facts = {
-        "\u5408\u540c\u540d\u79f0": _first_non_empty(
-            [
-                key_facts_bucket.get("\u5408\u540c\u540d\u79f0"),
-                key_facts_bucket.get("\u534f\u8bae\u540d\u79f0"),
-                key_facts_bucket.get("contract_name"),
-                key_facts_bucket.get("name"),
-                _DEFAULT_STAMP,
-            ]
-        ),
-        "\u7532\u65b9": _first_non_empty(
-            [
-                key_facts_bucket.get("\u7532\u65b9"),
-                key_facts_bucket.get("\u7532\u65b9\u540d\u79f0"),
-                key_facts_bucket.get("partyA"),
-                key_facts_bucket.get("party_a"),
-                _DEFAULT_STAMP,
-            ]
-        ),
-        "\u4e59\u65b9": _first_non_empty(
-            [
-                key_facts_bucket.get("\u4e59\u65b9"),
-                key_facts_bucket.get("\u4e59\u65b9\u540d\u79f0"),
-                key_facts_bucket.get("partyB"),
-                key_facts_bucket.get("party_b"),
-                _DEFAULT_STAMP,
-            ]
-        ),
-        "\u91d1\u989d": _first_non_empty(
-            [
-                key_facts_bucket.get("\u91d1\u989d"),
-                key_facts_bucket.get("\u5408\u540c\u91d1\u989d"),
-                key_facts_bucket.get("\u603b\u91d1\u989d"),
-                key_facts_bucket.get("amount"),
-                _DEFAULT_STAMP,
-            ]
-        ),
-        "\u671f\u9650": _first_non_empty(
-            [
-                key_facts_bucket.get("\u671f\u9650"),
-                key_facts_bucket.get("\u5408\u540c\u671f\u9650"),
-                key_facts_bucket.get("\u6709\u6548\u671f"),
-                key_facts_bucket.get("term"),
-                _DEFAULT_STAMP,
-            ]
-        ),
+        field: value or _DEFAULT_STAMP
+        for field, value in zip(_KEY_FACT_TABLE.fields, _KEY_FACT_TABLE.resolve(key_facts_bucket))
     }
 
-    overview = _first_non_empty(
-        [
-            data.get(_CN_OVERVIEW),
-            data.get("overview"),
-            data.get("summary"),
-            (data.get("result") or {}).get("overview") if isinstance(data.get("result"), dict) else None,
-            raw_markdown,
-        ]
-    ) or _DEFAULT_OVERVIEW
+    nested = data.get("result")
+    overview = (
+        top_overview
+        or (_text(nested.get("overview")) if isinstance(nested, dict) else "")
+        or raw_markdown
+        or _DEFAULT_OVERVIEW
+    )
 
-    risks = [
-        _normalize_review_item(item, _CN_RISKS)
-        for item in _extract_review_items(data, [_CN_RISKS, "risks", "risk_points", _CN_RISKS_WITH_SUGGESTION])
-    ]
+    risks = [_normalize_review_item(item, _CN_RISKS) for item in _extract_review_items(data, _RISK_KEYS)]
     for item in risks:
         item["suggestion"] = ""
 
     improvements = [
-        _normalize_review_item(item, _CN_IMPROVEMENTS)
-        for item in _extract_review_items(
-            data,
-            [
-                _CN_IMPROVEMENTS,
-                _CN_IMPROVEMENTS_ALT,
-                "improvements",
-                "improvement",
-                "improvement_suggestions",
-                "suggestions",
-                "recommendations",
-                "\u4f18\u5316\u5efa\u8bae",
-                "\u5b8c\u5584\u5efa\u8bae",
-                "\u4fee\u6539\u5efa\u8bae",
-                "\u5ba1\u67e5\u5efa\u8bae",
-            ],
-        )
+        _normalize_review_item(item, _CN_IMPROVEMENTS) for item in _extract_review_items(data, _IMPROVEMENT_KEYS)
     ]
     if not _has_meaningful_items(improvements):
         improvements = _extract_improvement_suggestions_from_markdown(raw_markdown)
@@ -0,0 +1,31 @@
+import json
+import unittest
+
+from packages.shared_contract_schema import build_report_payload, canonicalize_result, load_report_payload
+
+
+class CanonicalPayloadTests(unittest.TestCase):
+    CASES = [
+        ({"合同类型": "服务合同", "风险点": [{"title": "付款", "level": "高"}], "stamp_status": "YES"}, "概述"),
+        ({"contract_type": "租赁合同", "risks": [{"name": "押金", "severity": "中", "desc": "d", "advice": "a"}]}, ""),
+        ({"result": {"type": "买卖合同", "risk_points": ["字符串风险"], "suggestions": ["补充条款"]}}, "md"),
+        ({"key_facts": {"partyA": "A 公司", "乙方名称": "B 公司", "amount": "1 万元"}, "是否盖章": "否"}, ""),
+        ({"风险点": [], "改进措施": [{"修改建议": "只有建议"}], "overview": "  空白  "}, "# 报告\n- 风险"),
+        ({}, ""),
+        (None, "只有 markdown"),
+    ]
+
+    def test_canonical_payload_matches_alias_parsing(self):
+        for result_json, markdown in self.CASES:
+            with self.subTest(result_json=result_json):
+                expected = build_report_payload(result_json, markdown)
+                canonical = canonicalize_result(result_json, markdown)
+                self.assertEqual(load_report_payload(canonical, result_json, markdown), expected)
+                # 定型结果经 JSON 存库后再读回，结果不变
+                stored = json.loads(json.dumps(canonical, ensure_ascii=False)) if canonical is not None else None
+                self.assertEqual(load_report_payload(stored, result_json, markdown), expected)
+                self.assertEqual(load_report_payload(None, result_json, markdown), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
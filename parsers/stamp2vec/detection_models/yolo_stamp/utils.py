@@ -7,12 +7,57 @@ import matplotlib.pyplot as plt
 from .constants import *
 
 
-def output_tensor_to_boxes(boxes_tensor):
+_ANCHORS_WH = torch.tensor(ANCHORS, dtype=torch.float32)
+
+
+def decode_output(output):
+    """
+        Decodes raw YOLO output into boxes for every cell and anchor at once.
+
+        Arguments:
+        output -- tensor of shape (..., S, S, BOX, 5), e.g. one page or a whole batch
+
+        Returns:
+        decoded -- tensor of the same shape holding [x, y, w, h, prob] in input image pixels
+    """
+    cell_w, cell_h = W/S, H/S
+    output = output.float()
+    anchors_wh = _ANCHORS_WH.to(output.device)
+    xy = torch.sigmoid(output[..., 0:2])
+    wh = torch.exp(output[..., 2:4]) * anchors_wh
+    prob = torch.sigmoid(output[..., 4:5])
+    # column index j shifts x, row index i shifts y
+    rows = torch.arange(S, dtype=output.dtype, device=output.device).view(S, 1, 1)
+    cols = torch.arange(S, dtype=output.dtype, device=output.device).view(1, S, 1)
+    x = (xy[..., 0] + cols - wh[..., 0] / 2) * cell_w
+    y = (xy[..., 1] + rows - wh[..., 1] / 2) * cell_h
+    return torch.stack((x, y, wh[..., 0] * cell_w, wh[..., 1] * cell_h, prob[..., 0]), dim=-1)
+
+
+def select_boxes(decoded, output_thresh=None):
+    """
+        Keeps boxes of one image whose probability is above the threshold.
+
+        Arguments:
+        decoded -- tensor of shape (S, S, BOX, 5) from decode_output
+        output_thresh -- minimal probability (defaults to OUTPUT_THRESH)
+
+        Returns:
+        boxes -- tensor of shape (None, 5), in grid order (row, column, anchor)
+    """
+    if output_thresh is None:
+        output_thresh = OUTPUT_THRESH
+    boxes = decoded.reshape(-1, 5)
+    return boxes[boxes[:, 4] > output_thresh]
+
+
+def output_tensor_to_boxes(boxes_tensor, output_thresh=None):
     """
         Converts the YOLO output tensor to list of boxes with probabilites.
 
         Arguments:
         boxes_tensor -- tensor of shape (S, S, BOX, 5)
+        output_thresh -- minimal probability (defaults to OUTPUT_THRESH)
 
         Returns:
         boxes -- list of shape (None, 5)
@@ -20,25 +65,7 @@ def output_tensor_to_boxes(boxes_tensor):
         Note: "None" is here because you don't know the exact number of selected boxes, as it depends on the threshold. 
         For example, the actual output size of scores would be (10, 5) if there are 10 boxes
     """
-    cell_w, cell_h = W/S, H/S
-    boxes = []
-    
-    for i in range(S):
-        for j in range(S):
-            for b in range(BOX):
-                anchor_wh = torch.tensor(ANCHORS[b])
-                data = boxes_tensor[i,j,b]
-                xy = torch.sigmoid(data[:2])
-                wh = torch.exp(data[2:4])*anchor_wh
-                obj_prob = torch.sigmoid(data[4])
-                
-                if obj_prob > OUTPUT_THRESH:
-                    x_center, y_center, w, h = xy[0], xy[1], wh[0], wh[1]
-                    x, y = x_center+j-w/2, y_center+i-h/2
-                    x,y,w,h = x*cell_w, y*cell_h, w*cell_w, h*cell_h
-                    box = [x,y,w,h, obj_prob]
-                    boxes.append(box)
-    return boxes
+    return select_boxes(decode_output(boxes_tensor), output_thresh).tolist()
 
 
 def plot_img(img, size=(7,7)):
@@ -204,7 +231,7 @@ def compute_iou(box1, box2):
 
     area1, area2 = w1*h1, w2*h2
     intersect_w = overlap((x1,x1+w1), (x2,x2+w2))
-    intersect_h = overlap((y1,y1+h1), (y2,y2+w2))
+    intersect_h = overlap((y1,y1+h1), (y2,y2+h2))
     if intersect_w == w1 and intersect_h == h1 or intersect_w == w2 and intersect_h == h2:
         return 1.
     intersect_area = intersect_w*intersect_h
@@ -212,28 +239,75 @@ def compute_iou(box1, box2):
     return iou
 
 
-def nonmax_suppression(boxes, iou_thresh = IOU_THRESH):
+def pairwise_iou(boxes):
+    """
+        IOU between every pair of boxes; a box lying inside another counts as 1 (same rule as compute_iou).
+
+        Arguments:
+        boxes -- tensor of shape (n, 4+) with [x, y, w, h, ...]
+
+        Returns:
+        iou -- tensor of shape (n, n)
+    """
+    x, y, w, h = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    x2, y2 = x + w, y + h
+    inter_w = (torch.minimum(x2[:, None], x2[None, :]) - torch.maximum(x[:, None], x[None, :])).clamp(min=0)
+    inter_h = (torch.minimum(y2[:, None], y2[None, :]) - torch.maximum(y[:, None], y[None, :])).clamp(min=0)
+    inter = inter_w * inter_h
+    area = w * h
+    iou = inter / (area[:, None] + area[None, :] - inter).clamp(min=1e-9)
+    inside_row = torch.isclose(inter_w, w[:, None]) & torch.isclose(inter_h, h[:, None])
+    inside_col = torch.isclose(inter_w, w[None, :]) & torch.isclose(inter_h, h[None, :])
+    return torch.where(inside_row | inside_col, torch.ones_like(iou), iou)
+
+
+def suppress_boxes(boxes, iou_thresh=None):
+    """
+        Greedy non-maximum suppression on a tensor of boxes.
+
+        Arguments:
+        boxes -- tensor of shape (n, 5) with [x, y, w, h, prob]
+        iou_thresh -- maximal iou when boxes are considered different (defaults to IOU_THRESH)
+
+        Returns:
+        boxes -- tensor of shape (None, 5), sorted by probability
+    """
+    if iou_thresh is None:
+        iou_thresh = IOU_THRESH
+    if boxes.shape[0] <= 1:
+        return boxes
+    order = torch.sort(boxes[:, 4], descending=True, stable=True).indices
+    boxes = boxes[order]
+    # only a higher-ranked box can suppress a lower-ranked one
+    overlaps = torch.triu(pairwise_iou(boxes) > iou_thresh, diagonal=1).tolist()
+    suppressed = [False] * boxes.shape[0]
+    keep = []
+    for i, row in enumerate(overlaps):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        for j, hit in enumerate(row):
+            if hit:
+                suppressed[j] = True
+    return boxes[keep]
+
+
+def nonmax_suppression(boxes, iou_thresh=None):
     """
         Removes ovelap bboxes
 
         Arguments:
         boxes -- list of shape (None, 5)
-        iou_thresh -- maximal value of iou when boxes are considered different
+        iou_thresh -- maximal value of iou when boxes are considered different (defaults to IOU_THRESH)
         Each box is [x, y, w, h, prob]
 
         Returns:
         boxes -- list of shape (None, 5) with removed overlapping boxes
     """
-    boxes = sorted(boxes, key=lambda x: x[4], reverse=True)
-    for i, current_box in enumerate(boxes):
-        if current_box[4] <= 0:
-            continue
-        for j in range(i+1, len(boxes)):
-            iou = compute_iou(current_box, boxes[j])
-            if iou > iou_thresh:
-                boxes[j][4] = 0
-    boxes = [box for box in boxes if box[4] > 0]
-    return boxes
+    if len(boxes) == 0:
+        return []
+    t = boxes if isinstance(boxes, torch.Tensor) else torch.tensor([list(map(float, b[:5])) for b in boxes])
+    return suppress_boxes(t, iou_thresh).tolist()
 
 
     
@@ -1,12 +1,17 @@
-from typing import Any
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
 from detection_models.yolo_stamp.constants import *
 from detection_models.yolo_stamp.utils import *
 from detection_models.yolo_stamp.model import SymReLU, YOLOStamp
-import albumentations as A
-from albumentations.pytorch.transforms import ToTensorV2
 import torch
 from huggingface_hub import hf_hub_download
 import numpy as np
+from PIL import Image
+
+# same as albumentations Normalize() with max_pixel_value=255
+_NORM_MEAN = np.array(MEAN, dtype=np.float32) * 255.0
+_NORM_SCALE = 1.0 / (np.array(STD, dtype=np.float32) * 255.0)
 
 
 def _safe_load_yolo_stamp(path: str):
@@ -31,14 +36,34 @@ def _safe_load_yolo_stamp(path: str):
         return torch.load(path, map_location="cpu")
 
 
+def _load_resized(image) -> Tuple[Tuple[int, int], np.ndarray]:
+    """Opens (if given a path) and resizes one page; returns original (w, h) and an HxWx3 uint8 array."""
+    if isinstance(image, (str, os.PathLike)):
+        with Image.open(image) as src:
+            size = src.size
+            resized = src.convert("RGB").resize((W, H))
+    else:
+        size = image.size
+        resized = image.convert("RGB").resize((W, H))
+    return size, np.asarray(resized)
+
+
+def _page_boxes(decoded: torch.Tensor, coef: torch.Tensor, output_thresh=None, iou_thresh=None) -> torch.Tensor:
+    """Filters and suppresses one page of decoded output (S, S, BOX, 5); returns xyxy boxes in original image pixels."""
+    boxes = suppress_boxes(select_boxes(decoded, output_thresh), iou_thresh)
+    if boxes.shape[0] == 0:
+        return torch.empty((0, 4))
+    boxes_xy = xywh2xyxy(boxes[:, :4])
+    boxes_xy = boxes_xy * coef
+    return boxes_xy
+
+
 class YoloStampPipeline:
     def __init__(self):
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         self.model = None
-        self.transform = A.Compose([
-            A.Normalize(),
-            ToTensorV2(p=1.0),
-        ])
+        # threads for page decode + resize (PIL releases the GIL there)
+        self.preprocess_workers = max(1, min(4, os.cpu_count() or 1))
     
     @classmethod
     def from_pretrained(cls, model_path_hf: str = None, filename_hf: str = "weights.pt", local_model_path: str = None):
@@ -52,36 +77,77 @@ class YoloStampPipeline:
             yolo.model.to(yolo.device)
             yolo.model.eval()
         return yolo
-    
-    def __call__(self, image) -> torch.Tensor:
-        shape = torch.tensor(image.size)
-        coef =  torch.hstack((shape, shape)) / 448
-        image = image.convert("RGB").resize((448, 448))
-        image_np = np.array(image)
-        image_tensor = self.transform(image=image_np)["image"]
-        output = self.model(image_tensor.unsqueeze(0).to(self.device))
+
+    def preprocess(self, images: Sequence) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+            Resizes and normalizes a batch of pages at once.
+
+            Arguments:
+            images -- PIL images or image paths
+
+            Returns:
+            batch -- float tensor of shape (N, 3, H, W)
+            coefs -- tensor of shape (N, 4) mapping model coordinates back to each page
+        """
+        if len(images) > 1 and self.preprocess_workers > 1:
+            with ThreadPoolExecutor(max_workers=min(self.preprocess_workers, len(images))) as pool:
+                loaded = list(pool.map(_load_resized, images))
+        else:
+            loaded = [_load_resized(image) for image in images]
+        sizes = torch.tensor([size for size, _ in loaded], dtype=torch.float32)
+        coefs = torch.hstack((sizes, sizes)) / 448
+        pixels = np.stack([arr for _, arr in loaded]).astype(np.float32)
+        pixels -= _NORM_MEAN
+        pixels *= _NORM_SCALE
+        batch = torch.from_numpy(np.ascontiguousarray(pixels.transpose(0, 3, 1, 2)))
+        return batch, coefs
+
+    def _forward(self, batch: torch.Tensor) -> Any:
+        with torch.inference_mode():
+            output = self.model(batch.to(self.device))
         if isinstance(output, (list, tuple)):
             if not output:
-                return torch.empty((0, 4))
-            output_tensor = output[0]
-        else:
-            output_tensor = output
-        if not torch.is_tensor(output_tensor):
-            return torch.empty((0, 4))
-        if output_tensor.ndim == 5 and output_tensor.shape[0] == 1:
-            output_tensor = output_tensor[0]
-        if output_tensor.ndim != 4:
-            return torch.empty((0, 4))
-        boxes = output_tensor_to_boxes(output_tensor.detach().cpu())
-        boxes = nonmax_suppression(boxes=boxes)
-        if boxes is None or len(boxes) == 0:
-            return torch.empty((0, 4))
-        t = torch.tensor(boxes)
-        if t.ndim == 1:
-            if t.numel() < 4:
-                return torch.empty((0, 4))
-            t = t.view(1, -1)
-        t = t[:, :4]
-        boxes_xy = xywh2xyxy(t)
-        boxes_xy = boxes_xy * coef
-        return boxes_xy
+                return None
+            output = output[0]
+        if not torch.is_tensor(output):
+            return None
+        if output.ndim == 4 and batch.shape[0] == 1:
+            output = output.unsqueeze(0)
+        if output.ndim != 5 or output.shape[0] != batch.shape[0]:
+            return None
+        return output.detach().cpu()
+
+    def iter_detect(
+        self,
+        images: Sequence,
+        batch_size: int = 8,
+        output_thresh: Optional[float] = None,
+        iou_thresh: Optional[float] = None,
+    ) -> Iterator[torch.Tensor]:
+        """
+            Yields xyxy boxes per page, in order. Pages are preprocessed and run through the model
+            batch_size at a time, so a caller that stops iterating skips the remaining batches.
+            Thresholds default to OUTPUT_THRESH / IOU_THRESH.
+        """
+        batch_size = max(1, int(batch_size))
+        for start in range(0, len(images), batch_size):
+            batch, coefs = self.preprocess(images[start:start + batch_size])
+            output = self._forward(batch)
+            decoded = decode_output(output) if output is not None else None
+            for k in range(batch.shape[0]):
+                if decoded is None:
+                    yield torch.empty((0, 4))
+                else:
+                    yield _page_boxes(decoded[k], coefs[k], output_thresh, iou_thresh)
+
+    def detect_batch(
+        self,
+        images: Sequence,
+        batch_size: int = 8,
+        output_thresh: Optional[float] = None,
+        iou_thresh: Optional[float] = None,
+    ) -> List[torch.Tensor]:
+        return list(self.iter_detect(images, batch_size, output_thresh, iou_thresh))
+
+    def __call__(self, image) -> torch.Tensor:
+        return self.detect_batch([image])[0]
@@ -0,0 +1,65 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from detection_models.yolo_stamp import utils
+from detection_models.yolo_stamp.constants import ANCHORS, BOX, H, IOU_THRESH, OUTPUT_THRESH, S, W
+
+
+def loop_output_to_boxes(output):
+    # per-cell, per-anchor decoding as it was before vectorization
+    cell_w, cell_h = W / S, H / S
+    boxes = []
+    for i in range(S):
+        for j in range(S):
+            for b in range(BOX):
+                data = output[i, j, b]
+                xy = torch.sigmoid(data[:2])
+                wh = torch.exp(data[2:4]) * torch.tensor(ANCHORS[b])
+                prob = torch.sigmoid(data[4])
+                if prob > OUTPUT_THRESH:
+                    x, y = xy[0] + j - wh[0] / 2, xy[1] + i - wh[1] / 2
+                    boxes.append([float(x * cell_w), float(y * cell_h), float(wh[0] * cell_w), float(wh[1] * cell_h), float(prob)])
+    return boxes
+
+
+def loop_nms(boxes, iou_thresh):
+    boxes = sorted([list(b) for b in boxes], key=lambda b: b[4], reverse=True)
+    for i, current in enumerate(boxes):
+        if current[4] <= 0:
+            continue
+        for j in range(i + 1, len(boxes)):
+            if utils.compute_iou(current, boxes[j]) > iou_thresh:
+                boxes[j][4] = 0
+    return [b for b in boxes if b[4] > 0]
+
+
+class TestYoloStampUtils:
+
+    def test_decode_matches_loop(self):
+        gen = torch.Generator().manual_seed(0)
+        output = torch.randn(S, S, BOX, 5, generator=gen)
+        output[..., 4] += 1.5
+        expected = loop_output_to_boxes(output)
+        got = utils.output_tensor_to_boxes(output)
+        assert len(got) == len(expected)
+        assert torch.allclose(torch.tensor(got), torch.tensor(expected), atol=1e-4)
+        batch = utils.decode_output(torch.stack([output, output]))
+        assert torch.allclose(batch[1], utils.decode_output(output))
+
+    def test_suppress_matches_loop(self):
+        gen = torch.Generator().manual_seed(1)
+        for _ in range(5):
+            xy = torch.rand(40, 2, generator=gen) * 300
+            wh = torch.rand(40, 2, generator=gen) * 80 + 10
+            prob = torch.rand(40, 1, generator=gen)
+            boxes = torch.cat([xy, wh, prob], dim=1)
+            # a box fully inside another one counts as iou 1, as in compute_iou
+            boxes[1] = torch.tensor([boxes[0, 0] + 1, boxes[0, 1] + 1, boxes[0, 2] / 2, boxes[0, 3] / 2, 0.01])
+            expected = loop_nms(boxes.tolist(), IOU_THRESH)
+            got = utils.suppress_boxes(boxes, IOU_THRESH)
+            assert got.shape[0] == len(expected)
+            assert torch.allclose(got, torch.tensor(expected), atol=1e-5)
+
+    def test_nonmax_suppression_empty(self):
+        assert utils.nonmax_suppression([]) == []
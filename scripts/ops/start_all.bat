@@ -22,6 +22,7 @@ set "DJANGO_HEALTH_URL=http://127.0.0.1:8000/contract/api/health/"
 set "WORKER_HEALTH_URL=http://127.0.0.1:8001/healthz"
 
 if not defined LOCAL_API_PORT set "LOCAL_API_PORT=8003"
+if not defined STAMP_DAEMON_PORT set "STAMP_DAEMON_PORT=18765"
 set "LOCAL_API_HEALTH_URL=http://127.0.0.1:%LOCAL_API_PORT%/contract/api/health/"
 
 if not defined DJANGO_HOST set "DJANGO_HOST=127.0.0.1"
@@ -38,7 +39,7 @@ if not defined LOCAL_VLLM_MODEL set "LOCAL_VLLM_MODEL=.\hf_models\Qwen3-8B-AWQ"
 if not defined LOCAL_VLLM_SERVED_MODEL set "LOCAL_VLLM_SERVED_MODEL=%LOCAL_VLLM_MODEL%"
 if not defined LOCAL_VLLM_API_KEY set "LOCAL_VLLM_API_KEY=dummy"
 if not defined VLLM_MAX_MODEL_LEN set "VLLM_MAX_MODEL_LEN=4096"
-if not defined LOCAL_VLLM_EXTRA_ARGS set "LOCAL_VLLM_EXTRA_ARGS=--quantization awq_marlin --dtype half --gpu-memory-utilization 0.86 --max-model-len 256 --max-num-seqs 1 --enforce-eager"
+if not defined LOCAL_VLLM_EXTRA_ARGS set "LOCAL_VLLM_EXTRA_ARGS=--quantization awq_marlin --dtype half --gpu-memory-utilization 0.86 --max-model-len 256 --max-num-seqs 1 --enforce-eager --enable-prefix-caching"
 if defined LOCAL_VLLM_PYTHON set "VLLM_PY=%LOCAL_VLLM_PYTHON%"
 
 if not defined LLM_PRIMARY_PROVIDER set "LLM_PRIMARY_PROVIDER=%LLM_PROVIDER%"
@@ -175,6 +176,8 @@ call :kill_port 8001
 echo [stop] %CELERY_TITLE%
 taskkill /F /FI "WINDOWTITLE eq %CELERY_TITLE%" >nul 2>nul
 call :kill_celery
+echo [stop] stamp daemon
+call :kill_port %STAMP_DAEMON_PORT%
 echo [stop] %DJANGO_TITLE%
 taskkill /F /FI "WINDOWTITLE eq %DJANGO_TITLE%" >nul 2>nul
 call :kill_port 8000